@@ -19,6 +19,8 @@ from backend.app.schemas.grid import (
 from backend.app.services.grid.grid_service import GridService
 from backend.app.services.grid.grid_strategy_factory import GridStrategyFactory
 from backend.utils.exchange_connection_manager import exchange_connection_manager
+from backend.utils.market_metadata import market_metadata_cache
+from backend.app.schemas.trading import ExchangeEnum
 from backend.app.api.endpoints.settings import get_user_api_keys
 from backend.app.services.market_data import MarketDataService
 
@@ -59,22 +61,21 @@ async def create_grid_strategy(
             logger.error(f"無法獲取交易所連接 - user:{user_id}, exchange:{exchange}")
             raise HTTPException(status_code=500, detail="無法連接到交易所")
         
-        # 獲取交易對信息
-        exchange_info = await client.get_exchange_info()
-        symbol_info = next((s for s in exchange_info["symbols"] if s["symbol"] == grid_request.symbol), None)
+        # 獲取交易對規則，來自進程內共享的市場元數據並同步到 SymbolRules
+        rules = await market_metadata_cache.get_symbol_rules(
+            ExchangeEnum(exchange), grid_request.symbol, market_type="future", db=db
+        )
         
-        if not symbol_info:
+        if not rules:
             logger.warning(f"未找到交易對信息 - user:{user_id}, symbol:{grid_request.symbol}")
             raise HTTPException(status_code=400, detail=f"未找到交易對 {grid_request.symbol} 的信息")
         
         # 解析規則
-        price_precision = symbol_info["pricePrecision"]
-        qty_precision = symbol_info["quantityPrecision"]
-        filters = {f["filterType"]: f for f in symbol_info["filters"]}
-        
-        min_qty = float(filters["LOT_SIZE"]["minQty"])
-        min_notional = float(filters["MIN_NOTIONAL"]["notional"])
-        max_leverage = int(symbol_info.get("leverageFilter", {}).get("maxLeverage", 125))
+        price_precision = rules["price_precision"]
+        qty_precision = rules["quantity_precision"]
+        min_qty = float(rules["min_quantity"])
+        min_notional = float(rules["min_notional"])
+        max_leverage = int(rules["max_leverage"] or 125)
         
         # 獲取交易所費率
         fee_info = await client.get_fee_info(grid_request.symbol)
@@ -17,13 +17,24 @@ import httpx  # 導入現代化的HTTP客戶端，支援異步請求
 import json  # 導入JSON處理工具
 import asyncio  # 導入異步IO處理庫
 import time  # 導入時間處理函數
+import numpy as np  # 導入NumPy，用於比較列式行情存儲的更新時間
 from datetime import datetime  # 導入日期時間處理類
 from sqlalchemy.orm import Session  # 導入SQLAlchemy的ORM會話類
 from ...db.database import get_db  # 導入資料庫連接函數
 from fastapi.security import OAuth2PasswordBearer  # 導入OAuth2密碼授權機制
 from fastapi.responses import JSONResponse  # 導入JSON響應類
-from websockets.exceptions import ConnectionClosed, ConnectionClosedOK, ConnectionClosedError  # 導入WebSocket連接相關異常
+from websockets.exceptions import ConnectionClosed  # 導入WebSocket連接相關異常
 from ...services.market_data import market_data_service  # 導入市場數據服務
+from ...services.candle_store import candle_store  # 導入K線存儲服務
+from ...services.indicators import to_json_values  # 導入指標結果的JSON轉換工具
+from ...services.screener import market_screener  # 導入全市場篩選服務
+from ...services.order_book import order_book_service  # 導入訂單簿深度緩存服務
+from ...services.market_recorder import market_recorder  # 導入行情歷史記錄服務
+from ...core.ws_broadcast import WebSocketFanout  # 導入帶背壓的併發廣播工具
+from ...core.topic_registry import TopicRegistry  # 導入按主題共享生產者的推送註冊表
+from ...core.http_client import http_clients  # 導入按主機共享的長連接HTTP客戶端
+from ...core.config import settings  # 導入系統配置
+from ...core.async_cache import AsyncSingleFlightCache  # 導入按鍵合併並發請求的異步緩存
 import os  # 導入操作系統模組，用於環境變數
 from bs4 import BeautifulSoup  # 導入BeautifulSoup，用於解析HTML
 from dotenv import load_dotenv  # 導入dotenv以載入環境變數
@@ -133,7 +144,9 @@ class PriceCache:
     主要特點:
     - 支援多交易所數據緩存 (Binance、Bybit、OKX等)
     - 區分現貨和期貨市場
-    - 異步更新機制
+    - 訂閱市場數據總線，幣安行情保存在列式存儲中，價格字典只在讀取時按需生成
+    - REST API 僅作為冷啟動或數據流中斷時的後備快照
+    - 24小時行情維護為單一的交易對表，自定義訂閱只是該表的視圖
     - 防止短時間內頻繁請求
     - 自動日誌記錄和統計
     """
@@ -146,7 +159,7 @@ class PriceCache:
         """
         # 主數據存儲，按交易所和市場類型組織
         self.data = {
-            "binance": {"spot": {}, "futures": {}, "24h": {}},  # 幣安的現貨、期貨和24小時數據
+            "binance": {"spot": {}, "futures": {}, "24h": {}},  # 幣安的現貨、期貨和24小時數據（24h為REST批量刷新的表，數據流覆蓋的交易對從列式存儲讀取）
             "bybit": {"spot": {}, "futures": {}},  # Bybit的現貨和期貨數據
             "okx": {"spot": {}, "futures": {}}  # OKX的現貨和期貨數據
         }
@@ -157,8 +170,10 @@ class PriceCache:
             "okx": {"spot": None, "futures": None}
         }
         self.update_interval = 1.0  # 更新間隔（秒），控制API請求頻率
-        self.last_fetch_time = 0  # 上次獲取數據的時間戳
-        self.lock = asyncio.Lock()  # 異步鎖，確保並發環境下的數據一致性
+        self.missing_24h_refresh_interval = 60.0  # 數據流正常時，為表中缺失的交易對補充批量請求的最短間隔（秒）
+        # 按 (交易所, 市場類型) 合併REST請求：同一鍵的並發請求共用一次調用，不同鍵並行刷新，
+        # 失敗後在 negative_ttl 內不重試
+        self.fetches = AsyncSingleFlightCache("price_cache", ttl=self.update_interval, negative_ttl=self.update_interval)
         # 更新計數器，用於統計和監控
         self.update_counts = {
             "binance": {"spot": 0, "futures": 0, "24h": 0},
@@ -167,13 +182,109 @@ class PriceCache:
         }
         self.log_interval = 3600  # 日誌記錄間隔（秒），每小時記錄一次統計信息
         self.last_log_time = datetime.now()  # 上次記錄日誌的時間
+        # 每個 (交易所, 市場類型) 最近一次數據流更新的總線序列號
+        self.stream_sequences: Dict[tuple, int] = {}
+        # 價格字典的同步狀態: (交易所, 市場類型) → (價格字典, 同步時的序列號, 同步時各行的更新時間)
+        self._synced: Dict[tuple, tuple] = {}
+        # 訂閱幣安數據流推送的增量更新
+        for market_type in ("spot", "futures"):
+            market_data_service.bus.add_listener("binance", market_type, self._on_stream_update)
+        
+    def _on_stream_update(self, exchange, market_type, deltas, sequence):
+        """
+        市場數據總線回調，只記錄數據流有新數據
+        
+        行情已由交易所連接器寫入列式存儲，這裡不為每個交易對生成字典，
+        價格字典在調用方讀取時由 _sync_stream_prices 按需生成。
+        
+        參數:
+            exchange (str): 交易所名稱
+            market_type (str): 市場類型
+            deltas (dict): 本次變化的交易對數據，格式為 {交易對: 行情數據}
+            sequence (int): 總線序列號
+        """
+        self.stream_sequences[(exchange, market_type)] = sequence
+        self.last_update[exchange][market_type] = datetime.now().isoformat()
+        self.update_counts[exchange][market_type] += 1
+        
+        # !ticker@arr 已攜帶24小時統計，現貨更新同時即為24小時行情表的更新
+        if market_type == "spot":
+            self.last_update[exchange]["24h"] = self.last_update[exchange][market_type]
+        
+    def _sync_stream_prices(self, exchange, market_type):
+        """
+        將列式存儲中自上次讀取後更新過的交易對寫入價格字典
+        
+        通過比較各行的更新時間找出變化的交易對，只為這些交易對重建字典，
+        未變化的交易對沿用原有的字典對象。
+        
+        參數:
+            exchange (str): 交易所名稱
+            market_type (str): 市場類型
+            
+        返回:
+            dict: 價格數據，格式為 {交易對: {"price": ..., "lastUpdate": ...}}
+        """
+        cache = self.data[exchange][market_type]
+        store = market_data_service.get_ticker_store(exchange, market_type)
+        if store is None:
+            return cache
+            
+        key = (exchange, market_type)
+        sequence = self.stream_sequences.get(key, 0)
+        synced = self._synced.get(key)
+        if synced is not None and synced[0] is cache and synced[1] == sequence:
+            return cache
+            
+        count = len(store)
+        updated_at = store.updated_at[:count]
+        if synced is None or synced[0] is not cache:
+            # 首次同步或價格字典已被REST快照替換，重建全部交易對
+            cache = dict(cache)
+            rows = range(count)
+        else:
+            previous = synced[2]
+            changed = np.flatnonzero(updated_at[:len(previous)] != previous).tolist()
+            rows = changed + list(range(len(previous), count))
+            
+        prices = store.column("price")
+        for row in rows:
+            cache[store.symbols[row]] = {
+                "price": float(prices[row]),
+                "lastUpdate": datetime.fromtimestamp(updated_at[row]).isoformat()
+            }
+        self._synced[key] = (cache, sequence, updated_at.copy())
+        self.data[exchange][market_type] = cache
+        return cache
+        
+    @staticmethod
+    def _format_24h(row):
+        """將列式存儲的行情視圖轉換為24小時行情表的格式"""
+        return {
+            "price": row["price"],
+            "priceChange": row["price_change_24h"],
+            "high": row["high_24h"],
+            "low": row["low_24h"],
+            "volume": row["volume_24h"],
+            "quoteVolume": row["quote_volume_24h"],
+            "lastUpdate": row["last_update"]
+        }
+        
+    def is_stream_active(self, exchange="binance", market_type="spot"):
+        """
+        檢查指定市場是否由數據流維持最新數據
+        
+        返回:
+            bool: 數據流在過期閾值內有推送更新時返回True
+        """
+        return not market_data_service.is_stream_stale(exchange, market_type)
         
     async def get_prices(self, exchange="binance", market_type="spot", force_update=False):
         """
         獲取指定交易所和市場類型的價格數據
         
-        智能判斷是否需要更新數據，若數據較新則直接返回緩存，
-        否則通過API獲取最新數據。
+        智能判斷是否需要更新數據，若數據流正常推送或數據較新則直接返回緩存，
+        否則通過API獲取最新數據作為後備快照。
         
         參數:
             exchange (str): 交易所名稱，默認為"binance"
@@ -183,18 +294,23 @@ class PriceCache:
         返回:
             dict: 包含價格數據的字典，格式為 {交易對: {價格信息}}
         """
-        current_time = time.time()
-        
-        # 如果请求间隔太短且不强制更新，直接返回缓存
-        if not force_update and (current_time - self.last_fetch_time < self.update_interval):
+        # 數據流正常推送時列式存儲已是最新，只需同步變化的交易對，無需請求REST API
+        if self.is_stream_active(exchange, market_type):
+            return self._sync_stream_prices(exchange, market_type)
+            
+        if exchange not in CRYPTO_EXCHANGES or market_type not in CRYPTO_EXCHANGES[exchange]:
+            logger.warning(f"不支持的交易所: {exchange}")
             return self.data[exchange][market_type]
             
-        # 使用锁确保同一时间只有一个更新操作
-        async with self.lock:
-            # 再次检查，避免在等待锁期间其他请求已经更新了数据
-            if force_update or (current_time - self.last_fetch_time >= self.update_interval):
-                await self._update_prices(exchange, market_type)
-                self.last_fetch_time = time.time()
+        # 按鍵合併並發請求，更新間隔內直接返回緩存，失敗時保留舊數據
+        try:
+            await self.fetches.get(
+                (exchange, market_type),
+                lambda: self._update_prices(exchange, market_type),
+                force=force_update
+            )
+        except Exception as e:
+            logger.error(f"更新失敗: {exchange} {market_type}: {str(e)}")
                 
         return self.data[exchange][market_type]
     
@@ -202,7 +318,7 @@ class PriceCache:
         """
         更新指定交易所和市場類型的價格數據
         
-        內部方法，通過API請求獲取最新價格數據，
+        內部方法，作為 self.fetches 的加載函數，通過API請求獲取最新價格數據，
         並根據不同交易所的數據格式進行解析和存儲。
         
         參數:
@@ -210,76 +326,72 @@ class PriceCache:
             market_type (str): 市場類型，如"spot"或"futures"
             
         返回:
-            dict或None: 成功時返回更新後的數據，失敗時返回None
-        """
-        if exchange not in CRYPTO_EXCHANGES or market_type not in CRYPTO_EXCHANGES[exchange]:
-            logger.warning(f"不支持的交易所: {exchange}")
-            return
+            dict: 更新後的數據
             
-        try:
-            url = CRYPTO_EXCHANGES[exchange][market_type]
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(url)
-                response.raise_for_status()
-                data = response.json()
-                
-                result = {}
-                
-                # 根据不同交易所处理返回数据
-                if exchange == "binance":
-                    if isinstance(data, list):
-                        for item in data:
-                            symbol = item.get("symbol")
-                            price = item.get("price")
-                            if symbol and price:
-                                result[symbol] = {
-                                    "price": float(price),
-                                    "lastUpdate": datetime.now().isoformat()
-                                }
-                elif exchange == "bybit":
-                    if "result" in data and "list" in data["result"]:
-                        for item in data["result"]["list"]:
-                            symbol = item.get("symbol")
-                            price = item.get("lastPrice")
-                            if symbol and price:
-                                result[symbol] = {
-                                    "price": float(price),
-                                    "lastUpdate": datetime.now().isoformat()
-                                }
-                elif exchange == "okx":
-                    if "data" in data:
-                        for item in data["data"]:
-                            symbol = item.get("instId")
-                            price = item.get("last")
-                            if symbol and price:
-                                result[symbol] = {
-                                    "price": float(price),
-                                    "lastUpdate": datetime.now().isoformat()
-                                }
-                
-                # 更新缓存
-                self.data[exchange][market_type] = result
-                self.last_update[exchange][market_type] = datetime.now().isoformat()
-                self.update_counts[exchange][market_type] += 1
-                
-                # 每10分鐘記錄一次統計信息
-                current_time = datetime.now()
-                if (current_time - self.last_log_time).total_seconds() >= self.log_interval:
-                    logger.info(f"更新統計: {exchange} - 總更新次數 {self.update_counts[exchange][market_type]}")
-                    self.last_log_time = current_time
-                
-                return result
-                
-        except Exception as e:
-            logger.error(f"更新失敗: {exchange}")
-            return None
+        異常:
+            請求或解析失敗時拋出異常，由緩存記錄並在短時間內不再重試
+        """
+        url = CRYPTO_EXCHANGES[exchange][market_type]
+        client = http_clients.get(url)
+        response = await client.get(url)
+        response.raise_for_status()
+        data = response.json()
+        
+        result = {}
+        
+        # 根据不同交易所处理返回数据
+        if exchange == "binance":
+            if isinstance(data, list):
+                for item in data:
+                    symbol = item.get("symbol")
+                    price = item.get("price")
+                    if symbol and price:
+                        result[symbol] = {
+                            "price": float(price),
+                            "lastUpdate": datetime.now().isoformat()
+                        }
+        elif exchange == "bybit":
+            if "result" in data and "list" in data["result"]:
+                for item in data["result"]["list"]:
+                    symbol = item.get("symbol")
+                    price = item.get("lastPrice")
+                    if symbol and price:
+                        result[symbol] = {
+                            "price": float(price),
+                            "lastUpdate": datetime.now().isoformat()
+                        }
+        elif exchange == "okx":
+            if "data" in data:
+                for item in data["data"]:
+                    symbol = item.get("instId")
+                    price = item.get("last")
+                    if symbol and price:
+                        result[symbol] = {
+                            "price": float(price),
+                            "lastUpdate": datetime.now().isoformat()
+                        }
+        
+        # 更新缓存
+        self.data[exchange][market_type] = result
+        self.last_update[exchange][market_type] = datetime.now().isoformat()
+        self.update_counts[exchange][market_type] += 1
+        
+        # 每10分鐘記錄一次統計信息
+        current_time = datetime.now()
+        if (current_time - self.last_log_time).total_seconds() >= self.log_interval:
+            logger.info(f"更新統計: {exchange} - 總更新次數 {self.update_counts[exchange][market_type]}")
+            self.last_log_time = current_time
+        
+        return result
             
     async def get_24h_data(self, exchange="binance", symbols=None):
         """
         獲取24小時行情數據
         
-        通過API獲取指定交易對的24小時交易統計數據，
-        包括最高價、最低價、交易量、價格變化百分比等信息。
+        返回指定交易對的24小時行情，包括最高價、最低價、交易量、
+        價格變化百分比等信息。數據流正常時直接從列式存儲為請求的交易對生成；
+        數據流未覆蓋的交易對及數據流中斷時，使用批量 /ticker/24hr 請求刷新的行情表，
+        每個更新間隔最多發出一次請求。
         
         參數:
             exchange (str): 交易所名稱，目前僅支持 "binance"
@@ -295,50 +407,108 @@ class PriceCache:
         if not symbols:
             return {}
             
-        try:
-            results = {}
-            async with httpx.AsyncClient(timeout=15.0) as client:
-                for symbol in symbols:
-                    try:
-                        url = f"https://api.binance.com/api/v3/ticker/24hr?symbol={symbol}"
-                        response = await client.get(url)
-                        if response.status_code == 200:
-                            data = response.json()
-                            results[symbol] = {
-                                "price": float(data.get("lastPrice", 0)),
-                                "priceChange": float(data.get("priceChangePercent", 0)),
-                                "high": float(data.get("highPrice", 0)),
-                                "low": float(data.get("lowPrice", 0)),
-                                "volume": float(data.get("volume", 0)),
-                                "quoteVolume": float(data.get("quoteVolume", 0)),
-                                "lastUpdate": datetime.now().isoformat()
-                            }
-                        else:
-                            logger.warning(f"請求失敗: {symbol}")
-                    except Exception as e:
-                        logger.error(f"處理失敗: {symbol}")
-                        continue
-                        
-            # 更新缓存
-            self.data[exchange]["24h"] = results
-            self.last_update[exchange]["24h"] = datetime.now().isoformat()
-            self.update_counts[exchange]["24h"] += 1
+        table = self.data[exchange]["24h"]
+        stream_active = self.is_stream_active(exchange, "spot")
+        store = market_data_service.get_ticker_store(exchange, "spot") if stream_active else None
+        
+        if not stream_active:
+            # 數據流中斷，按更新間隔批量刷新
+            refresh_interval = self.update_interval
+        elif any(symbol not in table and (store is None or symbol not in store) for symbol in symbols):
+            # 數據流只推送USDT交易對，其他交易對低頻批量補充
+            refresh_interval = self.missing_24h_refresh_interval
+        else:
+            refresh_interval = None
             
-            # 每10分鐘記錄一次統計信息
-            current_time = datetime.now()
-            if (current_time - self.last_log_time).total_seconds() >= self.log_interval:
-                logger.info(f"24h更新統計: 總更新次數 {self.update_counts[exchange]['24h']}")
-                self.last_log_time = current_time
-                
-            return results
+        if refresh_interval is not None:
+            try:
+                await self.fetches.get(
+                    (exchange, "24h"),
+                    lambda: self._refresh_24h_table(exchange),
+                    ttl=refresh_interval
+                )
+            except Exception as e:
+                logger.error(f"24h數據批量更新失敗: {str(e)}")
             
-        except Exception as e:
-            logger.error("24h數據更新失敗")
-            return {}
+        table = self.data[exchange]["24h"]
+        result = {}
+        for symbol in symbols:
+            row = store.row(symbol) if store is not None else None
+            if row is not None:
+                result[symbol] = self._format_24h(row)
+            elif symbol in table:
+                result[symbol] = table[symbol]
+        return result
+        
+    async def _refresh_24h_table(self, exchange="binance"):
+        """
+        通過一次批量請求刷新24小時行情表
+        
+        內部方法，作為 self.fetches 的加載函數，並發的刷新請求共用同一次調用。
+        
+        參數:
+            exchange (str): 交易所名稱
+            
+        返回:
+            dict: 更新後的24小時行情表
+        """
+        client = http_clients.get(CRYPTO_EXCHANGES[exchange]["24h_ticker"])
+        response = await client.get(CRYPTO_EXCHANGES[exchange]["24h_ticker"], timeout=15.0)
+        response.raise_for_status()
+        data = response.json()
+            
+        now = datetime.now().isoformat()
+        table = self.data[exchange]["24h"]
+        for item in data:
+            symbol = item.get("symbol")
+            if not symbol:
+                continue
+            try:
+                table[symbol] = {
+                    "price": float(item.get("lastPrice", 0)),
+                    "priceChange": float(item.get("priceChangePercent", 0)),
+                    "high": float(item.get("highPrice", 0)),
+                    "low": float(item.get("lowPrice", 0)),
+                    "volume": float(item.get("volume", 0)),
+                    "quoteVolume": float(item.get("quoteVolume", 0)),
+                    "lastUpdate": now
+                }
+            except (TypeError, ValueError):
+                continue
+                
+        self.last_update[exchange]["24h"] = now
+        self.update_counts[exchange]["24h"] += 1
+        
+        # 每10分鐘記錄一次統計信息
+        current_time = datetime.now()
+        if (current_time - self.last_log_time).total_seconds() >= self.log_interval:
+            logger.info(f"24h更新統計: 總更新次數 {self.update_counts[exchange]['24h']}")
+            self.last_log_time = current_time
+        
+        return table
 
 # 初始化價格緩存
 price_cache = PriceCache()
 
+def _diff_prices(previous: Dict[str, Any], current: Dict[str, Any]):
+    """
+    比較兩次價格數據，找出價格變化的交易對
+    
+    參數:
+        previous (dict): 上一次廣播的價格數據，格式為 {交易對: {"price": ...}}
+        current (dict): 本次的價格數據
+        
+    返回:
+        tuple: (變化的交易對數據字典, 已移除的交易對列表)
+    """
+    changed = {}
+    for symbol, info in current.items():
+        old_info = previous.get(symbol)
+        if old_info is None or old_info.get("price") != info.get("price"):
+            changed[symbol] = info
+    removed = [symbol for symbol in previous if symbol not in current]
+    return changed, removed
+
 # WebSocket 連接管理
 class ConnectionManager:
     """
@@ -351,6 +521,8 @@ class ConnectionManager:
     - 建立和關閉WebSocket連接
     - 管理連接分組
     - 向特定分組廣播消息
+    - 增量協議：連接時發送一次完整快照，之後只推送價格變化的交易對和序列號
+    - 每個連接擁有有界出站隊列，完整價格推送按主題合併只保留最新一條，慢速連接會被驅逐
     - 統計連接數量和廣播次數
     """
     def __init__(self):
@@ -366,7 +538,18 @@ class ConnectionManager:
             "binance_futures": [],  # 訂閱幣安期貨的連接
             "custom_symbols": {}  # 自定義交易對訂閱，格式為 {交易對字符串: [連接列表]}
         }
+        # 使用增量協議的連接，按價格分組存儲
+        self.delta_connections: Dict[str, List[WebSocket]] = {
+            "binance_spot": [],
+            "binance_futures": []
+        }
+        # 增量協議狀態: {分組: {"seq": 序列號, "data": 最後一次廣播的完整價格數據}}
+        self.delta_state: Dict[str, Dict[str, Any]] = {
+            group: {"seq": 0, "data": {}} for group in self.delta_connections
+        }
         self.background_tasks = set()  # 追蹤背景任務
+        # 每個連接的出站隊列和寫入任務，廣播只入隊不等待發送
+        self.fanout = WebSocketFanout()
         # 廣播計數器，用於統計
         self.broadcast_counts = {
             "all_prices": 0,
@@ -378,17 +561,19 @@ class ConnectionManager:
         self.log_interval = 600  # 每10分鐘記錄一次統計信息
         self.last_log_time = datetime.now()  # 上次記錄日誌的時間
 
-    async def connect(self, websocket: WebSocket, connection_type: str, symbols=None):
+    async def connect(self, websocket: WebSocket, connection_type: str, symbols=None, protocol: str = "full"):
         """
         建立WebSocket連接
         
         接受WebSocket連接請求，並將連接添加到適當的分組中。
         根據連接類型和訂閱的交易對進行不同處理。
+        使用增量協議的連接在此只接受連接，需調用 send_snapshot 後才加入分組。
         
         參數:
             websocket (WebSocket): 待連接的WebSocket對象
             connection_type (str): 連接類型，如 "all_prices", "binance_spot", "custom" 等
             symbols (list, 可選): 若為自定義交易對訂閱，需提供交易對列表
+            protocol (str): 推送協議，"full" 每次推送完整數據，"delta" 推送快照加增量
             
         返回:
             str: 客戶端ID，用於日誌記錄和調試
@@ -409,6 +594,8 @@ class ConnectionManager:
                     self.broadcast_counts["custom"][key] = 0
                 
                 self.active_connections["custom_symbols"][key].append(websocket)
+            elif protocol == "delta" and connection_type in self.delta_connections:
+                pass  # 由 send_snapshot 在發送快照時加入分組，保證客戶端先收到快照
             else:
                 self.active_connections[connection_type].append(websocket)
                 
@@ -454,6 +641,10 @@ class ConnectionManager:
             else:
                 if websocket in self.active_connections[connection_type]:
                     self.active_connections[connection_type].remove(websocket)
+                if websocket in self.delta_connections.get(connection_type, ()):
+                    self.delta_connections[connection_type].remove(websocket)
+            
+            self.fanout.unregister(websocket)
                     
             # 每10分鐘記錄一次統計信息
             current_time = datetime.now()
@@ -475,7 +666,7 @@ class ConnectionManager:
         
         參數:
             group (str): 要廣播的目標分組，如 "all_prices", "binance_spot" 等
-            message (dict): 要發送的消息內容，將被轉換為JSON
+            message (dict): 要發送的消息內容，只序列化一次後放入分組內所有連接的出站隊列
         """
         if group not in self.active_connections:
             return
@@ -490,14 +681,11 @@ class ConnectionManager:
                 logger.info(f"廣播統計: {group} - {self.broadcast_counts[group]}次")
             self.last_log_time = current_time
             
-        disconnected = []
-        for connection in self.active_connections[group]:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                disconnected.append((connection, group, None))
+        # 完整價格消息每次都攜帶全量數據，按分組和市場合併，慢速客戶端只收到最新一條
+        coalesce_key = f"{group}:{message.get('market', '')}"
+        _, disconnected = self.fanout.broadcast(self.active_connections[group], message, coalesce_key)
         
-        for conn, group, _ in disconnected:
+        for conn in disconnected:
             self.disconnect(conn, group)
 
     async def broadcast_to_custom(self, symbols: List[str], message: Dict[str, Any]):
@@ -509,7 +697,7 @@ class ConnectionManager:
         
         參數:
             symbols (list): 交易對列表，如 ["BTCUSDT", "ETHUSDT"]
-            message (dict): 要發送的消息內容，將被轉換為JSON
+            message (dict): 要發送的消息內容，只序列化一次後放入所有訂閱連接的出站隊列
         """
         if not symbols:
             return
@@ -532,15 +720,102 @@ class ConnectionManager:
                 logger.info(f"自定義廣播統計: {self.broadcast_counts['custom'][key]}次")
             self.last_log_time = current_time
             
-        disconnected = []
-        for connection in self.active_connections["custom_symbols"][key]:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                disconnected.append((connection, "custom", formatted_symbols))
+        _, disconnected = self.fanout.broadcast(self.active_connections["custom_symbols"][key], message, f"custom:{key}")
         
-        for conn, group, symbols in disconnected:
-            self.disconnect(conn, group, symbols)
+        for conn in disconnected:
+            self.disconnect(conn, "custom", formatted_symbols)
+
+    def build_snapshot(self, group: str, market: str, fallback_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        構建增量協議的完整快照消息
+        
+        快照內容與當前序列號對應，客戶端收到後應以此替換本地數據，
+        並從 seq + 1 開始應用增量更新。
+        
+        參數:
+            group (str): 價格分組，如 "binance_spot"
+            market (str): 市場類型，如 "spot"
+            fallback_data (dict, 可選): 分組尚未廣播過數據時用於初始化快照的價格數據
+            
+        返回:
+            dict: 快照消息
+        """
+        state = self.delta_state[group]
+        if not state["data"] and fallback_data:
+            state["data"] = dict(fallback_data)
+        return {
+            "type": "snapshot",
+            "exchange": "binance",
+            "market": market,
+            "seq": state["seq"],
+            "timestamp": datetime.now().isoformat(),
+            "data": state["data"]
+        }
+
+    async def send_snapshot(self, websocket: WebSocket, group: str, market: str, fallback_data: Optional[Dict[str, Any]] = None):
+        """
+        向增量協議客戶端發送完整快照，並將其加入增量分組
+        
+        用於連接建立時的初始數據和客戶端檢測到序列號缺口後的重新同步。
+        快照與增量經由同一個出站隊列依序發送，確保快照先於後續增量到達客戶端。
+        
+        參數:
+            websocket (WebSocket): 客戶端連接
+            group (str): 價格分組，如 "binance_spot"
+            market (str): 市場類型，如 "spot"
+            fallback_data (dict, 可選): 分組尚未廣播過數據時用於初始化快照的價格數據
+        """
+        snapshot = self.build_snapshot(group, market, fallback_data)
+        if websocket not in self.delta_connections[group]:
+            self.delta_connections[group].append(websocket)
+        if not self.fanout.enqueue(websocket, snapshot):
+            logger.warning(f"增量協議快照未能入隊: {group}_{id(websocket)}")
+
+    async def broadcast_prices(self, group: str, message: Dict[str, Any]):
+        """
+        向價格分組廣播更新，同時支援完整協議和增量協議
+        
+        完整協議的連接收到原始消息；增量協議的連接只收到與上次廣播相比
+        價格發生變化的交易對，並附帶遞增的序列號。沒有變化時不推送增量。
+        增量消息不能合併，出站隊列已滿時被丟棄的增量會表現為序列號缺口，
+        由客戶端發送 resync 重新獲取快照。
+        
+        參數:
+            group (str): 價格分組，如 "binance_spot"
+            message (dict): 包含完整價格數據（data 字段）的更新消息
+        """
+        await self.broadcast_to_group(group, message)
+        
+        if group not in self.delta_state:
+            return
+            
+        state = self.delta_state[group]
+        current = message.get("data") or {}
+        changed, removed = _diff_prices(state["data"], current)
+        if not changed and not removed:
+            return
+            
+        state["seq"] += 1
+        state["data"] = dict(current)
+        
+        if not self.delta_connections[group]:
+            return
+            
+        delta_message = {
+            "type": "delta",
+            "exchange": message.get("exchange", "binance"),
+            "market": message.get("market"),
+            "seq": state["seq"],
+            "timestamp": message.get("timestamp", datetime.now().isoformat()),
+            "data": changed
+        }
+        if removed:
+            delta_message["removed"] = removed
+            
+        _, disconnected = self.fanout.broadcast(self.delta_connections[group], delta_message)
+        
+        for conn in disconnected:
+            self.disconnect(conn, group)
 
     def get_total_connections(self):
         """
@@ -558,6 +833,10 @@ class ConnectionManager:
         for key, conns in self.active_connections["custom_symbols"].items():
             total += len(conns)
             
+        # 添加增量協議连接
+        for conns in self.delta_connections.values():
+            total += len(conns)
+            
         return total
 
     def add_background_task(self, task):
@@ -575,15 +854,61 @@ class ConnectionManager:
 # 初始化连接管理器
 manager = ConnectionManager()
 
+# 推送主題註冊表：相同數據的連接共用一個生產者任務，與連接管理器共用出站隊列
+topics = TopicRegistry(manager.fanout)
+
+def _topic_producer(build, interval: float, market_types=None, exchange: str = "binance"):
+    """
+    創建主題生產者：構建消息並發布，然後等待下一次更新
+    
+    參數:
+        build: 異步函數，返回要發布的消息，返回 None 時本輪不發布
+        interval: 指定 market_types 時為等待數據流推送的最長秒數，否則為固定發布間隔
+        market_types: 觸發發布的市場類型，數據流推送時立即構建下一條消息
+        exchange: 交易所名稱
+    
+    返回:
+        生產者協程函數
+    """
+    async def produce(topic):
+        while True:
+            message = await build()
+            if message is not None:
+                topic.publish(message)
+            if market_types:
+                await market_data_service.wait_for_any_update(market_types, exchange, timeout=interval)
+            else:
+                await asyncio.sleep(interval)
+    return produce
+
+# 單個 /ws/symbols 連接最多訂閱的交易對數量，每個交易對對應多個上游數據流
+MAX_WS_SYMBOLS = 50
+
+def _with_symbol_streams(producer, symbols: List[str], exchange: str, market_type: str):
+    """為生產者包裝逐交易對數據流訂閱：主題啟動時訂閱，停止時釋放"""
+    async def produce(topic):
+        subscribed = await market_data_service.subscribe_symbols(symbols, exchange, market_type)
+        try:
+            await producer(topic)
+        finally:
+            if subscribed:
+                await market_data_service.unsubscribe_symbols(symbols, exchange, market_type)
+    return produce
+
+async def _wait_for_disconnect(websocket: WebSocket):
+    """讀取客戶端消息直到連接斷開，用於只接收推送、不處理客戶端消息的端點"""
+    while True:
+        await websocket.receive_text()
+
 # 后台任务：更新所有价格并广播
 async def background_price_updater():
     """
     後台價格更新任務
     
-    持續運行的後台任務，負責定期更新價格數據並廣播給訂閱的用戶。
+    持續運行的後台任務，負責在價格更新時廣播給訂閱的用戶。
     功能包括：
-    1. 獲取最新的現貨和期貨價格數據
-    2. 將數據廣播給相應分組的WebSocket連接
+    1. 等待市場數據總線推送的現貨和期貨更新，收到後立即廣播
+    2. 數據流中斷時退回REST API快照，保持每秒更新
     3. 更新自定義交易對訂閱
     4. 定期記錄統計信息
     5. 錯誤處理和恢復機制
@@ -593,9 +918,24 @@ async def background_price_updater():
     logger.info("服務啟動")
     last_log_time = datetime.now()
     log_interval = 600  # 每10分鐘記錄一次統計
+    last_custom_update = 0.0
+    last_fallback_update = 0.0
+    market_types = ("spot", "futures")
     
     while True:
         try:
+            # 等待數據流推送，超時後對過期的市場使用REST後備快照
+            updated_markets = await market_data_service.wait_for_any_update(
+                market_types, "binance", timeout=price_cache.update_interval
+            )
+            if time.time() - last_fallback_update >= price_cache.update_interval:
+                last_fallback_update = time.time()
+                updated_markets.extend(
+                    market_type for market_type in market_types
+                    if market_type not in updated_markets
+                    and not price_cache.is_stream_active("binance", market_type)
+                )
+            
             connection_count = manager.get_total_connections()
             current_time = datetime.now()
             
@@ -605,50 +945,37 @@ async def background_price_updater():
                 last_log_time = current_time
             
             if connection_count > 0:
-                # 更新Binance现货价格
-                binance_spot = await price_cache.get_prices("binance", "spot", force_update=True)
-                if binance_spot:
-                    spot_message = {
-                        "type": "update",
-                        "exchange": "binance",
-                        "market": "spot",
-                        "timestamp": datetime.now().isoformat(),
-                        "data": binance_spot
-                    }
-                    await manager.broadcast_to_group("all_prices", spot_message)
-                    await manager.broadcast_to_group("binance_spot", spot_message)
-                
-                # 更新Binance期货价格
-                binance_futures = await price_cache.get_prices("binance", "futures", force_update=True)
-                if binance_futures:
-                    futures_message = {
-                        "type": "update",
-                        "exchange": "binance",
-                        "market": "futures",
-                        "timestamp": datetime.now().isoformat(),
-                        "data": binance_futures
-                    }
-                    await manager.broadcast_to_group("all_prices", futures_message)
-                    await manager.broadcast_to_group("binance_futures", futures_message)
-                
-                # 更新自定义交易对订阅
-                for symbols_key in list(manager.active_connections["custom_symbols"].keys()):
-                    if not manager.active_connections["custom_symbols"][symbols_key]:
-                        continue
-                        
-                    symbols = symbols_key.split(",")
-                    data = await price_cache.get_24h_data("binance", symbols)
-                    if data:
-                        custom_message = {
+                for market_type in updated_markets:
+                    prices = await price_cache.get_prices("binance", market_type, force_update=True)
+                    if prices:
+                        message = {
                             "type": "update",
                             "exchange": "binance",
-                            "market": "custom",
+                            "market": market_type,
                             "timestamp": datetime.now().isoformat(),
-                            "data": data
+                            "data": prices
                         }
-                        await manager.broadcast_to_custom(symbols, custom_message)
-            
-            await asyncio.sleep(1.0)
+                        await manager.broadcast_to_group("all_prices", message)
+                        await manager.broadcast_prices(f"binance_{market_type}", message)
+                
+                # 更新自定义交易对订阅，保持每秒一次，各訂閱只是24小時行情表的視圖
+                if time.time() - last_custom_update >= price_cache.update_interval:
+                    last_custom_update = time.time()
+                    for symbols_key in list(manager.active_connections["custom_symbols"].keys()):
+                        if not manager.active_connections["custom_symbols"].get(symbols_key):
+                            continue
+                            
+                        symbols = symbols_key.split(",")
+                        data = await price_cache.get_24h_data("binance", symbols)
+                        if data:
+                            custom_message = {
+                                "type": "update",
+                                "exchange": "binance",
+                                "market": "custom",
+                                "timestamp": datetime.now().isoformat(),
+                                "data": data
+                            }
+                            await manager.broadcast_to_custom(symbols, custom_message)
             
         except Exception as e:
             logger.error("服務異常")
@@ -665,6 +992,8 @@ async def initialize_market_services():
     功能：
     1. 初始化價格緩存，預先載入幣安的現貨和期貨價格
     2. 啟動後台價格更新任務，持續獲取和廣播最新市場數據
+    3. 啟動全球市場數據和恐懼與貪婪指數的後台刷新任務
+    4. 啟用時啟動行情歷史記錄器
     
     這確保了服務一啟動就能提供有效的市場數據。
     """
@@ -674,6 +1003,9 @@ async def initialize_market_services():
     
     task = asyncio.create_task(background_price_updater())
     manager.add_background_task(task)
+    global_market_cache.start_refresher()
+    if settings.MARKET_RECORDER_ENABLED:
+        market_recorder.start()
     logger.info("市場數據價格緩存和後台更新任務初始化完成")
 
 @router.get("/prices", response_model=Dict[str, Any])
@@ -692,7 +1024,7 @@ async def get_all_prices(
         market_type: 市場類型，可選 "spot"(現貨) 或 "futures"(期貨)，默認為 "spot"
     
     返回:
-        包含交易所、市場類型、時間戳、最後更新時間和價格數據的JSON物件
+        包含交易所、市場類型、時間戳、最後更新時間、數據流是否過期和價格數據的JSON物件
         
     錯誤:
         400: 不支持的交易所或市場類型
@@ -706,11 +1038,15 @@ async def get_all_prices(
     if not prices:
         raise HTTPException(status_code=500, detail=f"獲取 {exchange} {market_type} 價格時出錯")
     
+    stream = market_data_service.get_stream_status(exchange).get(market_type, {})
     return {
         "exchange": exchange,
         "market": market_type,
         "timestamp": datetime.now().isoformat(),
         "last_update": price_cache.last_update[exchange][market_type],
+        # 數據流中斷或過期時為True，此時數據來自REST後備快照，客戶端可據此標記舊數據
+        "stream_stale": market_data_service.is_stream_stale(exchange, market_type),
+        "staleness_seconds": stream.get("staleness_seconds"),
         "data": prices
     }
 
@@ -785,6 +1121,27 @@ async def get_multiple_24h_tickers(
     }
 
 # WebSocket 端點 - 允許訪客模式
+async def _build_all_markets(exchange: str):
+    """構建 /ws/all 的全市場行情消息，現貨和期貨都沒有數據時返回 None"""
+    spot_tickers = market_data_service.get_all_tickers(exchange, "spot")
+    futures_tickers = market_data_service.get_all_tickers(exchange, "futures")
+    if not spot_tickers and not futures_tickers:
+        return None
+    return {
+        "type": "update",
+        "timestamp": datetime.now().isoformat(),
+        "exchange": exchange,
+        "markets": {
+            "spot": spot_tickers,
+            "futures": futures_tickers
+        },
+        "stats": {
+            "spot_count": len(spot_tickers),
+            "futures_count": len(futures_tickers),
+            "total_count": len(spot_tickers) + len(futures_tickers)
+        }
+    }
+
 @router.websocket("/ws/all")
 async def websocket_all_prices(
     websocket: WebSocket,
@@ -794,6 +1151,7 @@ async def websocket_all_prices(
     WebSocket連接獲取所有市場的價格更新
     
     建立WebSocket長連接，實時接收指定交易所的現貨和期貨市場價格更新。
+    所有連接訂閱同一個 all:<交易所> 主題，行情消息由主題的生產者構建一次後共享。
     支援心跳機制、連接超時檢測和錯誤處理。
     
     連接參數:
@@ -803,188 +1161,100 @@ async def websocket_all_prices(
     - connection_established: 連接建立確認
     - update: 價格更新數據
     - heartbeat: 心跳消息
-    - error: 錯誤信息
     - timeout_warning: 連接超時警告
-    - connection_closing: 連接關閉通知
     
     客戶端可發送ping消息保持連接活躍。
     """
     await websocket.accept()
     connection_id = id(websocket)
-    last_heartbeat = datetime.now()
     heartbeat_interval = 10  # 每10秒发送一次心跳
-    is_closed = False
-    last_client_message = datetime.now()
-    connection_timeout = 60  # 60秒无消息则断开
+    connection_timeout = 60  # 60秒无消息则发送超时警告
+    last_client_message = time.time()
+    topic_name = f"all:{exchange}"
     
     logger.info(f"新的市场数据WebSocket连接已建立 [ID: {connection_id}]")
     
-    try:
-        # 发送连接确认
-        await websocket.send_json({
-            "type": "connection_established",
-            "connection_id": connection_id,
-            "timestamp": datetime.now().isoformat(),
-            "message": "已连接到市场数据服务"
-        })
-    except Exception as e:
-        logger.error(f"发送连接确认失败 [ID: {connection_id}]: {str(e)}")
-        return
+    # 连接确认经由出站队列发送，保证先于行情数据到达
+    topics.send(websocket, {
+        "type": "connection_established",
+        "connection_id": connection_id,
+        "timestamp": datetime.now().isoformat(),
+        "message": "已连接到市场数据服务"
+    })
+    # 等待數據流推送下一次更新，數據流中斷時最多等待0.5秒
+    topics.subscribe(topic_name, websocket, _topic_producer(
+        lambda: _build_all_markets(exchange), 0.5, ("spot", "futures"), exchange
+    ))
     
     try:
-        while not is_closed:
+        while True:
             try:
-                # 尝试接收客户端消息（非阻塞）
-                try:
-                    text = await asyncio.wait_for(
-                        websocket.receive_text(),
-                        timeout=0.1  # 使用非常短的超时时间，不会阻塞太久
-                    )
-                    # 记录收到客户端消息的时间
-                    last_client_message = datetime.now()
-                    
-                    # 处理客户端消息
-                    try:
-                        data = json.loads(text)
-                        if data.get("type") == "ping":
-                            # 记录 ping 消息
-                            logger.debug(f"PING - conn:{connection_id}")
-                            await websocket.send_json({
-                                "type": "pong",
-                                "timestamp": datetime.now().isoformat()
-                            })
-                            continue
-                    except:
-                        # 忽略无效的JSON
-                        pass
-                except asyncio.TimeoutError:
-                    # 超时是正常的，继续执行
-                    pass
-                except WebSocketDisconnect:
-                    logger.info(f"客户端断开连接 [ID: {connection_id}]")
-                    is_closed = True
-                    break
-                except ConnectionClosedOK:
-                    logger.info(f"客户端正常断开连接 [ID: {connection_id}]")
-                    is_closed = True
-                    break
-                except ConnectionClosedError:
-                    logger.warning(f"客户端异常断开连接 [ID: {connection_id}]")
-                    is_closed = True
-                    break
-                except ConnectionClosed:
-                    logger.warning(f"客户端连接关闭 [ID: {connection_id}]")
-                    is_closed = True
-                    break
-                
-                # 检查连接是否超时
+                text = await asyncio.wait_for(websocket.receive_text(), timeout=heartbeat_interval)
+            except asyncio.TimeoutError:
                 current_time = datetime.now()
-                if (current_time - last_client_message).total_seconds() > connection_timeout:
+                if time.time() - last_client_message > connection_timeout:
                     logger.warning(f"连接超时 [ID: {connection_id}]: {connection_timeout}秒内无响应")
-                    try:
-                        await websocket.send_json({
-                            "type": "timeout_warning",
-                            "timestamp": current_time.isoformat(),
-                            "message": "连接即将关闭，请发送ping消息保持活跃"
-                        })
-                    except:
-                        is_closed = True
-                        break
-                
-                # 获取市场数据
-                spot_tickers = market_data_service.get_all_tickers(exchange, "spot")
-                futures_tickers = market_data_service.get_all_tickers(exchange, "futures")
-                
-                # 检查数据是否有效
-                if not spot_tickers and not futures_tickers:
-                    # 数据无效，等待一段时间再尝试
-                    await asyncio.sleep(1)
-                    continue
-                
-                # 构建市场数据
-                market_data = {
-                    "type": "update",
-                    "timestamp": current_time.isoformat(),
-                    "exchange": exchange,
-                    "markets": {
-                        "spot": spot_tickers,
-                        "futures": futures_tickers
-                    },
-                    "stats": {
-                        "spot_count": len(spot_tickers),
-                        "futures_count": len(futures_tickers),
-                        "total_count": len(spot_tickers) + len(futures_tickers)
-                    }
-                }
-                
-                # 发送市场数据
-                if not is_closed:
-                    try:
-                        await websocket.send_json(market_data)
-                    except Exception as e:
-                        logger.error(f"发送市场数据失败 [ID: {connection_id}]: {str(e)}")
-                        is_closed = True
-                        break
-                
-                # 检查是否需要发送心跳
-                if (current_time - last_heartbeat).total_seconds() >= heartbeat_interval:
-                    if not is_closed:
-                        try:
-                            await websocket.send_json({
-                                "type": "heartbeat",
-                                "timestamp": current_time.isoformat()
-                            })
-                            last_heartbeat = current_time
-                        except Exception as e:
-                            logger.error(f"发送心跳失败 [ID: {connection_id}]: {str(e)}")
-                            is_closed = True
-                            break
-                    
-                # 等待下一次更新
-                await asyncio.sleep(0.5)
-                
-            except WebSocketDisconnect:
-                logger.info(f"客户端断开连接 [ID: {connection_id}]")
-                is_closed = True
-                break
-            except ConnectionClosedOK:
-                logger.info(f"客户端正常断开连接 [ID: {connection_id}]")
-                is_closed = True
-                break
-            except ConnectionClosedError as e:
-                logger.warning(f"客户端异常断开连接 [ID: {connection_id}]: {str(e)}")
-                is_closed = True
-                break
-            except Exception as e:
-                logger.error(f"处理市场数据失败 [ID: {connection_id}]: {str(e)}")
-                if not is_closed:
-                    try:
-                        await websocket.send_json({
-                            "type": "error",
-                            "timestamp": datetime.now().isoformat(),
-                            "message": "获取市场数据失败，稍后重试"
-                        })
-                    except:
-                        is_closed = True
-                        break
-                # 出错后稍等一段时间再继续
-                await asyncio.sleep(2)
+                    topics.send(websocket, {
+                        "type": "timeout_warning",
+                        "timestamp": current_time.isoformat(),
+                        "message": "连接即将关闭，请发送ping消息保持活跃"
+                    })
+                topics.send(websocket, {"type": "heartbeat", "timestamp": current_time.isoformat()})
+                continue
+            
+            # 记录收到客户端消息的时间
+            last_client_message = time.time()
+            try:
+                data = json.loads(text)
+            except ValueError:
+                continue  # 忽略无效的JSON
+            if isinstance(data, dict) and data.get("type") == "ping":
+                logger.debug(f"PING - conn:{connection_id}")
+                topics.send(websocket, {"type": "pong", "timestamp": datetime.now().isoformat()})
                 
+    except (WebSocketDisconnect, ConnectionClosed):
+        logger.info(f"客户端断开连接 [ID: {connection_id}]")
     except Exception as e:
         logger.error(f"WebSocket连接出现异常 [ID: {connection_id}]: {str(e)}")
     finally:
+        topics.release(websocket)
         logger.info(f"WebSocket连接已关闭 [ID: {connection_id}]")
-        if not is_closed:
-            try:
-                # 发送关闭通知
-                await websocket.send_json({
-                    "type": "connection_closing",
-                    "timestamp": datetime.now().isoformat(),
-                    "message": "服务器正在关闭连接"
-                })
-                await websocket.close()
-            except:
-                pass
+
+async def _market_tickers_endpoint(websocket: WebSocket, exchange: str, market_type: str, label: str):
+    """
+    單一市場全部行情的推送端點
+    
+    訂閱 tickers:<交易所>:<市場類型> 主題，數據流推送時廣播，最長每秒一次。
+    
+    參數:
+        websocket (WebSocket): 客戶端連接
+        exchange (str): 交易所名稱
+        market_type (str): 市場類型
+        label (str): 日誌中使用的市場名稱
+    """
+    await websocket.accept()
+    connection_id = id(websocket)
+    logger.info(f"新的{label}WebSocket连接已建立 [ID: {connection_id}]")
+    
+    async def build():
+        return {
+            "type": "update",
+            "timestamp": datetime.now().isoformat(),
+            "exchange": exchange,
+            "market_type": market_type,
+            "data": market_data_service.get_all_tickers(exchange, market_type)
+        }
+    
+    topics.subscribe(f"tickers:{exchange}:{market_type}", websocket, _topic_producer(build, 1.0, (market_type,), exchange))
+    try:
+        await _wait_for_disconnect(websocket)
+    except WebSocketDisconnect:
+        logger.info(f"{label}WebSocket客户端断开连接 [ID: {connection_id}]")
+    except Exception as e:
+        logger.error(f"{label}WebSocket连接错误 [ID: {connection_id}]: {str(e)}")
+    finally:
+        topics.release(websocket)
+        logger.info(f"{label}WebSocket连接已关闭 [ID: {connection_id}]")
 
 @router.websocket("/ws/spot")
 async def websocket_spot_prices(
@@ -995,7 +1265,7 @@ async def websocket_spot_prices(
     WebSocket連接獲取現貨市場的價格更新
     
     建立WebSocket長連接，專門接收指定交易所的現貨市場實時價格數據。
-    每秒更新一次數據，並自動處理連接異常。
+    數據流推送時更新，數據流中斷時每秒更新一次。
     
     連接參數:
         exchange: 交易所名稱，默認為 "binance"
@@ -1009,41 +1279,7 @@ async def websocket_spot_prices(
             "data": {交易對價格數據}
         }
     """
-    await websocket.accept()
-    connection_id = id(websocket)
-    logger.info(f"新的现货WebSocket连接已建立 [ID: {connection_id}]")
-    
-    try:
-        while True:
-            try:
-                # 获取现货数据
-                spot_tickers = market_data_service.get_all_tickers(exchange, "spot")
-                
-                # 构建数据
-                market_data = {
-                    "type": "update",
-                    "timestamp": datetime.now().isoformat(),
-                    "exchange": exchange,
-                    "market_type": "spot",
-                    "data": spot_tickers
-                }
-                
-                # 发送数据
-                await websocket.send_json(market_data)
-                await asyncio.sleep(1)
-                
-            except WebSocketDisconnect:
-                logger.info(f"现货WebSocket客户端断开连接 [ID: {connection_id}]")
-                break
-            except Exception as e:
-                logger.error(f"处理现货WebSocket数据时出错 [ID: {connection_id}]: {str(e)}")
-                await asyncio.sleep(5)
-                
-    except Exception as e:
-        logger.error(f"现货WebSocket连接错误 [ID: {connection_id}]: {str(e)}")
-    finally:
-        logger.info(f"现货WebSocket连接已关闭 [ID: {connection_id}]")
-        await websocket.close()
+    await _market_tickers_endpoint(websocket, exchange, "spot", "现货")
 
 @router.websocket("/ws/futures")
 async def websocket_futures_prices(
@@ -1054,7 +1290,7 @@ async def websocket_futures_prices(
     WebSocket連接獲取期貨市場的價格更新
     
     建立WebSocket長連接，專門接收指定交易所的期貨市場實時價格數據。
-    每秒更新一次數據，自動處理連接中斷和錯誤恢復。
+    數據流推送時更新，數據流中斷時每秒更新一次。
     
     連接參數:
         exchange: 交易所名稱，默認為 "binance"
@@ -1068,82 +1304,90 @@ async def websocket_futures_prices(
             "data": {期貨交易對價格數據}
         }
     """
-    await websocket.accept()
-    connection_id = id(websocket)
-    logger.info(f"新的合约WebSocket连接已建立 [ID: {connection_id}]")
+    await _market_tickers_endpoint(websocket, exchange, "futures", "合约")
+
+async def _price_client_loop(websocket: WebSocket, group: str, market: str):
+    """
+    價格推送連接的客戶端消息循環
     
-    try:
-        while True:
-            try:
-                # 获取合约数据
-                futures_tickers = market_data_service.get_all_tickers(exchange, "futures")
-                
-                # 构建数据
-                market_data = {
-                    "type": "update",
-                    "timestamp": datetime.now().isoformat(),
-                    "exchange": exchange,
-                    "market_type": "futures",
-                    "data": futures_tickers
-                }
-                
-                # 发送数据
-                await websocket.send_json(market_data)
-                await asyncio.sleep(1)
-                
-            except WebSocketDisconnect:
-                logger.info(f"合约WebSocket客户端断开连接 [ID: {connection_id}]")
-                return
-            except Exception as e:
-                logger.error(f"处理合约WebSocket数据时出错 [ID: {connection_id}]: {str(e)}")
-                await asyncio.sleep(5)
-                continue
-                
-    except Exception as e:
-        logger.error(f"合约WebSocket连接错误 [ID: {connection_id}]: {str(e)}")
-    finally:
-        logger.info(f"合约WebSocket连接已关闭 [ID: {connection_id}]")
-        await websocket.close()
+    每30秒無消息時發送心跳；處理客戶端的 ping 和增量協議的 resync 請求。
+    客戶端在檢測到序列號缺口（收到的 seq 不等於上一個 seq + 1）時應發送
+    {"type": "resync"}，服務器會回覆當前的完整快照。
+    
+    參數:
+        websocket (WebSocket): 客戶端連接
+        group (str): 價格分組，如 "binance_spot"
+        market (str): 市場類型，如 "spot"
+    """
+    while True:
+        try:
+            text = await asyncio.wait_for(websocket.receive_text(), timeout=30)
+        except asyncio.TimeoutError:
+            manager.fanout.enqueue(websocket, {"type": "heartbeat"})
+            continue
+            
+        try:
+            data = json.loads(text)
+        except ValueError:
+            continue  # 忽略无效的JSON
+        if not isinstance(data, dict):
+            continue
+            
+        if data.get("type") == "resync":
+            await manager.send_snapshot(websocket, group, market, await price_cache.get_prices("binance", market))
+        elif data.get("type") == "ping":
+            manager.fanout.enqueue(websocket, {"type": "pong", "timestamp": datetime.now().isoformat()})
 
 @router.websocket("/ws/binance/spot")
-async def websocket_binance_spot(websocket: WebSocket):
+async def websocket_binance_spot(
+    websocket: WebSocket,
+    protocol: str = Query("full", description="推送協議: full（每次完整數據）或 delta（快照加增量）")
+):
     """
     WebSocket連接獲取幣安現貨實時價格
     
     使用連接管理器建立WebSocket連接，實時接收幣安現貨市場所有交易對的價格數據。
     提供初始數據載入和定期心跳機制，確保連接穩定性。
     
+    連接參數:
+        protocol: "full"（默認）每次推送完整價格數據；"delta" 連接時推送一次快照，
+                  之後只推送價格變化的交易對
+    
     消息類型:
-    - initial: 連接建立後發送的初始數據
+    - initial: 連接建立後發送的初始數據（full 協議）
+    - update: 完整價格更新（full 協議）
+    - snapshot: 帶序列號的完整快照（delta 協議，連接時及 resync 後發送）
+    - delta: 帶序列號的增量更新，僅包含價格變化的交易對（delta 協議）
     - heartbeat: 每30秒發送一次的心跳消息
     
-    初始數據包含幣安現貨市場所有交易對的最新價格，之後的更新通過廣播方式推送。
+    使用 delta 協議的客戶端發現序列號不連續時，應發送 {"type": "resync"} 重新獲取快照。
     """
     client_id = None
     send_counter = 0
     
     try:
         # 接受連接
-        client_id = await manager.connect(websocket, "binance_spot")
+        client_id = await manager.connect(websocket, "binance_spot", protocol=protocol)
         logger.info(f"Binance現貨WebSocket連接已建立：{client_id}")
         
         # 立即發送初始價格數據
-        initial_data = {
-            "type": "initial",
-            "exchange": "binance",
-            "market": "spot",
-            "timestamp": datetime.now().isoformat(),
-            "data": await price_cache.get_prices("binance", "spot")
-        }
-        await websocket.send_json(initial_data)
+        if protocol == "delta":
+            await manager.send_snapshot(websocket, "binance_spot", "spot", await price_cache.get_prices("binance", "spot"))
+        else:
+            initial_data = {
+                "type": "initial",
+                "exchange": "binance",
+                "market": "spot",
+                "timestamp": datetime.now().isoformat(),
+                "data": await price_cache.get_prices("binance", "spot")
+            }
+            # 初始數據經由出站隊列發送，保證先於後續廣播到達且連接只有一個寫入方
+            manager.fanout.enqueue(websocket, initial_data)
         logger.info(f"已發送初始Binance現貨價格數據到客戶端：{client_id}")
         send_counter += 1
         
-        # 保持连接，等待客户端消息
-        while True:
-            await asyncio.sleep(30)  # 使用简单的心跳保持连接
-            await websocket.send_json({"type": "heartbeat"})
-            # 不再記錄每次心跳
+        # 保持连接，处理心跳和客户端消息
+        await _price_client_loop(websocket, "binance_spot", "spot")
             
     except WebSocketDisconnect:
         logger.info(f"Binance現貨客戶端主動斷開連接：{client_id}")
@@ -1155,18 +1399,40 @@ async def websocket_binance_spot(websocket: WebSocket):
             manager.disconnect(websocket, "binance_spot")
             logger.info(f"Binance現貨WebSocket連接已清理：{client_id}，共發送 {send_counter} 次數據")
 
+async def _build_nested_futures():
+    """構建 /ws/binance/futures 完整協議的嵌套格式更新，沒有數據時發送心跳"""
+    updated_data = await price_cache.get_prices("binance", "futures")
+    if updated_data:
+        return {
+            "type": "update",
+            "data": {
+                "binance": {
+                    "futures": updated_data
+                }
+            }
+        }
+    return {"type": "heartbeat", "timestamp": datetime.now().isoformat()}
+
 @router.websocket("/ws/binance/futures")
-async def websocket_binance_futures(websocket: WebSocket):
+async def websocket_binance_futures(
+    websocket: WebSocket,
+    protocol: str = Query("full", description="推送協議: full（每次完整數據）或 delta（快照加增量）")
+):
     """
     WebSocket連接獲取幣安期貨實時價格
     
     使用連接管理器建立WebSocket連接，專門接收幣安期貨市場的實時價格數據。
     提供完整的連接生命週期管理，包括連接建立、數據初始化、定期更新和連接關閉。
+    完整協議的定期更新由 binance_futures:nested 主題統一構建，所有連接共享。
+    
+    連接參數:
+        protocol: "full"（默認）或 "delta"，delta 協議的消息格式與 /ws/binance/spot 相同
     
     消息類型:
     - connection_success: 連接成功確認
     - initial: 初始價格數據
     - update: 每3秒更新一次的價格數據
+    - snapshot / delta: 增量協議的快照和增量更新
     - heartbeat: 心跳消息（當無數據更新時發送）
     - error: 錯誤信息
     
@@ -1174,80 +1440,101 @@ async def websocket_binance_futures(websocket: WebSocket):
     """
     client_id = None
     connection_type = "binance_futures"
-    update_counter = 0
     
     try:
-        client_id = await manager.connect(websocket, connection_type)
+        client_id = await manager.connect(websocket, connection_type, protocol=protocol)
         logger.info(f"Binance期貨WebSocket連接已建立：{client_id}")
         
+        # 增量協議：發送快照後由後台廣播推送增量
+        if protocol == "delta":
+            await manager.send_snapshot(websocket, connection_type, "futures", await price_cache.get_prices("binance", "futures"))
+            await _price_client_loop(websocket, connection_type, "futures")
+            return
+        
         # 發送初始數據
         initial_data = await price_cache.get_prices("binance", "futures", force_update=True)
         if initial_data:
-            # 发送连接成功消息
-            await websocket.send_json({
+            topics.send(websocket, {
                 "type": "connection_success",
                 "message": "已連接到合約市場"
             })
-            
-            # 发送初始数据
-            await websocket.send_json({
-            "type": "initial",
+            topics.send(websocket, {
+                "type": "initial",
                 "data": {
                     "binance": {
                         "futures": initial_data
                     }
                 }
             })
-            
             logger.info(f"已向客戶端 {client_id} 發送合約市場初始數據")
         else:
-            await websocket.send_json({
+            topics.send(websocket, {
                 "type": "error",
                 "message": "獲取合約市場數據失敗"
             })
             logger.error(f"向客戶端 {client_id} 發送合約市場初始數據失敗")
             
-        # 持續發送更新數據
-        while True:
-            # 每3秒從緩存獲取一次最新數據
-            await asyncio.sleep(3)
-            
-            # 檢查連接是否仍然活躍
-            try:
-                # 嘗試獲取最新數據
-                updated_data = await price_cache.get_prices("binance", "futures")
-                
-                if updated_data:
-                    # 發送更新數據
-                    await websocket.send_json({
-                        "type": "update",
-                        "data": {
-                            "binance": {
-                                "futures": updated_data
-                            }
-                        }
-                    })
-                    update_counter += 1
-                    # 不再每次更新都記錄日誌
-                else:
-                    # 發送心跳保持連接
-                    await websocket.send_json({
-                        "type": "heartbeat",
-                        "timestamp": datetime.now().isoformat()
-                    })
-            except Exception as e:
-                logger.error(f"發送合約市場更新數據時出錯: {str(e)}")
-                break
+        # 每3秒從緩存獲取一次最新數據，由主題統一推送
+        topics.subscribe("binance_futures:nested", websocket, _topic_producer(_build_nested_futures, 3.0))
+        await _price_client_loop(websocket, connection_type, "futures")
             
     except WebSocketDisconnect:
-        logger.info(f"WebSocket客戶端 {client_id} 斷開連接 (合約市場)，共發送 {update_counter} 次數據更新")
+        logger.info(f"WebSocket客戶端 {client_id} 斷開連接 (合約市場)")
     except Exception as e:
         logger.error(f"處理WebSocket連接時出錯 (合約市場): {str(e)}")
     finally:
         if client_id:
+            topics.release(websocket)
             manager.disconnect(websocket, connection_type)
             logger.info(f"Binance期貨WebSocket連接已清理：{client_id}")
 
+# 期貨24小時漲跌幅的共享緩存，所有期貨價格推送共用，避免每個連接各自請求REST API
+_futures_changes = {"data": {}, "updated": 0.0}
+_futures_changes_lock = asyncio.Lock()
+
+async def get_futures_price_changes(max_age: float = 10.0) -> Dict[str, Any]:
+    """
+    獲取期貨24小時價格變化數據，緩存超過 max_age 秒時才重新請求
+    
+    參數:
+        max_age (float): 緩存的最長有效秒數
+        
+    返回:
+        dict: {交易對: 24小時變化數據}
+    """
+    if time.time() - _futures_changes["updated"] < max_age:
+        return _futures_changes["data"]
+    async with _futures_changes_lock:
+        if time.time() - _futures_changes["updated"] >= max_age:
+            data = await update_futures_price_changes()
+            if data:
+                _futures_changes["data"] = data
+            _futures_changes["updated"] = time.time()
+    return _futures_changes["data"]
+
+def _merge_price_changes(prices: Dict[str, Any], changes: Dict[str, Any]) -> Dict[str, Any]:
+    """將24小時漲跌幅合併到價格數據的副本中，不修改價格緩存"""
+    return {
+        symbol: {**info, "priceChange": changes[symbol].get("priceChange", 0)} if symbol in changes else info
+        for symbol, info in prices.items()
+    }
+
+async def _build_futures_prices():
+    """構建 /ws/futures/prices 的更新消息，沒有數據時發送心跳"""
+    updated_data = await price_cache.get_prices("binance", "futures")
+    if not updated_data:
+        return {"type": "heartbeat", "timestamp": datetime.now().isoformat()}
+    # 24小時數據約每5次更新（10秒）重新獲取一次
+    changes = await get_futures_price_changes()
+    return {
+        "type": "update",
+        "data": {
+            "binance": {
+                "futures": _merge_price_changes(updated_data, changes)  # 明确标识为futures数据
+            }
+        }
+    }
+
 @router.websocket("/ws/futures/prices")
 async def websocket_futures_prices(websocket: WebSocket):
     """
@@ -1258,9 +1545,8 @@ async def websocket_futures_prices(websocket: WebSocket):
     
     特點:
     - 包含24小時價格變化百分比（priceChange字段）
-    - 每5次更新重新獲取一次24小時變化數據
-    - 數據更新頻率為2秒一次
-    - 支持自動重連和錯誤處理
+    - 24小時變化數據由所有連接共享，每10秒重新獲取一次
+    - 數據更新頻率為2秒一次，由 futures_prices 主題統一構建
     
     消息類型:
     - connection_success: 連接成功確認
@@ -1270,7 +1556,6 @@ async def websocket_futures_prices(websocket: WebSocket):
     - error: 錯誤信息
     """
     client_id = None
-    update_counter = 0
     
     try:
         client_id = await manager.connect(websocket, "binance_futures")
@@ -1279,89 +1564,41 @@ async def websocket_futures_prices(websocket: WebSocket):
         # 發送初始數據
         initial_data = await price_cache.get_prices("binance", "futures", force_update=True)
         if initial_data:
-            # 计算并添加24小时涨跌幅
             try:
-                # 獲取24小時行情數據以添加漲跌幅
-                futures_24h_data = await update_futures_price_changes()
-                
-                # 合併價格和漲跌幅數據
-                for symbol, info in futures_24h_data.items():
-                    if symbol in initial_data:
-                        initial_data[symbol]["priceChange"] = info.get("priceChange", 0)
+                initial_data = _merge_price_changes(initial_data, await get_futures_price_changes())
             except Exception as e:
                 logger.error(f"獲取合約市場24小時數據時出錯: {str(e)}")
             
-            # 发送连接成功消息
-            await websocket.send_json({
+            topics.send(websocket, {
                 "type": "connection_success",
                 "message": "已連接到合約市場價格推送"
             })
-            
-            # 发送初始数据，确保数据格式一致且只包含futures数据
-            await websocket.send_json({
-            "type": "initial",
+            topics.send(websocket, {
+                "type": "initial",
                 "data": {
                     "binance": {
                         "futures": initial_data  # 确保标记为futures数据
                     }
                 }
             })
-            
             logger.info(f"已向客戶端 {client_id} 發送合約市場初始數據")
         else:
-            await websocket.send_json({
+            topics.send(websocket, {
                 "type": "error",
                 "message": "獲取合約市場初始數據失敗"
             })
             logger.error(f"向客戶端 {client_id} 發送合約市場初始數據失敗")
             
-        # 持續發送更新數據
-        futures_24h_data = {}
-        while True:
-            # 每2秒更新一次
-            await asyncio.sleep(2)
-            
-            try:
-                # 每5次更新獲取一次24小時數據
-                if update_counter % 5 == 0:
-                    futures_24h_data = await update_futures_price_changes()
-                
-                # 獲取最新價格數據
-                updated_data = await price_cache.get_prices("binance", "futures")
-                
-                if updated_data:
-                    # 合併價格和漲跌幅數據
-                    for symbol, info in futures_24h_data.items():
-                        if symbol in updated_data:
-                            updated_data[symbol]["priceChange"] = info.get("priceChange", 0)
-                    
-                    # 發送更新數據，明确标识为期货数据
-                    await websocket.send_json({
-                        "type": "update",
-                        "data": {
-                            "binance": {
-                                "futures": updated_data  # 明确标识为futures数据
-                            }
-                        }
-                    })
-                    # 不再每次更新都記錄日誌
-                    update_counter += 1
-                else:
-                    # 發送心跳包
-                    await websocket.send_json({
-                        "type": "heartbeat",
-                        "timestamp": datetime.now().isoformat()
-                    })
-            except Exception as e:
-                logger.error(f"發送合約市場更新數據時出錯: {str(e)}")
-                break
+        topics.subscribe("futures_prices", websocket, _topic_producer(_build_futures_prices, 2.0))
+        await _wait_for_disconnect(websocket)
             
     except WebSocketDisconnect:
-        logger.info(f"WebSocket客戶端 {client_id} 斷開連接 (期貨價格)，共發送 {update_counter} 次數據更新")
+        logger.info(f"WebSocket客戶端 {client_id} 斷開連接 (期貨價格)")
     except Exception as e:
         logger.error(f"處理WebSocket連接時出錯 (期貨價格): {str(e)}")
     finally:
         if client_id:
+            topics.release(websocket)
             manager.disconnect(websocket, "binance_futures")
             logger.info(f"期貨價格WebSocket連接已清理：{client_id}")
 
@@ -1369,28 +1606,28 @@ async def update_futures_price_changes():
     """獲取期貨24小時價格變化數據"""
     try:
         url = CRYPTO_EXCHANGES["binance"]["futures_24h"]
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(url)
-            response.raise_for_status()
-            data = response.json()
-            
-            result = {}
-            if isinstance(data, list):
-                for item in data:
-                    symbol = item.get("symbol")
-                    price_change = item.get("priceChangePercent")
-                    
-                    if symbol and price_change is not None:
-                        result[symbol] = {
-                            "priceChange": float(price_change) / 100,  # 轉換為小數
-                            "high": float(item.get("highPrice", 0)),
-                            "low": float(item.get("lowPrice", 0)),
-                            "volume": float(item.get("volume", 0)),
-                            "quoteVolume": float(item.get("quoteVolume", 0)),
-                            "lastUpdate": datetime.now().isoformat()
-                        }
-            
-            return result
+        client = http_clients.get(url)
+        response = await client.get(url)
+        response.raise_for_status()
+        data = response.json()
+        
+        result = {}
+        if isinstance(data, list):
+            for item in data:
+                symbol = item.get("symbol")
+                price_change = item.get("priceChangePercent")
+                
+                if symbol and price_change is not None:
+                    result[symbol] = {
+                        "priceChange": float(price_change) / 100,  # 轉換為小數
+                        "high": float(item.get("highPrice", 0)),
+                        "low": float(item.get("lowPrice", 0)),
+                        "volume": float(item.get("volume", 0)),
+                        "quoteVolume": float(item.get("quoteVolume", 0)),
+                        "lastUpdate": datetime.now().isoformat()
+                    }
+        
+        return result
     except Exception as e:
         logger.error(f"獲取期貨24小時數據時出錯: {str(e)}")
         return {}
@@ -1408,7 +1645,7 @@ async def get_futures_prices(
             return {"success": False, "message": "獲取期貨價格數據失敗", "data": {}}
         
         # 獲取24小時變化數據
-        futures_24h_data = await update_futures_price_changes()
+        futures_24h_data = await get_futures_price_changes()
         
         # 合併數據
         for symbol, info in futures_24h_data.items():
@@ -1453,7 +1690,7 @@ async def websocket_custom_symbols(
         # 获取并发送初始数据
         initial_data = await price_cache.get_24h_data("binance", symbol_list)
         
-        await websocket.send_json({
+        manager.fanout.enqueue(websocket, {
             "type": "initial",
             "exchange": "binance",
             "symbols": symbol_list,
@@ -1463,10 +1700,11 @@ async def websocket_custom_symbols(
         logger.info(f"已發送初始自定義交易對數據到客戶端：{client_id}")
         update_counter += 1
         
-        # 保持连接，等待客户端消息
-        while True:
+        # 保持连接，心跳同样经由出站队列发送；连接断开后写入任务发送失败并驱逐连接
+        sender = manager.fanout.register(websocket)
+        while not sender.closed:
             await asyncio.sleep(30)  # 使用简单的心跳保持连接
-            await websocket.send_json({"type": "heartbeat"})
+            manager.fanout.enqueue(websocket, {"type": "heartbeat"})
             # 不記錄心跳
             
     except WebSocketDisconnect:
@@ -1491,7 +1729,13 @@ async def cleanup_market_services():
     - 停止市場數據服務
     - 關閉所有活躍的WebSocket連接
     - 取消後台任務
+    - 停止所有推送主題的生產者任務
+    - 停止全球市場數據的後台刷新任務
+    - 停止行情歷史記錄器並寫入緩衝中的記錄
     """
+    await topics.close()
+    await global_market_cache.stop_refresher()
+    await market_recorder.stop()
     await market_data_service.stop()
     logger.info("市場數據服務已停止")
 
@@ -1544,6 +1788,142 @@ async def get_24h_ticker(
         raise HTTPException(status_code=404, detail="未找到该交易对的24小时行情数据")
     return ticker
 
+@router.get("/screener", response_model=Dict[str, Any])
+async def screen_market(
+    market_type: str = Query("spot", description="市场类型 (spot/futures)"),
+    sort: str = Query("gainers", description="排序方式 (gainers/losers/volume/trades)"),
+    limit: int = Query(20, ge=1, le=500, description="返回数量"),
+    min_change: Optional[float] = Query(None, description="最小24小时涨跌幅(%)"),
+    max_change: Optional[float] = Query(None, description="最大24小时涨跌幅(%)"),
+    min_quote_volume: Optional[float] = Query(None, ge=0, description="最小24小时成交额"),
+    quote_asset: Optional[str] = Query(None, description="计价资产，如 USDT")
+):
+    """全市场筛选：从预排序的排行索引中按条件切片，只返回前端需要显示的交易对"""
+    try:
+        return market_screener.screen(market_type, sort, limit, min_change, max_change, min_quote_volume, quote_asset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/klines", response_model=Dict[str, Any])
+async def get_klines(
+    symbol: str = Query(..., description="交易对名称"),
+    interval: str = Query("1m", description="K线周期，如 1m/5m/15m/1h/4h/1d"),
+    limit: int = Query(500, ge=1, le=1440, description="返回的K线数量"),
+    market_type: str = Query("spot", description="市场类型 (spot/futures)")
+):
+    """获取K线数据，直接从内存中的K线存储读取，高周期由1分钟K线重采样"""
+    if market_type not in ("spot", "futures"):
+        raise HTTPException(status_code=400, detail="市场类型必须是 spot 或 futures")
+    try:
+        candles = await candle_store.get_candles(symbol, interval, limit, market_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(status_code=e.response.status_code, detail=f"回补K线数据失败: {e.response.text}")
+    except httpx.HTTPError as e:
+        logger.error(f"回补K线数据失败: {str(e)}")
+        raise HTTPException(status_code=503, detail="回补K线数据失败")
+
+    fields = list(candles.keys())
+    rows = zip(*(candles[field].tolist() for field in fields))
+    return {
+        "symbol": symbol.upper(),
+        "interval": interval,
+        "market_type": market_type,
+        "candles": [dict(zip(fields, row)) for row in rows]
+    }
+
+@router.get("/indicators", response_model=Dict[str, Any])
+async def get_indicators(
+    symbol: str = Query(..., description="交易对名称"),
+    interval: str = Query("1m", description="K线周期，如 1m/5m/15m/1h/4h/1d"),
+    indicators: Optional[str] = Query(None, description="指标列表，用逗号分隔，如 sma,ema,rsi,bollinger,macd"),
+    limit: int = Query(500, ge=1, le=1440, description="用于计算的K线数量"),
+    market_type: str = Query("spot", description="市场类型 (spot/futures)")
+):
+    """基于内存中的K线计算技术指标，数据不足的位置返回 null"""
+    if market_type not in ("spot", "futures"):
+        raise HTTPException(status_code=400, detail="市场类型必须是 spot 或 futures")
+    try:
+        candles = await candle_store.get_candles(symbol, interval, limit, market_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except httpx.HTTPError as e:
+        logger.error(f"回补K线数据失败: {str(e)}")
+        raise HTTPException(status_code=503, detail="回补K线数据失败")
+
+    indicator_list = [name.strip() for name in indicators.split(",")] if indicators else None
+    result = market_data_service.calculate_technical_indicators(candle_store.get_ohlcv(candles), indicator_list)
+    return {
+        "symbol": symbol.upper(),
+        "interval": interval,
+        "market_type": market_type,
+        "open_time": candles["open_time"].tolist(),
+        "indicators": to_json_values(result)
+    }
+
+@router.get("/history/tickers", response_model=Dict[str, Any])
+async def get_ticker_history(
+    symbol: str = Query(..., description="交易对名称"),
+    start: int = Query(..., ge=0, description="开始时间（毫秒时间戳）"),
+    end: Optional[int] = Query(None, ge=0, description="结束时间（毫秒时间戳），默认为当前时间"),
+    limit: int = Query(5000, ge=1, le=50000, description="最多返回的记录数"),
+    market_type: str = Query("spot", description="市场类型 (spot/futures)")
+):
+    """读取行情历史记录器保存的行情更新，按时间范围从按日分区的文件中切片"""
+    end = end if end is not None else int(time.time() * 1000)
+    try:
+        records = await asyncio.to_thread(market_recorder.read, "ticker", symbol, start, end, market_type, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    fields = records.dtype.names
+    return {
+        "symbol": symbol.upper(),
+        "market_type": market_type,
+        "records": [dict(zip(fields, row)) for row in records.tolist()]
+    }
+
+@router.get("/history/klines", response_model=Dict[str, Any])
+async def get_kline_history(
+    symbol: str = Query(..., description="交易对名称"),
+    start: int = Query(..., ge=0, description="开始时间（毫秒时间戳）"),
+    end: Optional[int] = Query(None, ge=0, description="结束时间（毫秒时间戳），默认为当前时间"),
+    interval: str = Query("1m", description="K线周期，如 1m/5m/15m/1h/4h/1d"),
+    limit: int = Query(1000, ge=1, le=10000, description="最多返回的K线数量，时间范围按此数量截断"),
+    market_type: str = Query("spot", description="市场类型 (spot/futures)")
+):
+    """读取行情历史记录器保存的已收盘K线，高周期由1分钟K线重采样"""
+    end = end if end is not None else int(time.time() * 1000)
+    try:
+        candles = await asyncio.to_thread(market_recorder.read_candles, symbol, start, end, interval, market_type, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    fields = list(candles.keys())
+    rows = zip(*(candles[field].tolist() for field in fields))
+    return {
+        "symbol": symbol.upper(),
+        "interval": interval,
+        "market_type": market_type,
+        "candles": [dict(zip(fields, row)) for row in rows]
+    }
+
+@router.get("/depth", response_model=Dict[str, Any])
+async def get_depth(
+    symbol: str = Query(..., description="交易对名称"),
+    limit: int = Query(20, ge=1, le=1000, description="每侧返回的档位数量"),
+    market_type: str = Query("spot", description="市场类型 (spot/futures)")
+):
+    """获取订单簿前N档、价差和中间价；已有推送连接维护该交易对时读取本地订单簿，否则返回一次REST快照"""
+    try:
+        return await order_book_service.get_depth(symbol, market_type, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(status_code=e.response.status_code, detail=f"获取深度快照失败: {e.response.text}")
+    except (httpx.HTTPError, RuntimeError) as e:
+        logger.error(f"获取订单簿深度失败: {str(e)}")
+        raise HTTPException(status_code=503, detail="获取订单簿深度失败")
+
 @router.websocket("/ws/symbols")
 async def websocket_symbol_prices(
     websocket: WebSocket,
@@ -1551,23 +1931,41 @@ async def websocket_symbol_prices(
     exchange: str = Query("binance", description="交易所名称"),
     market_type: str = Query("spot", description="市场类型 (spot/futures)")
 ):
-    """WebSocket连接获取特定交易对的价格更新"""
+    """WebSocket连接获取特定交易对的价格更新，订阅相同交易对组合的连接共享同一个主题
+    
+    交易对数量不能超过 MAX_WS_SYMBOLS，行情表中不存在的交易对会被拒绝，不订阅其数据流。
+    """
     await websocket.accept()
-    symbol_list = [s.strip() for s in symbols.split(",")]
+    requested = sorted({s.strip().upper() for s in symbols.split(",") if s.strip()})
+    if len(requested) > MAX_WS_SYMBOLS:
+        await websocket.send_json({"type": "error", "message": f"交易对数量不能超过 {MAX_WS_SYMBOLS} 个"})
+        await websocket.close()
+        return
+    symbol_list = [symbol for symbol in requested if market_data_service.is_known_symbol(symbol, exchange, market_type)]
+    rejected = [symbol for symbol in requested if symbol not in symbol_list]
+    if not symbol_list:
+        await websocket.send_json({"type": "error", "message": "没有有效的交易对", "rejected": rejected})
+        await websocket.close()
+        return
+    if rejected:
+        topics.send(websocket, {"type": "error", "message": "部分交易对无效，已忽略", "rejected": rejected})
+    
+    async def build():
+        return {
+            symbol: market_data_service.get_ticker(symbol, exchange, market_type)
+            for symbol in symbol_list
+        }
+    
+    producer = _with_symbol_streams(_topic_producer(build, 1.0, (market_type,), exchange), symbol_list, exchange, market_type)
+    topics.subscribe(f"symbols:{exchange}:{market_type}:{','.join(symbol_list)}", websocket, producer)
     try:
-        await market_data_service.subscribe_symbols(symbol_list, exchange, market_type)
-        while True:
-            tickers = {
-                symbol: market_data_service.get_ticker(symbol, exchange, market_type)
-                for symbol in symbol_list
-            }
-            await websocket.send_json(tickers)
-            await asyncio.sleep(1)
+        await _wait_for_disconnect(websocket)
+    except WebSocketDisconnect:
+        pass
     except Exception as e:
         logger.error(f"WebSocket连接错误: {str(e)}")
     finally:
-        await market_data_service.unsubscribe_symbols(symbol_list, exchange, market_type)
-        await websocket.close()
+        topics.release(websocket)
 
 @router.get("/prices/usdt", response_model=Dict[str, Any])
 async def get_usdt_pairs(
@@ -1602,205 +2000,214 @@ async def websocket_usdt_pairs(
     exchange: str = Query("binance", description="交易所名称"),
     market_type: str = Query("spot", description="市場類型 (spot/futures)")
 ):
-    """WebSocket連接獲取USDT交易對的價格更新"""
+    """
+    WebSocket連接獲取USDT交易對的價格更新
+    
+    客戶端發送 {"type": "subscribe"} 後訂閱 usdt:<交易所>:<市場類型> 主題，
+    每秒推送一次；服務器定期發送心跳，60秒內未收到 pong 則斷開連接。
+    """
     await websocket.accept()
-    last_heartbeat = datetime.now()
+    last_heartbeat = time.time()
+    heartbeat_interval = 15  # 心跳間隔，數據由主題推送，不再需要按秒輪詢
     connection_id = id(websocket)
-    is_closed = False
-    is_subscribed = False
+    topic_name = f"usdt:{exchange}:{market_type}"
     logger.info(f"新的USDT交易對WebSocket連接已建立 [ID: {connection_id}]")
     
+    async def build():
+        # 篩選USDT交易對
+        all_tickers = market_data_service.get_all_tickers(exchange, market_type)
+        usdt_tickers = {
+            symbol: data for symbol, data in all_tickers.items()
+            if symbol.endswith('USDT')
+        }
+        return {
+            "type": "update",
+            "timestamp": datetime.now().isoformat(),
+            "exchange": exchange,
+            "market_type": market_type,
+            "count": len(usdt_tickers),
+            "data": usdt_tickers
+        }
+    
     try:
-        while not is_closed:
-            try:
-                # 檢查心跳超時
-                current_time = datetime.now()
-                if (current_time - last_heartbeat).total_seconds() > 60:  # 60秒無響應則斷開
-                    logger.warning(f"WebSocket心跳超時 [ID: {connection_id}]")
-                    break
-                
-                # 等待客戶端消息或超時
-                try:
-                    message = await asyncio.wait_for(websocket.receive_text(), timeout=1.0)
-                    data = json.loads(message)
-                    
-                    if data.get("type") == "pong":
-                        last_heartbeat = current_time
-                        continue
-                    
-                    if data.get("type") == "subscribe":
-                        is_subscribed = True
-                        await websocket.send_json({
-                            "type": "subscribed",
-                            "timestamp": current_time.isoformat(),
-                            "market_type": market_type
-                        })
-                        logger.info(f"客戶端訂閱了 {market_type} 市場數據 [ID: {connection_id}]")
-                        continue
-                        
-                except asyncio.TimeoutError:
-                    # 發送心跳
-                    if not is_closed:
-                        await websocket.send_json({
-                            "type": "heartbeat",
-                            "timestamp": current_time.isoformat()
-                        })
-                    continue
-                except WebSocketDisconnect:
-                    logger.info(f"客戶端斷開連接 [ID: {connection_id}]")
-                    is_closed = True
-                    break
-                except Exception as e:
-                    logger.error(f"處理客戶端消息時出錯 [ID: {connection_id}]: {str(e)}")
-                    continue
-                
-                # 如果客戶端未訂閱，則不發送數據
-                if not is_subscribed:
-                    continue
-                
-                # 獲取所有價格
-                all_tickers = market_data_service.get_all_tickers(exchange, market_type)
-                
-                # 篩選USDT交易對
-                usdt_tickers = {
-                    symbol: data for symbol, data in all_tickers.items()
-                    if symbol.endswith('USDT')
-                }
-                
-                # 構建市場數據
-                market_data = {
-                    "type": "update",
-                    "timestamp": current_time.isoformat(),
-                    "exchange": exchange,
-                    "market_type": market_type,
-                    "count": len(usdt_tickers),
-                    "data": usdt_tickers
-                }
-                
-                # 發送數據
-                if not is_closed:
-                    await websocket.send_json(market_data)
-                
-                # 等待下一次更新
-                await asyncio.sleep(1)
-                
-            except WebSocketDisconnect:
-                logger.info(f"USDT交易對WebSocket客戶端斷開連接 [ID: {connection_id}]")
-                is_closed = True
+        while True:
+            # 檢查心跳超時
+            if time.time() - last_heartbeat > 60:  # 60秒無響應則斷開
+                logger.warning(f"WebSocket心跳超時 [ID: {connection_id}]")
                 break
-            except Exception as e:
-                logger.error(f"處理USDT交易對WebSocket數據時出錯 [ID: {connection_id}]: {str(e)}")
-                if not is_closed:
-                    try:
-                        await websocket.send_json({
-                            "type": "error",
-                            "timestamp": datetime.now().isoformat(),
-                            "message": "獲取USDT交易對數據時出錯"
-                        })
-                    except:
-                        is_closed = True
-                        break
-                await asyncio.sleep(5)  # 出錯後等待較長時間再重試
+            
+            # 等待客戶端消息，超時則發送心跳
+            try:
+                message = await asyncio.wait_for(websocket.receive_text(), timeout=heartbeat_interval)
+            except asyncio.TimeoutError:
+                topics.send(websocket, {"type": "heartbeat", "timestamp": datetime.now().isoformat()})
+                continue
+            
+            try:
+                data = json.loads(message)
+            except ValueError:
+                continue
+            if not isinstance(data, dict):
+                continue
+            
+            if data.get("type") == "pong":
+                last_heartbeat = time.time()
+            elif data.get("type") == "subscribe":
+                topics.send(websocket, {
+                    "type": "subscribed",
+                    "timestamp": datetime.now().isoformat(),
+                    "market_type": market_type
+                })
+                topics.subscribe(topic_name, websocket, _topic_producer(build, 1.0))
+                logger.info(f"客戶端訂閱了 {market_type} 市場數據 [ID: {connection_id}]")
                 
+    except WebSocketDisconnect:
+        logger.info(f"USDT交易對WebSocket客戶端斷開連接 [ID: {connection_id}]")
     except Exception as e:
         logger.error(f"USDT交易對WebSocket連接錯誤 [ID: {connection_id}]: {str(e)}")
     finally:
+        topics.release(websocket)
         logger.info(f"USDT交易對WebSocket連接已關閉 [ID: {connection_id}]")
-        if not is_closed:
-            try:
-                await websocket.close()
-            except:
-                pass 
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+
+def _build_ticker_message(symbol: str) -> Dict[str, Any]:
+    """構建單個交易對的行情消息，現貨優先，附帶最優買賣價"""
+    market_type = "spot"
+    ticker_data = market_data_service.get_ticker(symbol, "binance", "spot")
+    if ticker_data is None:
+        market_type = "futures"
+        ticker_data = market_data_service.get_ticker(symbol, "binance", "futures")
+    
+    # 如果未找到数据，发送一个提示信息
+    if not ticker_data:
+        return {
+            "type": "error",
+            "message": f"未找到交易对 {symbol} 的行情数据",
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    # 添加市场类型和时间戳
+    ticker_data["market_type"] = market_type
+    ticker_data["timestamp"] = datetime.now().isoformat()
+    ticker_data["symbol"] = symbol  # 确保包含交易对信息
+    book_ticker = market_data_service.get_book_ticker(symbol, "binance", market_type)
+    if book_ticker:
+        ticker_data["book"] = book_ticker
+    return ticker_data
 
 @router.websocket("/ws/ticker/{symbol}")
 async def websocket_ticker(websocket: WebSocket, symbol: str):
     """为单个交易对提供实时行情数据
     
+    同一交易对的所有连接订阅 ticker:<交易对> 主题，主题启动时订阅该交易对的
+    逐交易对数据流（最优买卖价等），最后一个连接关闭时释放。
+    
     Args:
         websocket: WebSocket连接
         symbol: 交易对符号，如BTCUSDT
     """
     await websocket.accept()
+    symbol = symbol.upper()
+    
+    # 只在現貨沒有而期貨有該交易對時訂閱期貨數據流；兩個市場都沒有時拒絕連接
+    if market_data_service.is_known_symbol(symbol, "binance", "spot"):
+        stream_market = "spot"
+    elif market_data_service.is_known_symbol(symbol, "binance", "futures"):
+        stream_market = "futures"
+    else:
+        await websocket.send_json({"type": "error", "message": f"未知的交易对: {symbol}"})
+        await websocket.close()
+        return
     
     # 发送连接确认消息
-    await websocket.send_json({
+    topics.send(websocket, {
         "type": "connection_established",
         "message": f"已连接到{symbol}行情数据",
         "timestamp": datetime.now().isoformat()
     })
     
-    # 定义异步生成数据的函数
-    async def send_ticker_data():
+    async def build():
+        return _build_ticker_message(symbol)
+    
+    producer = _with_symbol_streams(_topic_producer(build, 3.0, ("spot", "futures")), [symbol], "binance", stream_market)
+    topics.subscribe(f"ticker:{symbol}", websocket, producer)
+    
+    try:
+        await _wait_for_disconnect(websocket)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"交易对行情WebSocket错误: {str(e)}")
+    finally:
+        topics.release(websocket)
+
+# 訂單簿推送的最短間隔（秒），期間的多次增量合併為一次快照
+DEPTH_PUSH_INTERVAL = 0.5
+
+def _depth_producer(symbol: str, market_type: str, levels: int):
+    """
+    創建訂單簿主題的生產者：訂單簿有變化時按固定間隔推送前N檔快照
+
+    交易所以 4xx 拒絕快照請求（如無效交易對）時發布錯誤消息並結束，不再重啟重試。
+    """
+    async def produce(topic):
         try:
-            while True:
-                try:
-                    # 获取所有市场数据
-                    spot_tickers = market_data_service.get_all_tickers(exchange="binance", market_type="spot")
-                    futures_tickers = market_data_service.get_all_tickers(exchange="binance", market_type="futures")
-                    
-                    all_tickers = {
-                        "spot": spot_tickers,
-                        "futures": futures_tickers
-                    }
-                    
-                    # 确定交易对所在的市场类型
-                    ticker_data = None
-                    market_type = None
-                    
-                    if symbol in all_tickers.get("spot", {}):
-                        ticker_data = all_tickers["spot"][symbol]
-                        market_type = "spot"
-                    elif symbol in all_tickers.get("futures", {}):
-                        ticker_data = all_tickers["futures"][symbol]
-                        market_type = "futures"
-                    
-                    # 如果找到数据，发送给客户端
-                    if ticker_data:
-                        # 添加市场类型和时间戳
-                        ticker_data["market_type"] = market_type
-                        ticker_data["timestamp"] = datetime.now().isoformat()
-                        ticker_data["symbol"] = symbol  # 确保包含交易对信息
-                        
-                        await websocket.send_json(ticker_data)
-                    else:
-                        # 如果未找到数据，发送一个提示信息
-                        await websocket.send_json({
-                            "type": "error",
-                            "message": f"未找到交易对 {symbol} 的行情数据",
-                            "timestamp": datetime.now().isoformat()
-                        })
-                        
-                except Exception as e:
-                    logger.error(f"处理交易对 {symbol} 行情数据时出错: {str(e)}")
-                    # 发送错误消息到客户端
-                    await websocket.send_json({
-                        "type": "error",
-                        "message": f"获取行情数据时出错: {str(e)}",
-                        "timestamp": datetime.now().isoformat()
-                    })
-                
-                # 休眠一段时间
-                await asyncio.sleep(3)
-        except WebSocketDisconnect:
-            # 用户断开连接
+            await order_book_service.watch(symbol, market_type)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code >= 500:
+                raise
+            topic.publish({"type": "error", "message": f"获取深度快照失败: {e.response.text}"})
             return
-        except Exception as e:
-            # 发生错误，记录日志
-            logger.error(f"交易对行情WebSocket错误: {str(e)}")
+        try:
+            version = None
+            while True:
+                book = await order_book_service.get_book(symbol, market_type)
+                if book.version != version:
+                    version = book.version
+                    message = book.snapshot(levels)
+                    message["type"] = "depth"
+                    message["timestamp"] = datetime.now().isoformat()
+                    topic.publish(message)
+                await asyncio.sleep(DEPTH_PUSH_INTERVAL)
+        finally:
+            await order_book_service.unwatch(symbol, market_type)
+    return produce
+
+@router.websocket("/ws/depth/{symbol}")
+async def websocket_depth(
+    websocket: WebSocket,
+    symbol: str,
+    market_type: str = Query("spot", description="市场类型 (spot/futures)"),
+    levels: int = Query(20, ge=1, le=100, description="每侧推送的档位数量")
+):
+    """推送单个交易对的订单簿快照
     
-    # 启动数据发送任务
-    data_task = asyncio.create_task(send_ticker_data())
+    同一交易对、市场和档位数量的连接共享 depth:<市场>:<交易对>:<档位> 主题，
+    订单簿有变化时最多每 DEPTH_PUSH_INTERVAL 秒推送一次前N档、价差和中间价。
+    """
+    await websocket.accept()
+    if market_type not in ("spot", "futures"):
+        await websocket.send_json({"type": "error", "message": "市场类型必须是 spot 或 futures"})
+        await websocket.close()
+        return
+    symbol = symbol.upper()
+    if not market_data_service.is_known_symbol(symbol, "binance", market_type):
+        await websocket.send_json({"type": "error", "message": f"未知的交易对: {symbol}"})
+        await websocket.close()
+        return
+    topics.subscribe(f"depth:{market_type}:{symbol}:{levels}", websocket, _depth_producer(symbol, market_type, levels))
     
     try:
-        # 保持连接直到客户端断开
-        await websocket.wait_for_disconnect()
+        await _wait_for_disconnect(websocket)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"订单簿WebSocket错误: {str(e)}")
     finally:
-        # 取消数据发送任务
-        data_task.cancel()
-        try:
-            await data_task
-        except asyncio.CancelledError:
-            pass 
+        topics.release(websocket)
 
 # 新增CoinMarketCap API配置
 COINMARKETCAP_API_KEY = os.getenv("COINMARKETCAP_API_KEY", "")
@@ -1821,9 +2228,10 @@ async def get_global_metrics(force_refresh: bool = Query(False, description="強
     - 活躍市場數量
     - 恐懼與貪婪指數
     
-    為了減少API請求次數，數據會被緩存:
+    為了減少API請求次數，數據會被緩存並由後台任務在過期前刷新:
     - 全球市場數據每小時更新一次
     - 恐懼與貪婪指數每3小時更新一次
+    - 強制刷新全局每分鐘最多執行一次，其餘請求直接返回緩存
     
     參數:
         force_refresh (bool): 是否強制刷新數據，忽略緩存
@@ -1832,9 +2240,14 @@ async def get_global_metrics(force_refresh: bool = Query(False, description="強
         包含全球市場指標、恐懼與貪婪指數和緩存信息的JSON物件
     """
     try:
-        # 從緩存獲取數據
-        global_metrics = await global_market_cache.get_global_metrics(force_update=force_refresh)
-        fear_greed_data = await global_market_cache.get_fear_greed_index(force_update=force_refresh)
+        # 強制刷新全局限頻，超出頻率時直接返回緩存
+        forced = force_refresh and global_market_cache.try_force_refresh()
+        
+        # 從緩存獲取數據，兩類數據並行讀取
+        global_metrics, fear_greed_data = await asyncio.gather(
+            global_market_cache.get_global_metrics(force_update=forced),
+            global_market_cache.get_fear_greed_index(force_update=forced)
+        )
         
         # 合併數據
         result = {
@@ -1843,8 +2256,9 @@ async def get_global_metrics(force_refresh: bool = Query(False, description="強
             "global_metrics": global_metrics,
             "fear_greed_index": fear_greed_data,
             "cache_info": {
-                "was_cached": not force_refresh,
-                "last_forced_refresh": datetime.now().isoformat() if force_refresh else None
+                "was_cached": not forced,
+                "last_forced_refresh": datetime.now().isoformat() if forced else None,
+                "force_refresh_limited": force_refresh and not forced
             }
         }
         
@@ -1894,34 +2308,34 @@ async def get_coinmarketcap_global_metrics() -> Dict[str, Any]:
     
     try:
         logger.info(f"正在發送請求到 CoinMarketCap API: {url}")
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(url, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-            
-            # 檢查API響應是否成功
-            if "data" not in data:
-                error_message = data.get("status", {}).get("error_message", "Unknown error")
-                logger.error(f"CoinMarketCap API返回錯誤: {error_message}")
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"獲取CoinMarketCap數據失敗: {error_message}"
-                )
-            
-            # 處理並格式化數據
-            quotes = data["data"]["quote"]["USD"]
-            result = {
-                "total_market_cap_usd": quotes["total_market_cap"],
-                "total_volume_24h_usd": quotes["total_volume_24h"],
-                "bitcoin_dominance": data["data"]["btc_dominance"],
-                "ethereum_dominance": data["data"]["eth_dominance"],
-                "active_cryptocurrencies": data["data"]["active_cryptocurrencies"],
-                "active_exchanges": data["data"]["active_exchanges"],
-                "last_updated": data["data"]["last_updated"],
-            }
-            
-            logger.info("成功獲取CoinMarketCap全球市場數據")
-            return result
+        client = http_clients.get(url)
+        response = await client.get(url, headers=headers)
+        response.raise_for_status()
+        data = response.json()
+        
+        # 檢查API響應是否成功
+        if "data" not in data:
+            error_message = data.get("status", {}).get("error_message", "Unknown error")
+            logger.error(f"CoinMarketCap API返回錯誤: {error_message}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"獲取CoinMarketCap數據失敗: {error_message}"
+            )
+        
+        # 處理並格式化數據
+        quotes = data["data"]["quote"]["USD"]
+        result = {
+            "total_market_cap_usd": quotes["total_market_cap"],
+            "total_volume_24h_usd": quotes["total_volume_24h"],
+            "bitcoin_dominance": data["data"]["btc_dominance"],
+            "ethereum_dominance": data["data"]["eth_dominance"],
+            "active_cryptocurrencies": data["data"]["active_cryptocurrencies"],
+            "active_exchanges": data["data"]["active_exchanges"],
+            "last_updated": data["data"]["last_updated"],
+        }
+        
+        logger.info("成功獲取CoinMarketCap全球市場數據")
+        return result
     
     except httpx.HTTPError as e:
         logger.error(f"獲取CoinMarketCap全球指標數據時HTTP錯誤: {str(e)}")
@@ -1985,43 +2399,43 @@ async def get_fear_greed_index() -> Dict[str, Any]:
         # 1. 嘗試使用Alternative.me官方API
         logger.info("正在使用Alternative.me官方API獲取恐懼與貪婪指數...")
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(sources[0]["url"], headers=sources[0]["headers"], params={"limit": "3"})
-                response.raise_for_status()
-                data = response.json()
+            client = http_clients.get(sources[0]["url"])
+            response = await client.get(sources[0]["url"], headers=sources[0]["headers"], params={"limit": "3"})
+            response.raise_for_status()
+            data = response.json()
+            
+            # 檢查API響應是否成功
+            if "data" in data and len(data["data"]) > 0:
+                # 獲取最新數據
+                current_data = data["data"][0]
                 
-                # 檢查API響應是否成功
-                if "data" in data and len(data["data"]) > 0:
-                    # 獲取最新數據
-                    current_data = data["data"][0]
-                    
-                    fear_greed_value = int(current_data.get("value", 0))
-                    classification = current_data.get("value_classification", "").lower().replace(" ", "-")
-                    logger.info(f"從官方API成功獲取恐懼與貪婪指數: {fear_greed_value} ({classification})")
-                    
-                    # 獲取歷史數據
-                    if len(data["data"]) > 1:
-                        historical_data["yesterday"] = int(data["data"][1].get("value", 0))
+                fear_greed_value = int(current_data.get("value", 0))
+                classification = current_data.get("value_classification", "").lower().replace(" ", "-")
+                logger.info(f"從官方API成功獲取恐懼與貪婪指數: {fear_greed_value} ({classification})")
+                
+                # 獲取歷史數據
+                if len(data["data"]) > 1:
+                    historical_data["yesterday"] = int(data["data"][1].get("value", 0))
+                
+                if len(data["data"]) > 2:
+                    historical_data["last_week"] = int(data["data"][2].get("value", 0))
                     
-                    if len(data["data"]) > 2:
-                        historical_data["last_week"] = int(data["data"][2].get("value", 0))
+                # 額外請求獲取月度數據 (如果沒有在前面獲取到)
+                if "last_month" not in historical_data:
+                    try:
+                        month_response = await client.get(sources[0]["url"], headers=sources[0]["headers"], params={"limit": "30"})
+                        month_response.raise_for_status()
+                        month_data = month_response.json()
                         
-                    # 額外請求獲取月度數據 (如果沒有在前面獲取到)
-                    if "last_month" not in historical_data:
-                        try:
-                            month_response = await client.get(sources[0]["url"], headers=sources[0]["headers"], params={"limit": "30"})
-                            month_response.raise_for_status()
-                            month_data = month_response.json()
-                            
-                            if "data" in month_data and len(month_data["data"]) >= 30:
-                                historical_data["last_month"] = int(month_data["data"][29].get("value", 0))
-                        except Exception as e:
-                            logger.warning(f"獲取月度歷史數據時出錯: {str(e)}")
-                    
-                    success = True
-                else:
-                    error_messages.append("API回應未包含預期的數據結構")
-                    logger.warning("Alternative.me API回應未包含預期的數據結構")
+                        if "data" in month_data and len(month_data["data"]) >= 30:
+                            historical_data["last_month"] = int(month_data["data"][29].get("value", 0))
+                    except Exception as e:
+                        logger.warning(f"獲取月度歷史數據時出錯: {str(e)}")
+                
+                success = True
+            else:
+                error_messages.append("API回應未包含預期的數據結構")
+                logger.warning("Alternative.me API回應未包含預期的數據結構")
         except Exception as e:
             error_messages.append(f"Alternative.me API 獲取失敗: {str(e)}")
             logger.error(f"從Alternative.me API獲取恐懼與貪婪指數失敗: {str(e)}")
@@ -2030,139 +2444,139 @@ async def get_fear_greed_index() -> Dict[str, Any]:
         if not success:
             logger.info("API方法失敗，嘗試從Alternative.me網頁抓取恐懼與貪婪指數...")
             try:
-                async with httpx.AsyncClient(timeout=10.0) as client:
-                    response = await client.get(sources[1]["url"], headers=sources[1]["headers"], follow_redirects=True)
-                    response.raise_for_status()
-                    html = response.text
+                client = http_clients.get(sources[1]["url"])
+                response = await client.get(sources[1]["url"], headers=sources[1]["headers"], follow_redirects=True)
+                response.raise_for_status()
+                html = response.text
+                
+                # 使用BeautifulSoup解析HTML
+                soup = BeautifulSoup(html, 'html.parser')
+                logger.debug(f"成功獲取Alternative.me頁面，HTML長度: {len(html)}字元")
+                
+                # 檢查新網頁結構
+                now_section = soup.find("div", string="Now")
+                if now_section:
+                    # 尋找 Now 後面的值
+                    greed_section = now_section.find_next("div")
+                    if greed_section and greed_section.text.strip():
+                        # 找到分類和值
+                        classification = greed_section.text.strip().lower()
+                        value_section = greed_section.find_next("div")
+                        if value_section and value_section.text.strip().isdigit():
+                            fear_greed_value = int(value_section.text.strip())
+                            success = True
+                            logger.info(f"成功從網頁新結構獲取恐懼與貪婪指數值: {fear_greed_value} ({classification})")
+                            
+                            # 獲取歷史數據
+                            historical_sections = {
+                                "Yesterday": "yesterday",
+                                "Last week": "last_week",
+                                "Last month": "last_month"
+                            }
+                            
+                            for label, key in historical_sections.items():
+                                section = soup.find("div", string=label)
+                                if section:
+                                    # 跳過分類，直接獲取值
+                                    value_div = section.find_next("div")
+                                    if value_div:
+                                        value_div = value_div.find_next("div")
+                                        if value_div and value_div.text.strip().isdigit():
+                                            historical_data[key] = int(value_div.text.strip())
+                
+                # 如果新方法失敗，嘗試舊的選擇器
+                if not success:
+                    # 嘗試各種選擇器
+                    selectors = [
+                        '.fng-circle .fng-value',
+                        '.fng-value',
+                        'div[class*="fng-circle"] div[class*="fng-value"]',
+                        'div.fng-circle',
+                    ]
                     
-                    # 使用BeautifulSoup解析HTML
-                    soup = BeautifulSoup(html, 'html.parser')
-                    logger.debug(f"成功獲取Alternative.me頁面，HTML長度: {len(html)}字元")
+                    for selector in selectors:
+                        try:
+                            fear_greed_element = soup.select_one(selector)
+                            if fear_greed_element and fear_greed_element.text:
+                                value_text = fear_greed_element.text.strip()
+                                import re
+                                number_match = re.search(r'\d+', value_text)
+                                if number_match:
+                                    fear_greed_value = int(number_match.group())
+                                    logger.info(f"成功獲取恐懼與貪婪指數值: {fear_greed_value} (選擇器: {selector})")
+                                    success = True
+                                    break
+                        except Exception as e:
+                            logger.warning(f"使用選擇器 {selector} 提取數值時失敗: {str(e)}")
                     
-                    # 檢查新網頁結構
-                    now_section = soup.find("div", string="Now")
-                    if now_section:
-                        # 尋找 Now 後面的值
-                        greed_section = now_section.find_next("div")
-                        if greed_section and greed_section.text.strip():
-                            # 找到分類和值
-                            classification = greed_section.text.strip().lower()
-                            value_section = greed_section.find_next("div")
-                            if value_section and value_section.text.strip().isdigit():
-                                fear_greed_value = int(value_section.text.strip())
+                    # 嘗試從JavaScript變量提取
+                    if not success:
+                        try:
+                            logger.debug("嘗試從JavaScript變量中提取數據...")
+                            js_pattern = r'var\s+fng_value\s*=\s*(\d+)'
+                            js_match = re.search(js_pattern, html)
+                            if js_match:
+                                fear_greed_value = int(js_match.group(1))
+                                logger.info(f"從JavaScript變量成功獲取恐懼與貪婪指數: {fear_greed_value}")
                                 success = True
-                                logger.info(f"成功從網頁新結構獲取恐懼與貪婪指數值: {fear_greed_value} ({classification})")
-                                
-                                # 獲取歷史數據
-                                historical_sections = {
-                                    "Yesterday": "yesterday",
-                                    "Last week": "last_week",
-                                    "Last month": "last_month"
-                                }
-                                
-                                for label, key in historical_sections.items():
-                                    section = soup.find("div", string=label)
-                                    if section:
-                                        # 跳過分類，直接獲取值
-                                        value_div = section.find_next("div")
-                                        if value_div:
-                                            value_div = value_div.find_next("div")
-                                            if value_div and value_div.text.strip().isdigit():
-                                                historical_data[key] = int(value_div.text.strip())
+                        except Exception as e:
+                            logger.warning(f"從JavaScript提取恐懼與貪婪指數失敗: {str(e)}")
                     
-                    # 如果新方法失敗，嘗試舊的選擇器
-                    if not success:
-                        # 嘗試各種選擇器
-                        selectors = [
-                            '.fng-circle .fng-value',
-                            '.fng-value',
-                            'div[class*="fng-circle"] div[class*="fng-value"]',
-                            'div.fng-circle',
-                        ]
-                        
-                        for selector in selectors:
-                            try:
-                                fear_greed_element = soup.select_one(selector)
-                                if fear_greed_element and fear_greed_element.text:
-                                    value_text = fear_greed_element.text.strip()
-                                    import re
-                                    number_match = re.search(r'\d+', value_text)
-                                    if number_match:
-                                        fear_greed_value = int(number_match.group())
-                                        logger.info(f"成功獲取恐懼與貪婪指數值: {fear_greed_value} (選擇器: {selector})")
-                                        success = True
-                                        break
-                            except Exception as e:
-                                logger.warning(f"使用選擇器 {selector} 提取數值時失敗: {str(e)}")
-                        
-                        # 嘗試從JavaScript變量提取
-                        if not success:
-                            try:
-                                logger.debug("嘗試從JavaScript變量中提取數據...")
-                                js_pattern = r'var\s+fng_value\s*=\s*(\d+)'
-                                js_match = re.search(js_pattern, html)
-                                if js_match:
-                                    fear_greed_value = int(js_match.group(1))
-                                    logger.info(f"從JavaScript變量成功獲取恐懼與貪婪指數: {fear_greed_value}")
-                                    success = True
-                            except Exception as e:
-                                logger.warning(f"從JavaScript提取恐懼與貪婪指數失敗: {str(e)}")
+                    # 如果成功獲取值，嘗試提取分類
+                    if success:
+                        try:
+                            classification_element = soup.select_one('.fng-circle')
+                            if classification_element:
+                                classes = classification_element.get('class', [])
+                                classification = next((cls for cls in classes if cls.startswith('fng-') and cls != 'fng-circle' and cls != 'fng-value'), 'unknown')
+                                classification = classification.replace('fng-', '')
+                            
+                            # 根據值推斷分類
+                            if classification == 'unknown':
+                                if fear_greed_value >= 90:
+                                    classification = "extreme-greed"
+                                elif fear_greed_value >= 75:
+                                    classification = "greed"
+                                elif fear_greed_value >= 55:
+                                    classification = "neutral-greed"
+                                elif fear_greed_value >= 45:
+                                    classification = "neutral"
+                                elif fear_greed_value >= 25:
+                                    classification = "neutral-fear"
+                                elif fear_greed_value >= 10:
+                                    classification = "fear"
+                                else:
+                                    classification = "extreme-fear"
+                        except Exception as e:
+                            logger.warning(f"提取恐懼與貪婪指數分類時出錯: {str(e)}")
                         
-                        # 如果成功獲取值，嘗試提取分類
-                        if success:
+                        # 嘗試獲取歷史數據 (舊方法)
+                        if not historical_data:
                             try:
-                                classification_element = soup.select_one('.fng-circle')
-                                if classification_element:
-                                    classes = classification_element.get('class', [])
-                                    classification = next((cls for cls in classes if cls.startswith('fng-') and cls != 'fng-circle' and cls != 'fng-value'), 'unknown')
-                                    classification = classification.replace('fng-', '')
-                                
-                                # 根據值推斷分類
-                                if classification == 'unknown':
-                                    if fear_greed_value >= 90:
-                                        classification = "extreme-greed"
-                                    elif fear_greed_value >= 75:
-                                        classification = "greed"
-                                    elif fear_greed_value >= 55:
-                                        classification = "neutral-greed"
-                                    elif fear_greed_value >= 45:
-                                        classification = "neutral"
-                                    elif fear_greed_value >= 25:
-                                        classification = "neutral-fear"
-                                    elif fear_greed_value >= 10:
-                                        classification = "fear"
-                                    else:
-                                        classification = "extreme-fear"
+                                timeframes = soup.select('.fng-verbiage')
+                                for timeframe in timeframes:
+                                    period_text = timeframe.select_one('.gray')
+                                    if not period_text:
+                                        continue
+                                        
+                                    period_text_lower = period_text.text.lower()
+                                    value_element = timeframe.select_one('.fng-value')
+                                    if not value_element:
+                                        continue
+                                        
+                                    try:
+                                        value = int(value_element.text.strip())
+                                        
+                                        if "yesterday" in period_text_lower or "day" in period_text_lower:
+                                            historical_data["yesterday"] = value
+                                        elif "week" in period_text_lower:
+                                            historical_data["last_week"] = value
+                                        elif "month" in period_text_lower:
+                                            historical_data["last_month"] = value
+                                    except (ValueError, AttributeError):
+                                        continue
                             except Exception as e:
-                                logger.warning(f"提取恐懼與貪婪指數分類時出錯: {str(e)}")
-                            
-                            # 嘗試獲取歷史數據 (舊方法)
-                            if not historical_data:
-                                try:
-                                    timeframes = soup.select('.fng-verbiage')
-                                    for timeframe in timeframes:
-                                        period_text = timeframe.select_one('.gray')
-                                        if not period_text:
-                                            continue
-                                            
-                                        period_text_lower = period_text.text.lower()
-                                        value_element = timeframe.select_one('.fng-value')
-                                        if not value_element:
-                                            continue
-                                            
-                                        try:
-                                            value = int(value_element.text.strip())
-                                            
-                                            if "yesterday" in period_text_lower or "day" in period_text_lower:
-                                                historical_data["yesterday"] = value
-                                            elif "week" in period_text_lower:
-                                                historical_data["last_week"] = value
-                                            elif "month" in period_text_lower:
-                                                historical_data["last_month"] = value
-                                        except (ValueError, AttributeError):
-                                            continue
-                                except Exception as e:
-                                    logger.warning(f"提取恐懼與貪婪指數歷史數據時出錯: {str(e)}")
+                                logger.warning(f"提取恐懼與貪婪指數歷史數據時出錯: {str(e)}")
             
             except Exception as e:
                 error_messages.append(f"Alternative.me 網頁抓取失敗: {str(e)}")
@@ -2172,46 +2586,46 @@ async def get_fear_greed_index() -> Dict[str, Any]:
         if not success:
             logger.info("嘗試從CNN獲取恐懼與貪婪指數...")
             try:
-                async with httpx.AsyncClient(timeout=10.0) as client:
-                    response = await client.get(sources[2]["url"], headers=sources[2]["headers"])
-                    response.raise_for_status()
-                    data = response.json()
+                client = http_clients.get(sources[2]["url"])
+                response = await client.get(sources[2]["url"], headers=sources[2]["headers"])
+                response.raise_for_status()
+                data = response.json()
+                
+                # 檢查CNN數據格式
+                if data and "fear_and_greed" in data and len(data["fear_and_greed"]) > 0 and "score" in data["fear_and_greed"][-1]:
+                    fear_greed_value = int(data["fear_and_greed"][-1]["score"])
+                    logger.info(f"從CNN API成功獲取恐懼與貪婪指數值: {fear_greed_value}")
                     
-                    # 檢查CNN數據格式
-                    if data and "fear_and_greed" in data and len(data["fear_and_greed"]) > 0 and "score" in data["fear_and_greed"][-1]:
-                        fear_greed_value = int(data["fear_and_greed"][-1]["score"])
-                        logger.info(f"從CNN API成功獲取恐懼與貪婪指數值: {fear_greed_value}")
-                        
-                        # 根據值推斷分類
-                        if fear_greed_value >= 80:
-                            classification = "extreme-greed"
-                        elif fear_greed_value >= 65:
-                            classification = "greed"
-                        elif fear_greed_value >= 50:
-                            classification = "neutral-greed"
-                        elif fear_greed_value >= 35:
-                            classification = "neutral"
-                        elif fear_greed_value >= 20:
-                            classification = "neutral-fear"
-                        elif fear_greed_value >= 10:
-                            classification = "fear"
-                        else:
-                            classification = "extreme-fear"
-                        
-                        success = True
-                        
-                        # 提取歷史數據
-                        if len(data["fear_and_greed"]) > 1:
-                            historical_data["yesterday"] = int(data["fear_and_greed"][-2]["score"])
-                        
-                        if len(data["fear_and_greed"]) > 7:
-                            historical_data["last_week"] = int(data["fear_and_greed"][-8]["score"])
-                            
-                        if len(data["fear_and_greed"]) > 30:
-                            historical_data["last_month"] = int(data["fear_and_greed"][-31]["score"])
+                    # 根據值推斷分類
+                    if fear_greed_value >= 80:
+                        classification = "extreme-greed"
+                    elif fear_greed_value >= 65:
+                        classification = "greed"
+                    elif fear_greed_value >= 50:
+                        classification = "neutral-greed"
+                    elif fear_greed_value >= 35:
+                        classification = "neutral"
+                    elif fear_greed_value >= 20:
+                        classification = "neutral-fear"
+                    elif fear_greed_value >= 10:
+                        classification = "fear"
                     else:
-                        error_messages.append("CNN API回應未包含預期的數據結構")
-                        logger.warning("CNN API回應未包含預期的數據結構")
+                        classification = "extreme-fear"
+                    
+                    success = True
+                    
+                    # 提取歷史數據
+                    if len(data["fear_and_greed"]) > 1:
+                        historical_data["yesterday"] = int(data["fear_and_greed"][-2]["score"])
+                    
+                    if len(data["fear_and_greed"]) > 7:
+                        historical_data["last_week"] = int(data["fear_and_greed"][-8]["score"])
+                        
+                    if len(data["fear_and_greed"]) > 30:
+                        historical_data["last_month"] = int(data["fear_and_greed"][-31]["score"])
+                else:
+                    error_messages.append("CNN API回應未包含預期的數據結構")
+                    logger.warning("CNN API回應未包含預期的數據結構")
             except Exception as e:
                 error_messages.append(f"CNN 數據提取失敗: {str(e)}")
                 logger.error(f"從CNN獲取恐懼與貪婪指數失敗: {str(e)}")
@@ -2273,13 +2687,14 @@ async def get_fear_and_greed():
     返回當前加密貨幣市場的恐懼與貪婪指數，這是一個市場情緒指標，
     範圍從0（極度恐懼）到100（極度貪婪）。
     
-    該指數通過爬取Alternative.me網站獲取，包含當前值、分類和最近的歷史數據。
+    該指數通過爬取Alternative.me網站獲取，包含當前值、分類和最近的歷史數據，
+    與 /global-metrics 共用後台刷新的緩存。
     
     返回:
         包含恐懼與貪婪指數數據的JSON物件
     """
     try:
-        fear_greed_data = await get_fear_greed_index()
+        fear_greed_data = await global_market_cache.get_fear_greed_index()
         return {
             "success": True,
             "timestamp": datetime.now().isoformat(),
@@ -2301,8 +2716,9 @@ class GlobalMarketDataCache:
     - 支援全球市場數據緩存
     - 支援恐懼與貪婪指數緩存
     - 可設置不同數據類型的緩存時間
-    - 提供強制更新機制
-    - 自動數據過期檢查
+    - 後台定時在過期前提前刷新，請求路徑只讀取緩存
+    - 刷新期間或上游失敗時立即返回最後一次成功獲取的數據
+    - 強制更新機制全局限頻，避免客戶端觸發大量上游請求
     """
     def __init__(self):
         """初始化全球市場數據緩存"""
@@ -2321,11 +2737,19 @@ class GlobalMarketDataCache:
             "global_metrics": None,
             "fear_greed_index": None
         }
-        # 數據更新鎖，防止並發更新
-        self.locks = {
-            "global_metrics": asyncio.Lock(),
-            "fear_greed_index": asyncio.Lock()
+        # 單飛緩存：並發請求共用一次上游調用；過期後一天內先返回舊數據並在後台刷新；
+        # 上游失敗後60秒內不再重試
+        self.cache = AsyncSingleFlightCache("global_market", ttl=3600, stale_ttl=86400, negative_ttl=60)
+        # 各數據類型的上游獲取函數和日誌名稱
+        self.fetchers = {
+            "global_metrics": (get_coinmarketcap_global_metrics, "全球市場數據"),
+            "fear_greed_index": (get_fear_greed_index, "恐懼與貪婪指數")
         }
+        self.refresh_ahead = 0.8  # 在緩存時間的80%時由後台提前刷新
+        self.refresh_retry_interval = 60  # 後台刷新失敗後的重試間隔（秒）
+        self.force_refresh_interval = 60  # 全局強制刷新的最短間隔（秒），期間的強制刷新請求直接返回緩存
+        self.last_forced_refresh = 0.0  # 上次允許強制刷新的時間（time.monotonic）
+        self.refresher_task = None  # 後台刷新任務
         # 更新計數器
         self.update_counts = {
             "global_metrics": 0,
@@ -2334,64 +2758,84 @@ class GlobalMarketDataCache:
         # 日誌記錄時間
         self.last_log_time = datetime.now()
         self.log_interval = 3600  # 每小時記錄一次統計
+        # 上游失敗且沒有舊數據時返回的模擬數據
+        self.fallbacks = {
+            "global_metrics": lambda: {
+                "total_market_cap_usd": 2500000000000,
+                "total_volume_24h_usd": 150000000000,
+                "bitcoin_dominance": 48.5,
+                "ethereum_dominance": 18.7,
+                "active_cryptocurrencies": 10000,
+                "active_exchanges": 500,
+                "last_updated": datetime.now().isoformat(),
+                "note": "模擬數據 - 更新失敗"
+            },
+            "fear_greed_index": lambda: {
+                "value": 50,
+                "classification": "neutral",
+                "readable_classification": "中性",
+                "timestamp": datetime.now().isoformat(),
+                "source": "simulation",
+                "note": "模擬數據 - 更新失敗"
+            }
+        }
         
-    async def get_global_metrics(self, force_update=False) -> Dict[str, Any]:
+    async def _fetch(self, data_type: str, fetcher, label: str) -> Dict[str, Any]:
         """
-        獲取全球市場指標數據，如果數據過期或強制更新則重新獲取
+        單飛緩存的加載函數：調用上游並更新緩存數據與統計
         
         參數:
-            force_update (bool): 是否強制更新數據，忽略緩存
-            
-        返回:
-            Dict[str, Any]: 全球市場指標數據
+            data_type (str): 數據類型
+            fetcher: 獲取數據的協程函數
+            label (str): 日誌中使用的數據名稱
         """
+        logger.info(f"緩存過期或強制更新，正在獲取新的{label}")
+        new_data = await fetcher()
+        
+        # 更新緩存
+        self.data[data_type] = new_data
+        self.last_update[data_type] = datetime.now()
+        self.update_counts[data_type] += 1
+        
+        # 記錄統計信息
         current_time = datetime.now()
-        data_type = "global_metrics"
+        if (current_time - self.last_log_time).total_seconds() >= self.log_interval:
+            logger.info(f"{label}更新統計: 總更新次數 {self.update_counts[data_type]}")
+            self.last_log_time = current_time
+        return new_data
+        
+    def _loader(self, data_type: str):
+        """返回數據類型對應的單飛緩存加載函數"""
+        fetcher, label = self.fetchers[data_type]
+        return lambda: self._fetch(data_type, fetcher, label)
         
-        # 檢查是否需要更新數據
-        if (force_update or 
-            self.data[data_type] is None or 
-            self.last_update[data_type] is None or
-            (current_time - self.last_update[data_type]).total_seconds() > self.cache_times[data_type]):
+    async def _get(self, data_type: str, force_update: bool) -> Dict[str, Any]:
+        """
+        通過單飛緩存獲取數據並附加緩存信息
+        
+        後台刷新正常運行時緩存始終有效，本方法只讀取內存；僅在冷啟動尚無數據時
+        等待（並共用）正在進行的上游調用。
+        
+        參數:
+            data_type (str): 數據類型
+            force_update (bool): 是否強制更新數據，忽略緩存
             
-            # 使用鎖確保同一時間只有一個更新操作
-            async with self.locks[data_type]:
-                # 再次檢查，避免在等待鎖期間已被其他請求更新
-                if (force_update or 
-                    self.data[data_type] is None or 
-                    self.last_update[data_type] is None or
-                    (current_time - self.last_update[data_type]).total_seconds() > self.cache_times[data_type]):
-                    
-                    try:
-                        logger.info("緩存過期或強制更新，正在獲取新的全球市場數據")
-                        new_data = await get_coinmarketcap_global_metrics()
-                        
-                        # 更新緩存
-                        self.data[data_type] = new_data
-                        self.last_update[data_type] = datetime.now()
-                        self.update_counts[data_type] += 1
-                        
-                        # 記錄統計信息
-                        current_time = datetime.now()
-                        if (current_time - self.last_log_time).total_seconds() >= self.log_interval:
-                            logger.info(f"全球市場數據更新統計: 總更新次數 {self.update_counts[data_type]}")
-                            self.last_log_time = current_time
-                    
-                    except Exception as e:
-                        logger.error(f"更新全球市場數據失敗: {str(e)}")
-                        # 如果更新失敗但有舊數據，繼續使用舊數據
-                        if self.data[data_type] is None:
-                            # 如果沒有舊數據，創建一個模擬數據
-                            self.data[data_type] = {
-                                "total_market_cap_usd": 2500000000000,
-                                "total_volume_24h_usd": 150000000000,
-                                "bitcoin_dominance": 48.5,
-                                "ethereum_dominance": 18.7,
-                                "active_cryptocurrencies": 10000,
-                                "active_exchanges": 500,
-                                "last_updated": datetime.now().isoformat(),
-                                "note": "模擬數據 - 更新失敗"
-                            }
+        返回:
+            Dict[str, Any]: 數據及 cache_info
+        """
+        label = self.fetchers[data_type][1]
+        try:
+            await self.cache.get(
+                data_type,
+                self._loader(data_type),
+                ttl=self.cache_times[data_type],
+                force=force_update
+            )
+        except Exception as e:
+            logger.error(f"更新{label}失敗: {str(e)}")
+            # 如果沒有舊數據，創建一個模擬數據
+            if self.data[data_type] is None:
+                self.data[data_type] = self.fallbacks[data_type]()
         
         # 添加緩存信息
         result = self.data[data_type].copy()
@@ -2404,6 +2848,18 @@ class GlobalMarketDataCache:
                                      if self.last_update[data_type] else 0
         }
         return result
+        
+    async def get_global_metrics(self, force_update=False) -> Dict[str, Any]:
+        """
+        獲取全球市場指標數據，如果數據過期或強制更新則重新獲取
+        
+        參數:
+            force_update (bool): 是否強制更新數據，忽略緩存
+            
+        返回:
+            Dict[str, Any]: 全球市場指標數據
+        """
+        return await self._get("global_metrics", force_update)
             
     async def get_fear_greed_index(self, force_update=False) -> Dict[str, Any]:
         """
@@ -2415,63 +2871,55 @@ class GlobalMarketDataCache:
         返回:
             Dict[str, Any]: 恐懼與貪婪指數數據
         """
-        current_time = datetime.now()
-        data_type = "fear_greed_index"
+        return await self._get("fear_greed_index", force_update)
         
-        # 檢查是否需要更新數據
-        if (force_update or 
-            self.data[data_type] is None or 
-            self.last_update[data_type] is None or
-            (current_time - self.last_update[data_type]).total_seconds() > self.cache_times[data_type]):
-            
-            # 使用鎖確保同一時間只有一個更新操作
-            async with self.locks[data_type]:
-                # 再次檢查，避免在等待鎖期間已被其他請求更新
-                if (force_update or 
-                    self.data[data_type] is None or 
-                    self.last_update[data_type] is None or
-                    (current_time - self.last_update[data_type]).total_seconds() > self.cache_times[data_type]):
-                    
+    def try_force_refresh(self) -> bool:
+        """
+        申請一次強制刷新，全局每 force_refresh_interval 秒最多允許一次
+        
+        返回:
+            bool: 是否允許本次強制刷新
+        """
+        now = time.monotonic()
+        if now - self.last_forced_refresh < self.force_refresh_interval:
+            return False
+        self.last_forced_refresh = now
+        return True
+        
+    async def _refresh_loop(self):
+        """
+        後台刷新循環
+        
+        數據達到緩存時間的 refresh_ahead 比例時提前刷新，使請求路徑始終命中有效緩存；
+        刷新失敗時保留舊數據，並在 refresh_retry_interval 秒後重試。
+        """
+        while True:
+            delay = max(self.cache_times.values())
+            for data_type in self.data:
+                due = self.cache_times[data_type] * self.refresh_ahead
+                age = self.cache.age(data_type)
+                if age is None or age >= due:
                     try:
-                        logger.info("緩存過期或強制更新，正在獲取新的恐懼與貪婪指數")
-                        new_data = await get_fear_greed_index()
-                        
-                        # 更新緩存
-                        self.data[data_type] = new_data
-                        self.last_update[data_type] = datetime.now()
-                        self.update_counts[data_type] += 1
-                        
-                        # 記錄統計信息
-                        current_time = datetime.now()
-                        if (current_time - self.last_log_time).total_seconds() >= self.log_interval:
-                            logger.info(f"恐懼與貪婪指數更新統計: 總更新次數 {self.update_counts[data_type]}")
-                            self.last_log_time = current_time
-                    
+                        await self.cache.refresh(data_type, self._loader(data_type))
                     except Exception as e:
-                        logger.error(f"更新恐懼與貪婪指數失敗: {str(e)}")
-                        # 如果更新失敗但有舊數據，繼續使用舊數據
-                        if self.data[data_type] is None:
-                            # 如果沒有舊數據，創建一個模擬數據
-                            self.data[data_type] = {
-                                "value": 50,
-                                "classification": "neutral",
-                                "readable_classification": "中性",
-                                "timestamp": datetime.now().isoformat(),
-                                "source": "simulation",
-                                "note": "模擬數據 - 更新失敗"
-                            }
-        
-        # 添加緩存信息
-        result = self.data[data_type].copy()
-        result["cache_info"] = {
-            "is_cached": True,
-            "last_update": self.last_update[data_type].isoformat() if self.last_update[data_type] else None,
-            "cache_time_seconds": self.cache_times[data_type],
-            "next_update_in_seconds": max(0, self.cache_times[data_type] - 
-                                         (datetime.now() - self.last_update[data_type]).total_seconds())
-                                     if self.last_update[data_type] else 0
-        }
-        return result
+                        logger.error(f"後台刷新{self.fetchers[data_type][1]}失敗: {str(e)}")
+                    age = self.cache.age(data_type)
+                remaining = due - age if age is not None else 0
+                delay = min(delay, max(remaining, self.refresh_retry_interval))
+            await asyncio.sleep(delay)
+            
+    def start_refresher(self):
+        """啟動後台刷新任務（已啟動時不重複啟動）"""
+        if self.refresher_task is None or self.refresher_task.done():
+            self.refresher_task = asyncio.create_task(self._refresh_loop())
+            logger.info("全球市場數據後台刷新任務已啟動")
+            
+    async def stop_refresher(self):
+        """停止後台刷新任務"""
+        task, self.refresher_task = self.refresher_task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
 
 # 初始化全球市場數據緩存
 global_market_cache = GlobalMarketDataCache()
@@ -2497,6 +2945,10 @@ async def diagnostic_check(
         "tests": {},
         "market_data_service": {},
         "direct_connection": {},
+        "websocket_fanout": manager.fanout.get_stats(),
+        "websocket_topics": topics.get_stats(),
+        "http_clients": http_clients.get_stats(),
+        "request_caches": [price_cache.fetches.get_stats(), global_market_cache.cache.get_stats()],
         "suggestions": []
     }
     
@@ -2511,11 +2963,13 @@ async def diagnostic_check(
         if exchange in market_data_service.exchanges:
             exchange_obj = market_data_service.exchanges[exchange]
             # 檢查連接狀態
+            stream_status = market_data_service.get_stream_status(exchange)
             ws_connections = {
-                market_type: (ws is not None and hasattr(ws, 'open') and ws.open) 
-                for market_type, ws in exchange_obj.ws_connections.items()
+                market_type: status["connected"]
+                for market_type, status in stream_status.items()
             }
             results["market_data_service"]["ws_connections"] = ws_connections
+            results["market_data_service"]["streams"] = stream_status
             results["market_data_service"]["is_running"] = exchange_obj.is_running
             
             # 檢查數據
@@ -2524,6 +2978,13 @@ async def diagnostic_check(
                 for market_type, data in exchange_obj.market_data.items()
             }
             results["market_data_service"]["data_counts"] = data_counts
+            results["market_data_service"]["bus"] = market_data_service.bus.get_stats()
+            if hasattr(exchange_obj, "streams"):
+                results["market_data_service"]["symbol_streams"] = exchange_obj.streams.get_stats()
+                results["market_data_service"]["candle_store"] = candle_store.get_stats()
+                results["market_data_service"]["screener"] = market_screener.get_stats()
+                results["market_data_service"]["order_books"] = order_book_service.get_stats()
+                results["market_data_service"]["recorder"] = market_recorder.get_stats()
             
             # 如果沒有連接，則嘗試啟動
             if not any(ws_connections.values()):
@@ -2548,10 +3009,11 @@ async def diagnostic_check(
     # 2. 嘗試直接連接測試
     try:
         from app.core.exchanges.binance import BinanceExchange
+        from app.core.market_data_bus import MarketDataBus
         logger.info("診斷: 創建新的 BinanceExchange 實例進行測試")
         
-        # 創建新實例
-        test_exchange = BinanceExchange()
+        # 創建新實例，使用獨立的數據總線，測試數據不會發布給生產環境的訂閱者
+        test_exchange = BinanceExchange(bus=MarketDataBus())
         results["direct_connection"]["instance_created"] = True
         
         # 嘗試連接
@@ -2567,8 +3029,8 @@ async def diagnostic_check(
                 
                 # 檢查是否有活躍連接
                 ws_connections = {
-                    market_type: (ws is not None and hasattr(ws, 'open') and ws.open) 
-                    for market_type, ws in test_exchange.ws_connections.items()
+                    market_type: status["connected"]
+                    for market_type, status in test_exchange.get_stream_status().items()
                 }
                 results["direct_connection"]["ws_connections"] = ws_connections
                 
@@ -2589,16 +3051,15 @@ async def diagnostic_check(
                             for symbol in symbols
                         }
                 results["direct_connection"]["sample_data"] = sample_data
-                
-                # 關閉測試連接
-                logger.info("診斷: 測試完成，關閉連接")
-                await test_exchange.disconnect()
-                results["direct_connection"]["disconnected"] = True
             else:
                 results["suggestions"].append("直接連接失敗，可能是網絡問題或API端點不可用")
         except Exception as e:
             results["direct_connection"]["connection_error"] = str(e)
             results["suggestions"].append(f"連接過程發生錯誤: {str(e)}")
+        finally:
+            # 無論連接是否成功都關閉測試連接，connect() 失敗時監管者仍在後台重連
+            logger.info("診斷: 測試完成，關閉連接")
+            results["direct_connection"]["disconnected"] = await test_exchange.disconnect()
     except Exception as e:
         results["direct_connection"]["error"] = str(e)
         results["suggestions"].append("無法創建交易所實例")
@@ -2635,16 +3096,15 @@ async def diagnostic_check(
     
     # 4. HTTP連接檢查
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            if exchange == "binance":
-                url = "https://api.binance.com/api/v3/ping"
-                response = await client.get(url)
-                results["tests"]["http"] = {
-                    "success": response.status_code == 200,
-                    "status_code": response.status_code,
-                    "url": url
-                }
-                logger.info(f"HTTP連接測試: {url} -> {response.status_code}")
+        if exchange == "binance":
+            url = "https://api.binance.com/api/v3/ping"
+            response = await http_clients.get(url).get(url)
+            results["tests"]["http"] = {
+                "success": response.status_code == 200,
+                "status_code": response.status_code,
+                "url": url
+            }
+            logger.info(f"HTTP連接測試: {url} -> {response.status_code}")
     except Exception as e:
         results["tests"]["http"] = {
             "success": False,
@@ -320,7 +320,7 @@ async def batch_place_orders(
     current_user: User = Depends(get_current_user)
 ) -> Any:
     """
-    批量下單（最多5個訂單）
+    批量下單（最多200個訂單），結果順序與請求中的訂單一致
     """
     try:
         results = await trading_service.batch_place_orders(
@@ -347,7 +347,7 @@ async def batch_cancel_orders(
     current_user: User = Depends(get_current_user)
 ) -> Any:
     """
-    批量取消訂單（最多10個訂單）
+    批量取消訂單（最多200個訂單），結果順序與請求中的訂單ID一致
     """
     try:
         results = await trading_service.batch_cancel_orders(
@@ -395,7 +395,8 @@ async def get_connection_pool_stats(
     """
     獲取連接池統計信息
     
-    僅限管理員使用，用於監控系統性能和連接使用情況
+    僅限管理員使用，用於監控系統性能和連接使用情況。
+    wait 為等待分片鎖及等待連接創建完成的時間（毫秒）。
     """
     # 檢查用戶是否是管理員
     if not current_user.is_admin:
@@ -413,6 +414,7 @@ async def get_connection_pool_stats(
             "data": {
                 "active_connections": stats["active_connections"],
                 "stats": stats["stats"],
+                "wait": stats.get("wait", {}),
                 "rate_limits": stats.get("rate_limits", {}),
                 "pools": stats["pools"]
             },
@@ -67,7 +67,7 @@ async def main_websocket_endpoint(
     logger.debug(f"[WebSocket] 已同步用戶 {user.id} 的聊天室列表: {room_ids}")
 
     # 發送連線成功訊息
-    await websocket.send_json({
+    await websocket_manager.send_to_user(user.id, {
         "type": "connected",
         "user_id": user.id,
         "room_ids": room_ids,
@@ -98,7 +98,7 @@ async def main_websocket_endpoint(
                     logger.debug(f"PING - user:{user.id}")
                     # 更新在線狀態管理器中的最後活動時間
                     online_status_manager.update_user_active_time(user.id)
-                    await websocket.send_json({
+                    await websocket_manager.send_to_user(user.id, {
                         "type": "pong", 
                         "timestamp": datetime.now().isoformat()
                     })
@@ -123,7 +123,7 @@ async def main_websocket_endpoint(
                     ).first()
                     if not member:
                         logger.warning(f"[WebSocket] 用戶 {user.id} 不是聊天室 {room_id} 成員，無法發送訊息")
-                        await websocket.send_json({
+                        await websocket_manager.send_to_user(user.id, {
                             "type": "chat/error",
                             "room_id": room_id,
                             "content": "您不是此聊天室成員，無法發送訊息",
@@ -167,10 +167,10 @@ async def main_websocket_endpoint(
                     room_id = int(message_data.get("room_id", 0))
                     room = db.query(ChatRoom).filter(ChatRoom.id == room_id).first()
                     if not room:
-                        await websocket.send_json({"type": "chat/error", "content": "聊天室不存在"})
+                        await websocket_manager.send_to_user(user.id, {"type": "chat/error", "content": "聊天室不存在"})
                         continue
                     if not room.is_public and not user.is_admin:
-                        await websocket.send_json({"type": "chat/error", "content": "該聊天室是私有的，需要邀請才能加入"})
+                        await websocket_manager.send_to_user(user.id, {"type": "chat/error", "content": "該聊天室是私有的，需要邀請才能加入"})
                         continue
                     
                     existing_member = db.query(ChatRoomMember).filter(
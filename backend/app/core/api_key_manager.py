@@ -7,15 +7,16 @@ API 密鑰管理器模塊
 
 import logging
 import time
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy import update, select, func
 
-from ..db.models.exchange_api import ExchangeAPI
+from ..db.models.exchange_api import ExchangeAPI, ApiUsageLog
 from ..core.security import encrypt_api_key, decrypt_api_key
 from ..schemas.trading import ExchangeEnum
 from .secure_key_cache import SecureKeyCache
+from .api_usage_recorder import api_usage_recorder
 
 logger = logging.getLogger(__name__)
 
@@ -560,67 +561,58 @@ class ApiKeyManager:
     
     # 使用記錄和監控
     
-    async def log_api_usage(self, db: Session, api_key_id: int, 
-                          operation: str, success: bool,
+    async def log_api_usage(self, db: Session = None, api_key_id: int = None,
+                          operation: str = "", success: bool = True,
                           execution_time: float = None, 
-                          error: str = None) -> None:
+                          error: str = None, user_id: int = None,
+                          virtual_key_id: str = None,
+                          details: Dict[str, Any] = None) -> None:
         """
         記錄 API 使用情況
         
+        只將事件放入 API 使用記錄器的內存隊列後立即返回，日誌表和密鑰的
+        最後使用時間由後台批量寫入，調用方的請求延遲中不包含數據庫寫入。
+        
         Args:
-            db: 數據庫會話
-            api_key_id: API 密鑰 ID
+            db: 數據庫會話（保留參數以兼容舊調用，不再使用）
+            api_key_id: API 密鑰 ID，與 virtual_key_id 至少提供一個
             operation: 執行的操作
             success: 操作是否成功
             execution_time: 執行時間（秒）
-            error: 錯誤信息（如果有）
+            error: 錯誤信息（如果有），未提供時使用 details 中的 error
+            user_id: 用戶 ID
+            virtual_key_id: 虛擬密鑰 ID
+            details: 附加信息，僅用於日誌輸出
         """
         try:
-            # 獲取 API 密鑰記錄
-            api_key = db.query(ExchangeAPI).filter(
-                ExchangeAPI.id == api_key_id
-            ).first()
-            
-            if not api_key:
-                self.logger.warning(f"未找到 ID 為 {api_key_id} 的 API 密鑰，無法記錄使用情況")
-                return
-            
-            # 構建日誌消息
-            log_message = (
-                f"API使用: user_id={api_key.user_id}, "
-                f"exchange={api_key.exchange}, "
-                f"virtual_key_id={api_key.virtual_key_id}, "
-                f"operation={operation}, "
-                f"success={success}"
+            if not error and details:
+                error = details.get("error")
+            
+            api_usage_recorder.record(
+                operation=operation,
+                success=success,
+                execution_time=execution_time,
+                error=error,
+                api_key_id=api_key_id,
+                virtual_key_id=virtual_key_id,
+                user_id=user_id
             )
             
-            if execution_time is not None:
-                log_message += f", execution_time={execution_time:.3f}s"
-            
-            if error:
-                log_message += f", error={error}"
-            
-            # 記錄日誌
-            if success:
-                self.logger.info(log_message)
-            else:
+            # 成功的操作由調用方記錄日誌，這裡只輸出失敗
+            if not success:
+                log_message = (
+                    f"API使用: user_id={user_id}, "
+                    f"api_key_id={api_key_id}, "
+                    f"virtual_key_id={virtual_key_id}, "
+                    f"operation={operation}, "
+                    f"success={success}"
+                )
+                if execution_time is not None:
+                    log_message += f", execution_time={execution_time:.3f}s"
+                if error:
+                    log_message += f", error={error}"
                 self.logger.warning(log_message)
             
-            # 更新最後使用時間
-            api_key.last_used_at = datetime.utcnow()
-            db.commit()
-            
-            # 如果需要，可以在這裡添加代碼將使用記錄寫入專門的日誌表
-            # 例如：
-            # db.add(ApiUsageLog(
-            #     exchange_api_id=api_key.id,
-            #     operation=operation,
-            #     success=success,
-            #     execution_time=execution_time,
-            #     error=error
-            # ))
-            # db.commit()
-            
         except Exception as e:
             self.logger.error(f"記錄 API 使用情況失敗: {str(e)}")
             # 不拋出異常，避免影響主要操作
@@ -641,9 +633,6 @@ class ApiKeyManager:
             Dict[str, Any]: 使用統計信息
         """
         try:
-            # 如果有專門的日誌表，可以從中獲取詳細統計
-            # 這裡僅返回基本信息
-            
             # 查詢條件
             query = db.query(ExchangeAPI).filter(ExchangeAPI.user_id == user_id)
             
@@ -660,7 +649,13 @@ class ApiKeyManager:
                 "total_keys": len(api_keys),
                 "active_keys": sum(1 for key in api_keys if key.is_active),
                 "keys_by_exchange": {},
-                "last_used": {}
+                "last_used": {},
+                "total_requests": 0,
+                "successful_requests": 0,
+                "failed_requests": 0,
+                "avg_execution_time": None,
+                "requests_by_operation": {},
+                "requests_by_exchange": {}
             }
             
             # 按交易所分組
@@ -675,6 +670,44 @@ class ApiKeyManager:
                     if exchange not in statistics["last_used"] or key.last_used_at > statistics["last_used"][exchange]:
                         statistics["last_used"][exchange] = key.last_used_at
             
+            # 從使用日誌表按交易所和操作聚合請求次數
+            usage_query = db.query(
+                ExchangeAPI.exchange,
+                ApiUsageLog.operation,
+                ApiUsageLog.success,
+                func.count(ApiUsageLog.id),
+                func.sum(ApiUsageLog.execution_time),
+                func.count(ApiUsageLog.execution_time)
+            ).join(ExchangeAPI, ApiUsageLog.exchange_api_id == ExchangeAPI.id).filter(
+                ApiUsageLog.user_id == user_id
+            )
+            
+            if start_time:
+                usage_query = usage_query.filter(ApiUsageLog.created_at >= start_time)
+            if end_time:
+                usage_query = usage_query.filter(ApiUsageLog.created_at <= end_time)
+            
+            total_time = 0.0
+            timed_count = 0
+            for exchange, operation, success, count, time_sum, time_count in usage_query.group_by(
+                ExchangeAPI.exchange, ApiUsageLog.operation, ApiUsageLog.success
+            ).all():
+                statistics["total_requests"] += count
+                if success:
+                    statistics["successful_requests"] += count
+                else:
+                    statistics["failed_requests"] += count
+                
+                statistics["requests_by_operation"][operation] = statistics["requests_by_operation"].get(operation, 0) + count
+                exchange = exchange.value
+                statistics["requests_by_exchange"][exchange] = statistics["requests_by_exchange"].get(exchange, 0) + count
+                
+                total_time += time_sum or 0.0
+                timed_count += time_count
+            
+            if timed_count:
+                statistics["avg_execution_time"] = total_time / timed_count
+            
             return statistics
             
         except Exception as e:
@@ -755,18 +788,13 @@ class ApiKeyManager:
             if not api_key.rate_limit:
                 return True
             
-            # 如果有專門的使用日誌表，可以從中獲取最近的使用次數
-            # 這裡僅做簡單示例
-            
-            # 獲取最近一分鐘的使用次數（假設有日誌表）
-            # 實際實現時需要根據具體的日誌表結構調整
-            # recent_usage_count = db.query(ApiUsageLog).filter(
-            #     ApiUsageLog.exchange_api_id == api_key.id,
-            #     ApiUsageLog.timestamp >= datetime.utcnow() - timedelta(minutes=1)
-            # ).count()
-            
-            # 簡化處理：假設未超過限制
-            recent_usage_count = 0
+            # 獲取最近一分鐘的使用次數：已寫入日誌表的記錄加上仍在內存隊列中的事件
+            since = datetime.utcnow() - timedelta(minutes=1)
+            recent_usage_count = db.query(func.count(ApiUsageLog.id)).filter(
+                ApiUsageLog.exchange_api_id == api_key.id,
+                ApiUsageLog.created_at >= since
+            ).scalar() or 0
+            recent_usage_count += api_usage_recorder.pending_count(api_key.id, virtual_key_id, since)
             
             # 檢查是否超過限制
             if recent_usage_count >= api_key.rate_limit:
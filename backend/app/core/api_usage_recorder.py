@@ -0,0 +1,229 @@
+"""
+API 使用記錄器模塊
+
+交易請求只把使用事件放入內存隊列，由後台任務按 API_USAGE_FLUSH_INTERVAL
+批量寫入 api_usage_logs 表並更新密鑰的最後使用時間。數據庫寫入在線程中以
+單個事務完成，交易路徑上不再有任何數據庫讀寫。
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import or_
+
+from .config import settings
+from ..db.database import SessionLocal
+from ..db.models.exchange_api import ApiUsageLog, ExchangeAPI
+
+logger = logging.getLogger(__name__)
+
+# 過期日誌的清理間隔（秒）
+PRUNE_INTERVAL = 3600
+
+# 使用事件: (API密鑰ID, 虛擬密鑰ID, 用戶ID, 操作, 是否成功, 執行時間, 錯誤信息, 發生時間)
+UsageEvent = Tuple[Optional[int], Optional[str], Optional[int], str, bool, Optional[float], Optional[str], datetime]
+
+
+class ApiUsageRecorder:
+    """
+    API 使用記錄器
+
+    record 只追加到有界隊列（隊列已滿時丟棄最舊的事件），不等待數據庫；
+    尚未寫入的事件可通過 pending_count 計入速率限制檢查。
+    """
+
+    def __init__(self, flush_interval: Optional[float] = None, max_pending: Optional[int] = None,
+                 retention_days: Optional[int] = None):
+        """
+        初始化記錄器
+
+        Args:
+            flush_interval: 寫入間隔（秒），默認讀取 API_USAGE_FLUSH_INTERVAL
+            max_pending: 隊列中最多保留的事件數，默認讀取 API_USAGE_MAX_PENDING
+            retention_days: 日誌保留天數，默認讀取 API_USAGE_RETENTION_DAYS，0 表示不清理
+        """
+        self.flush_interval = flush_interval or settings.API_USAGE_FLUSH_INTERVAL
+        self.retention_days = settings.API_USAGE_RETENTION_DAYS if retention_days is None else retention_days
+        self._pending: Deque[UsageEvent] = deque(maxlen=max_pending or settings.API_USAGE_MAX_PENDING)
+        # 正在寫入的批次，寫入完成前仍計入 pending_count
+        self._writing: List[UsageEvent] = []
+        self._last_prune = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"recorded": 0, "dropped": 0, "written": 0, "unresolved": 0, "flushes": 0, "write_errors": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def record(self, operation: str, success: bool, execution_time: Optional[float] = None,
+               error: Optional[str] = None, api_key_id: Optional[int] = None,
+               virtual_key_id: Optional[str] = None, user_id: Optional[int] = None) -> None:
+        """
+        記錄一次 API 使用，立即返回
+
+        Args:
+            operation: 執行的操作
+            success: 操作是否成功
+            execution_time: 執行時間（秒）
+            error: 錯誤信息（如果有）
+            api_key_id: API 密鑰 ID，與 virtual_key_id 至少提供一個
+            virtual_key_id: 虛擬密鑰 ID，寫入時批量解析為密鑰 ID
+            user_id: 用戶 ID，未提供時從密鑰記錄獲取
+        """
+        if api_key_id is None and not virtual_key_id:
+            return
+        if len(self._pending) == self._pending.maxlen:
+            self.stats["dropped"] += 1
+        if error:
+            error = error[:500]
+        self._pending.append((api_key_id, virtual_key_id, user_id, operation[:64], success,
+                              execution_time, error, datetime.utcnow()))
+        self.stats["recorded"] += 1
+        if not self.running:
+            self._ensure_started()
+
+    def _ensure_started(self) -> None:
+        """在事件循環中首次記錄時啟動後台寫入任務"""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self.start()
+
+    def pending_count(self, api_key_id: int, virtual_key_id: Optional[str] = None,
+                      since: Optional[datetime] = None) -> int:
+        """
+        統計尚未寫入數據庫的事件數
+
+        Args:
+            api_key_id: API 密鑰 ID
+            virtual_key_id: 該密鑰的虛擬密鑰 ID
+            since: 只統計此時間（UTC）之後的事件
+
+        Returns:
+            int: 事件數
+        """
+        count = 0
+        for events in (self._writing, list(self._pending)):
+            for event in events:
+                if event[0] != api_key_id and (not virtual_key_id or event[1] != virtual_key_id):
+                    continue
+                if since is None or event[7] >= since:
+                    count += 1
+        return count
+
+    def _write(self, batch: List[UsageEvent]) -> Tuple[int, int]:
+        """
+        將一批事件寫入數據庫（在線程中執行）
+
+        Returns:
+            Tuple[int, int]: (寫入的日誌數, 無法解析密鑰而丟棄的事件數)
+        """
+        db = SessionLocal()
+        try:
+            # 一次查詢解析虛擬密鑰和缺少用戶ID的事件
+            virtual_ids = {event[1] for event in batch if event[0] is None}
+            key_ids = {event[0] for event in batch if event[0] is not None}
+            conditions = []
+            if virtual_ids:
+                conditions.append(ExchangeAPI.virtual_key_id.in_(virtual_ids))
+            if key_ids:
+                conditions.append(ExchangeAPI.id.in_(key_ids))
+            rows = db.query(ExchangeAPI.id, ExchangeAPI.virtual_key_id, ExchangeAPI.user_id).filter(or_(*conditions)).all()
+            by_virtual = {row.virtual_key_id: (row.id, row.user_id) for row in rows if row.virtual_key_id}
+            by_id = {row.id: row.user_id for row in rows}
+
+            logs: List[Dict[str, Any]] = []
+            last_used: Dict[int, datetime] = {}
+            for api_key_id, virtual_key_id, user_id, operation, success, execution_time, error, created_at in batch:
+                if api_key_id is None:
+                    api_key_id, owner_id = by_virtual.get(virtual_key_id, (None, None))
+                else:
+                    owner_id = by_id.get(api_key_id)
+                if api_key_id is None or owner_id is None:
+                    continue
+                logs.append({
+                    "exchange_api_id": api_key_id,
+                    "user_id": user_id if user_id is not None else owner_id,
+                    "operation": operation,
+                    "success": success,
+                    "execution_time": execution_time,
+                    "error": error,
+                    "created_at": created_at,
+                })
+                if api_key_id not in last_used or created_at > last_used[api_key_id]:
+                    last_used[api_key_id] = created_at
+
+            if logs:
+                db.bulk_insert_mappings(ApiUsageLog, logs)
+                db.bulk_update_mappings(ExchangeAPI, [
+                    {"id": api_key_id, "last_used_at": used_at} for api_key_id, used_at in last_used.items()
+                ])
+
+            now = time.monotonic()
+            if self.retention_days > 0 and now - self._last_prune >= PRUNE_INTERVAL:
+                self._last_prune = now
+                cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+                db.query(ApiUsageLog).filter(ApiUsageLog.created_at < cutoff).delete(synchronize_session=False)
+
+            db.commit()
+            return len(logs), len(batch) - len(logs)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def flush(self) -> None:
+        """將隊列中的事件寫入數據庫"""
+        if not self._pending:
+            return
+        batch = list(self._pending)
+        self._pending.clear()
+        self._writing = batch
+        try:
+            written, unresolved = await asyncio.to_thread(self._write, batch)
+            self.stats["written"] += written
+            self.stats["unresolved"] += unresolved
+            self.stats["flushes"] += 1
+        except Exception as e:
+            self.stats["write_errors"] += 1
+            logger.error(f"寫入 API 使用記錄失敗，丟棄 {len(batch)} 條記錄: {str(e)}")
+        finally:
+            self._writing = []
+
+    async def _flush_loop(self) -> None:
+        """後台寫入循環"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self) -> None:
+        """啟動後台寫入任務"""
+        if self.running:
+            return
+        self._task = asyncio.create_task(self._flush_loop())
+        logger.info(f"API 使用記錄器已啟動，寫入間隔: {self.flush_interval} 秒")
+
+    async def stop(self) -> None:
+        """停止後台任務並寫入剩餘記錄"""
+        if self._task is not None:
+            task, self._task = self._task, None
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取記錄器統計信息"""
+        stats = self.stats.copy()
+        stats["running"] = self.running
+        stats["pending"] = len(self._pending) + len(self._writing)
+        return stats
+
+
+# 創建全局實例
+api_usage_recorder = ApiUsageRecorder()
@@ -0,0 +1,194 @@
+"""
+異步單飛（single-flight）緩存模組
+
+同一個鍵的並發請求共用一次上游調用，不同的鍵互不阻塞、可並行刷新。
+支援以下策略：
+- TTL：有效期內直接返回緩存值
+- 過期後仍可使用（stale-while-revalidate）：在 stale_ttl 窗口內立即返回舊值，
+  同時在後台刷新
+- 失敗的負緩存：上游失敗後在 negative_ttl 內不再重試，有舊值時繼續返回舊值，
+  避免上游故障期間每個請求都重新發起調用
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 加載函數：無參數的協程函數，返回新的緩存值，失敗時拋出異常
+Loader = Callable[[], Awaitable[Any]]
+
+_MISSING = object()
+
+
+class CacheEntry:
+    """單個鍵的緩存狀態"""
+
+    __slots__ = ("value", "fetched_at", "error", "error_until")
+
+    def __init__(self):
+        self.value: Any = _MISSING
+        self.fetched_at = 0.0      # 最後一次成功加載的時間（time.monotonic）
+        self.error: Optional[BaseException] = None
+        self.error_until = 0.0     # 負緩存的截止時間
+
+    @property
+    def has_value(self) -> bool:
+        return self.value is not _MISSING
+
+    def age(self) -> Optional[float]:
+        """距最後一次成功加載的秒數，沒有值時返回None"""
+        return time.monotonic() - self.fetched_at if self.has_value else None
+
+
+class AsyncSingleFlightCache:
+    """
+    異步單飛緩存
+
+    用法:
+        cache = AsyncSingleFlightCache("prices", ttl=1.0)
+        value = await cache.get(("binance", "spot"), lambda: fetch_prices("binance", "spot"))
+    """
+
+    def __init__(self, name: str, ttl: float, stale_ttl: float = 0.0, negative_ttl: float = 5.0):
+        """
+        初始化緩存
+
+        參數:
+            name: 緩存名稱，用於日誌和統計
+            ttl: 默認有效期（秒）
+            stale_ttl: 過期後仍可直接返回舊值並在後台刷新的時間窗口（秒），0表示不啟用
+            negative_ttl: 上游失敗後不再重試的時間（秒）
+        """
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self._entries: Dict[Hashable, CacheEntry] = {}
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0, "loads": 0, "errors": 0, "negative_hits": 0}
+
+    def _entry(self, key: Hashable) -> CacheEntry:
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = CacheEntry()
+            self._entries[key] = entry
+        return entry
+
+    async def _load(self, key: Hashable, loader: Loader) -> Any:
+        """執行上游調用並更新緩存，結束後移除進行中的標記"""
+        entry = self._entry(key)
+        self.stats["loads"] += 1
+        try:
+            value = await loader()
+        except Exception as e:
+            self.stats["errors"] += 1
+            entry.error = e
+            entry.error_until = time.monotonic() + self.negative_ttl
+            raise
+        else:
+            entry.value = value
+            entry.fetched_at = time.monotonic()
+            entry.error = None
+            entry.error_until = 0.0
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def _start(self, key: Hashable, loader: Loader) -> asyncio.Task:
+        """啟動或加入鍵的上游調用"""
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+            return task
+        task = asyncio.create_task(self._load(key, loader))
+        # 後台刷新無人等待時也要取回異常，避免 "exception was never retrieved"
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._inflight[key] = task
+        return task
+
+    async def get(self, key: Hashable, loader: Loader, ttl: Optional[float] = None, force: bool = False) -> Any:
+        """
+        獲取緩存值，必要時通過 loader 加載
+
+        參數:
+            key: 緩存鍵
+            loader: 加載新值的協程函數
+            ttl: 本次使用的有效期，默認使用構造時的 ttl
+            force: 忽略有效期強制刷新；已有進行中的調用時直接共用，負緩存期間不重試
+
+        返回:
+            Any: 緩存值
+
+        異常:
+            上游失敗且沒有可用的舊值時，拋出 loader 的異常
+        """
+        ttl = self.ttl if ttl is None else ttl
+        entry = self._entry(key)
+        now = time.monotonic()
+
+        if entry.has_value and not force:
+            age = now - entry.fetched_at
+            if age < ttl:
+                self.stats["hits"] += 1
+                return entry.value
+            if age < ttl + self.stale_ttl:
+                # 返回舊值，同時在後台刷新（負緩存期間不刷新）
+                self.stats["stale_hits"] += 1
+                if now >= entry.error_until:
+                    self._start(key, loader)
+                return entry.value
+
+        if entry.error is not None and now < entry.error_until:
+            self.stats["negative_hits"] += 1
+            if entry.has_value:
+                return entry.value
+            raise entry.error
+
+        self.stats["misses"] += 1
+        try:
+            # shield：單個等待者被取消時不影響其他共用這次調用的請求
+            return await asyncio.shield(self._start(key, loader))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            if entry.has_value:
+                logger.warning(f"緩存 {self.name} 刷新 {key} 失敗，繼續使用舊數據")
+                return entry.value
+            raise
+
+    def refresh(self, key: Hashable, loader: Loader) -> asyncio.Task:
+        """在後台刷新鍵（已有進行中的調用時直接共用），返回對應的任務"""
+        return self._start(key, loader)
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """不觸發加載，直接讀取緩存值"""
+        entry = self._entries.get(key)
+        return entry.value if entry is not None and entry.has_value else default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """直接寫入緩存值，例如由數據流推送的數據"""
+        entry = self._entry(key)
+        entry.value = value
+        entry.fetched_at = time.monotonic()
+        entry.error = None
+        entry.error_until = 0.0
+
+    def age(self, key: Hashable) -> Optional[float]:
+        """鍵距最後一次成功加載的秒數，沒有值時返回None"""
+        entry = self._entries.get(key)
+        return entry.age() if entry is not None else None
+
+    def invalidate(self, key: Hashable) -> None:
+        """移除鍵的緩存值"""
+        self._entries.pop(key, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取緩存統計信息"""
+        stats = self.stats.copy()
+        stats["name"] = self.name
+        stats["keys"] = len(self._entries)
+        stats["inflight"] = len(self._inflight)
+        return stats
@@ -10,6 +10,7 @@ from typing import Dict, Set, List, Optional, Any
 from datetime import datetime
 
 from .main_ws_manager import websocket_manager
+from .ws_broadcast import encode_message
 
 logger = logging.getLogger(__name__)
 
@@ -246,6 +247,8 @@ class ChatRoomManager:
         """
         向聊天室廣播消息
         
+        消息只序列化一次，然後將相同的JSON文本放入每個在線成員的出站隊列。
+        
         Args:
             message: 消息
             room_id: 聊天室ID
@@ -271,13 +274,15 @@ class ChatRoomManager:
         
         # 發送計數
         sent_count = 0
+        payload = encode_message(message)
+        message_type = message.get('type', 'unknown')
         
         # 向每個成員發送消息
         for user_id in room_members:
             try:
                 # 只向在線用戶發送
                 if websocket_manager.is_user_connected(user_id):
-                    success = await websocket_manager.send_to_user(user_id, message)
+                    success = websocket_manager.queue_encoded_to_user(user_id, payload, message_type)
                     if success:
                         sent_count += 1
             except Exception as e:
@@ -130,6 +130,34 @@ class Settings(BaseSettings):
     WS_MESSAGE_RATE_LIMIT: int = int(os.getenv("WS_MESSAGE_RATE_LIMIT", "10"))
     WS_RATE_LIMIT_WINDOW: int = int(os.getenv("WS_RATE_LIMIT_WINDOW", "60"))
     
+    # WebSocket廣播背壓配置：每個連接的出站隊列長度、隊列持續已滿的驅逐時間和單次發送超時
+    WS_OUTBOUND_QUEUE_SIZE: int = int(os.getenv("WS_OUTBOUND_QUEUE_SIZE", "64"))
+    WS_SLOW_CONSUMER_EVICT_SECONDS: float = float(os.getenv("WS_SLOW_CONSUMER_EVICT_SECONDS", "10"))
+    WS_SEND_TIMEOUT_SECONDS: float = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "10"))
+    
+    # 共享HTTP客戶端配置：每個上游主機的連接池上限、保持連接數、空閒連接過期時間、請求超時和是否啟用HTTP/2
+    HTTP_CLIENT_MAX_CONNECTIONS: int = int(os.getenv("HTTP_CLIENT_MAX_CONNECTIONS", "20"))
+    HTTP_CLIENT_MAX_KEEPALIVE: int = int(os.getenv("HTTP_CLIENT_MAX_KEEPALIVE", "10"))
+    HTTP_CLIENT_KEEPALIVE_EXPIRY: float = float(os.getenv("HTTP_CLIENT_KEEPALIVE_EXPIRY", "60"))
+    HTTP_CLIENT_TIMEOUT: float = float(os.getenv("HTTP_CLIENT_TIMEOUT", "10"))
+    HTTP_CLIENT_HTTP2: bool = os.getenv("HTTP_CLIENT_HTTP2", "true").lower() == "true"
+    
+    # K線存儲配置：每個交易對保存的 1 分鐘K線數量（1440 即一天，更高週期由此重採樣）
+    CANDLE_BUFFER_SIZE: int = int(os.getenv("CANDLE_BUFFER_SIZE", "1440"))
+    # 同時追蹤（保留緩衝區並訂閱 kline_1m 數據流）的交易對上限，以及未被讀取多少秒後停止追蹤
+    CANDLE_MAX_SYMBOLS: int = int(os.getenv("CANDLE_MAX_SYMBOLS", "200"))
+    CANDLE_IDLE_SECONDS: float = float(os.getenv("CANDLE_IDLE_SECONDS", "1800"))
+    
+    # 行情記錄器配置：是否啟用、數據目錄和寫盤間隔（秒）；未啟用時仍可讀取已有的歷史文件
+    MARKET_RECORDER_ENABLED: bool = os.getenv("MARKET_RECORDER_ENABLED", "false").lower() == "true"
+    MARKET_RECORDER_DIR: str = os.getenv("MARKET_RECORDER_DIR", "data/market_history")
+    MARKET_RECORDER_FLUSH_INTERVAL: float = float(os.getenv("MARKET_RECORDER_FLUSH_INTERVAL", "1"))
+    
+    # API 使用記錄配置：批量寫入間隔（秒）、內存中最多等待寫入的事件數和日誌保留天數（0 表示不清理）
+    API_USAGE_FLUSH_INTERVAL: float = float(os.getenv("API_USAGE_FLUSH_INTERVAL", "2"))
+    API_USAGE_MAX_PENDING: int = int(os.getenv("API_USAGE_MAX_PENDING", "10000"))
+    API_USAGE_RETENTION_DAYS: int = int(os.getenv("API_USAGE_RETENTION_DAYS", "30"))
+    
     # WebSocket相關配置 - 已棄用，保留為向後相容
     WEBSOCKET_MAX_CONNECTIONS: int = int(os.getenv("WS_MAX_GLOBAL_CONNECTIONS", "1000"))
     WEBSOCKET_MAX_CONNECTIONS_PER_USER: int = int(os.getenv("WS_MAX_CONNECTIONS_PER_USER", "5"))
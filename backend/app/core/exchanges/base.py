@@ -146,6 +146,22 @@ class ExchangeBase(ABC):
         """
         pass
         
+    def get_book_ticker(self, symbol: str, market_type: str) -> Optional[Dict[str, Any]]:
+        """
+        獲取最優買賣價
+        
+        只有通過 subscribe_symbols 訂閱了逐交易對數據流的交易所才會提供，
+        默認實現返回None。
+        
+        參數:
+            symbol: 交易對名稱，如 'BTCUSDT'
+            market_type: 市場類型，'spot'（現貨）或'futures'（期貨）
+            
+        返回:
+            最優買賣價數據字典，未訂閱時返回None
+        """
+        return None
+        
     @abstractmethod
     def format_ticker_data(self, raw_data: Dict[str, Any], market_type: str) -> Dict[str, Any]:
         """
@@ -1,11 +1,15 @@
-import json
 import logging
 import asyncio
 from typing import Dict, Any, Optional, List, Set
 from datetime import datetime
-import websockets  # 恢復使用 websockets 庫
+import time
 import ssl  # 引入 SSL 模組以處理 SSL 上下文
 from .base import ExchangeBase
+from ..market_data_bus import MarketDataBus, market_data_bus
+from ..json_utils import parse_json
+from .ticker_store import TickerStore
+from .binance_streams import BinanceStreamMultiplexer, DEFAULT_SYMBOL_STREAMS
+from .stream_supervisor import StreamSupervisor
 import os
 from dotenv import load_dotenv
 from urllib.parse import urlparse
@@ -28,12 +32,15 @@ class BinanceExchange(ExchangeBase):
     行情數據訂閱和處理等功能。支持現貨和期貨市場的實時價格訂閱。
     """
     
-    def __init__(self):
+    def __init__(self, bus: Optional[MarketDataBus] = None):
         """
         初始化幣安交易所連接
         
         設置API端點、連接管理、市場數據緩存等資源。
         支持從環境變數中讀取端點配置。
+        
+        參數:
+            bus: 發布增量更新的市場數據總線，默認為全局總線；臨時實例（如診斷測試）應傳入獨立的總線
         """
         super().__init__("binance")
         
@@ -52,17 +59,16 @@ class BinanceExchange(ExchangeBase):
             "futures": os.getenv("BINANCE_FUTURES_API", "https://fapi.binance.com/fapi/v1")             # 期貨市場REST API
         }
         
-        self.ws_connections = {
-            "spot": None,                                                # 現貨WebSocket連接對象
-            "futures": None                                              # 期貨WebSocket連接對象
-        }
+        # 全市場行情流的監管者，負責連接、重連和輪換: {市場類型: StreamSupervisor}
+        self.supervisors: Dict[str, StreamSupervisor] = {}
         self.subscribed_channels = {
             "spot": set(),                                               # 已訂閱的現貨頻道集合
             "futures": set()                                             # 已訂閱的期貨頻道集合
         }
+        # 市場數據緩存使用列式存儲，數據流原地更新數值列，字典視圖按需生成
         self.market_data = {
-            "spot": {},                                                  # 現貨市場數據緩存
-            "futures": {}                                                # 期貨市場數據緩存
+            "spot": TickerStore("spot", self.name),                      # 現貨市場數據緩存
+            "futures": TickerStore("futures", self.name)                 # 期貨市場數據緩存
         }
         self.is_running = False                                          # 運行狀態標誌
         self.is_shutting_down = False                                    # 應用關閉標誌，用於防止在關閉時嘗試重新連接
@@ -72,13 +78,16 @@ class BinanceExchange(ExchangeBase):
             "spot": {"count": 0, "last_time": datetime.now()},           # 現貨數據更新檢查點
             "futures": {"count": 0, "last_time": datetime.now()}         # 期貨數據更新檢查點
         }
-        # 連接嘗試計數
-        self.connection_attempts = {
-            "spot": 0,                                                   # 現貨連接嘗試次數
-            "futures": 0                                                 # 期貨連接嘗試次數
-        }
-        # 最大重試次數
-        self.max_retry_attempts = int(os.getenv("BINANCE_MAX_RETRY", "5"))  # 連接失敗後的最大重試次數
+        # 市場數據總線，數據流處理後將每個交易對的增量更新發布給訂閱者
+        self.bus = bus if bus is not None else market_data_bus
+        # 逐交易對數據流（bookTicker、aggTrade、kline_1m）的組合流訂閱管理器，按客戶端興趣引用計數
+        self.streams = BinanceStreamMultiplexer(self.bus, self.name)
+        # 行情流監管參數：斷線後永不放棄重連，退避封頂；連接存活到輪換時間前預先開啟替換連接
+        self.connect_timeout = float(os.getenv("BINANCE_WS_CONNECT_TIMEOUT", "30"))  # connect() 等待首幀的時間（秒）
+        self.rotate_after = float(os.getenv("BINANCE_WS_ROTATE_HOURS", "23")) * 3600  # 幣安單個連接最長24小時
+        self.stale_after = float(os.getenv("BINANCE_WS_STALE_SECONDS", "10"))        # 超過此時間未收到數據視為過期
+        self.idle_timeout = float(os.getenv("BINANCE_WS_IDLE_TIMEOUT", "60"))        # 超過此時間未收到數據則重連
+        self.max_backoff = float(os.getenv("BINANCE_WS_MAX_BACKOFF", "30"))          # 重連退避上限（秒）
         
         # 簡化初始化日誌，只記錄一條摘要信息
         logger.info(f"幣安交易所初始化完成，端點: spot={self.ws_endpoints['spot'].split('/')[2]}, futures={self.ws_endpoints['futures'].split('/')[2]}")
@@ -93,17 +102,19 @@ class BinanceExchange(ExchangeBase):
         """
         建立WebSocket連接到幣安交易所
         
-        使用優化的連接參數和SSL設置，嘗試解決測試腳本能連接但服務無法連接的問題。
-        包含增強的重試機制和連接診斷。
+        為每個市場啟動數據流監管者，並等待首幀數據。監管者在斷線後自動重連，
+        接近幣安24小時連接上限前無縫輪換連接，不會放棄重試；因此即使在等待時間內
+        未能連接，數據流仍會在後台持續重連。
         
         返回:
-            連接成功返回True，否則返回False
+            至少一個市場在等待時間內收到數據返回True，否則返回False
         """
         # 簡化開始連接日誌
         logger.info("開始連接幣安交易所WebSocket")
         try:
             # 首先設置運行標誌，確保任務能正常運行
             self.is_running = True
+            self.is_shutting_down = False
             
             # 檢查代理設置
             # 讀取代理配置
@@ -118,269 +129,103 @@ class BinanceExchange(ExchangeBase):
                     os.environ["HTTPS_PROXY"] = wss_proxy
                     os.environ["HTTP_PROXY"] = http_proxy if http_proxy else wss_proxy
                     os.environ["WSS_PROXY"] = wss_proxy
-                    
-            # 創建一個自定義的SSL上下文，針對可能的SSL問題進行調整
-            ssl_context = ssl.create_default_context()
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE  # 在故障排除過程中禁用證書驗證
-            
-            connected_markets = []
             
             for market_type in ["spot", "futures"]:
-                if not self.ws_connections[market_type]:
-                    logger.info(f"連接幣安{market_type}市場WebSocket...")
-                    
-                    # 使用重試邏輯
-                    max_retries = 5  # 增加重試次數
-                    retry_count = 0
-                    last_error = None
-                    
-                    while retry_count < max_retries and self.is_running:
-                        try:
-                            # 減少連接嘗試日誌，只在重試時記錄
-                            if retry_count > 0:
-                                logger.info(f"嘗試第 {retry_count + 1} 次連接到 {market_type} 市場...")
-                            
-                            # 配置連接選項，使用更寬松的超時設定
-                            connect_kwargs = {
-                                "ping_interval": 30,  # 增加ping間隔
-                                "ping_timeout": 20,   # 增加ping超時
-                                "close_timeout": 20,  # 增加關閉超時
-                                "max_size": 10 * 1024 * 1024,  # 增加最大消息大小至10MB
-                                "ssl": ssl_context    # 使用自定義的SSL上下文
-                            }
-                            
-                            # 連接到WebSocket，使用更長的超時時間
-                            self.ws_connections[market_type] = await asyncio.wait_for(
-                                websockets.connect(
-                                    self.ws_endpoints[market_type],
-                                    **connect_kwargs
-                                ),
-                                timeout=60.0  # 增加至60秒連接超時
-                            )
-                            
-                            # 驗證連接是否建立
-                            if self.ws_connections[market_type].open:
-                                logger.info(f"幣安{market_type}市場WebSocket連接成功")
-                                
-                                # 立即訂閱所有市場數據 - 以確保數據流開始
-                                try:
-                                    await asyncio.wait_for(
-                                        self.subscribe_market_type(market_type),
-                                        timeout=10.0  # 10秒訂閱超時
-                                    )
-                                except asyncio.TimeoutError:
-                                    logger.warning(f"{market_type}市場訂閱超時，但連接已建立")
-                                    # 忽略訂閱超時，繼續處理
-                                
-                                # 啟動消息處理任務
-                                task = asyncio.create_task(
-                                    self._handle_messages(market_type)
-                                )
-                                self.tasks.append(task)
-                                
-                                connected_markets.append(market_type)
-                                break  # 連接成功，跳出重試循環
-                            else:
-                                logger.error(f"幣安{market_type}市場WebSocket連接未打開")
-                                retry_count += 1
-                                last_error = "連接已創建但未打開"
-                                
-                        except asyncio.TimeoutError as e:
-                            retry_count += 1
-                            last_error = f"連接超時: {str(e)}"
-                            logger.warning(f"連接到 {market_type} 市場超時，第 {retry_count} 次重試")
-                            await asyncio.sleep(2 * retry_count)  # 指數退避延遲
-                            
-                        except Exception as e:
-                            retry_count += 1
-                            last_error = str(e)
-                            logger.warning(f"連接到 {market_type} 市場失敗: {str(e)}，第 {retry_count} 次重試")
-                            await asyncio.sleep(2 * retry_count)  # 指數退避延遲
-                    
-                    # 如果所有重試都失敗了
-                    if retry_count >= max_retries:
-                        logger.error(f"連接幣安{market_type}市場WebSocket失敗，已重試 {max_retries} 次，最後錯誤: {last_error}")
-                else:
-                    logger.info(f"幣安{market_type}市場WebSocket已連接")
-                    connected_markets.append(market_type)
+                if market_type not in self.supervisors:
+                    self.supervisors[market_type] = self._create_supervisor(market_type)
+                self.supervisors[market_type].start()
+                await self.subscribe_market_type(market_type)
+            
+            # 並行等待各市場收到首幀
+            results = await asyncio.gather(*(
+                supervisor.wait_connected(self.connect_timeout) for supervisor in self.supervisors.values()
+            ))
+            connected_markets = [market_type for market_type, ok in zip(self.supervisors, results) if ok]
                     
             # 檢查至少有一個市場連接成功
             if connected_markets:
                 logger.info(f"幣安交易所連接完成，已連接: {', '.join(connected_markets)}")
                 return True
             else:
-                logger.error("幣安交易所連接失敗，所有市場都無法連接")
-                self.is_running = False  # 重置運行標誌
+                logger.error(f"幣安交易所在 {self.connect_timeout} 秒內未能連接任何市場，將在後台持續重連")
                 return False
         except Exception as e:
             logger.error(f"連接幣安WebSocket時出錯: {str(e)}")
             # 添加詳細的異常信息
             import traceback
             logger.error(f"異常追踪: {traceback.format_exc()}")
-            self.is_running = False  # 重置運行標誌
             return False
     
-    async def _handle_messages(self, market_type: str):
+    def _create_supervisor(self, market_type: str) -> StreamSupervisor:
+        """創建市場行情流的監管者"""
+        endpoint = self.ws_endpoints[market_type]
+        if endpoint.startswith("wss://"):
+            # 創建一個自定義的SSL上下文，針對可能的SSL問題進行調整；ws:// 端點（如本地回放服務器）不使用SSL
+            ssl_context = ssl.create_default_context()
+            ssl_context.check_hostname = False
+            ssl_context.verify_mode = ssl.CERT_NONE  # 在故障排除過程中禁用證書驗證
+        else:
+            ssl_context = None
+        return StreamSupervisor(
+            f"幣安{market_type}市場",
+            endpoint,
+            lambda message: self._on_message(market_type, message),
+            connect_kwargs={
+                "ping_interval": 30,
+                "ping_timeout": 20,
+                "close_timeout": 20,
+                "max_size": 10 * 1024 * 1024,  # 行情幀為數百KB，最大消息大小設為10MB
+                "ssl": ssl_context
+            },
+            rotate_after=self.rotate_after,
+            stale_after=self.stale_after,
+            idle_timeout=self.idle_timeout,
+            max_backoff=self.max_backoff
+        )
+    
+    def _on_message(self, market_type: str, message: Any) -> None:
         """
         處理WebSocket消息，解析幣安推送的數據
         
-        增強的錯誤處理和重連機制，添加更多診斷資訊
+        由數據流監管者在收到每一幀時調用，連接管理和重連由監管者負責。
         """
-        ws = self.ws_connections[market_type]
-        if not ws:
-            logger.error(f"無法處理{market_type}市場數據：WebSocket連接不存在")
+        if not message:
             return
-            
-        logger.info(f"開始處理幣安{market_type}市場數據")
-        message_count = 0
-        update_count = 0
-        last_log_time = datetime.now()
-        log_interval = 600  # 延長日誌間隔至10分鐘
-        start_time = datetime.now()  # 記錄開始時間
-        last_message_time = datetime.now()  # 最後收到消息的時間
         
+        # 解析數據，行情幀為數百KB的數組，使用 orjson 解析
         try:
-            # 簡化循環開始前的狀態日誌
-            while self.is_running and ws.open:
-                try:
-                    # 接收消息，設置超時防止永久阻塞
-                    message = await asyncio.wait_for(ws.recv(), timeout=30.0)
-                    current_time = datetime.now()
-                    time_since_last = (current_time - last_message_time).total_seconds()
-                    last_message_time = current_time  # 更新最後消息時間
-                    
-                    if not message:
-                        continue
-                        
-                    message_count += 1
-                    
-                    # 只記錄第一條消息，減少日誌量
-                    if message_count == 1:
-                        logger.info(f"幣安{market_type}市場收到首條數據")
-                    
-                    # 解析數據
-                    try:
-                        data = json.loads(message)
-                    except json.JSONDecodeError:
-                        if message_count < 5:  # 僅在前幾條消息出現問題時記錄
-                            logger.warning(f"幣安{market_type}市場收到無效數據")
-                        continue
-                    
-                    # 如果收到的是ping/pong消息，直接忽略
-                    if isinstance(data, dict) and (data.get("ping") is not None or data.get("pong") is not None):
-                        continue
-                    
-                    # 處理數據
-                    if self._process_ticker_data(data, market_type):
-                        update_count += 1
-                        
-                        # 減少更新日誌頻率，每10000次更新記錄一次進度
-                        if update_count == 1 or update_count % 10000 == 0:
-                            current_time = datetime.now()
-                            runtime = (current_time - start_time).total_seconds()
-                            logger.info(f"幣安{market_type}市場更新: {update_count}次，當前有{len(self.market_data[market_type])}個交易對")
-                    
-                    # 每10分鐘記錄一次統計信息，減少日誌量
-                    current_time = datetime.now()
-                    if (current_time - last_log_time).total_seconds() >= log_interval:
-                        runtime = (current_time - start_time).total_seconds()
-                        logger.info(f"{market_type}市場統計: 已處理{message_count}條消息，更新{update_count}次，運行{int(runtime)}秒")
-                        last_log_time = current_time
-                        
-                except asyncio.TimeoutError:
-                    # 檢測心跳超時 - 如果30秒未收到消息，記錄警告
-                    current_time = datetime.now()
-                    time_since_last = (current_time - last_message_time).total_seconds()
-                    
-                    if time_since_last > 60:  # 超過60秒未收到消息
-                        logger.warning(f"幣安{market_type}市場已 {time_since_last:.1f} 秒未收到消息，可能存在連接問題")
-                        
-                        # 檢查連接是否仍然開放
-                        if not ws.open:
-                            logger.error(f"幣安{market_type}市場WebSocket連接已關閉，正在重連")
-                            raise websockets.exceptions.ConnectionClosed(1000, "Connection timeout, no messages received")
-                    
-                    # 否則靜默繼續
-                    continue
-                        
-                except websockets.exceptions.ConnectionClosed as e:
-                    # 檢查是否是應用關閉導致的連接斷開
-                    # 當代碼為1000時表示正常關閉，或者當應用處於關閉狀態時，不應嘗試重新連接
-                    if self.is_shutting_down or e.code == 1000:
-                        logger.info(f"幣安{market_type}市場WebSocket連接已正常關閉，不嘗試重連")
-                        break
-                    
-                    logger.warning(f"幣安{market_type}市場WebSocket連接意外關閉，嘗試重連")
-                    
-                    # 檢查是否超過最大重試次數
-                    if self.connection_attempts[market_type] >= self.max_retry_attempts:
-                        logger.error(f"幣安{market_type}市場連接重試已達上限({self.max_retry_attempts})")
-                        break
-                    
-                    # 應用未關閉時才嘗試重新連接
-                    if not self.is_shutting_down:
-                        self.connection_attempts[market_type] += 1
-                        retry_delay = min(2 ** self.connection_attempts[market_type], 60)
-                        
-                        logger.info(f"幣安{market_type}市場將在{retry_delay}秒後重連 (嘗試 {self.connection_attempts[market_type]}/{self.max_retry_attempts})")
-                        await asyncio.sleep(retry_delay)
-                        
-                        # 嘗試重新連接，使用優化的連接參數
-                        logger.info(f"重新連接到幣安{market_type}市場")
-                        
-                        # 創建一個自定義的SSL上下文
-                        ssl_context = ssl.create_default_context()
-                        ssl_context.check_hostname = False
-                        ssl_context.verify_mode = ssl.CERT_NONE  # 禁用證書驗證
-                        
-                        self.ws_connections[market_type] = await asyncio.wait_for(
-                            websockets.connect(
-                                self.ws_endpoints[market_type],
-                                ping_interval=30,
-                                ping_timeout=20,
-                                close_timeout=20,
-                                max_size=10 * 1024 * 1024,
-                                ssl=ssl_context
-                            ),
-                            timeout=60.0
-                        )
-                        
-                        if self.ws_connections[market_type].open:
-                            logger.info(f"幣安{market_type}市場重連成功")
-                            ws = self.ws_connections[market_type]  # 更新ws引用
-                            self.connection_attempts[market_type] = 0
-                            
-                            # 重新訂閱
-                            await self.subscribe_market_type(market_type)
-                            logger.info(f"幣安{market_type}市場數據流已重新訂閱")
-                            
-                            # 重置計數器和時間
-                            last_message_time = datetime.now()
-                            continue
-                        else:
-                            logger.error(f"幣安{market_type}市場重連失敗")
-                            break
-                    else:
-                        logger.info(f"應用正在關閉，不再嘗試重連幣安{market_type}市場")
-                        break
-                    
-                except asyncio.CancelledError:
-                    logger.info(f"幣安{market_type}市場數據處理任務被取消")
-                    raise
-                    
-                except Exception as e:
-                    logger.error(f"處理{market_type}市場數據出錯: {str(e)}")
-                    await asyncio.sleep(1)
-                    continue
-                    
-        except asyncio.CancelledError:
-            logger.info(f"幣安{market_type}市場數據處理任務已取消")
-        except Exception as e:
-            logger.error(f"幣安{market_type}市場數據處理異常: {str(e)}")
-        finally:
-            runtime = datetime.now() - start_time
-            logger.info(f"幣安{market_type}市場數據處理結束，運行{int(runtime.total_seconds())}秒，處理{message_count}條消息，更新{update_count}次")
+            data = parse_json(message)
+        except ValueError:
+            logger.warning(f"幣安{market_type}市場收到無效數據")
+            return
+        
+        # 如果收到的是ping/pong消息，直接忽略
+        if isinstance(data, dict) and (data.get("ping") is not None or data.get("pong") is not None):
+            return
+        
+        # 處理數據
+        self._process_ticker_data(data, market_type)
+    
+    def get_stream_status(self, market_type: Optional[str] = None) -> Dict[str, Any]:
+        """
+        獲取全市場行情流的狀態
+        
+        參數:
+            market_type: 市場類型，None 表示返回全部市場
+            
+        返回:
+            Dict[str, Any]: 連接狀態、距最後一幀的秒數（staleness_seconds）、是否過期（stale）等，
+            未指定市場類型時為 {市場類型: 狀態}
+        """
+        if market_type is not None:
+            supervisor = self.supervisors.get(market_type)
+            return supervisor.get_status() if supervisor is not None else {"connected": False, "stale": True}
+        return {market_type: supervisor.get_status() for market_type, supervisor in self.supervisors.items()}
+    
+    def is_stream_stale(self, market_type: str) -> bool:
+        """全市場行情流是否中斷或超過過期閾值未收到數據"""
+        supervisor = self.supervisors.get(market_type)
+        return supervisor is None or supervisor.is_stale()
 
     async def disconnect(self) -> bool:
         """
@@ -400,14 +245,19 @@ class BinanceExchange(ExchangeBase):
             # 設置運行標誌為False，停止所有處理循環
             self.is_running = False
             
-            # 關閉所有WebSocket連接
-            for market_type, ws in self.ws_connections.items():
-                if ws:
-                    try:
-                        await ws.close(code=1000, reason="Application shutdown")
-                        logger.info(f"已關閉幣安{market_type}市場WebSocket連接")
-                    except Exception as e:
-                        logger.error(f"關閉幣安{market_type}市場WebSocket連接時出錯: {str(e)}")
+            # 關閉逐交易對的組合流連接
+            try:
+                await self.streams.close()
+            except Exception as e:
+                logger.error(f"關閉幣安組合流連接時出錯: {str(e)}")
+            
+            # 停止行情流監管者並關閉連接
+            for market_type, supervisor in self.supervisors.items():
+                try:
+                    await supervisor.close()
+                    logger.info(f"已關閉幣安{market_type}市場WebSocket連接")
+                except Exception as e:
+                    logger.error(f"關閉幣安{market_type}市場WebSocket連接時出錯: {str(e)}")
                 
             # 取消所有異步任務
             for task in self.tasks:
@@ -452,7 +302,7 @@ class BinanceExchange(ExchangeBase):
                 logger.error(f"不支持的市場類型: {market_type}")
                 return False
                 
-            if not self.ws_connections[market_type]:
+            if market_type not in self.supervisors:
                 logger.error(f"無法訂閱{market_type}市場: WebSocket未連接")
                 return False
             
@@ -465,37 +315,83 @@ class BinanceExchange(ExchangeBase):
             logger.error(f"訂閱幣安{market_type}市場時出錯: {str(e)}")
             return False
         
-    async def subscribe_symbols(self, symbols: List[str], market_type: str) -> bool:
+    async def subscribe_symbols(self, symbols: List[str], market_type: str, streams: Optional[List[str]] = None) -> bool:
         """
-        訂閱特定交易對的行情
+        訂閱特定交易對的逐交易對數據流
         
-        我們使用全局行情流，所以此方法主要是保留兼容性。
-        如果需要單獨訂閱特定交易對，也可以發送訂閱消息。
+        全市場的24小時行情仍來自 !ticker@arr；此方法為客戶端實際關注的交易對
+        訂閱低延遲的 bookTicker、aggTrade 和 kline_1m 數據流。數據流按訂閱次數
+        引用計數，每次調用都需要對應一次 unsubscribe_symbols。
         
         參數:
             symbols: 要訂閱的交易對列表，例如 ["BTCUSDT", "ETHUSDT"]
             market_type: 市場類型，可選 "spot"（現貨）或 "futures"（期貨）
+            streams: 流類型列表，默認為 bookTicker、aggTrade 和 kline_1m
             
         返回:
             訂閱成功返回True，否則返回False
         """
-        logger.info(f"幣安{market_type}市場已通過全局行情流訂閱所有交易對，包括: {', '.join(symbols)}")
-        return True
+        if market_type not in self.streams.connections:
+            logger.error(f"不支持的市場類型: {market_type}")
+            return False
+        try:
+            symbols = [self.normalize_symbol(symbol) for symbol in symbols]
+            await self.streams.acquire(market_type, symbols, streams or DEFAULT_SYMBOL_STREAMS)
+            return True
+        except Exception as e:
+            logger.error(f"訂閱幣安{market_type}市場交易對數據流時出錯: {str(e)}")
+            return False
+            
+    async def unsubscribe_symbols(self, symbols: List[str], market_type: str, streams: Optional[List[str]] = None) -> bool:
+        """
+        取消訂閱特定交易對，引用計數歸零的數據流才會真正取消訂閱
+        
+        參數:
+            symbols: 要取消訂閱的交易對列表
+            market_type: 市場類型
+            streams: 流類型列表，需與訂閱時一致
+        """
+        if market_type not in self.streams.connections:
+            return False
+        try:
+            symbols = [self.normalize_symbol(symbol) for symbol in symbols]
+            await self.streams.release(market_type, symbols, streams or DEFAULT_SYMBOL_STREAMS)
+            return True
+        except Exception as e:
+            logger.error(f"取消訂閱幣安{market_type}市場交易對數據流時出錯: {str(e)}")
+            return False
             
-    async def unsubscribe_symbols(self, symbols: List[str], market_type: str) -> bool:
-        """取消訂閱特定交易對"""
-        # 不需要實際取消訂閱，因為我們使用全局流
-        logger.info(f"幣安{market_type}市場使用全局行情流，不支持取消單個交易對訂閱")
-        return True
+    def get_book_ticker(self, symbol: str, market_type: str) -> Optional[Dict[str, Any]]:
+        """獲取已訂閱交易對的最優買賣價"""
+        return self.streams.get_book_ticker(self.normalize_symbol(symbol), market_type)
             
     def get_all_tickers(self, market_type: str) -> Dict[str, Any]:
-        """獲取所有交易對的最新行情"""
-        return self.market_data.get(market_type, {})
+        """獲取所有交易對的最新行情，從列式存儲生成可序列化的字典"""
+        store = self.market_data.get(market_type)
+        return store.to_dict() if store is not None else {}
         
     def get_ticker(self, symbol: str, market_type: str) -> Optional[Dict[str, Any]]:
         """獲取單個交易對的最新行情"""
         symbol = self.normalize_symbol(symbol)
-        return self.market_data.get(market_type, {}).get(symbol)
+        store = self.market_data.get(market_type)
+        return store.get_dict(symbol) if store is not None else None
+        
+    def get_top_tickers(self, market_type: str, field: str = "price_change_24h", limit: int = 10, ascending: bool = False) -> List[Dict[str, Any]]:
+        """
+        按指定字段對全市場排序，返回前 limit 個交易對的行情
+        
+        排序在列式存儲上向量化完成，只為返回的交易對生成字典。
+        
+        參數:
+            market_type: 市場類型
+            field: 排序字段，如 'price_change_24h'、'quote_volume_24h'
+            limit: 返回數量
+            ascending: 是否升序，默認降序
+        """
+        store = self.market_data.get(market_type)
+        if store is None:
+            return []
+        return list(store.to_dict(store.top(field, limit, ascending)).values())
         
     def get_24h_ticker(self, symbol: str, market_type: str) -> Optional[Dict[str, Any]]:
         """獲取24小時行情數據 - 直接返回ticker數據，已包含24小時信息"""
@@ -573,10 +469,18 @@ class BinanceExchange(ExchangeBase):
             return default
 
     def _process_ticker_data(self, data, market_type):
-        """處理ticker數據，返回是否成功處理"""
+        """
+        處理ticker數據，返回是否成功處理
+        
+        原始數據直接寫入列式存儲，不再為每個交易對創建格式化字典；
+        發布到總線的增量為存儲行的只讀視圖。
+        """
         try:
+            store = self.market_data[market_type]
+            received_at = time.time()
             updates_count = 0
             temp_symbols = set()
+            deltas = {}
             
             # 首先檢查數據類型
             if data is None:
@@ -611,14 +515,19 @@ class BinanceExchange(ExchangeBase):
                         if not symbol.endswith("USDT"):
                             continue
                     
+                    if "c" not in item:
+                        continue  # 跳過沒有最新價格的數據
+                        
                     try:
-                        formatted_data = self.format_ticker_data(item, market_type)
-                        if formatted_data:
-                            self.market_data[market_type][symbol] = formatted_data
-                            updates_count += 1
+                        deltas[symbol] = store.row_view(store.update(symbol, item, received_at))
+                        updates_count += 1
                     except Exception:
                         continue  # 單個交易對出錯不影響其他交易對處理
                 
+                # 將本幀變化的交易對發布到市場數據總線
+                if deltas:
+                    self.bus.publish(self.name, market_type, deltas)
+                
                 # 只在更新數量大于0時記錄日誌
                 if updates_count > 0:
                     self.update_checkpoints[market_type]["count"] += 1
@@ -648,14 +557,13 @@ class BinanceExchange(ExchangeBase):
                     if not symbol.endswith("USDT"):
                         valid_for_market = False
                 
-                if valid_for_market:
+                if valid_for_market and "c" in data:
                     try:
-                        formatted_data = self.format_ticker_data(data, market_type)
-                        if formatted_data:
-                            self.market_data[market_type][symbol] = formatted_data
-                            updates_count += 1
-                            self.update_checkpoints[market_type]["count"] += 1
-                            self.update_checkpoints[market_type]["last_time"] = datetime.now()
+                        row = store.update(symbol, data, received_at)
+                        updates_count += 1
+                        self.update_checkpoints[market_type]["count"] += 1
+                        self.update_checkpoints[market_type]["last_time"] = datetime.now()
+                        self.bus.publish(self.name, market_type, {symbol: store.row_view(row)})
                     except Exception:
                         return False
                 
@@ -0,0 +1,389 @@
+"""
+幣安組合流訂閱管理模組
+
+將按交易對的數據流（<symbol>@bookTicker、<symbol>@aggTrade、<symbol>@kline_1m、
+<symbol>@depth@100ms）多路複用到幣安組合流（/stream）連接上。每個數據流按客戶端興趣引用計數，
+第一個訂閱者出現時發送 SUBSCRIBE，最後一個訂閱者離開時發送 UNSUBSCRIBE；
+單個連接的數據流數量達到上限時自動開啟新連接。收到的數據按流類型整理後
+發布到市場數據總線，主題為 "binance:<市場類型>@<流類型>"。
+"""
+
+import asyncio
+import logging
+import os
+import ssl
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import websockets
+
+from ..json_utils import dump_json_str, parse_json
+from ..market_data_bus import MarketDataBus
+
+logger = logging.getLogger(__name__)
+
+# 默認為每個交易對訂閱的流類型
+DEFAULT_SYMBOL_STREAMS = ("bookTicker", "aggTrade", "kline_1m")
+
+# 幣安單個連接允許的最大數據流數量：現貨1024，期貨200
+MAX_STREAMS_PER_CONNECTION = {
+    "spot": int(os.getenv("BINANCE_SPOT_MAX_STREAMS", "1024")),
+    "futures": int(os.getenv("BINANCE_FUTURES_MAX_STREAMS", "200"))
+}
+
+# 控制消息（SUBSCRIBE/UNSUBSCRIBE）之間的最小間隔，幣安限制每秒最多5條（期貨10條）
+CONTROL_MESSAGE_INTERVAL = 0.25
+# 單條 SUBSCRIBE 消息攜帶的最大數據流數量
+MAX_PARAMS_PER_MESSAGE = 200
+
+
+def stream_name(symbol: str, kind: str) -> str:
+    """組合數據流名稱，如 btcusdt@bookTicker"""
+    return f"{symbol.lower()}@{kind}"
+
+
+class CombinedStreamConnection:
+    """
+    單個組合流連接
+
+    維護該連接承載的數據流集合，斷線後自動重連並重新訂閱全部數據流。
+    """
+
+    def __init__(self, manager: "BinanceStreamMultiplexer", market_type: str, connection_id: int):
+        self.manager = manager
+        self.market_type = market_type
+        self.connection_id = connection_id
+        self.streams: Set[str] = set()
+        self.ws = None
+        self.task: Optional[asyncio.Task] = None
+        self.closed = False
+        self._request_id = 0
+        self._send_lock = asyncio.Lock()
+        self._last_control_time = 0.0
+        self._connected = asyncio.Event()
+
+    async def start(self) -> None:
+        """啟動連接的讀取任務"""
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def _open(self) -> None:
+        """建立WebSocket連接並訂閱當前承載的全部數據流"""
+        endpoint = self.manager.endpoints[self.market_type]
+        # ws:// 端點（如本地回放服務器）不使用SSL
+        ssl_context = ssl.create_default_context() if endpoint.startswith("wss://") else None
+        self.ws = await asyncio.wait_for(
+            websockets.connect(
+                endpoint,
+                ping_interval=30,
+                ping_timeout=20,
+                close_timeout=10,
+                max_size=10 * 1024 * 1024,
+                ssl=ssl_context
+            ),
+            timeout=30.0
+        )
+        self._connected.set()
+        if self.streams:
+            await self.send_control("SUBSCRIBE", sorted(self.streams))
+        logger.info(f"幣安{self.market_type}組合流連接#{self.connection_id}已建立，數據流: {len(self.streams)}")
+
+    async def _run(self) -> None:
+        """讀取循環，斷線後以指數退避重連，直到連接被關閉"""
+        attempts = 0
+        while not self.closed:
+            try:
+                await self._open()
+                attempts = 0
+                async for message in self.ws:
+                    try:
+                        payload = parse_json(message)
+                    except ValueError:
+                        self.manager.stats["malformed"] += 1
+                        continue
+                    if isinstance(payload, dict) and "stream" in payload:
+                        # 單條格式異常的消息只跳過，不中斷整個組合流連接
+                        try:
+                            self.manager.dispatch(self.market_type, payload["stream"], payload.get("data") or {})
+                        except (KeyError, TypeError, ValueError, AttributeError) as e:
+                            self.manager.stats["malformed"] += 1
+                            logger.warning(f"幣安{self.market_type}組合流消息格式異常，已跳過 {payload.get('stream')}: {str(e)}")
+                    elif isinstance(payload, dict) and payload.get("error"):
+                        logger.warning(f"幣安{self.market_type}組合流訂閱錯誤: {payload['error']}")
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                if self.closed:
+                    break
+                logger.warning(f"幣安{self.market_type}組合流連接#{self.connection_id}中斷: {str(e)}")
+            finally:
+                self._connected.clear()
+
+            if self.closed:
+                break
+            attempts += 1
+            await asyncio.sleep(min(2 ** attempts, 60))
+
+    async def send_control(self, method: str, params: List[str]) -> None:
+        """
+        發送 SUBSCRIBE/UNSUBSCRIBE 控制消息
+
+        連接尚未建立時直接返回，連接建立後會自動訂閱 streams 中的全部數據流。
+        消息之間保持最小間隔，避免超過幣安的控制消息頻率限制。
+        """
+        if not params or self.ws is None or not self._connected.is_set():
+            return
+        async with self._send_lock:
+            for start in range(0, len(params), MAX_PARAMS_PER_MESSAGE):
+                wait = CONTROL_MESSAGE_INTERVAL - (time.monotonic() - self._last_control_time)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                self._request_id += 1
+                try:
+                    await self.ws.send(dump_json_str({
+                        "method": method,
+                        "params": params[start:start + MAX_PARAMS_PER_MESSAGE],
+                        "id": self._request_id
+                    }))
+                except Exception as e:
+                    logger.warning(f"幣安{self.market_type}組合流發送{method}失敗: {str(e)}")
+                    return
+                finally:
+                    self._last_control_time = time.monotonic()
+
+    async def close(self) -> None:
+        """關閉連接並停止讀取任務"""
+        self.closed = True
+        if self.ws is not None:
+            try:
+                await self.ws.close(code=1000, reason="No active streams")
+            except Exception:
+                pass
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+
+class BinanceStreamMultiplexer:
+    """
+    幣安組合流訂閱管理器
+
+    按客戶端興趣對每個 <symbol>@<kind> 數據流引用計數，並將數據流分配到
+    組合流連接上。每個連接承載的數據流數量不超過幣安的單連接上限。
+    """
+
+    def __init__(self, bus: MarketDataBus, exchange: str = "binance"):
+        """
+        初始化訂閱管理器
+
+        參數:
+            bus: 市場數據總線，收到的數據發布到 "<市場類型>@<流類型>" 主題
+            exchange: 交易所名稱
+        """
+        self.bus = bus
+        self.exchange = exchange
+        self.endpoints = {
+            "spot": os.getenv("BINANCE_SPOT_STREAM_WS", "wss://stream.binance.com:9443/stream"),
+            "futures": os.getenv("BINANCE_FUTURES_STREAM_WS", "wss://fstream.binance.com/stream")
+        }
+        # 數據流引用計數: {市場類型: {數據流名稱: 訂閱數}}
+        self.refcounts: Dict[str, Dict[str, int]] = {"spot": {}, "futures": {}}
+        # 組合流連接: {市場類型: [連接]}
+        self.connections: Dict[str, List[CombinedStreamConnection]] = {"spot": [], "futures": []}
+        # 數據流所在的連接: {市場類型: {數據流名稱: 連接}}
+        self._stream_connection: Dict[str, Dict[str, CombinedStreamConnection]] = {"spot": {}, "futures": {}}
+        # 最新的最優買賣價: {市場類型: {交易對: 數據}}
+        self.book_tickers: Dict[str, Dict[str, Dict[str, Any]]] = {"spot": {}, "futures": {}}
+        self._lock = asyncio.Lock()
+        self._next_connection_id = 0
+        self.stats = {"messages": 0, "malformed": 0, "subscribes": 0, "unsubscribes": 0}
+
+    async def acquire(self, market_type: str, symbols: Iterable[str], kinds: Iterable[str] = DEFAULT_SYMBOL_STREAMS) -> List[str]:
+        """
+        增加交易對數據流的引用計數，新出現的數據流會被訂閱
+
+        參數:
+            market_type: 市場類型
+            symbols: 交易對列表
+            kinds: 流類型，如 bookTicker、aggTrade、kline_1m
+
+        返回:
+            List[str]: 本次新訂閱的數據流名稱
+        """
+        names = [stream_name(symbol, kind) for symbol in symbols for kind in kinds]
+        async with self._lock:
+            refcounts = self.refcounts[market_type]
+            new_streams = []
+            for name in names:
+                refcounts[name] = refcounts.get(name, 0) + 1
+                if refcounts[name] == 1:
+                    new_streams.append(name)
+
+            # 按連接剩餘容量分配新數據流
+            pending: Dict[CombinedStreamConnection, List[str]] = {}
+            for name in new_streams:
+                connection = await self._connection_with_capacity(market_type)
+                connection.streams.add(name)
+                self._stream_connection[market_type][name] = connection
+                pending.setdefault(connection, []).append(name)
+
+        for connection, streams in pending.items():
+            await connection.send_control("SUBSCRIBE", streams)
+        self.stats["subscribes"] += len(new_streams)
+        return new_streams
+
+    async def release(self, market_type: str, symbols: Iterable[str], kinds: Iterable[str] = DEFAULT_SYMBOL_STREAMS) -> List[str]:
+        """
+        減少交易對數據流的引用計數，沒有訂閱者的數據流會被取消訂閱
+
+        參數:
+            market_type: 市場類型
+            symbols: 交易對列表
+            kinds: 流類型
+
+        返回:
+            List[str]: 本次取消訂閱的數據流名稱
+        """
+        names = [stream_name(symbol, kind) for symbol in symbols for kind in kinds]
+        removed_streams = []
+        pending: Dict[CombinedStreamConnection, List[str]] = {}
+        empty_connections = []
+        async with self._lock:
+            refcounts = self.refcounts[market_type]
+            for name in names:
+                count = refcounts.get(name, 0)
+                if count <= 0:
+                    continue
+                if count > 1:
+                    refcounts[name] = count - 1
+                    continue
+                del refcounts[name]
+                removed_streams.append(name)
+                connection = self._stream_connection[market_type].pop(name, None)
+                if connection is not None:
+                    connection.streams.discard(name)
+                    pending.setdefault(connection, []).append(name)
+
+            for connection in pending:
+                if not connection.streams:
+                    self.connections[market_type].remove(connection)
+                    empty_connections.append(connection)
+
+        for connection, streams in pending.items():
+            if connection in empty_connections:
+                await connection.close()
+            else:
+                await connection.send_control("UNSUBSCRIBE", streams)
+        for name in removed_streams:
+            symbol, _, kind = name.partition("@")
+            if kind == "bookTicker":
+                self.book_tickers[market_type].pop(symbol.upper(), None)
+        self.stats["unsubscribes"] += len(removed_streams)
+        return removed_streams
+
+    async def _connection_with_capacity(self, market_type: str) -> CombinedStreamConnection:
+        """找到仍有容量的連接，全部已滿時開啟新連接"""
+        limit = MAX_STREAMS_PER_CONNECTION[market_type]
+        for connection in self.connections[market_type]:
+            if len(connection.streams) < limit:
+                return connection
+        self._next_connection_id += 1
+        connection = CombinedStreamConnection(self, market_type, self._next_connection_id)
+        self.connections[market_type].append(connection)
+        await connection.start()
+        return connection
+
+    def dispatch(self, market_type: str, stream: str, data: Dict[str, Any]) -> None:
+        """
+        將組合流消息整理後發布到市場數據總線
+
+        參數:
+            market_type: 市場類型
+            stream: 數據流名稱，如 btcusdt@bookTicker
+            data: 數據流的原始數據
+        """
+        self.stats["messages"] += 1
+        symbol, _, kind = stream.partition("@")
+        symbol = data.get("s") or symbol.upper()
+        now = datetime.now().isoformat()
+
+        if kind == "bookTicker":
+            update = {
+                "symbol": symbol,
+                "bid_price": float(data.get("b", 0)),
+                "bid_qty": float(data.get("B", 0)),
+                "ask_price": float(data.get("a", 0)),
+                "ask_qty": float(data.get("A", 0)),
+                "update_id": data.get("u"),
+                "last_update": now
+            }
+            self.book_tickers[market_type][symbol] = update
+        elif kind == "aggTrade":
+            update = {
+                "symbol": symbol,
+                "price": float(data.get("p", 0)),
+                "quantity": float(data.get("q", 0)),
+                "trade_time": data.get("T"),
+                "is_buyer_maker": data.get("m"),
+                "last_update": now
+            }
+        elif kind.startswith("kline_"):
+            kline = data.get("k") or {}
+            update = {
+                "symbol": symbol,
+                "interval": kline.get("i"),
+                "open_time": kline.get("t"),
+                "close_time": kline.get("T"),
+                "open": float(kline.get("o", 0)),
+                "high": float(kline.get("h", 0)),
+                "low": float(kline.get("l", 0)),
+                "close": float(kline.get("c", 0)),
+                "volume": float(kline.get("v", 0)),
+                "quote_volume": float(kline.get("q", 0)),
+                "closed": bool(kline.get("x")),
+                "last_update": now
+            }
+        elif kind.startswith("depth"):
+            # 增量深度事件保留原始字段（U/u/pu/b/a），由訂單簿服務按更新ID排序應用
+            update = data
+        else:
+            update = dict(data)
+
+        self.bus.publish(self.exchange, f"{market_type}@{kind}", {symbol: update})
+
+    def get_book_ticker(self, symbol: str, market_type: str) -> Optional[Dict[str, Any]]:
+        """獲取交易對最新的最優買賣價，未訂閱時返回None"""
+        return self.book_tickers.get(market_type, {}).get(symbol.upper())
+
+    async def close(self) -> None:
+        """關閉全部組合流連接並清空引用計數"""
+        async with self._lock:
+            connections = [c for conns in self.connections.values() for c in conns]
+            for market_type in self.connections:
+                self.connections[market_type] = []
+                self.refcounts[market_type].clear()
+                self._stream_connection[market_type].clear()
+        for connection in connections:
+            await connection.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        獲取訂閱統計信息
+
+        返回:
+            Dict[str, Any]: 各市場的連接數、數據流數量及消息統計
+        """
+        stats = self.stats.copy()
+        stats["markets"] = {
+            market_type: {
+                "connections": [len(c.streams) for c in connections],
+                "streams": len(self.refcounts[market_type]),
+                "subscribers": sum(self.refcounts[market_type].values())
+            }
+            for market_type, connections in self.connections.items()
+        }
+        return stats
@@ -0,0 +1,267 @@
+"""
+WebSocket 數據流監管模組
+
+維持單個 WebSocket 數據流持續可用：斷線後立即重連，連續失敗時以封頂的指數退避重試，
+永不放棄；連接接近交易所的最長連接時間（幣安為24小時）前預先開啟替換連接，
+替換連接收到首幀後才原子切換並關閉舊連接，切換期間不丟失數據。
+記錄最後一幀的時間，供調用方判斷數據是否過期。
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+import websockets
+
+logger = logging.getLogger(__name__)
+
+# 替換連接建立期間輪詢舊連接的間隔（秒）
+ROTATION_POLL_INTERVAL = 0.1
+# 替換連接建立失敗後再次嘗試輪換的間隔（秒）
+ROTATION_RETRY_INTERVAL = 60.0
+
+
+class StreamSupervisor:
+    """
+    單個 WebSocket 數據流的監管者
+
+    用法:
+        supervisor = StreamSupervisor("幣安spot市場", url, on_message)
+        supervisor.start()
+        await supervisor.wait_connected(timeout=30)
+        ...
+        await supervisor.close()
+    """
+
+    def __init__(self, name: str, url: str, on_message: Callable[[Any], None],
+                 connect_kwargs: Optional[Dict[str, Any]] = None,
+                 rotate_after: float = 23 * 3600, stale_after: float = 10.0, idle_timeout: float = 60.0,
+                 connect_timeout: float = 30.0, first_frame_timeout: float = 30.0, max_backoff: float = 30.0):
+        """
+        參數:
+            name: 數據流名稱，用於日誌
+            url: WebSocket 端點
+            on_message: 收到消息時的同步回調，參數為原始消息
+            connect_kwargs: 傳給 websockets.connect 的參數
+            rotate_after: 連接存活多久後輪換（秒）
+            stale_after: 超過多久未收到消息視為過期（秒）
+            idle_timeout: 超過多久未收到消息視為連接失效並重連（秒）
+            connect_timeout: 建立連接的超時（秒）
+            first_frame_timeout: 連接建立後等待首幀的超時（秒）
+            max_backoff: 重連退避的上限（秒）
+        """
+        self.name = name
+        self.url = url
+        self.on_message = on_message
+        self.connect_kwargs = connect_kwargs or {}
+        self.rotate_after = rotate_after
+        self.stale_after = stale_after
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self.first_frame_timeout = first_frame_timeout
+        self.max_backoff = max_backoff
+        self.ws = None
+        self.task: Optional[asyncio.Task] = None
+        self.closed = False
+        self.attempts = 0  # 當前連續失敗次數
+        self.last_message_at: Optional[float] = None
+        self.connected_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._connected = asyncio.Event()
+        self._closing: Set[asyncio.Task] = set()
+        self.stats = {"messages": 0, "connects": 0, "disconnects": 0, "rotations": 0,
+                      "failed_rotations": 0, "callback_errors": 0}
+
+    @property
+    def connected(self) -> bool:
+        return self._connected.is_set()
+
+    def start(self) -> None:
+        """啟動監管任務"""
+        if self.task is None or self.task.done():
+            self.closed = False
+            self.task = asyncio.create_task(self._run())
+
+    async def wait_connected(self, timeout: Optional[float] = None) -> bool:
+        """等待數據流收到首幀，超時返回False"""
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def staleness(self) -> Optional[float]:
+        """距離最後一幀的秒數，從未收到數據時返回None"""
+        if self.last_message_at is None:
+            return None
+        return time.monotonic() - self.last_message_at
+
+    def is_stale(self) -> bool:
+        """連接中斷、從未收到數據或超過 stale_after 未收到消息時返回True"""
+        staleness = self.staleness()
+        return not self.connected or staleness is None or staleness > self.stale_after
+
+    def _backoff(self) -> float:
+        """連續失敗時的重試延遲：1, 2, 4 ... 秒，不超過 max_backoff"""
+        return min(2 ** (self.attempts - 1), self.max_backoff)
+
+    async def _open(self) -> Tuple[Any, Any]:
+        """建立連接並等待首幀，返回 (連接, 首幀)"""
+        ws = await asyncio.wait_for(websockets.connect(self.url, **self.connect_kwargs), self.connect_timeout)
+        try:
+            first = await asyncio.wait_for(ws.recv(), self.first_frame_timeout)
+        except BaseException:
+            await self._close_ws(ws)
+            raise
+        return ws, first
+
+    async def _close_ws(self, ws, reason: str = "Stream rotated") -> None:
+        try:
+            await ws.close(code=1000, reason=reason)
+        except Exception:
+            pass
+
+    def _close_in_background(self, ws) -> None:
+        """在後台關閉舊連接，不阻塞讀取循環"""
+        task = asyncio.create_task(self._close_ws(ws))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    def _handle(self, message: Any) -> None:
+        self.last_message_at = time.monotonic()
+        self.stats["messages"] += 1
+        try:
+            self.on_message(message)
+        except Exception as e:
+            self.stats["callback_errors"] += 1
+            logger.error(f"{self.name}數據流處理消息出錯: {str(e)}")
+
+    async def _run(self) -> None:
+        """監管循環：建立連接並讀取，斷線後重連，直到 close() 被調用"""
+        while not self.closed:
+            try:
+                ws, first = await self._open()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.attempts += 1
+                self.last_error = str(e) or type(e).__name__
+                delay = self._backoff()
+                logger.warning(f"{self.name}數據流連接失敗（連續第 {self.attempts} 次）: {self.last_error}，{delay}秒後重試")
+                await asyncio.sleep(delay)
+                continue
+
+            self.attempts = 0
+            self.stats["connects"] += 1
+            logger.info(f"{self.name}數據流已連接")
+            try:
+                await self._serve(ws, first)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self.closed:
+                    break
+                self.stats["disconnects"] += 1
+                self.last_error = str(e) or type(e).__name__
+                logger.warning(f"{self.name}數據流中斷: {self.last_error}，立即重連")
+            finally:
+                self._connected.clear()
+                if self.ws is not None:
+                    self._close_in_background(self.ws)
+                    self.ws = None
+
+    async def _serve(self, ws, first: Any) -> None:
+        """讀取連接直到中斷；到達輪換時間時預先開啟替換連接，收到首幀後切換"""
+        self.ws = ws
+        self.connected_at = time.monotonic()
+        self._connected.set()
+        self._handle(first)
+        rotate_at = self.connected_at + self.rotate_after
+        rotation: Optional[asyncio.Task] = None
+        try:
+            while not self.closed:
+                now = time.monotonic()
+                if rotation is None and now >= rotate_at:
+                    logger.info(f"{self.name}數據流開始輪換連接")
+                    rotation = asyncio.create_task(self._open())
+                if rotation is not None and rotation.done():
+                    try:
+                        new_ws, new_first = rotation.result()
+                    except Exception as e:
+                        self.stats["failed_rotations"] += 1
+                        logger.warning(f"{self.name}數據流替換連接建立失敗: {str(e)}，{ROTATION_RETRY_INTERVAL}秒後再試")
+                        rotate_at = now + ROTATION_RETRY_INTERVAL
+                    else:
+                        ws = self._switch(ws, new_ws, new_first)
+                        rotate_at = self.connected_at + self.rotate_after
+                    rotation = None
+
+                timeout = ROTATION_POLL_INTERVAL if rotation is not None else min(self.idle_timeout, max(rotate_at - now, 0.0))
+                try:
+                    message = await asyncio.wait_for(ws.recv(), timeout)
+                except asyncio.TimeoutError:
+                    idle = time.monotonic() - self.last_message_at
+                    if idle >= self.idle_timeout:
+                        raise ConnectionError(f"{idle:.0f}秒未收到消息")
+                    continue
+                except websockets.exceptions.ConnectionClosed:
+                    # 舊連接在輪換期間斷開時，等待已在建立的替換連接，避免重新開始
+                    if rotation is None or self.closed:
+                        raise
+                    new_ws, new_first = await rotation
+                    rotation = None
+                    ws = self._switch(ws, new_ws, new_first)
+                    rotate_at = self.connected_at + self.rotate_after
+                    continue
+                self._handle(message)
+        finally:
+            if rotation is not None:
+                rotation.cancel()
+                try:
+                    new_ws, _ = await rotation
+                    self._close_in_background(new_ws)
+                except BaseException:
+                    pass
+
+    def _switch(self, old_ws, new_ws, first: Any):
+        """原子切換到替換連接，舊連接在後台關閉"""
+        self.ws = new_ws
+        self.connected_at = time.monotonic()
+        self.stats["rotations"] += 1
+        self._handle(first)
+        self._close_in_background(old_ws)
+        logger.info(f"{self.name}數據流已切換到替換連接")
+        return new_ws
+
+    async def close(self) -> None:
+        """停止監管並關閉連接"""
+        self.closed = True
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+        if self.ws is not None:
+            await self._close_ws(self.ws, "Application shutdown")
+            self.ws = None
+        self._connected.clear()
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        獲取數據流狀態
+
+        返回:
+            Dict[str, Any]: 連接狀態、距最後一幀的秒數、是否過期、當前連接存活時間及統計
+        """
+        staleness = self.staleness()
+        status = self.stats.copy()
+        status.update({
+            "connected": self.connected,
+            "stale": self.is_stale(),
+            "staleness_seconds": round(staleness, 3) if staleness is not None else None,
+            "connection_age_seconds": round(time.monotonic() - self.connected_at) if self.connected and self.connected_at else None,
+            "consecutive_failures": self.attempts,
+            "last_error": self.last_error
+        })
+        return status
@@ -0,0 +1,218 @@
+"""
+列式行情存儲模組
+
+以「交易對 → 行號」索引加 NumPy 列存儲全市場 24 小時行情。數據流每一幀只
+原地更新數值列，不再為每個交易對創建新的字典；字典形式的行情只在 API 需要時
+才按需生成。整列數據可直接用於排序、篩選等向量化的全市場查詢。
+"""
+
+from collections.abc import Mapping
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+# 列名與幣安 24hr ticker 原始字段的對應關係，列順序即數值矩陣的列順序
+TICKER_FIELDS = (
+    ("price", "c"),             # 最新價格
+    ("price_change_24h", "P"),  # 24小時漲跌幅
+    ("price_change", "p"),      # 24小時價格變化
+    ("volume_24h", "v"),        # 24小時成交量
+    ("quote_volume_24h", "q"),  # 24小時成交額
+    ("high_24h", "h"),          # 24小時最高價
+    ("low_24h", "l"),           # 24小時最低價
+    ("open_24h", "o"),          # 24小時開盤價
+    ("count", "n"),             # 成交筆數
+    ("bid_price", "b"),         # 最佳買入價
+    ("ask_price", "a"),         # 最佳賣出價
+    ("bid_qty", "B"),           # 最佳買入量
+    ("ask_qty", "A"),           # 最佳賣出量
+    ("event_time", "E"),        # 交易所事件時間（毫秒）
+)
+COLUMN_INDEX = {name: index for index, (name, _) in enumerate(TICKER_FIELDS)}
+RAW_KEYS = tuple(raw_key for _, raw_key in TICKER_FIELDS)
+
+
+def _to_float(value: Any) -> float:
+    """將原始字段轉換為浮點數，缺失或無效時返回0"""
+    if value is None:
+        return 0.0
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class TickerRow(Mapping):
+    """
+    單個交易對的只讀行情視圖
+
+    直接讀取 TickerStore 中的數值列，不複製數據。鍵與原先 format_ticker_data
+    返回的字典相同；需要可序列化的字典時使用 dict(row) 或 TickerStore.get_dict。
+    """
+
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store: "TickerStore", row: int):
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, key: str) -> Any:
+        store = self._store
+        column = COLUMN_INDEX.get(key)
+        if column is not None:
+            value = store.values[self._row, column]
+            return int(value) if key in ("count", "event_time") else float(value)
+        if key == "symbol":
+            return store.symbols[self._row]
+        if key == "last_update":
+            return datetime.fromtimestamp(store.updated_at[self._row]).isoformat()
+        if key == "market_type":
+            return store.market_type
+        if key == "exchange":
+            return store.exchange
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(TickerStore.VIEW_KEYS)
+
+    def __len__(self) -> int:
+        return len(TickerStore.VIEW_KEYS)
+
+
+class TickerStore(Mapping):
+    """
+    列式行情存儲
+
+    實現只讀的 Mapping 接口（交易對 → 行情視圖），可替代原先的
+    {交易對: 行情字典} 緩存；寫入只通過 update 原地更新數值列。
+    """
+
+    VIEW_KEYS = ("symbol",) + tuple(name for name, _ in TICKER_FIELDS if name != "event_time") + (
+        "last_update", "market_type", "exchange"
+    )
+
+    def __init__(self, market_type: str, exchange: str = "binance", capacity: int = 512):
+        """
+        初始化列式存儲
+
+        參數:
+            market_type: 市場類型，'spot' 或 'futures'
+            exchange: 交易所名稱
+            capacity: 初始行數，交易對數量超過時自動擴容
+        """
+        self.market_type = market_type
+        self.exchange = exchange
+        self.index: Dict[str, int] = {}
+        self.symbols: List[str] = []
+        self.values = np.zeros((capacity, len(TICKER_FIELDS)), dtype=np.float64)
+        self.updated_at = np.zeros(capacity, dtype=np.float64)
+
+    def _row_for(self, symbol: str) -> int:
+        """獲取交易對所在行，新交易對追加到末尾並在需要時擴容"""
+        row = self.index.get(symbol)
+        if row is None:
+            row = len(self.symbols)
+            if row >= self.values.shape[0]:
+                capacity = self.values.shape[0] * 2
+                self.values = np.resize(self.values, (capacity, len(TICKER_FIELDS)))
+                self.values[row:] = 0
+                self.updated_at = np.resize(self.updated_at, capacity)
+                self.updated_at[row:] = 0
+            self.index[symbol] = row
+            self.symbols.append(symbol)
+        return row
+
+    def update(self, symbol: str, raw: Dict[str, Any], timestamp: float) -> int:
+        """
+        以幣安原始 ticker 數據原地更新一行
+
+        參數:
+            symbol: 交易對
+            raw: 幣安 24hr ticker 原始數據
+            timestamp: 本地接收時間（秒）
+
+        返回:
+            int: 交易對所在行號
+        """
+        row = self._row_for(symbol)
+        try:
+            # 快速路徑：字段齊全且合法時直接轉換，缺失字段（如期貨沒有買賣盤）按0處理
+            self.values[row] = [float(raw.get(key, 0)) for key in RAW_KEYS]
+        except (TypeError, ValueError):
+            self.values[row] = [_to_float(raw.get(key)) for key in RAW_KEYS]
+        self.updated_at[row] = timestamp
+        return row
+
+    def row_view(self, row: int) -> TickerRow:
+        """獲取指定行的只讀視圖"""
+        return TickerRow(self, row)
+
+    def row(self, symbol: str) -> Optional[TickerRow]:
+        """獲取交易對的只讀視圖，不存在時返回None"""
+        row = self.index.get(symbol)
+        return TickerRow(self, row) if row is not None else None
+
+    def get_dict(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """生成交易對的行情字典，格式與 format_ticker_data 相同"""
+        row = self.row(symbol)
+        return dict(row) if row is not None else None
+
+    def to_dict(self, symbols: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        生成 {交易對: 行情字典}，只在 API 需要可序列化數據時調用
+
+        參數:
+            symbols: 只生成指定交易對，None 表示全部
+        """
+        if symbols is None:
+            symbols = self.symbols
+        result = {}
+        for symbol in symbols:
+            row = self.index.get(symbol)
+            if row is not None:
+                result[symbol] = dict(TickerRow(self, row))
+        return result
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        獲取一個數值列（只含有效行），用於向量化計算
+
+        返回的是底層數組的視圖，調用方不應修改。
+        """
+        return self.values[:len(self.symbols), COLUMN_INDEX[name]]
+
+    def top(self, field: str = "price_change_24h", limit: int = 10, ascending: bool = False) -> List[str]:
+        """
+        按指定列排序，返回前 limit 個交易對
+
+        參數:
+            field: 排序的列名，如 'price_change_24h'、'quote_volume_24h'
+            limit: 返回數量
+            ascending: 是否升序，默認降序（如漲幅榜）
+
+        返回:
+            List[str]: 交易對列表
+        """
+        values = self.column(field)
+        count = len(values)
+        if count == 0 or limit <= 0:
+            return []
+        limit = min(limit, count)
+        keys = values if ascending else -values
+        # argpartition 先選出前 limit 個，再只對這部分排序
+        candidates = np.argpartition(keys, limit - 1)[:limit]
+        ordered = candidates[np.argsort(keys[candidates], kind="stable")]
+        return [self.symbols[i] for i in ordered]
+
+    def __getitem__(self, symbol: str) -> TickerRow:
+        return TickerRow(self, self.index[symbol])
+
+    def __contains__(self, symbol: object) -> bool:
+        return symbol in self.index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.symbols)
+
+    def __len__(self) -> int:
+        return len(self.symbols)
@@ -0,0 +1,154 @@
+"""
+共享HTTP客戶端模組
+
+按上游主機維護長期存活的 httpx.AsyncClient，所有對外的REST請求共用連接池，
+避免每次請求都重新進行 DNS 解析、TCP 連接和 TLS 握手。客戶端在應用的
+lifespan 中啟動和關閉，並統計請求數與新建連接數，以觀察連接重用率。
+"""
+
+import logging
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# HTTP/2 需要可選依賴 h2（httpx[http2]），未安裝時回退到 HTTP/1.1
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class HTTPClientRegistry:
+    """
+    HTTP客戶端註冊表
+
+    每個上游主機（scheme + host + port）對應一個共享的 AsyncClient，
+    調用方通過 get(url) 取得客戶端後直接發送請求，不需要也不應該關閉它。
+    """
+
+    def __init__(self):
+        """初始化客戶端註冊表，連接池參數讀取自配置"""
+        self.clients: Dict[str, httpx.AsyncClient] = {}
+        self.http2 = settings.HTTP_CLIENT_HTTP2 and HTTP2_AVAILABLE
+        self.limits = httpx.Limits(
+            max_connections=settings.HTTP_CLIENT_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_CLIENT_MAX_KEEPALIVE,
+            keepalive_expiry=settings.HTTP_CLIENT_KEEPALIVE_EXPIRY
+        )
+        self.timeout = httpx.Timeout(settings.HTTP_CLIENT_TIMEOUT)
+        self.started_at: Optional[float] = None
+        # 按主機統計: {主機: {"requests": 請求數, "new_connections": 新建連接數, "errors": 錯誤數}}
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def host_key(url: str) -> str:
+        """
+        從URL中提取主機鍵
+
+        Args:
+            url: 完整URL或主機URL，如 https://api.binance.com/api/v3/ping
+
+        Returns:
+            str: 主機鍵，如 https://api.binance.com
+        """
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    async def start(self) -> None:
+        """啟動註冊表，由應用的 lifespan 在啟動時調用"""
+        self.started_at = time.time()
+        if settings.HTTP_CLIENT_HTTP2 and not HTTP2_AVAILABLE:
+            logger.warning("未安裝 h2 套件，共享HTTP客戶端將使用 HTTP/1.1")
+        logger.info(f"共享HTTP客戶端已啟動: HTTP/2={self.http2}, 最大連接數={settings.HTTP_CLIENT_MAX_CONNECTIONS}")
+
+    def get(self, url: str) -> httpx.AsyncClient:
+        """
+        獲取URL所屬主機的共享客戶端，不存在時創建
+
+        Args:
+            url: 請求的URL
+
+        Returns:
+            httpx.AsyncClient: 共享客戶端
+        """
+        key = self.host_key(url)
+        client = self.clients.get(key)
+        if client is None or client.is_closed:
+            client = self._create_client(key)
+            self.clients[key] = client
+        return client
+
+    def _create_client(self, key: str) -> httpx.AsyncClient:
+        """
+        創建單個主機的客戶端，並掛上統計連接重用的事件鉤子
+
+        Args:
+            key: 主機鍵
+
+        Returns:
+            httpx.AsyncClient: 新客戶端
+        """
+        stats = self.stats.setdefault(key, {"requests": 0, "new_connections": 0, "errors": 0})
+
+        async def trace(event_name: str, info: Dict[str, Any]) -> None:
+            # 只有建立新連接時才會觸發 connect_tcp 事件，重用連接則不會
+            if event_name == "connection.connect_tcp.complete":
+                stats["new_connections"] += 1
+
+        async def on_request(request: httpx.Request) -> None:
+            stats["requests"] += 1
+            request.extensions["trace"] = trace
+
+        async def on_response(response: httpx.Response) -> None:
+            if response.status_code >= 500:
+                stats["errors"] += 1
+
+        logger.debug(f"創建共享HTTP客戶端: {key}")
+        return httpx.AsyncClient(
+            http2=self.http2,
+            limits=self.limits,
+            timeout=self.timeout,
+            event_hooks={"request": [on_request], "response": [on_response]}
+        )
+
+    async def close(self) -> None:
+        """關閉所有客戶端，由應用的 lifespan 在關閉時調用"""
+        for key, client in list(self.clients.items()):
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.error(f"關閉HTTP客戶端 {key} 失敗: {str(e)}")
+        self.clients.clear()
+        logger.info("共享HTTP客戶端已關閉")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        獲取連接重用統計
+
+        Returns:
+            Dict[str, Any]: 各主機的請求數、新建連接數和連接重用率
+        """
+        hosts = {}
+        for key, stats in self.stats.items():
+            requests = stats["requests"]
+            hosts[key] = {
+                **stats,
+                "reuse_ratio": round(1 - stats["new_connections"] / requests, 4) if requests else None
+            }
+        return {
+            "http2": self.http2,
+            "clients": len(self.clients),
+            "uptime_seconds": round(time.time() - self.started_at, 1) if self.started_at else None,
+            "hosts": hosts
+        }
+
+
+# 創建全局實例
+http_clients = HTTPClientRegistry()
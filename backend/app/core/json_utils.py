@@ -54,8 +54,7 @@ def parse_json(data: Union[str, bytes]) -> Dict[str, Any]:
         ValueError: 如果 JSON 解析失敗
     """
     try:
-        if isinstance(data, str):
-            data = data.encode('utf-8')
+        # orjson 可直接解析 str，無需先編碼為 bytes 產生一次額外複製
         return orjson.loads(data)
     except (orjson.JSONDecodeError, TypeError) as e:
         raise ValueError(f"JSON 解析錯誤: {str(e)}")
@@ -7,9 +7,10 @@ WebSocket連接管理模組
 import asyncio
 from typing import Dict, Any, List, Optional, Set
 from fastapi import WebSocket
-from starlette.websockets import WebSocketDisconnect
 import logging
 
+from .ws_broadcast import encode_message, EncodedMessage, WebSocketFanout
+
 logger = logging.getLogger(__name__)
 
 class WebSocketManager:
@@ -18,11 +19,14 @@ class WebSocketManager:
     def __init__(self):
         # 存儲活躍的WebSocket連接: {user_id: websocket}
         self.active_connections: Dict[int, WebSocket] = {}
+        # 每個連接的出站隊列和寫入任務，廣播只入隊，慢速連接不會阻塞其他用戶
+        self.fanout = WebSocketFanout()
         # 統計信息
         self.stats = {
             "total_connections_handled": 0,
             "messages_sent": 0,
-            "messages_failed": 0
+            "messages_failed": 0,
+            "messages_dropped": 0
         }
 
     async def connect(self, user_id: int, websocket: WebSocket) -> None:
@@ -36,6 +40,7 @@ class WebSocketManager:
         await websocket.accept()
         # 如果用戶已有連接，關閉舊連接
         if user_id in self.active_connections:
+            self.fanout.unregister(self.active_connections[user_id])
             try:
                 await self.active_connections[user_id].close()
                 logger.debug(f"[WebSocket] 關閉用戶 {user_id} 的舊連接")
@@ -55,7 +60,7 @@ class WebSocketManager:
             user_id: 用戶ID
         """
         if user_id in self.active_connections:
-            del self.active_connections[user_id]
+            self.fanout.unregister(self.active_connections.pop(user_id))
             logger.info(f"[WebSocket] 用戶 {user_id} 已從連接管理器移除，當前活躍連接數: {len(self.active_connections)}")
 
     async def close_connection(self, user_id: int) -> bool:
@@ -85,43 +90,71 @@ class WebSocketManager:
         """
         向特定用戶發送消息
         
+        消息放入連接的出站隊列，與廣播共用同一個寫入任務，
+        同一連接上不會有多個發送方並發寫入或打亂消息順序。
+        
         Args:
             user_id: 用戶ID
             message: 要發送的消息
             
         Returns:
-            bool: 是否成功發送
+            bool: 是否成功入隊
         """
         if user_id not in self.active_connections:
             logger.warning(f"[WebSocket] 嘗試發送消息到不存在的連接, 用戶ID: {user_id}")
             return False
             
-        try:
-            await self.active_connections[user_id].send_json(message)
+        message_type = message.get('type', 'unknown')
+        queued = self.queue_encoded_to_user(user_id, encode_message(message), message_type)
+        if queued:
+            logger.debug(f"[WebSocket] 已將消息放入用戶 {user_id} 的出站隊列: 類型={message_type}")
+        return queued
+
+    def queue_encoded_to_user(self, user_id: int, payload: EncodedMessage, message_type: str = "unknown") -> bool:
+        """
+        將預編碼的消息放入用戶連接的出站隊列
+        
+        用於廣播場景，消息只在廣播前序列化一次，由連接的寫入任務異步發送，
+        不會因為某個用戶網絡緩慢而阻塞廣播。連接因隊列持續已滿或發送失敗
+        被驅逐時，會同時從管理器中移除。
+        
+        Args:
+            user_id: 用戶ID
+            payload: encode_message 返回的JSON文本
+            message_type: 消息類型，僅用於日誌
+            
+        Returns:
+            bool: 是否成功入隊
+        """
+        websocket = self.active_connections.get(user_id)
+        if websocket is None:
+            return False
+            
+        sender = self.fanout.register(websocket)
+        if sender.enqueue(payload):
             self.stats["messages_sent"] += 1
-            logger.debug(f"[WebSocket] 成功發送消息給用戶 {user_id}: 類型={message.get('type', 'unknown')}")
             return True
-        except WebSocketDisconnect:
-            logger.debug(f"[WebSocket] 用戶 {user_id} 已斷開連接，無法發送消息")
-            self.disconnect(user_id)
-            self.stats["messages_failed"] += 1
-            raise
-        except Exception as e:
-            logger.error(f"[WebSocket] 向用戶 {user_id} 發送消息失敗: {str(e)}")
+            
+        if sender.closed:
+            logger.warning(f"[WebSocket] 用戶 {user_id} 的連接已被驅逐: 類型={message_type}")
             self.disconnect(user_id)
             self.stats["messages_failed"] += 1
-            return False
+        else:
+            self.stats["messages_dropped"] += 1
+        return False
 
     async def broadcast(self, message: Dict[str, Any], exclude_user_ids: Optional[List[int]] = None) -> int:
         """
         向所有連接的用戶廣播消息
         
+        消息只序列化一次，然後將相同的JSON文本放入每個用戶的出站隊列。
+        
         Args:
             message: 要廣播的消息
             exclude_user_ids: 要排除的用戶ID列表
             
         Returns:
-            int: 成功發送的消息數
+            int: 成功入隊的消息數
         """
         if exclude_user_ids is None:
             exclude_user_ids = []
@@ -130,17 +163,15 @@ class WebSocketManager:
         
         sent_count = 0
         user_ids = list(self.active_connections.keys())
+        payload = encode_message(message)
+        message_type = message.get('type', 'unknown')
         
         for user_id in user_ids:
             if user_id in exclude_user_ids:
                 continue
                 
-            try:
-                success = await self.send_to_user(user_id, message)
-                if success:
-                    sent_count += 1
-            except WebSocketDisconnect:
-                pass  # 已在 send_to_user 中處理
+            if self.queue_encoded_to_user(user_id, payload, message_type):
+                sent_count += 1
                 
         return sent_count
 
@@ -183,6 +214,7 @@ class WebSocketManager:
         """
         stats = self.stats.copy()
         stats["active_connections"] = len(self.active_connections)
+        stats["outbound"] = self.fanout.get_stats()
         return stats
 
 # 創建全局實例
@@ -0,0 +1,222 @@
+"""
+市場數據總線模組
+
+進程內的行情發布/訂閱總線。交易所數據流（如幣安 !ticker@arr）將每個交易對的
+增量更新發布到總線，PriceCache、市場 WebSocket 端點和 MarketDataService
+作為訂閱者接收更新，REST API 僅在冷啟動或數據流中斷時作為後備快照來源。
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# 監聽器回調簽名: callback(exchange, market_type, deltas, sequence)
+DeltaListener = Callable[[str, str, Dict[str, Dict[str, Any]], int], None]
+
+
+class MarketDataBus:
+    """
+    市場數據總線
+
+    按主題（交易所 + 市場類型）分發交易對增量更新，支援三種訂閱方式：
+    - 同步監聽器：在發布時直接回調，適合更新內存緩存（如 PriceCache）
+    - 異步隊列：每個訂閱者擁有獨立的有界隊列，隊列已滿時丟棄最舊的事件
+    - 等待更新：協程等待主題的下一次發布，適合按推送節奏驅動的循環
+    """
+
+    def __init__(self, queue_size: int = 16, stale_after: float = 5.0):
+        """
+        初始化市場數據總線
+
+        參數:
+            queue_size: 每個異步訂閱隊列的最大長度
+            stale_after: 主題超過此秒數未收到數據即視為過期
+        """
+        self.queue_size = queue_size
+        self.stale_after = stale_after
+        # 同步監聽器: {topic: [callback]}
+        self._listeners: Dict[str, List[DeltaListener]] = {}
+        # 異步訂閱隊列: {topic: set(queue)}
+        self._queues: Dict[str, Set[asyncio.Queue]] = {}
+        # 等待下一次發布的 Future: {topic: future}
+        self._waiters: Dict[str, asyncio.Future] = {}
+        # 每個主題的序列號和最後發布時間
+        self.sequences: Dict[str, int] = {}
+        self.last_publish: Dict[str, float] = {}
+        # 統計信息
+        self.stats = {
+            "published": 0,
+            "symbols_published": 0,
+            "listener_errors": 0,
+            "dropped_events": 0
+        }
+
+    @staticmethod
+    def topic(exchange: str, market_type: str) -> str:
+        """
+        組合主題名稱
+
+        參數:
+            exchange: 交易所名稱，如 'binance'
+            market_type: 市場類型，'spot' 或 'futures'
+
+        返回:
+            主題名稱，格式為 "交易所:市場類型"
+        """
+        return f"{exchange}:{market_type}"
+
+    def publish(self, exchange: str, market_type: str, deltas: Dict[str, Dict[str, Any]]) -> int:
+        """
+        發布一批交易對增量更新
+
+        此方法為同步方法且不會阻塞，可直接在數據流處理循環中調用。
+
+        參數:
+            exchange: 交易所名稱
+            market_type: 市場類型
+            deltas: 本次變化的交易對數據，格式為 {交易對: 行情數據}
+
+        返回:
+            本次發布的序列號，沒有數據時返回當前序列號
+        """
+        topic = self.topic(exchange, market_type)
+        if not deltas:
+            return self.sequences.get(topic, 0)
+
+        sequence = self.sequences.get(topic, 0) + 1
+        self.sequences[topic] = sequence
+        self.last_publish[topic] = time.monotonic()
+        self.stats["published"] += 1
+        self.stats["symbols_published"] += len(deltas)
+
+        # 同步監聽器，單個監聽器出錯不影響其他訂閱者
+        for callback in self._listeners.get(topic, ()):
+            try:
+                callback(exchange, market_type, deltas, sequence)
+            except Exception as e:
+                self.stats["listener_errors"] += 1
+                logger.error(f"市場數據監聽器處理 {topic} 更新時出錯: {str(e)}")
+
+        # 異步隊列，隊列已滿時丟棄最舊的事件，保證訂閱者總能拿到最新數據
+        event = (sequence, deltas)
+        for queue in self._queues.get(topic, ()):
+            if queue.full():
+                try:
+                    queue.get_nowait()
+                    self.stats["dropped_events"] += 1
+                except asyncio.QueueEmpty:
+                    pass
+            queue.put_nowait(event)
+
+        # 喚醒等待者
+        waiter = self._waiters.pop(topic, None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(sequence)
+
+        return sequence
+
+    def add_listener(self, exchange: str, market_type: str, callback: DeltaListener) -> None:
+        """
+        註冊同步監聽器
+
+        參數:
+            exchange: 交易所名稱
+            market_type: 市場類型
+            callback: 回調函數，簽名為 callback(exchange, market_type, deltas, sequence)
+        """
+        listeners = self._listeners.setdefault(self.topic(exchange, market_type), [])
+        if callback not in listeners:
+            listeners.append(callback)
+
+    def remove_listener(self, exchange: str, market_type: str, callback: DeltaListener) -> None:
+        """移除同步監聽器"""
+        listeners = self._listeners.get(self.topic(exchange, market_type), [])
+        if callback in listeners:
+            listeners.remove(callback)
+
+    def subscribe(self, exchange: str, market_type: str, maxsize: Optional[int] = None) -> asyncio.Queue:
+        """
+        建立異步訂閱隊列
+
+        隊列中的元素為 (序列號, 增量數據) 元組。
+
+        參數:
+            exchange: 交易所名稱
+            market_type: 市場類型
+            maxsize: 隊列最大長度，未指定時使用總線默認值
+
+        返回:
+            asyncio.Queue: 訂閱隊列，使用完畢後需調用 unsubscribe
+        """
+        queue = asyncio.Queue(maxsize=maxsize or self.queue_size)
+        self._queues.setdefault(self.topic(exchange, market_type), set()).add(queue)
+        return queue
+
+    def unsubscribe(self, exchange: str, market_type: str, queue: asyncio.Queue) -> None:
+        """取消異步訂閱隊列"""
+        topic = self.topic(exchange, market_type)
+        queues = self._queues.get(topic)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._queues[topic]
+
+    async def wait_for_update(self, exchange: str, market_type: str, timeout: Optional[float] = None) -> Optional[int]:
+        """
+        等待主題的下一次發布
+
+        參數:
+            exchange: 交易所名稱
+            market_type: 市場類型
+            timeout: 超時秒數，None 表示一直等待
+
+        返回:
+            新發布的序列號，超時返回None
+        """
+        topic = self.topic(exchange, market_type)
+        waiter = self._waiters.get(topic)
+        if waiter is None or waiter.done():
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters[topic] = waiter
+        try:
+            # shield 確保單個等待者超時不會取消其他等待者共享的 Future
+            return await asyncio.wait_for(asyncio.shield(waiter), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def is_stale(self, exchange: str, market_type: str) -> bool:
+        """
+        檢查主題數據是否過期
+
+        返回:
+            從未收到數據或超過 stale_after 秒未更新時返回True
+        """
+        last = self.last_publish.get(self.topic(exchange, market_type))
+        return last is None or (time.monotonic() - last) > self.stale_after
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        獲取總線統計信息
+
+        返回:
+            Dict[str, Any]: 包含發布次數、各主題序列號、數據年齡和訂閱者數量
+        """
+        now = time.monotonic()
+        stats = self.stats.copy()
+        stats["topics"] = {
+            topic: {
+                "sequence": sequence,
+                "age_seconds": round(now - self.last_publish[topic], 3) if topic in self.last_publish else None,
+                "listeners": len(self._listeners.get(topic, ())),
+                "queues": len(self._queues.get(topic, ()))
+            }
+            for topic, sequence in self.sequences.items()
+        }
+        return stats
+
+
+# 創建全局實例
+market_data_bus = MarketDataBus()
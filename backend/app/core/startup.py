@@ -0,0 +1,184 @@
+"""
+應用啟動依賴圖
+
+將應用啟動拆分為帶依賴關係的步驟：沒有依賴關係的步驟並發執行，
+應用只等待關鍵步驟完成即可開始服務；非關鍵步驟（如連接交易所、預熱行情）
+在後台繼續執行，其狀態由就緒探針反映。
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 步驟狀態
+PENDING = "pending"
+RUNNING = "running"
+OK = "ok"
+FAILED = "failed"
+SKIPPED = "skipped"
+CANCELLED = "cancelled"
+
+
+class StartupStep:
+    """單個啟動步驟"""
+
+    def __init__(self, name: str, func: Callable[[], Awaitable[Any]], depends: Iterable[str] = (),
+                 critical: bool = False, timeout: Optional[float] = None):
+        """
+        參數:
+            name: 步驟名稱
+            func: 無參數的協程函數，拋出異常表示失敗
+            depends: 依賴的步驟名稱，依賴全部成功後才執行
+            critical: 是否為關鍵步驟，應用在所有關鍵步驟完成後才開始服務
+            timeout: 超時秒數，None 表示不限制
+        """
+        self.name = name
+        self.func = func
+        self.depends = tuple(depends)
+        self.critical = critical
+        self.timeout = timeout
+        self.state = PENDING
+        self.error: Optional[str] = None
+        self.duration: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "critical": self.critical,
+            "depends": list(self.depends),
+            "duration_ms": round(self.duration * 1000, 1) if self.duration is not None else None,
+            "error": self.error
+        }
+
+
+class StartupGraph:
+    """
+    啟動依賴圖
+
+    用法:
+        graph = StartupGraph()
+        graph.add("http_clients", http_clients.start, critical=True)
+        graph.add("market_data", start_market_data, depends=("http_clients",))
+        await graph.start()   # 返回時關鍵步驟已完成，其餘步驟在後台繼續
+        ...
+        await graph.stop()    # 取消仍未完成的步驟
+    """
+
+    def __init__(self):
+        self.steps: Dict[str, StartupStep] = {}
+        self.started_at: Optional[float] = None
+        self.ready_after: Optional[float] = None  # 從開始啟動到關鍵步驟全部完成的秒數
+
+    def add(self, name: str, func: Callable[[], Awaitable[Any]], depends: Iterable[str] = (),
+            critical: bool = False, timeout: Optional[float] = None) -> StartupStep:
+        """
+        添加啟動步驟，依賴的步驟必須先添加（因此圖中不會出現循環）
+
+        異常:
+            ValueError: 步驟名稱重複或依賴的步驟不存在
+        """
+        if name in self.steps:
+            raise ValueError(f"啟動步驟重複: {name}")
+        for dependency in depends:
+            if dependency not in self.steps:
+                raise ValueError(f"啟動步驟 {name} 依賴的 {dependency} 不存在")
+        step = StartupStep(name, func, depends, critical, timeout)
+        self.steps[name] = step
+        return step
+
+    async def _run_step(self, step: StartupStep) -> None:
+        """等待依賴完成後執行步驟，依賴未成功時跳過"""
+        for dependency in step.depends:
+            upstream = self.steps[dependency]
+            await asyncio.wait({upstream.task})
+            if upstream.state != OK:
+                step.state = SKIPPED
+                step.error = f"依賴的步驟 {dependency} 未成功"
+                logger.warning(f"跳過啟動步驟 {step.name}: {step.error}")
+                return
+
+        step.state = RUNNING
+        started = time.monotonic()
+        try:
+            if step.timeout is not None:
+                await asyncio.wait_for(step.func(), step.timeout)
+            else:
+                await step.func()
+            step.state = OK
+        except asyncio.CancelledError:
+            step.state = CANCELLED
+            raise
+        except asyncio.TimeoutError:
+            step.state = FAILED
+            step.error = f"超時（{step.timeout}秒）"
+            logger.error(f"啟動步驟 {step.name} 超時")
+        except Exception as e:
+            step.state = FAILED
+            step.error = str(e)
+            logger.error(f"啟動步驟 {step.name} 失敗: {str(e)}")
+        finally:
+            step.duration = time.monotonic() - started
+            if step.state == OK:
+                logger.info(f"啟動步驟 {step.name} 完成，耗時 {step.duration:.2f} 秒")
+
+    async def start(self) -> None:
+        """並發啟動所有步驟，等待關鍵步驟（及其依賴）完成後返回"""
+        self.started_at = time.monotonic()
+        for step in self.steps.values():
+            step.task = asyncio.create_task(self._run_step(step))
+        critical = [step.task for step in self.steps.values() if step.critical]
+        if critical:
+            await asyncio.wait(critical)
+        self.ready_after = time.monotonic() - self.started_at
+        background = [step.name for step in self.steps.values() if not step.task.done()]
+        logger.info(f"關鍵啟動步驟已完成，耗時 {self.ready_after:.2f} 秒"
+                    + (f"，後台繼續初始化: {', '.join(background)}" if background else ""))
+
+    async def stop(self) -> None:
+        """取消仍在執行的步驟"""
+        tasks = [step.task for step in self.steps.values() if step.task is not None and not step.task.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    @property
+    def ready(self) -> bool:
+        """所有關鍵步驟均已成功"""
+        return self.ready_after is not None and all(
+            step.state == OK for step in self.steps.values() if step.critical
+        )
+
+    def status(self) -> Dict[str, Any]:
+        """
+        就緒狀態
+
+        返回:
+            Dict[str, Any]: status 為以下之一，以及各步驟的狀態
+                starting  關鍵步驟尚未完成
+                failed    有關鍵步驟失敗
+                warming   關鍵步驟已完成，非關鍵步驟仍在後台執行
+                degraded  有非關鍵步驟失敗或被跳過
+                ready     所有步驟均已成功
+        """
+        steps = self.steps.values()
+        if self.ready_after is None:
+            status = "starting"
+        elif not self.ready:
+            status = "failed"
+        elif any(step.state in (FAILED, SKIPPED, CANCELLED) for step in steps):
+            status = "degraded"
+        elif any(step.state in (PENDING, RUNNING) for step in steps):
+            status = "warming"
+        else:
+            status = "ready"
+        return {
+            "status": status,
+            "ready": self.ready,
+            "ready_after_seconds": round(self.ready_after, 3) if self.ready_after is not None else None,
+            "steps": {step.name: step.to_dict() for step in steps}
+        }
@@ -0,0 +1,194 @@
+"""
+WebSocket主題註冊表
+
+多個連接訂閱相同數據時共用同一個主題：每個主題只有一個生產者任務負責讀取
+數據、構建並序列化消息，再經由 WebSocketFanout 放入各訂閱連接的出站隊列。
+連接本身只負責訂閱和退訂，CPU 開銷隨主題數量而不是連接數量增長。
+
+主題在第一個連接訂閱時啟動生產者，最後一個連接退訂時停止；後加入的連接
+會立即收到該主題最近一次發布的消息。
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
+
+from fastapi import WebSocket
+
+from .ws_broadcast import EncodedMessage, WebSocketFanout, encode_message
+
+logger = logging.getLogger(__name__)
+
+# 生產者協程：接收主題對象，循環構建消息並調用 topic.publish，直到被取消
+Producer = Callable[["Topic"], Awaitable[None]]
+
+
+class Topic:
+    """
+    單個推送主題
+
+    保存訂閱連接、最近一次發布的消息和生產者任務。
+    """
+
+    def __init__(self, registry: "TopicRegistry", name: str, producer: Producer, coalesce: bool = True):
+        """
+        初始化主題
+
+        參數:
+            registry: 所屬的主題註冊表
+            name: 主題名稱，如 "tickers:binance:spot"
+            producer: 生產者協程函數
+            coalesce: 是否合併未發送的消息，完整數據類主題只需保留最新一條
+        """
+        self.registry = registry
+        self.name = name
+        self.producer = producer
+        self.coalesce_key = name if coalesce else None
+        self.subscribers: Dict[WebSocket, None] = {}  # 以字典保持訂閱順序
+        self.last_message: Optional[EncodedMessage] = None
+        self.task: Optional[asyncio.Task] = None
+        self.created_at = time.time()
+        self.stats = {"published": 0, "errors": 0}
+
+    def publish(self, message: Union[Dict[str, Any], EncodedMessage]) -> int:
+        """
+        向所有訂閱連接發布消息，消息只序列化一次
+
+        參數:
+            message: 消息字典或已編碼的JSON文本
+
+        返回:
+            int: 成功入隊的連接數
+        """
+        payload = encode_message(message)
+        self.last_message = payload
+        self.stats["published"] += 1
+        if not self.subscribers:
+            return 0
+        queued, evicted = self.registry.fanout.broadcast(self.subscribers, payload, self.coalesce_key)
+        for websocket in evicted:
+            self.registry.unsubscribe(self.name, websocket)
+        return queued
+
+
+class TopicRegistry:
+    """
+    主題註冊表
+
+    管理主題的創建、生產者任務的啟停和連接的訂閱關係。
+    與連接管理器共用同一個 WebSocketFanout，確保每個連接只有一個寫入任務。
+    """
+
+    def __init__(self, fanout: Optional[WebSocketFanout] = None, restart_delay: float = 5.0):
+        """
+        初始化主題註冊表
+
+        參數:
+            fanout: 出站隊列廣播器，默認創建新的實例
+            restart_delay: 生產者異常退出後重新啟動前的等待秒數
+        """
+        self.fanout = fanout or WebSocketFanout()
+        self.restart_delay = restart_delay
+        self.topics: Dict[str, Topic] = {}
+
+    async def _run(self, topic: Topic) -> None:
+        """運行主題的生產者，異常時記錄並在等待後重新啟動"""
+        while True:
+            try:
+                await topic.producer(topic)
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                topic.stats["errors"] += 1
+                logger.error(f"主題 {topic.name} 的生產者出錯，{self.restart_delay}秒後重啟: {str(e)}")
+                await asyncio.sleep(self.restart_delay)
+
+    def subscribe(self, name: str, websocket: WebSocket, producer: Producer, coalesce: bool = True) -> Topic:
+        """
+        將連接訂閱到主題，主題不存在時創建並啟動生產者
+
+        參數:
+            name: 主題名稱，相同名稱的訂閱共用一個生產者
+            websocket: WebSocket連接
+            producer: 主題不存在時使用的生產者協程函數
+            coalesce: 是否合併未發送的消息
+
+        返回:
+            Topic: 訂閱的主題
+        """
+        topic = self.topics.get(name)
+        if topic is None:
+            topic = Topic(self, name, producer, coalesce)
+            self.topics[name] = topic
+            topic.task = asyncio.create_task(self._run(topic))
+            logger.debug(f"主題已啟動: {name}")
+
+        if websocket not in topic.subscribers:
+            topic.subscribers[websocket] = None
+            if topic.last_message is not None:
+                self.fanout.enqueue(websocket, topic.last_message, topic.coalesce_key)
+        return topic
+
+    def unsubscribe(self, name: str, websocket: WebSocket) -> None:
+        """
+        將連接從主題退訂，主題沒有訂閱者時停止生產者
+
+        參數:
+            name: 主題名稱
+            websocket: WebSocket連接
+        """
+        topic = self.topics.get(name)
+        if topic is None:
+            return
+        topic.subscribers.pop(websocket, None)
+        if not topic.subscribers:
+            del self.topics[name]
+            if topic.task is not None:
+                topic.task.cancel()
+            logger.debug(f"主題已停止: {name}")
+
+    def send(self, websocket: WebSocket, message: Union[Dict[str, Any], EncodedMessage]) -> bool:
+        """
+        向單個連接發送消息（確認、心跳、錯誤等），經由同一個出站隊列以保持順序
+
+        參數:
+            websocket: WebSocket連接
+            message: 消息字典或已編碼的JSON文本
+
+        返回:
+            bool: 是否已入隊
+        """
+        return self.fanout.enqueue(websocket, message)
+
+    def release(self, websocket: WebSocket) -> None:
+        """連接關閉時調用：退訂所有主題並移除其出站隊列"""
+        for name in [name for name, topic in self.topics.items() if websocket in topic.subscribers]:
+            self.unsubscribe(name, websocket)
+        self.fanout.unregister(websocket)
+
+    async def close(self) -> None:
+        """停止所有主題的生產者任務"""
+        tasks = [topic.task for topic in self.topics.values() if topic.task is not None]
+        self.topics.clear()
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        獲取主題統計信息
+
+        返回:
+            Dict[str, Any]: 主題數、訂閱總數及各主題的訂閱數和發布次數
+        """
+        return {
+            "topics": len(self.topics),
+            "subscriptions": sum(len(topic.subscribers) for topic in self.topics.values()),
+            "detail": {
+                name: {"subscribers": len(topic.subscribers), **topic.stats}
+                for name, topic in self.topics.items()
+            }
+        }
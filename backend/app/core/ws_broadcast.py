@@ -0,0 +1,308 @@
+"""
+WebSocket廣播工具模組
+
+提供「序列化一次、發送多次」的廣播原語。同一條消息在廣播前只用 orjson
+編碼一次，之後將預編碼的JSON文本直接發送給每個接收者，避免每個連接
+各自調用 send_json 重複序列化相同的內容。
+
+WebSocketFanout 為每個連接維護一個有界的出站隊列和獨立的寫入任務，
+廣播只需將消息放入隊列，慢速客戶端不會阻塞其他連接或廣播方；
+價格類消息可按主題合併，只保留最新一條；隊列持續已滿的連接會被驅逐。
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple, Union
+
+from fastapi import WebSocket
+
+from .config import settings
+from .json_utils import dump_json_str
+
+logger = logging.getLogger(__name__)
+
+# 預編碼消息的類型：已序列化的JSON文本
+EncodedMessage = str
+
+
+def encode_message(message: Union[Dict[str, Any], EncodedMessage]) -> EncodedMessage:
+    """
+    將消息編碼為JSON文本
+
+    已編碼的字符串原樣返回，便於調用方在多個廣播之間共享同一份編碼結果。
+
+    Args:
+        message: 消息字典或已編碼的JSON文本
+
+    Returns:
+        str: JSON文本
+    """
+    if isinstance(message, str):
+        return message
+    return dump_json_str(message)
+
+
+class OutboundSender:
+    """
+    單個WebSocket連接的出站隊列與寫入任務
+
+    消息入隊後由後台寫入任務依序發送。帶有合併鍵的消息在隊列中只保留最新
+    一條（原位置替換），適用於每次都攜帶完整狀態的價格推送；隊列已滿時丟棄
+    新消息，若隊列持續已滿超過驅逐時間或單次發送超時，則關閉該連接。
+    """
+
+    def __init__(self, websocket: WebSocket, max_queue: int, evict_after: float, send_timeout: float):
+        """
+        初始化出站隊列
+
+        Args:
+            websocket: WebSocket連接
+            max_queue: 隊列最大長度
+            evict_after: 隊列持續已滿多少秒後驅逐連接
+            send_timeout: 單次發送的超時秒數
+        """
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.evict_after = evict_after
+        self.send_timeout = send_timeout
+        # 隊列元素為 [合併鍵, 預編碼消息]，使用列表以便合併時原位替換
+        self._items: Deque[List[Any]] = deque()
+        self._keyed: Dict[str, List[Any]] = {}
+        self._wakeup = asyncio.Event()
+        self._full_since: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self.closed = False
+        self.evicted = False
+        self.stats = {
+            "sent": 0,
+            "dropped": 0,
+            "coalesced": 0,
+            "failed": 0
+        }
+
+    def enqueue(self, payload: EncodedMessage, coalesce_key: Optional[str] = None) -> bool:
+        """
+        將預編碼消息放入出站隊列，不會阻塞
+
+        Args:
+            payload: encode_message 返回的JSON文本
+            coalesce_key: 合併鍵，隊列中已有相同鍵的消息時直接替換為最新內容
+
+        Returns:
+            bool: 消息是否已入隊（包括合併），連接已關閉或隊列已滿時返回False
+        """
+        if self.closed:
+            return False
+
+        if coalesce_key is not None:
+            item = self._keyed.get(coalesce_key)
+            if item is not None:
+                item[1] = payload
+                self.stats["coalesced"] += 1
+                return True
+
+        if len(self._items) >= self.max_queue:
+            now = time.monotonic()
+            if self._full_since is None:
+                self._full_since = now
+            elif now - self._full_since >= self.evict_after:
+                self.evict(f"出站隊列已滿超過 {self.evict_after} 秒")
+            self.stats["dropped"] += 1
+            return False
+
+        self._full_since = None
+        item = [coalesce_key, payload]
+        self._items.append(item)
+        if coalesce_key is not None:
+            self._keyed[coalesce_key] = item
+
+        if self._task is None:
+            self._task = asyncio.create_task(self._writer())
+        self._wakeup.set()
+        return True
+
+    def queue_size(self) -> int:
+        """獲取當前隊列長度"""
+        return len(self._items)
+
+    async def _writer(self):
+        """後台寫入任務，依序發送隊列中的消息"""
+        try:
+            while not self.closed:
+                if not self._items:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+
+                item = self._items.popleft()
+                coalesce_key, payload = item
+                if coalesce_key is not None and self._keyed.get(coalesce_key) is item:
+                    del self._keyed[coalesce_key]
+
+                try:
+                    await asyncio.wait_for(self.websocket.send_text(payload), timeout=self.send_timeout)
+                    self.stats["sent"] += 1
+                except asyncio.TimeoutError:
+                    self.stats["failed"] += 1
+                    self.evict(f"發送超時 ({self.send_timeout} 秒)")
+                    return
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    self.evict(f"發送失敗: {str(e)}")
+                    return
+        except asyncio.CancelledError:
+            pass
+
+    def evict(self, reason: str) -> None:
+        """
+        驅逐慢速或已失效的連接
+
+        清空隊列、停止寫入任務並嘗試關閉WebSocket連接。
+
+        Args:
+            reason: 驅逐原因，用於日誌
+        """
+        if self.closed:
+            return
+        logger.warning(f"[WebSocket] 驅逐慢速連接 {id(self.websocket)}: {reason}")
+        self.evicted = True
+        self.close()
+        asyncio.create_task(self._close_socket())
+
+    async def _close_socket(self):
+        """關閉被驅逐的WebSocket連接，忽略已斷開連接的錯誤"""
+        try:
+            await asyncio.wait_for(self.websocket.close(code=1013), timeout=self.send_timeout)
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        """停止寫入任務並丟棄未發送的消息"""
+        self.closed = True
+        self._items.clear()
+        self._keyed.clear()
+        self._wakeup.set()
+        if self._task is not None and not self._task.done() and self._task is not asyncio.current_task():
+            self._task.cancel()
+
+
+class WebSocketFanout:
+    """
+    併發、帶背壓的WebSocket廣播器
+
+    為每個連接維護一個 OutboundSender。廣播時消息只編碼一次並放入各連接的
+    出站隊列後立即返回，廣播耗時與連接數量和最慢的客戶端無關。
+    """
+
+    def __init__(
+        self,
+        max_queue: Optional[int] = None,
+        evict_after: Optional[float] = None,
+        send_timeout: Optional[float] = None
+    ):
+        """
+        初始化廣播器
+
+        Args:
+            max_queue: 每個連接的出站隊列長度，默認讀取 WS_OUTBOUND_QUEUE_SIZE
+            evict_after: 隊列持續已滿多少秒後驅逐，默認讀取 WS_SLOW_CONSUMER_EVICT_SECONDS
+            send_timeout: 單次發送超時秒數，默認讀取 WS_SEND_TIMEOUT_SECONDS
+        """
+        self.max_queue = max_queue or settings.WS_OUTBOUND_QUEUE_SIZE
+        self.evict_after = evict_after or settings.WS_SLOW_CONSUMER_EVICT_SECONDS
+        self.send_timeout = send_timeout or settings.WS_SEND_TIMEOUT_SECONDS
+        self.senders: Dict[WebSocket, OutboundSender] = {}
+        self.stats = {
+            "broadcasts": 0,
+            "evicted": 0
+        }
+
+    def register(self, websocket: WebSocket) -> OutboundSender:
+        """
+        為連接建立出站隊列，已存在時直接返回
+
+        Args:
+            websocket: WebSocket連接
+
+        Returns:
+            OutboundSender: 連接的出站隊列
+        """
+        sender = self.senders.get(websocket)
+        if sender is None:
+            sender = OutboundSender(websocket, self.max_queue, self.evict_after, self.send_timeout)
+            self.senders[websocket] = sender
+        return sender
+
+    def unregister(self, websocket: WebSocket) -> None:
+        """
+        移除連接的出站隊列並停止其寫入任務
+
+        Args:
+            websocket: WebSocket連接
+        """
+        sender = self.senders.pop(websocket, None)
+        if sender is not None:
+            if sender.evicted:
+                self.stats["evicted"] += 1
+            sender.close()
+
+    def enqueue(self, websocket: WebSocket, message: Union[Dict[str, Any], EncodedMessage], coalesce_key: Optional[str] = None) -> bool:
+        """
+        將消息放入單個連接的出站隊列
+
+        Args:
+            websocket: WebSocket連接
+            message: 消息字典或已編碼的JSON文本
+            coalesce_key: 合併鍵，相同鍵的未發送消息只保留最新一條
+
+        Returns:
+            bool: 是否已入隊，連接已被驅逐時返回False
+        """
+        return self.register(websocket).enqueue(encode_message(message), coalesce_key)
+
+    def broadcast(
+        self,
+        connections: Iterable[WebSocket],
+        message: Union[Dict[str, Any], EncodedMessage],
+        coalesce_key: Optional[str] = None
+    ) -> Tuple[int, List[WebSocket]]:
+        """
+        將消息編碼一次後放入所有連接的出站隊列
+
+        Args:
+            connections: 接收消息的WebSocket連接
+            message: 消息字典或已編碼的JSON文本
+            coalesce_key: 合併鍵，價格類主題傳入後慢速客戶端只會收到最新一條
+
+        Returns:
+            Tuple[int, List[WebSocket]]: (入隊數, 已被驅逐的連接列表)
+        """
+        payload = encode_message(message)
+        self.stats["broadcasts"] += 1
+        queued = 0
+        evicted: List[WebSocket] = []
+
+        for websocket in list(connections):
+            sender = self.register(websocket)
+            if sender.enqueue(payload, coalesce_key):
+                queued += 1
+            elif sender.closed:
+                evicted.append(websocket)
+
+        return queued, evicted
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        獲取廣播器統計信息
+
+        Returns:
+            Dict[str, Any]: 連接數、隊列長度及發送、丟棄、合併和驅逐次數
+        """
+        stats = self.stats.copy()
+        stats["connections"] = len(self.senders)
+        stats["queued_messages"] = sum(sender.queue_size() for sender in self.senders.values())
+        for key in ("sent", "dropped", "coalesced", "failed"):
+            stats[key] = sum(sender.stats[key] for sender in self.senders.values())
+        return stats
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, MetaData
+from sqlalchemy import create_engine, event, MetaData
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -31,6 +31,15 @@ engine = create_engine(
     pool_pre_ping=True  # 啟用連接預檢查，確保獲取的連接始終有效
 )
 
+# SQLite 默認不執行外鍵約束，模型中的 ondelete="CASCADE" / "SET NULL" 需要在每個連接上啟用
+# 例如刪除 API 密鑰時由數據庫級聯刪除其使用日誌（relationship 設置了 passive_deletes）
+if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
+    @event.listens_for(engine, "connect")
+    def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
 # 創建會話工廠，用於生成資料庫會話實例
 # autocommit=False：需要明確提交事務才能保存更改
 # autoflush=False：需要明確呼叫flush才會將更改發送到資料庫
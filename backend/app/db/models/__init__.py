@@ -1,7 +1,7 @@
 from .base import get_china_time, NotificationType, UserTag
 from .user import User, RefreshToken
 from .notification import Notification
-from .exchange_api import ExchangeAPI
+from .exchange_api import ExchangeAPI, ApiUsageLog
 from .chat import ChatSession, ChatMessage, ChatMessageUsage
 from .grid import GridStrategy, GridOrder, SymbolRules
 
@@ -16,6 +16,7 @@ __all__ = [
     "RefreshToken",         # 刷新令牌模型，用於JWT認證機制中的令牌刷新
     "Notification",         # 通知模型，用於存儲系統通知和用戶消息
     "ExchangeAPI",          # 交易所API密鑰模型，管理用戶的交易所連接憑證
+    "ApiUsageLog",          # API使用日誌模型，記錄通過API密鑰執行的操作
     "ChatSession",          # 聊天會話模型，存儲用戶與Gemini的對話會話
     "ChatMessage",          # 聊天消息模型，存儲會話中的單條消息
     "ChatMessageUsage",     # 聊天消息使用統計模型
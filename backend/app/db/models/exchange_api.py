@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Boolean, JSON
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Boolean, JSON, Float, Index
 from sqlalchemy.orm import relationship
 from ...db.database import Base
 from .base import get_china_time
@@ -48,8 +48,10 @@ class ExchangeAPI(Base):
     # 多對一關係，多個交易所API密鑰可以屬於同一個用戶
     user = relationship("User", back_populates="exchange_apis")
     
-    # 關聯關係：使用日誌（如果需要）
-    # api_usage_logs = relationship("ApiUsageLog", back_populates="exchange_api", cascade="all, delete-orphan")
+    # 關聯關係：使用日誌
+    # 刪除密鑰時由數據庫級聯刪除日誌，不在內存中逐條載入
+    api_usage_logs = relationship("ApiUsageLog", back_populates="exchange_api",
+                                  cascade="all, delete-orphan", passive_deletes=True)
     
     # Pydantic ORM 模式配置
     # 實現 ORM 模型與 API 模型的自動轉換
@@ -72,4 +74,35 @@ class ExchangeAPI(Base):
     @staticmethod
     def generate_virtual_key_id():
         """生成唯一的虛擬密鑰標識符"""
-        return str(uuid.uuid4()) 
\ No newline at end of file
+        return str(uuid.uuid4()) 
+
+
+class ApiUsageLog(Base):
+    """
+    API 使用日誌模型
+    
+    記錄每次通過 API 密鑰執行的交易所操作。記錄由後台寫入器批量插入，
+    不在交易請求中同步寫入；用於速率限制檢查和使用統計。
+    """
+    __tablename__ = "api_usage_logs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    exchange_api_id = Column(Integer, ForeignKey("exchange_apis.id", ondelete="CASCADE"), nullable=False)  # 使用的 API 密鑰
+    user_id = Column(Integer, nullable=False)  # 冗餘存儲用戶ID，統計時無需關聯密鑰表
+    operation = Column(String(64), nullable=False)  # 執行的操作，如 place_order
+    success = Column(Boolean, nullable=False)  # 操作是否成功
+    execution_time = Column(Float, nullable=True)  # 執行時間（秒）
+    error = Column(String(500), nullable=True)  # 錯誤信息
+    created_at = Column(DateTime, nullable=False)  # 操作發生時間（UTC），與 last_used_at 一致
+    
+    # 關聯關係：所屬 API 密鑰
+    exchange_api = relationship("ExchangeAPI", back_populates="api_usage_logs")
+    
+    __table_args__ = (
+        # 速率限制按密鑰統計最近一段時間的次數，使用統計按用戶和時間範圍查詢
+        Index("ix_api_usage_logs_key_time", "exchange_api_id", "created_at"),
+        Index("ix_api_usage_logs_user_time", "user_id", "created_at"),
+    )
+    
+    def __repr__(self):
+        return f"<ApiUsageLog {self.operation} key={self.exchange_api_id} success={self.success}>"
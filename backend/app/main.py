@@ -81,6 +81,7 @@ from .api.endpoints import users as users_router
 
 # 引入認證優化系統
 from app.core.auth_optimizations import initialize_auth_optimizations
+from app.core.startup import StartupGraph
 
 # 簡單的記憶體速率限制器
 class RateLimiter:
@@ -119,6 +120,61 @@ class RateLimiter:
 # 創建速率限制器實例
 ping_rate_limiter = RateLimiter(requests_limit=20, window_seconds=60)  # 每分鐘限制20次，允許完成一次15秒的網絡測試
 
+# Redis WebSocket管理器初始化超時（秒），超時後使用本地管理器
+REDIS_STARTUP_TIMEOUT = 10
+
+# 應用啟動步驟
+async def _start_http_clients():
+    """啟動共享HTTP客戶端，後續所有對外REST請求共用連接池"""
+    from app.core.http_client import http_clients
+    await http_clients.start()
+
+async def _initialize_exchange_connection_manager():
+    """初始化交易所連接管理器"""
+    from backend.utils.exchange_connection_manager import exchange_connection_manager
+    logger.info("正在初始化交易所連接管理器...")
+    await exchange_connection_manager.initialize()
+    logger.info("交易所連接管理器初始化完成，已連接到WebSocket客戶端池")
+
+async def _start_market_data_service():
+    """啟動市場數據服務，沒有交易所在等待時間內連接時標記為失敗（數據流仍在後台持續重連）"""
+    from app.services.market_data import market_data_service
+    logger.info("正在啟動市場數據服務...")
+    active_exchanges = await market_data_service.start()
+    if not active_exchanges:
+        raise RuntimeError("沒有交易所連接成功，數據流將在後台持續重連")
+    logger.info(f"市場數據服務已成功啟動，活躍交易所: {active_exchanges}")
+
+async def _initialize_market_services():
+    """初始化市場價格緩存和後台更新任務"""
+    from app.api.endpoints.markets import initialize_market_services
+    logger.info("正在初始化市場價格緩存和後台更新任務...")
+    await initialize_market_services()
+    logger.info("市場價格緩存和後台更新任務已初始化")
+
+async def _start_api_usage_recorder():
+    """啟動API使用記錄器，交易請求的使用日誌由其在後台批量寫入"""
+    from app.core.api_usage_recorder import api_usage_recorder
+    api_usage_recorder.start()
+
+async def _start_online_status_manager():
+    """啟動在線狀態管理器"""
+    from app.core.online_status_manager import online_status_manager
+    await online_status_manager.start()
+    logger.info("在線狀態管理器已啟動")
+
+async def _initialize_redis_ws_manager():
+    """初始化Redis WebSocket管理器，失敗時使用本地管理器"""
+    from app.core.settings import settings
+    from app.core.websocket_redis import init_redis_ws_manager
+    if not settings.REDIS_ENABLED:
+        return
+    ws_manager = await init_redis_ws_manager(settings.NODE_ID)
+    if ws_manager:
+        logger.info(f"Redis WebSocket管理器初始化成功")
+    else:
+        logger.warning("Redis WebSocket管理器初始化失敗，將使用本地管理器")
+
 # 應用啟動和關閉事件
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -129,91 +185,28 @@ async def lifespan(app: FastAPI):
     if not os.path.exists("logs"):
         os.makedirs("logs")
     
-    # 初始化交易所連接管理器
-    try:
-        from backend.utils.exchange_connection_manager import exchange_connection_manager
-        logger.info("正在初始化交易所連接管理器...")
-        await exchange_connection_manager.initialize()
-        logger.info("交易所連接管理器初始化完成，已連接到WebSocket客戶端池")
-    except Exception as e:
-        logger.error(f"初始化交易所連接管理器失敗: {str(e)}")
+    # 按依賴關係並發啟動各服務：只等待關鍵步驟完成即開始服務，
+    # 交易所連接和行情預熱在後台繼續，進度由 /ready 反映
+    startup = StartupGraph()
+    app.state.startup = startup
+    startup.add("http_clients", _start_http_clients, critical=True)
+    startup.add("online_status_manager", _start_online_status_manager, critical=True)
+    startup.add("auth_optimizations", lambda: initialize_auth_optimizations(app), critical=True)
+    startup.add("api_usage_recorder", _start_api_usage_recorder)
+    startup.add("redis_ws_manager", _initialize_redis_ws_manager, timeout=REDIS_STARTUP_TIMEOUT)
+    startup.add("exchange_connection_manager", _initialize_exchange_connection_manager)
+    startup.add("market_data_service", _start_market_data_service, depends=("http_clients",))
+    startup.add("market_services", _initialize_market_services, depends=("http_clients",))
+    await startup.start()
     
-    # 初始化市場數據服務
-    try:
-        from app.services.market_data import market_data_service
-        logger.info("正在啟動市場數據服務...")
-        
-        # 顯式調用 start 方法並等待其完成
-        try:
-            active_exchanges = await market_data_service.start()
-            logger.info(f"市場數據服務已成功啟動，活躍交易所: {active_exchanges}")
-        except Exception as e:
-            logger.error(f"市場數據服務啟動失敗: {str(e)}")
-            
-            # 如果 market_data_service.start() 失敗，則嘗試直接連接 BinanceExchange
-            try:
-                logger.info("嘗試直接連接 BinanceExchange...")
-                from app.core.exchanges.binance import BinanceExchange
-                
-                # 創建並連接
-                binance_exchange = BinanceExchange()
-                connect_result = await binance_exchange.connect()
-                
-                if connect_result:
-                    logger.info("備用連接成功: 直接連接 BinanceExchange")
-                else:
-                    logger.error("備用連接失敗: BinanceExchange 連接返回 False")
-            except Exception as binance_error:
-                logger.error(f"備用連接失敗: {str(binance_error)}")
-        
-        # 初始化市場價格緩存和後台更新任務
-        try:
-            from app.api.endpoints.markets import initialize_market_services
-            logger.info("正在初始化市場價格緩存和後台更新任務...")
-            await initialize_market_services()
-            logger.info("市場價格緩存和後台更新任務已初始化")
-        except Exception as e:
-            logger.error(f"初始化市場價格緩存失敗: {str(e)}")
-    except Exception as e:
-        logger.error(f"啟動市場數據服務失敗: {str(e)}")
-    
-    # 初始化在線狀態管理器
-    try:
-        from app.core.online_status_manager import online_status_manager
-        await online_status_manager.start()
-        logger.info("在線狀態管理器已啟動")
-    except Exception as e:
-        logger.error(f"啟動在線狀態管理器失敗: {str(e)}")
-    
-    # 初始化WebSocket管理器
-    try:
-        from app.core.settings import settings
-        node_id = settings.NODE_ID
-        from app.core.websocket_redis import init_redis_ws_manager
-        if settings.REDIS_ENABLED:
-            ws_manager = await init_redis_ws_manager(node_id)
-            if ws_manager:
-                logger.info(f"Redis WebSocket管理器初始化成功")
-            else:
-                logger.warning("Redis WebSocket管理器初始化失敗，將使用本地管理器")
-    except Exception as e:
-        logger.error(f"初始化Redis WebSocket管理器時出錯: {str(e)}")
-        logger.info("將使用本地WebSocket管理器")
-    
-    # 初始化認證優化系統
-    try:
-        logger.info("正在初始化認證優化系統...")
-        await initialize_auth_optimizations(app)
-        logger.info("認證優化系統已成功初始化")
-    except Exception as e:
-        logger.error(f"初始化認證優化系統時出錯: {str(e)}")
-    
-    # 在这里可以进行数据库初始化等操作
     yield
     
     # 應用關閉時執行的代碼
     logger.info("應用正在關閉...")
     
+    # 取消仍在後台執行的啟動步驟
+    await startup.stop()
+    
     # 關閉市場數據服務及相關資源
     try:
         from app.api.endpoints.markets import cleanup_market_services
@@ -234,6 +227,27 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"關閉線上狀態管理器時出錯: {str(e)}")
     
+    # 停止API使用記錄器並寫入剩餘的使用日誌
+    try:
+        from app.core.api_usage_recorder import api_usage_recorder
+        await api_usage_recorder.stop()
+    except Exception as e:
+        logger.error(f"停止API使用記錄器時出錯: {str(e)}")
+    
+    # 關閉市場元數據緩存的模板客戶端
+    try:
+        from backend.utils.market_metadata import market_metadata_cache
+        await market_metadata_cache.close()
+    except Exception as e:
+        logger.error(f"關閉市場元數據緩存時出錯: {str(e)}")
+    
+    # 關閉共享HTTP客戶端
+    try:
+        from app.core.http_client import http_clients
+        await http_clients.close()
+    except Exception as e:
+        logger.error(f"關閉共享HTTP客戶端時出錯: {str(e)}")
+    
     logger.info("應用已完全關閉")
 
 # 創建 FastAPI 應用
@@ -322,6 +336,15 @@ async def health_check():
     logger.info(f"健康檢查請求 - 時間: {taipei_time}")
     return {"status": "healthy", "time": taipei_time, "environment": os.getenv("ENVIRONMENT", "development")}
 
+# 就緒探針：關鍵服務未啟動時返回 503，後台服務仍在預熱或失敗時標記為 warming / degraded
+@app.get("/ready")
+async def readiness_check(request: Request):
+    startup = getattr(request.app.state, "startup", None)
+    if startup is None:
+        return JSONResponse(status_code=503, content={"status": "starting", "ready": False})
+    result = startup.status()
+    return JSONResponse(status_code=200 if result["ready"] else 503, content=result)
+
 # 輕量級Ping端點，用於客戶端測量API延遲
 @app.get("/api/v1/ping")
 async def api_ping(request: Request):
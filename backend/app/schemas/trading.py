@@ -189,7 +189,7 @@ class StopOrderResponse(BaseResponse):
 # 批量訂單相關
 class BatchOrderRequest(BaseModel):
     """批量訂單請求"""
-    orders: List[Union[OrderRequest, StopOrder]] = Field(..., max_items=5, description="最多5個訂單")
+    orders: List[Union[OrderRequest, StopOrder]] = Field(..., max_items=200, description="最多200個訂單")
     order_type: str = Field(..., pattern="^(spot|futures)$", description="訂單類型：spot(現貨) 或 futures(合約)")
 
 class BatchOrderResponse(BaseResponse):
@@ -212,7 +212,7 @@ class BatchOrderResponse(BaseResponse):
 class BatchCancelRequest(BaseModel):
     """批量取消訂單請求"""
     symbol: str
-    order_ids: List[str] = Field(..., max_items=10, description="最多10個訂單ID")
+    order_ids: List[str] = Field(..., max_items=200, description="最多200個訂單ID")
     order_type: str = Field(..., pattern="^(spot|futures)$")
 
 class BatchCancelResponse(BaseResponse):
@@ -0,0 +1,381 @@
+"""
+K線數據存儲服務
+
+為每個（市場類型, 交易對）維護一個固定大小的 1 分鐘 K 線環形緩衝區（NumPy 數組）。
+首次請求時通過 REST /klines 回補歷史數據，之後由 <symbol>@kline_1m 數據流實時更新；
+更高週期的 K 線由 1 分鐘 K 線重採樣得到，不再單獨向交易所請求。
+指標計算和圖表接口可直接從內存讀取。
+
+追蹤的交易對數量有上限：長時間未被讀取的交易對，以及超出上限時最久未讀取的交易對
+會被停止追蹤（釋放緩衝區並取消數據流訂閱），回補失敗的交易對不會保留。
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.http_client import http_clients
+from app.services.market_data import market_data_service
+
+logger = logging.getLogger(__name__)
+
+MINUTE_MS = 60_000
+
+# 支援的K線週期及其對應的分鐘數
+INTERVAL_MINUTES = {
+    "1m": 1, "3m": 3, "5m": 5, "15m": 15, "30m": 30,
+    "1h": 60, "2h": 120, "4h": 240, "6h": 360, "8h": 480, "12h": 720,
+    "1d": 1440
+}
+
+# K線字段，除 open_time 外均為浮點數
+CANDLE_FIELDS = ("open", "high", "low", "close", "volume", "quote_volume")
+
+# 檢查閒置交易對的最短間隔（秒）
+IDLE_SWEEP_INTERVAL = 60
+
+
+class CandleBuffer:
+    """
+    單個交易對的 1 分鐘 K 線環形緩衝區
+
+    各字段分別存放在固定長度的 NumPy 數組中，寫入只覆蓋最舊的位置，不重新分配內存。
+    """
+
+    def __init__(self, capacity: int):
+        """
+        初始化環形緩衝區
+
+        參數:
+            capacity: 最多保存的K線數量
+        """
+        self.capacity = capacity
+        self.open_time = np.zeros(capacity, dtype=np.int64)
+        self.values = np.zeros((capacity, len(CANDLE_FIELDS)), dtype=np.float64)
+        self.start = 0  # 最舊一根K線的位置
+        self.size = 0
+        self.has_gap = False  # 數據流中斷導致缺少K線時為True，下次讀取時重新回補
+
+    @property
+    def last_open_time(self) -> Optional[int]:
+        """最新一根K線的開盤時間（毫秒）"""
+        if self.size == 0:
+            return None
+        return int(self.open_time[(self.start + self.size - 1) % self.capacity])
+
+    def upsert(self, open_time: int, values: Tuple[float, ...]) -> None:
+        """
+        寫入一根K線：與最新K線同一分鐘時原地更新，更新的分鐘則追加
+
+        參數:
+            open_time: 開盤時間（毫秒）
+            values: 依 CANDLE_FIELDS 順序的數值
+        """
+        last = self.last_open_time
+        if last is not None and open_time < last:
+            return  # 忽略過時的數據
+        if last is not None and open_time == last:
+            self.values[(self.start + self.size - 1) % self.capacity] = values
+            return
+        if last is not None and open_time - last > MINUTE_MS:
+            self.has_gap = True
+
+        if self.size < self.capacity:
+            position = (self.start + self.size) % self.capacity
+            self.size += 1
+        else:
+            position = self.start
+            self.start = (self.start + 1) % self.capacity
+        self.open_time[position] = open_time
+        self.values[position] = values
+
+    def load(self, open_time: np.ndarray, values: np.ndarray) -> None:
+        """
+        以回補的歷史數據替換緩衝區內容
+
+        參數:
+            open_time: 按時間升序的開盤時間數組
+            values: 對應的數值矩陣，列順序為 CANDLE_FIELDS
+        """
+        count = min(len(open_time), self.capacity)
+        self.open_time[:count] = open_time[-count:]
+        self.values[:count] = values[-count:]
+        self.start = 0
+        self.size = count
+        self.has_gap = False
+
+    def arrays(self, limit: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        按時間順序返回最近的K線
+
+        參數:
+            limit: 最多返回的數量，None 表示全部
+
+        返回:
+            Tuple[np.ndarray, np.ndarray]: (開盤時間數組, 數值矩陣)
+        """
+        count = self.size if limit is None else min(limit, self.size)
+        first = (self.start + self.size - count) % self.capacity
+        indices = (first + np.arange(count)) % self.capacity
+        return self.open_time[indices], self.values[indices]
+
+
+def resample(open_time: np.ndarray, values: np.ndarray, minutes: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    將 1 分鐘 K 線重採樣為更高週期
+
+    按開盤時間對齊到週期起點分組：開盤價取第一根、收盤價取最後一根、
+    最高價和最低價取極值、成交量求和。
+
+    參數:
+        open_time: 1 分鐘K線的開盤時間數組（升序）
+        values: 1 分鐘K線的數值矩陣
+        minutes: 目標週期的分鐘數
+
+    返回:
+        Tuple[np.ndarray, np.ndarray]: 重採樣後的 (開盤時間數組, 數值矩陣)
+    """
+    if minutes == 1 or len(open_time) == 0:
+        return open_time, values
+    period = minutes * MINUTE_MS
+    buckets = open_time - open_time % period
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+
+    result = np.empty((len(starts), len(CANDLE_FIELDS)), dtype=np.float64)
+    result[:, 0] = values[starts, 0]
+    result[:, 1] = np.maximum.reduceat(values[:, 1], starts)
+    result[:, 2] = np.minimum.reduceat(values[:, 2], starts)
+    result[:, 3] = values[ends, 3]
+    result[:, 4] = np.add.reduceat(values[:, 4], starts)
+    result[:, 5] = np.add.reduceat(values[:, 5], starts)
+    return buckets[starts], result
+
+
+class CandleStore:
+    """
+    K線存儲服務
+
+    首次請求某交易對時回補歷史K線並訂閱 kline_1m 數據流，之後所有週期的K線
+    都從內存中的 1 分鐘緩衝區讀取或重採樣。
+    """
+
+    def __init__(self, capacity: Optional[int] = None, exchange: str = "binance",
+                 max_symbols: Optional[int] = None, idle_seconds: Optional[float] = None):
+        """
+        初始化K線存儲
+
+        參數:
+            capacity: 每個交易對保存的 1 分鐘K線數量，默認讀取 CANDLE_BUFFER_SIZE（1440，即一天）
+            exchange: 交易所名稱
+            max_symbols: 同時追蹤的交易對上限，默認讀取 CANDLE_MAX_SYMBOLS
+            idle_seconds: 交易對未被讀取多少秒後停止追蹤，默認讀取 CANDLE_IDLE_SECONDS
+        """
+        self.capacity = capacity or settings.CANDLE_BUFFER_SIZE
+        self.exchange = exchange
+        self.max_symbols = max_symbols or settings.CANDLE_MAX_SYMBOLS
+        self.idle_seconds = idle_seconds or settings.CANDLE_IDLE_SECONDS
+        self.buffers: Dict[Tuple[str, str], CandleBuffer] = {}
+        self._loading: Dict[Tuple[str, str], asyncio.Task] = {}
+        # 每個交易對最後一次被讀取的時間（time.monotonic），用於閒置和 LRU 淘汰
+        self._last_access: Dict[Tuple[str, str], float] = {}
+        self._last_sweep = time.monotonic()
+        self._listening = set()
+        self.stats = {"backfills": 0, "backfill_errors": 0, "stream_updates": 0, "reads": 0, "evicted": 0}
+
+    def _on_kline(self, exchange: str, topic: str, deltas: Dict[str, Dict[str, Any]], sequence: int) -> None:
+        """市場數據總線回調，將 kline_1m 數據流寫入對應的緩衝區"""
+        market_type = topic.split("@", 1)[0]
+        for symbol, kline in deltas.items():
+            buffer = self.buffers.get((market_type, symbol))
+            if buffer is None or kline.get("interval") not in (None, "1m"):
+                continue
+            buffer.upsert(int(kline["open_time"]), tuple(kline.get(field, 0.0) for field in CANDLE_FIELDS))
+            self.stats["stream_updates"] += 1
+
+    async def _backfill(self, symbol: str, market_type: str) -> CandleBuffer:
+        """通過 REST /klines 回補 1 分鐘K線，並確保已訂閱 kline_1m 數據流"""
+        key = (market_type, symbol)
+        exchange = market_data_service.get_exchange(self.exchange)
+
+        if market_type not in self._listening:
+            market_data_service.bus.add_listener(self.exchange, f"{market_type}@kline_1m", self._on_kline)
+            self._listening.add(market_type)
+
+        buffer = self.buffers.get(key)
+        created = buffer is None
+        if created:
+            await self._evict(len(self.buffers) - self.max_symbols + 1)
+            buffer = CandleBuffer(self.capacity)
+            self.buffers[key] = buffer
+            self._last_access[key] = time.monotonic()
+
+        try:
+            # 先訂閱數據流再回補，回補期間到達的K線不會遺漏
+            if created and exchange is not None:
+                await exchange.subscribe_symbols([symbol], market_type, ["kline_1m"])
+            rows = await self._fetch_klines(exchange, symbol, market_type)
+            if created and exchange is not None and not rows:
+                raise ValueError(f"沒有 {symbol} 的K線數據")
+        except BaseException:
+            # 新追蹤的交易對回補失敗時撤銷緩衝區和數據流訂閱，避免無效交易對一直被追蹤
+            self.stats["backfill_errors"] += 1
+            if created:
+                await self.untrack(symbol, market_type)
+            raise
+
+        if rows:
+            open_time = np.array([int(row[0]) for row in rows], dtype=np.int64)
+            # REST 字段順序: 開盤時間, 開, 高, 低, 收, 成交量, 收盤時間, 成交額, ...
+            values = np.array([[row[1], row[2], row[3], row[4], row[5], row[7]] for row in rows], dtype=np.float64)
+            # 保留回補期間數據流已寫入的更新的K線
+            stream_time, stream_values = buffer.arrays()
+            newer = stream_time > open_time[-1]
+            if newer.any():
+                open_time = np.concatenate([open_time, stream_time[newer]])
+                values = np.concatenate([values, stream_values[newer]])
+            buffer.load(open_time, values)
+        self.stats["backfills"] += 1
+        return buffer
+
+    async def _fetch_klines(self, exchange: Any, symbol: str, market_type: str) -> List[List[Any]]:
+        """通過 REST /klines 分批獲取最近 capacity 根 1 分鐘K線，按時間升序返回"""
+        rows: List[List[Any]] = []
+        if exchange is not None:
+            url = f"{exchange.rest_endpoints[market_type]}/klines"
+            # 現貨單次最多1000根，期貨最多1500根
+            max_limit = 1000 if market_type == "spot" else 1500
+            end_time = None
+            remaining = self.capacity
+            client = http_clients.get(url)
+            while remaining > 0:
+                params = {"symbol": symbol, "interval": "1m", "limit": min(remaining, max_limit)}
+                if end_time is not None:
+                    params["endTime"] = end_time
+                response = await client.get(url, params=params)
+                response.raise_for_status()
+                batch = response.json()
+                if not batch:
+                    break
+                rows = batch + rows
+                remaining -= len(batch)
+                end_time = int(batch[0][0]) - 1
+                if len(batch) < params["limit"]:
+                    break
+        return rows
+
+    def _validate_symbol(self, symbol: str, market_type: str) -> None:
+        """
+        在回補前檢查交易對是否存在於行情表中
+
+        行情表尚未收到數據（數據流未連接）時不檢查，由回補失敗後的撤銷兜底。
+
+        異常:
+            ValueError: 無效或未知的交易對
+        """
+        if not symbol.isalnum():
+            raise ValueError(f"無效的交易對: {symbol}")
+        if not market_data_service.is_known_symbol(symbol, self.exchange, market_type):
+            raise ValueError(f"未知的交易對: {symbol}")
+
+    async def _evict(self, count: int = 0) -> None:
+        """
+        停止追蹤閒置超過 idle_seconds 的交易對，再按最久未讀取的順序額外淘汰 count 個
+
+        正在回補的交易對不會被淘汰。
+        """
+        now = time.monotonic()
+        self._last_sweep = now
+        candidates = sorted(
+            (accessed, key) for key, accessed in self._last_access.items() if key not in self._loading
+        )
+        for index, (accessed, (market_type, symbol)) in enumerate(candidates):
+            if now - accessed < self.idle_seconds and index >= count:
+                break
+            self.stats["evicted"] += 1
+            await self.untrack(symbol, market_type)
+
+    async def _ensure(self, symbol: str, market_type: str) -> CandleBuffer:
+        """確保交易對的緩衝區已回補，並發請求共用同一次回補"""
+        key = (market_type, symbol)
+        buffer = self.buffers.get(key)
+        if buffer is not None and buffer.size > 0 and not buffer.has_gap:
+            return buffer
+
+        task = self._loading.get(key)
+        if task is None:
+            task = asyncio.create_task(self._backfill(symbol, market_type))
+            self._loading[key] = task
+            task.add_done_callback(lambda _: self._loading.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def get_candles(self, symbol: str, interval: str = "1m", limit: int = 500, market_type: str = "spot") -> Dict[str, np.ndarray]:
+        """
+        獲取K線數據
+
+        參數:
+            symbol: 交易對，如 BTCUSDT
+            interval: K線週期，見 INTERVAL_MINUTES
+            limit: 返回的K線數量上限，受緩衝區容量限制
+            market_type: 市場類型
+
+        返回:
+            Dict[str, np.ndarray]: 包含 open_time 及 CANDLE_FIELDS 各字段的數組
+
+        異常:
+            ValueError: 不支援的K線週期、無效的交易對或交易對沒有K線數據
+        """
+        minutes = INTERVAL_MINUTES.get(interval)
+        if minutes is None:
+            raise ValueError(f"不支援的K線週期: {interval}")
+        symbol = symbol.upper()
+        key = (market_type, symbol)
+        if key in self.buffers:
+            self._last_access[key] = time.monotonic()
+        else:
+            self._validate_symbol(symbol, market_type)
+        if time.monotonic() - self._last_sweep >= IDLE_SWEEP_INTERVAL:
+            await self._evict()
+        buffer = await self._ensure(symbol, market_type)
+        self._last_access[key] = time.monotonic()
+        self.stats["reads"] += 1
+
+        # 只取足夠重採樣出 limit 根K線的 1 分鐘數據（多取一個週期以補齊開頭不完整的分組）
+        open_time, values = buffer.arrays((limit + 1) * minutes)
+        open_time, values = resample(open_time, values, minutes)
+        open_time, values = open_time[-limit:], values[-limit:]
+
+        candles = {"open_time": open_time}
+        for index, field in enumerate(CANDLE_FIELDS):
+            candles[field] = values[:, index]
+        return candles
+
+    def get_ohlcv(self, candles: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """從K線數組中取出 calculate_technical_indicators 使用的 OHLCV 字段，不複製數據"""
+        return {field: candles[field] for field in ("open", "high", "low", "close", "volume")}
+
+    async def untrack(self, symbol: str, market_type: str = "spot") -> None:
+        """停止追蹤交易對：釋放緩衝區並取消 kline_1m 數據流訂閱"""
+        symbol = symbol.upper()
+        self._last_access.pop((market_type, symbol), None)
+        if self.buffers.pop((market_type, symbol), None) is None:
+            return
+        exchange = market_data_service.get_exchange(self.exchange)
+        if exchange is not None:
+            await exchange.unsubscribe_symbols([symbol], market_type, ["kline_1m"])
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取K線存儲統計信息"""
+        stats = self.stats.copy()
+        stats["tracked"] = len(self.buffers)
+        stats["max_symbols"] = self.max_symbols
+        stats["capacity"] = self.capacity
+        return stats
+
+
+# 創建全局實例
+candle_store = CandleStore()
@@ -10,10 +10,16 @@ from sqlalchemy import desc
 
 from backend.app.db.models.grid import GridStrategy, GridOrder
 from backend.app.db.models.user import User
+from backend.app.schemas.trading import ExchangeEnum
 from backend.app.services.grid.grid_strategy_factory import GridStrategyFactory
+from backend.utils.batch import gather_bounded
+from backend.utils.rate_limiter import exchange_rate_limiter
 
 logger = logging.getLogger(__name__)
 
+# 啟動和停止網格時同時進行的下單/撤單請求數
+GRID_ORDER_CONCURRENCY = 10
+
 class GridService:
     """
     網格交易服務
@@ -130,10 +136,10 @@ class GridService:
             # 計算初始訂單
             initial_orders = strategy.calculate_initial_orders(current_price)
             
-            # 下單並記錄
-            for order in initial_orders:
-                # 通過客戶端下單
-                order_result = await client.place_order(
+            # 以有限並發同時提交所有初始訂單
+            async def _place(order):
+                await self._acquire_order_quota(exchange, client)
+                return await client.place_order(
                     symbol=grid_strategy.symbol,
                     side=order["side"],
                     order_type="LIMIT",
@@ -141,7 +147,20 @@ class GridService:
                     price=float(order["price"]),
                     time_in_force="GTC"
                 )
-                
+            
+            order_results = await gather_bounded(_place, initial_orders, GRID_ORDER_CONCURRENCY)
+            
+            # 任一訂單失敗時撤銷已成功的訂單，策略不會以不完整的網格啟動
+            errors = [result for result in order_results if isinstance(result, Exception)]
+            if errors:
+                placed = [result.get("orderId") for result in order_results
+                          if not isinstance(result, Exception) and result.get("orderId")]
+                logger.error(f"網格策略 {grid_id} 有 {len(errors)}/{len(initial_orders)} 個初始訂單下單失敗，撤銷已下的 {len(placed)} 個訂單")
+                await self._cancel_orders(exchange, client, grid_strategy.symbol, placed)
+                raise errors[0]
+            
+            # 按計算順序記錄訂單
+            for order, order_result in zip(initial_orders, order_results):
                 # 保存訂單信息
                 grid_order = GridOrder(
                     strategy_id=grid_strategy.id,
@@ -209,20 +228,17 @@ class GridService:
                 GridOrder.status == "PLACED"
             ).all()
             
-            for order in active_orders:
-                try:
-                    # 通過客戶端取消訂單
-                    await client.cancel_order(
-                        symbol=order.symbol,
-                        order_id=order.order_id
-                    )
-                    
-                    # 更新訂單狀態
-                    order.status = "CANCELED"
-                    order.updated_at = datetime.utcnow()
+            # 以有限並發同時取消訂單
+            cancel_results = await self._cancel_orders(
+                exchange, client, grid_strategy.symbol, [order.order_id for order in active_orders]
+            )
+            for order, result in zip(active_orders, cancel_results):
+                if isinstance(result, Exception):
+                    continue
                     
-                except Exception as e:
-                    logger.error(f"取消訂單失敗, order_id={order.order_id}: {str(e)}")
+                # 更新訂單狀態
+                order.status = "CANCELED"
+                order.updated_at = datetime.utcnow()
             
             # 更新策略狀態
             grid_strategy.status = "STOPPED"
@@ -237,6 +253,44 @@ class GridService:
             logger.error(f"停止網格策略失敗: {str(e)}")
             raise
     
+    async def _acquire_order_quota(self, exchange: str, client: Any, orders: int = 1) -> None:
+        """
+        通過共享頻率限制器預留額度
+        
+        網格訂單經 WebSocket API 提交，不經過 CCXT，因此在此處計入幣安合約（fapi）的 IP 權重和下單次數。
+        
+        Args:
+            exchange: 交易所
+            client: 交易所客戶端
+            orders: 請求包含的下單數量
+        """
+        if exchange == ExchangeEnum.BINANCE.value:
+            await exchange_rate_limiter.acquire(ExchangeEnum.BINANCE, getattr(client, "api_key", None), 1, orders,
+                                                api="fapi")
+    
+    async def _cancel_orders(self, exchange: str, client: Any, symbol: str, order_ids: List[str]) -> List[Any]:
+        """
+        以有限並發取消訂單，單個訂單失敗只記錄日誌
+        
+        Args:
+            exchange: 交易所
+            client: 交易所客戶端
+            symbol: 交易對
+            order_ids: 訂單ID列表
+            
+        Returns:
+            與 order_ids 順序一致的取消結果，失敗的位置為異常對象
+        """
+        async def _cancel(order_id):
+            await self._acquire_order_quota(exchange, client, orders=0)
+            return await client.cancel_order(symbol=symbol, order_id=order_id)
+        
+        results = await gather_bounded(_cancel, order_ids, GRID_ORDER_CONCURRENCY)
+        for order_id, result in zip(order_ids, results):
+            if isinstance(result, Exception):
+                logger.error(f"取消訂單失敗, order_id={order_id}: {str(result)}")
+        return results
+    
     async def handle_order_filled(self, order_id: str, client: Any) -> Optional[GridStrategy]:
         """
         處理訂單成交事件
@@ -285,6 +339,7 @@ class GridService:
             
             if next_order:
                 # 通過客戶端下單
+                await self._acquire_order_quota(grid_strategy.exchange, client)
                 order_result = await client.place_order(
                     symbol=grid_strategy.symbol,
                     side=next_order["side"],
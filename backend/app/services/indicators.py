@@ -0,0 +1,389 @@
+"""
+技術指標計算引擎
+
+提供兩種計算方式：
+- 向量化計算：以 NumPy 一次計算整個序列。SMA 與移動標準差基於累積和，
+  EMA 與 Wilder 平滑以一階遞歸濾波實現（安裝 SciPy 時使用 lfilter），
+  複雜度與週期長度無關。
+- 增量計算：IndicatorState 保存各指標的內部狀態，每根新K線以 O(1) 更新，
+  不必重新計算整個序列；尚未收盤的K線可用 peek 試算而不改變狀態。
+
+輸出格式與 MarketDataService.calculate_technical_indicators 原有結果相同：
+前期數據不足的位置為 NaN。
+"""
+
+import math
+from collections import deque
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+# 一階遞歸濾波優先使用 SciPy 的 lfilter（可選依賴），未安裝時使用分塊的閉式解
+try:
+    from scipy.signal import lfilter
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+# calculate_indicators 計算的指標及參數，與原有實現一致
+SMA_PERIODS = (5, 10, 20, 50, 200)
+EMA_PERIODS = (5, 10, 20, 50, 200)
+RSI_PERIOD = 14
+BOLLINGER_PERIOD = 20
+BOLLINGER_DEVIATION = 2.0
+MACD_PERIODS = (12, 26, 9)
+DEFAULT_INDICATORS = ("sma", "ema", "rsi", "bollinger", "macd")
+
+
+def _recursive_filter(data: np.ndarray, alpha: float, initial: float) -> np.ndarray:
+    """
+    計算一階遞歸 y[i] = alpha * x[i] + (1 - alpha) * y[i-1]，y[-1] = initial
+
+    未安裝 SciPy 時按塊使用閉式解：
+    y[i] = w^(i+1) * (initial + alpha * Σ x[j] / w^(j+1))，w = 1 - alpha，
+    塊長度限制在 w^-k 不超過 1e100 以內，避免溢出。
+    """
+    n = len(data)
+    if n == 0:
+        return np.empty(0, dtype=np.float64)
+    decay = 1.0 - alpha
+    if SCIPY_AVAILABLE:
+        result, _ = lfilter([alpha], [1.0, -decay], data, zi=[decay * initial])
+        return result
+    if decay == 0.0:
+        return data.astype(np.float64, copy=True)
+
+    block = max(1, int(100 * math.log(10) / -math.log(decay)))
+    result = np.empty(n, dtype=np.float64)
+    powers = decay ** np.arange(1, min(block, n) + 1, dtype=np.float64)
+    previous = initial
+    for start in range(0, n, block):
+        chunk = data[start:start + block]
+        weights = powers[:len(chunk)]
+        values = weights * (previous + alpha * np.cumsum(chunk / weights))
+        result[start:start + len(chunk)] = values
+        previous = values[-1]
+    return result
+
+
+def sma(data: np.ndarray, period: int) -> np.ndarray:
+    """簡單移動平均線，基於累積和計算"""
+    data = np.asarray(data, dtype=np.float64)
+    n = len(data)
+    result = np.full(n, np.nan)
+    if period <= 0 or n < period:
+        return result
+    # 先減去首值再累加，降低長序列累積和的數值誤差
+    cumulative = np.cumsum(np.concatenate(([0.0], data - data[0])))
+    result[period - 1:] = (cumulative[period:] - cumulative[:-period]) / period + data[0]
+    return result
+
+
+def rolling_std(data: np.ndarray, period: int) -> np.ndarray:
+    """移動總體標準差（與 np.std 相同，ddof=0），基於累積和與平方累積和計算"""
+    data = np.asarray(data, dtype=np.float64)
+    n = len(data)
+    result = np.full(n, np.nan)
+    if period <= 0 or n < period:
+        return result
+    centered = data - data.mean()
+    cumulative = np.cumsum(np.concatenate(([0.0], centered)))
+    cumulative_sq = np.cumsum(np.concatenate(([0.0], centered * centered)))
+    window_sum = cumulative[period:] - cumulative[:-period]
+    window_sq = cumulative_sq[period:] - cumulative_sq[:-period]
+    variance = window_sq / period - (window_sum / period) ** 2
+    result[period - 1:] = np.sqrt(np.maximum(variance, 0.0))
+    return result
+
+
+def ema(data: np.ndarray, period: int) -> np.ndarray:
+    """指數移動平均線，以前 period 個值的平均作為起點"""
+    data = np.asarray(data, dtype=np.float64)
+    n = len(data)
+    result = np.full(n, np.nan)
+    if period <= 0 or n < period:
+        return result
+    seed = data[:period].mean()
+    result[period - 1] = seed
+    result[period:] = _recursive_filter(data[period:], 2.0 / (period + 1.0), seed)
+    return result
+
+
+def rsi(data: np.ndarray, period: int = RSI_PERIOD) -> np.ndarray:
+    """相對強弱指標，使用 Wilder 平滑（alpha = 1 / period）"""
+    data = np.asarray(data, dtype=np.float64)
+    n = len(data)
+    result = np.full(n, np.nan)
+    if period <= 0 or n <= period:
+        return result
+    delta = np.diff(data)
+    gain = np.maximum(delta, 0.0)
+    loss = np.maximum(-delta, 0.0)
+
+    alpha = 1.0 / period
+    first_gain = gain[:period].mean()
+    first_loss = loss[:period].mean()
+    avg_gain = np.concatenate(([first_gain], _recursive_filter(gain[period:], alpha, first_gain)))
+    avg_loss = np.concatenate(([first_loss], _recursive_filter(loss[period:], alpha, first_loss)))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        values = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    result[period:] = np.where(avg_loss == 0, 100.0, values)
+    return result
+
+
+def bollinger_bands(data: np.ndarray, period: int = BOLLINGER_PERIOD,
+                    deviation: float = BOLLINGER_DEVIATION) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """布林帶，返回 (上軌, 中軌, 下軌)"""
+    middle = sma(data, period)
+    width = deviation * rolling_std(data, period)
+    return middle + width, middle, middle - width
+
+
+def macd(data: np.ndarray, fast_period: int = 12, slow_period: int = 26,
+         signal_period: int = 9) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """MACD，返回 (MACD線, 信號線, 柱狀圖)；信號線從第一個有效的 MACD 值開始計算"""
+    data = np.asarray(data, dtype=np.float64)
+    macd_line = ema(data, fast_period) - ema(data, slow_period)
+    signal_line = np.full(len(data), np.nan)
+    first = max(fast_period, slow_period) - 1
+    if len(data) > first:
+        signal_line[first:] = ema(macd_line[first:], signal_period)
+    return macd_line, signal_line, macd_line - signal_line
+
+
+def calculate_indicators(ohlcv_data: Dict[str, Any], indicators: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """
+    向量化計算技術指標
+
+    參數:
+        ohlcv_data: 包含OHLCV數據的字典，值可以是列表或 NumPy 數組
+        indicators: 要計算的指標列表，默認計算 sma、ema、rsi、bollinger、macd
+
+    返回:
+        Dict[str, Any]: 各指標的 NumPy 數組，結構與原有實現相同
+    """
+    closes = np.asarray(ohlcv_data.get("close", []), dtype=np.float64)
+    result = {}
+    for indicator in (indicators or DEFAULT_INDICATORS):
+        name = indicator.lower()
+        if name == "sma":
+            result["sma"] = {str(period): sma(closes, period) for period in SMA_PERIODS}
+        elif name == "ema":
+            result["ema"] = {str(period): ema(closes, period) for period in EMA_PERIODS}
+        elif name == "rsi":
+            result["rsi"] = {str(RSI_PERIOD): rsi(closes, RSI_PERIOD)}
+        elif name == "bollinger":
+            upper, middle, lower = bollinger_bands(closes, BOLLINGER_PERIOD, BOLLINGER_DEVIATION)
+            result["bollinger"] = {"upper": upper, "middle": middle, "lower": lower}
+        elif name == "macd":
+            macd_line, signal_line, histogram = macd(closes, *MACD_PERIODS)
+            result["macd"] = {"macd": macd_line, "signal": signal_line, "histogram": histogram}
+    return result
+
+
+class RollingWindow:
+    """固定長度的滑動窗口，O(1) 維護窗口內的和與平方和"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.values = deque(maxlen=period)
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.count = 0  # 已加入的數值數，用於定期重新求和以消除累積誤差
+
+    def _sums_with(self, value: float) -> Tuple[float, float, int]:
+        """加入 value 後的 (和, 平方和, 窗口長度)，不修改狀態"""
+        total = self.total + value
+        total_sq = self.total_sq + value * value
+        size = len(self.values) + 1
+        if size > self.period:
+            oldest = self.values[0]
+            total -= oldest
+            total_sq -= oldest * oldest
+            size = self.period
+        return total, total_sq, size
+
+    def push(self, value: float) -> None:
+        """加入一個數值，超出窗口的最舊數值自動移除"""
+        self.total, self.total_sq, _ = self._sums_with(value)
+        self.values.append(value)
+        self.count += 1
+        if self.count % (self.period * 64) == 0:
+            self.total = math.fsum(self.values)
+            self.total_sq = math.fsum(v * v for v in self.values)
+
+    def mean_std(self, value: Optional[float] = None) -> Tuple[float, float]:
+        """窗口的平均值與總體標準差；傳入 value 時為加入該值後的試算結果"""
+        if value is None:
+            total, total_sq, size = self.total, self.total_sq, len(self.values)
+        else:
+            total, total_sq, size = self._sums_with(value)
+        if size < self.period:
+            return math.nan, math.nan
+        mean = total / size
+        return mean, math.sqrt(max(total_sq / size - mean * mean, 0.0))
+
+
+class IncrementalEMA:
+    """增量指數移動平均，前 period 個值的平均作為起點"""
+
+    def __init__(self, period: int, alpha: Optional[float] = None):
+        self.period = period
+        self.alpha = alpha if alpha is not None else 2.0 / (period + 1.0)
+        self.value = math.nan
+        self._seed_sum = 0.0
+        self._seed_count = 0
+
+    def compute(self, value: float) -> float:
+        """加入 value 後的 EMA 值，不修改狀態"""
+        if self._seed_count < self.period:
+            if self._seed_count + 1 < self.period:
+                return math.nan
+            return (self._seed_sum + value) / self.period
+        return self.alpha * value + (1.0 - self.alpha) * self.value
+
+    def push(self, value: float) -> float:
+        """加入一個數值並返回新的 EMA 值"""
+        self.value = self.compute(value)
+        if self._seed_count < self.period:
+            self._seed_sum += value
+            self._seed_count += 1
+        return self.value
+
+
+class IncrementalRSI:
+    """增量相對強弱指標（Wilder 平滑）"""
+
+    def __init__(self, period: int = RSI_PERIOD):
+        self.period = period
+        self.previous = math.nan
+        self.avg_gain = IncrementalEMA(period, 1.0 / period)
+        self.avg_loss = IncrementalEMA(period, 1.0 / period)
+
+    @staticmethod
+    def _rsi(avg_gain: float, avg_loss: float) -> float:
+        if math.isnan(avg_gain) or math.isnan(avg_loss):
+            return math.nan
+        if avg_loss == 0:
+            return 100.0
+        return 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+    def compute(self, value: float) -> float:
+        """加入 value 後的 RSI 值，不修改狀態"""
+        if math.isnan(self.previous):
+            return math.nan
+        delta = value - self.previous
+        return self._rsi(self.avg_gain.compute(max(delta, 0.0)), self.avg_loss.compute(max(-delta, 0.0)))
+
+    def push(self, value: float) -> float:
+        """加入一個數值並返回新的 RSI 值"""
+        if math.isnan(self.previous):
+            self.previous = value
+            return math.nan
+        delta = value - self.previous
+        self.previous = value
+        return self._rsi(self.avg_gain.push(max(delta, 0.0)), self.avg_loss.push(max(-delta, 0.0)))
+
+
+class IncrementalMACD:
+    """增量 MACD，信號線從第一個有效的 MACD 值開始計算"""
+
+    def __init__(self, fast_period: int = 12, slow_period: int = 26, signal_period: int = 9):
+        self.fast = IncrementalEMA(fast_period)
+        self.slow = IncrementalEMA(slow_period)
+        self.signal = IncrementalEMA(signal_period)
+
+    def compute(self, value: float) -> Tuple[float, float, float]:
+        """加入 value 後的 (MACD, 信號線, 柱狀圖)，不修改狀態"""
+        macd_value = self.fast.compute(value) - self.slow.compute(value)
+        signal_value = self.signal.compute(macd_value) if not math.isnan(macd_value) else math.nan
+        return macd_value, signal_value, macd_value - signal_value
+
+    def push(self, value: float) -> Tuple[float, float, float]:
+        """加入一個數值並返回新的 (MACD, 信號線, 柱狀圖)"""
+        macd_value = self.fast.push(value) - self.slow.push(value)
+        signal_value = self.signal.push(macd_value) if not math.isnan(macd_value) else math.nan
+        return macd_value, signal_value, macd_value - signal_value
+
+
+class IndicatorState:
+    """
+    增量技術指標狀態
+
+    每根收盤K線調用 update 以 O(1) 更新全部指標；未收盤的K線調用 peek
+    取得試算值，狀態保持不變，收盤後再以最終收盤價 update。
+    結果為各指標的最新值，鍵與 calculate_indicators 相同。
+    """
+
+    def __init__(self, indicators: Optional[Iterable[str]] = None):
+        self.indicators = tuple(name.lower() for name in (indicators or DEFAULT_INDICATORS))
+        self.sma = {period: RollingWindow(period) for period in SMA_PERIODS}
+        self.ema = {period: IncrementalEMA(period) for period in EMA_PERIODS}
+        self.rsi = IncrementalRSI(RSI_PERIOD)
+        self.bollinger = RollingWindow(BOLLINGER_PERIOD)
+        self.macd = IncrementalMACD(*MACD_PERIODS)
+        self.count = 0
+        self.latest: Dict[str, Any] = {}
+
+    @classmethod
+    def from_history(cls, closes: Iterable[float], indicators: Optional[Iterable[str]] = None) -> "IndicatorState":
+        """以歷史收盤價初始化狀態"""
+        state = cls(indicators)
+        for value in closes:
+            state.update(float(value))
+        return state
+
+    def _result(self, value: float, commit: bool) -> Dict[str, Any]:
+        """計算加入 value 後的各指標值，commit 為 True 時同時更新狀態"""
+        result = {}
+        for name in self.indicators:
+            if name == "sma":
+                values = {}
+                for period, window in self.sma.items():
+                    if commit:
+                        window.push(value)
+                        values[str(period)] = window.mean_std()[0]
+                    else:
+                        values[str(period)] = window.mean_std(value)[0]
+                result["sma"] = values
+            elif name == "ema":
+                result["ema"] = {
+                    str(period): (average.push(value) if commit else average.compute(value))
+                    for period, average in self.ema.items()
+                }
+            elif name == "rsi":
+                result["rsi"] = {str(RSI_PERIOD): self.rsi.push(value) if commit else self.rsi.compute(value)}
+            elif name == "bollinger":
+                if commit:
+                    self.bollinger.push(value)
+                    middle, std = self.bollinger.mean_std()
+                else:
+                    middle, std = self.bollinger.mean_std(value)
+                width = BOLLINGER_DEVIATION * std
+                result["bollinger"] = {"upper": middle + width, "middle": middle, "lower": middle - width}
+            elif name == "macd":
+                macd_value, signal_value, histogram = self.macd.push(value) if commit else self.macd.compute(value)
+                result["macd"] = {"macd": macd_value, "signal": signal_value, "histogram": histogram}
+        return result
+
+    def update(self, close: float) -> Dict[str, Any]:
+        """加入一根收盤K線，返回各指標的最新值"""
+        self.latest = self._result(close, commit=True)
+        self.count += 1
+        return self.latest
+
+    def peek(self, close: float) -> Dict[str, Any]:
+        """以未收盤K線的當前價格試算各指標，不修改狀態"""
+        return self._result(close, commit=False)
+
+
+def to_json_values(result: Any) -> Any:
+    """將指標結果中的 NumPy 數組和 NaN 轉換為可 JSON 序列化的列表和 None"""
+    if isinstance(result, dict):
+        return {key: to_json_values(value) for key, value in result.items()}
+    if isinstance(result, np.ndarray):
+        return [None if math.isnan(value) else value for value in result.tolist()]
+    if isinstance(result, float) and math.isnan(result):
+        return None
+    return result
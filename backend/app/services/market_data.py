@@ -1,7 +1,11 @@
+import asyncio
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Iterable
 from app.core.exchanges.base import ExchangeBase
 from app.core.exchanges.binance import BinanceExchange
+from app.core.exchanges.ticker_store import TickerStore
+from app.core.market_data_bus import market_data_bus
+from app.services import indicators as indicator_engine
 
 # 导入Cython优化模块
 try:
@@ -9,10 +13,9 @@ try:
     import logging
     logging.info("使用Cython加速版技術指標計算函數")
 except ImportError:
-    # 如果导入失败，使用原生Python版本
+    # 如果导入失败，使用NumPy向量化实现
     CYTHON_ENABLED = False
-    logging.warning("Cython模块导入失败，使用Python原生实现")
-    import numpy as np
+    logging.warning("Cython模块导入失败，使用NumPy向量化实现")
 
 # 初始化日誌記錄器，用於記錄市場數據服務的運行情況
 logger = logging.getLogger(__name__)
@@ -36,6 +39,7 @@ class MarketDataService:
         呼叫初始化方法設置支援的交易所。
         """
         self.exchanges: Dict[str, ExchangeBase] = {}  # 交易所字典，鍵為交易所名稱，值為交易所實例
+        self.bus = market_data_bus  # 市場數據總線，交易所數據流在此發布增量更新
         self._initialize_exchanges()  # 初始化支援的交易所
         
     def _initialize_exchanges(self):
@@ -145,6 +149,43 @@ class MarketDataService:
             logger.error(f"獲取{exchange}交易所{market_type}市場全部行情時出錯: {str(e)}")
             return {}
             
+    def get_ticker_store(self, exchange: str = "binance", market_type: str = "spot") -> Optional[TickerStore]:
+        """
+        獲取交易所的列式行情存儲
+        
+        供需要向量化讀取全市場行情、或只為部分交易對按需生成字典的調用方使用。
+        
+        參數:
+            exchange: 交易所名稱，預設為 "binance"
+            market_type: 市場類型，預設為 "spot"
+            
+        返回:
+            TickerStore，交易所不存在或不使用列式存儲時返回None
+        """
+        market_data = getattr(self.exchanges.get(exchange), "market_data", None)
+        store = market_data.get(market_type) if isinstance(market_data, dict) else None
+        return store if isinstance(store, TickerStore) else None
+
+    def is_known_symbol(self, symbol: str, exchange: str = "binance", market_type: str = "spot") -> bool:
+        """
+        檢查交易對名稱是否有效且存在於行情表中
+        
+        用於在訂閱逐交易對數據流或回補數據前過濾客戶端傳入的交易對；
+        行情表尚未收到數據（數據流未連接）時只檢查名稱格式。
+        
+        參數:
+            symbol: 交易對（大寫），如 BTCUSDT
+            exchange: 交易所名稱，預設為 "binance"
+            market_type: 市場類型，預設為 "spot"
+            
+        返回:
+            名稱有效且交易對存在（或行情表為空）時返回True
+        """
+        if not symbol.isalnum():
+            return False
+        store = self.get_ticker_store(exchange, market_type)
+        return store is None or len(store) == 0 or symbol in store
+            
     def get_ticker(self, symbol: str, exchange: str = "binance", market_type: str = "spot") -> Optional[Dict[str, Any]]:
         """
         獲取指定交易對的行情
@@ -241,6 +282,118 @@ class MarketDataService:
             logger.error(f"取消訂閱{exchange}交易所{market_type}市場交易對時出錯: {str(e)}")
             return False
             
+    def get_book_ticker(self, symbol: str, exchange: str = "binance", market_type: str = "spot") -> Optional[Dict[str, Any]]:
+        """
+        獲取指定交易對的最優買賣價
+        
+        只有通過 subscribe_symbols 訂閱了該交易對時才有數據。
+        
+        參數:
+            symbol: 交易對名稱，例如 "BTCUSDT"
+            exchange: 交易所名稱，預設為 "binance"
+            market_type: 市場類型，可選 "spot"（現貨）或 "futures"（期貨），預設為 "spot"
+            
+        返回:
+            最優買賣價數據字典，未訂閱或交易所不存在時返回None
+        """
+        try:
+            if exchange in self.exchanges:
+                return self.exchanges[exchange].get_book_ticker(symbol, market_type)
+            return None
+        except Exception as e:
+            logger.error(f"獲取{exchange}交易所{market_type}市場{symbol}最優買賣價時出錯: {str(e)}")
+            return None
+            
+    def subscribe_updates(self, exchange: str = "binance", market_type: str = "spot", maxsize: Optional[int] = None) -> asyncio.Queue:
+        """
+        訂閱交易所數據流推送的增量更新
+        
+        參數:
+            exchange: 交易所名稱，預設為 "binance"
+            market_type: 市場類型，可選 "spot"（現貨）或 "futures"（期貨），預設為 "spot"
+            maxsize: 隊列最大長度，隊列已滿時丟棄最舊的更新
+            
+        返回:
+            asyncio.Queue: 元素為 (序列號, {交易對: 行情數據}) 的隊列，
+            使用完畢後需調用 unsubscribe_updates 釋放
+        """
+        return self.bus.subscribe(exchange, market_type, maxsize)
+        
+    def unsubscribe_updates(self, queue: asyncio.Queue, exchange: str = "binance", market_type: str = "spot") -> None:
+        """
+        取消增量更新訂閱
+        
+        參數:
+            queue: subscribe_updates 返回的隊列
+            exchange: 交易所名稱，預設為 "binance"
+            market_type: 市場類型，預設為 "spot"
+        """
+        self.bus.unsubscribe(exchange, market_type, queue)
+        
+    async def wait_for_update(self, exchange: str = "binance", market_type: str = "spot", timeout: Optional[float] = None) -> Optional[int]:
+        """
+        等待指定市場的下一次數據流更新
+        
+        參數:
+            exchange: 交易所名稱，預設為 "binance"
+            market_type: 市場類型，預設為 "spot"
+            timeout: 超時秒數，None 表示一直等待
+            
+        返回:
+            更新的序列號，超時返回None
+        """
+        return await self.bus.wait_for_update(exchange, market_type, timeout)
+        
+    async def wait_for_any_update(self, market_types: Iterable[str], exchange: str = "binance", timeout: Optional[float] = None) -> List[str]:
+        """
+        等待多個市場中任意一個的數據流更新
+        
+        參數:
+            market_types: 市場類型列表，例如 ["spot", "futures"]
+            exchange: 交易所名稱，預設為 "binance"
+            timeout: 超時秒數，None 表示一直等待
+            
+        返回:
+            List[str]: 在等待期間收到更新的市場類型列表，超時返回空列表
+        """
+        tasks = {
+            asyncio.create_task(self.bus.wait_for_update(exchange, market_type)): market_type
+            for market_type in market_types
+        }
+        try:
+            done, _ = await asyncio.wait(tasks.keys(), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            return [tasks[task] for task in done if task.result() is not None]
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                    
+    def is_stream_stale(self, exchange: str = "binance", market_type: str = "spot") -> bool:
+        """
+        檢查指定市場的數據流是否過期
+        
+        返回:
+            從未收到數據流更新、更新已超過總線過期閾值，或交易所報告行情流已中斷時返回True，
+            此時調用方應使用REST快照作為後備數據來源
+        """
+        if self.bus.is_stale(exchange, market_type):
+            return True
+        exchange_obj = self.exchanges.get(exchange)
+        return hasattr(exchange_obj, "is_stream_stale") and exchange_obj.is_stream_stale(market_type)
+        
+    def get_stream_status(self, exchange: str = "binance") -> Dict[str, Any]:
+        """
+        獲取交易所各市場行情流的狀態
+        
+        返回:
+            Dict[str, Any]: {市場類型: {"connected", "stale", "staleness_seconds", ...}}，
+            交易所不支援時返回空字典
+        """
+        exchange_obj = self.exchanges.get(exchange)
+        if not hasattr(exchange_obj, "get_stream_status"):
+            return {}
+        return exchange_obj.get_stream_status()
+            
     def calculate_technical_indicators(self, 
                                      ohlcv_data: Dict[str, List[float]], 
                                      indicators: List[str] = None) -> Dict[str, Any]:
@@ -264,161 +417,45 @@ class MarketDataService:
         if CYTHON_ENABLED:
             return calculate_indicators(ohlcv_data, indicators)
             
-        # 否则使用原生Python实现
-        result = {}
-        
-        # 确保数据正确转换为NumPy数组
-        closes = np.array(ohlcv_data.get('close', []), dtype=np.float64)
-        
-        # 计算所需指标
-        for indicator in indicators:
-            if indicator.lower() == 'sma':
-                result['sma'] = {
-                    '5': self._calculate_sma(closes, 5),
-                    '10': self._calculate_sma(closes, 10),
-                    '20': self._calculate_sma(closes, 20),
-                    '50': self._calculate_sma(closes, 50),
-                    '200': self._calculate_sma(closes, 200)
-                }
-            elif indicator.lower() == 'ema':
-                result['ema'] = {
-                    '5': self._calculate_ema(closes, 5),
-                    '10': self._calculate_ema(closes, 10),
-                    '20': self._calculate_ema(closes, 20),
-                    '50': self._calculate_ema(closes, 50),
-                    '200': self._calculate_ema(closes, 200)
-                }
-            elif indicator.lower() == 'rsi':
-                result['rsi'] = {
-                    '14': self._calculate_rsi(closes, 14)
-                }
-            elif indicator.lower() == 'bollinger':
-                upper, middle, lower = self._calculate_bollinger_bands(closes, 20, 2.0)
-                result['bollinger'] = {
-                    'upper': upper,
-                    'middle': middle,
-                    'lower': lower
-                }
-            elif indicator.lower() == 'macd':
-                macd_line, signal_line, histogram = self._calculate_macd(closes, 12, 26, 9)
-                result['macd'] = {
-                    'macd': macd_line,
-                    'signal': signal_line,
-                    'histogram': histogram
-                }
-        
-        return result
+        # 否则使用NumPy向量化实现
+        return indicator_engine.calculate_indicators(ohlcv_data, indicators)
     
-    def _calculate_sma(self, data, period):
-        """简单移动平均线计算"""
-        n = len(data)
-        result = np.zeros(n)
-        result[:period-1] = np.nan
+    def create_indicator_state(self, ohlcv_data: Dict[str, List[float]], 
+                               indicators: List[str] = None) -> indicator_engine.IndicatorState:
+        """
+        创建增量技术指标状态
+        
+        以历史收盘价初始化，之后每根收盘K线调用 update 以 O(1) 更新，
+        无需对整个序列重新调用 calculate_technical_indicators
         
-        # 使用滑动窗口计算
-        for i in range(period-1, n):
-            result[i] = np.mean(data[i-period+1:i+1])
+        参数:
+            ohlcv_data: 包含OHLCV数据的字典
+            indicators: 要计算的指标列表
             
-        return result
+        返回:
+            IndicatorState: 增量指标状态
+        """
+        return indicator_engine.IndicatorState.from_history(ohlcv_data.get('close', []), indicators)
+    
+    def _calculate_sma(self, data, period):
+        """简单移动平均线计算"""
+        return indicator_engine.sma(data, period)
     
     def _calculate_ema(self, data, period):
         """指数移动平均线计算"""
-        n = len(data)
-        result = np.zeros(n)
-        alpha = 2.0 / (period + 1.0)
-        
-        # 前period-1个点设为NaN
-        result[:period-1] = np.nan
-        
-        # 计算第一个EMA值
-        result[period-1] = np.mean(data[:period])
-        
-        # 计算其余EMA值
-        for i in range(period, n):
-            result[i] = data[i] * alpha + result[i-1] * (1.0 - alpha)
-            
-        return result
+        return indicator_engine.ema(data, period)
     
     def _calculate_rsi(self, data, period):
         """相对强弱指标计算"""
-        n = len(data)
-        result = np.zeros(n)
-        delta = np.zeros(n)
-        
-        # 计算价格变化
-        for i in range(1, n):
-            delta[i] = data[i] - data[i-1]
-        
-        # 分离涨跌
-        gain = np.zeros(n)
-        loss = np.zeros(n)
-        
-        for i in range(1, n):
-            if delta[i] > 0:
-                gain[i] = delta[i]
-            elif delta[i] < 0:
-                loss[i] = -delta[i]
-        
-        # 计算平均涨幅和跌幅
-        avg_gain = np.zeros(n)
-        avg_loss = np.zeros(n)
-        
-        # 计算第一个值
-        avg_gain[period] = np.sum(gain[1:period+1]) / period
-        avg_loss[period] = np.sum(loss[1:period+1]) / period
-        
-        # 计算其余值
-        for i in range(period+1, n):
-            avg_gain[i] = (avg_gain[i-1] * (period-1) + gain[i]) / period
-            avg_loss[i] = (avg_loss[i-1] * (period-1) + loss[i]) / period
-        
-        # 计算相对强度
-        rs = np.zeros(n)
-        for i in range(period, n):
-            if avg_loss[i] == 0:
-                result[i] = 100
-            else:
-                rs[i] = avg_gain[i] / avg_loss[i]
-                result[i] = 100 - (100 / (1 + rs[i]))
-        
-        # 前期值设为NaN
-        result[:period] = np.nan
-        
-        return result
+        return indicator_engine.rsi(data, period)
     
     def _calculate_bollinger_bands(self, data, period=20, deviation=2.0):
         """布林带计算"""
-        # 计算中轨(SMA)
-        middle = self._calculate_sma(data, period)
-        
-        # 计算标准差
-        std = np.zeros(len(data))
-        for i in range(period-1, len(data)):
-            window = data[i-period+1:i+1]
-            std[i] = np.std(window)
-        
-        # 计算上轨和下轨
-        upper = middle + deviation * std
-        lower = middle - deviation * std
-        
-        return upper, middle, lower
+        return indicator_engine.bollinger_bands(data, period, deviation)
     
     def _calculate_macd(self, data, fast_period=12, slow_period=26, signal_period=9):
         """MACD计算"""
-        # 计算快线和慢线
-        fast_ema = self._calculate_ema(data, fast_period)
-        slow_ema = self._calculate_ema(data, slow_period)
-        
-        # 计算MACD线
-        macd_line = fast_ema - slow_ema
-        
-        # 计算信号线
-        signal_line = self._calculate_ema(macd_line, signal_period)
-        
-        # 计算直方图
-        histogram = macd_line - signal_line
-        
-        return macd_line, signal_line, histogram
+        return indicator_engine.macd(data, fast_period, slow_period, signal_period)
     
     def get_exchange(self, exchange: str) -> Optional[ExchangeBase]:
         """
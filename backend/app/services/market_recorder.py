@@ -0,0 +1,276 @@
+"""
+行情歷史記錄服務
+
+將市場數據總線上的行情更新和已收盤的 1 分鐘K線追加寫入按日分區的列式文件：
+每個（類型, 交易所_市場, 日期, 交易對）一個文件，內容為定長的 NumPy 結構化記錄，
+沒有文件頭，按時間戳遞增排列。寫入只追加，讀取時以內存映射打開文件，
+用二分查找定位時間範圍後只複製所需的記錄，不會載入整個文件。
+
+目錄結構:
+    <MARKET_RECORDER_DIR>/ticker/binance_spot/20240101/BTCUSDT.bin
+    <MARKET_RECORDER_DIR>/kline_1m/binance_futures/20240101/BTCUSDT.bin
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.candle_store import CANDLE_FIELDS, INTERVAL_MINUTES, MINUTE_MS, resample
+from app.services.market_data import market_data_service
+
+logger = logging.getLogger(__name__)
+
+DAY_MS = 86_400_000
+
+# 行情記錄：交易所事件時間（毫秒）及主要行情字段
+TICKER_DTYPE = np.dtype([("timestamp", "<i8")] + [
+    (field, "<f8") for field in (
+        "price", "price_change_24h", "volume_24h", "quote_volume_24h",
+        "high_24h", "low_24h", "bid_price", "ask_price"
+    )
+])
+
+# K線記錄：開盤時間（毫秒）及 OHLCV 字段
+CANDLE_DTYPE = np.dtype([("timestamp", "<i8")] + [(field, "<f8") for field in CANDLE_FIELDS])
+
+# 記錄類型 → 記錄格式
+RECORD_DTYPES = {"ticker": TICKER_DTYPE, "kline_1m": CANDLE_DTYPE}
+
+MARKET_TYPES = ("spot", "futures")
+
+# 緩衝中的記錄鍵: (記錄類型, 市場類型, 日期序號, 交易對)
+BufferKey = Tuple[str, str, int, str]
+
+
+def _day_name(day: int) -> str:
+    """日期序號（自1970-01-01起的天數）轉換為目錄名，如 20240101"""
+    return (datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(days=day)).strftime("%Y%m%d")
+
+
+class MarketRecorder:
+    """
+    行情歷史記錄器
+
+    總線回調只把記錄追加到內存緩衝區，由後台任務按 flush_interval 批量寫盤，
+    文件寫入在線程中執行，不阻塞事件循環。
+    """
+
+    def __init__(self, root: Optional[str] = None, flush_interval: Optional[float] = None, exchange: str = "binance"):
+        """
+        初始化記錄器
+
+        參數:
+            root: 數據目錄，默認讀取 MARKET_RECORDER_DIR
+            flush_interval: 寫盤間隔（秒），默認讀取 MARKET_RECORDER_FLUSH_INTERVAL
+            exchange: 交易所名稱
+        """
+        self.root = root or settings.MARKET_RECORDER_DIR
+        self.flush_interval = flush_interval or settings.MARKET_RECORDER_FLUSH_INTERVAL
+        self.exchange = exchange
+        self._buffers: Dict[BufferKey, List[Tuple[Any, ...]]] = {}
+        # 每個 (記錄類型, 市場類型, 交易對) 最後記錄的時間戳，保證文件內時間戳嚴格遞增
+        self._last_timestamp: Dict[Tuple[str, str, str], int] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"records": 0, "skipped": 0, "flushes": 0, "bytes_written": 0, "write_errors": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def path(self, kind: str, market_type: str, day: int, symbol: str) -> str:
+        """記錄文件路徑"""
+        return os.path.join(self.root, kind, f"{self.exchange}_{market_type}", _day_name(day), f"{symbol}.bin")
+
+    def _append(self, kind: str, market_type: str, symbol: str, timestamp: int, values: Tuple[float, ...]) -> None:
+        """將一條記錄放入緩衝區，時間戳不大於上一條記錄時丟棄"""
+        last_key = (kind, market_type, symbol)
+        if timestamp <= self._last_timestamp.get(last_key, 0):
+            self.stats["skipped"] += 1
+            return
+        self._last_timestamp[last_key] = timestamp
+        key = (kind, market_type, timestamp // DAY_MS, symbol)
+        rows = self._buffers.get(key)
+        if rows is None:
+            rows = self._buffers[key] = []
+        rows.append((timestamp,) + values)
+        self.stats["records"] += 1
+
+    def _on_ticker(self, exchange: str, market_type: str, deltas: Dict[str, Any], sequence: int) -> None:
+        """市場數據總線回調，記錄行情更新"""
+        fields = TICKER_DTYPE.names[1:]
+        now = int(time.time() * 1000)
+        for symbol, ticker in deltas.items():
+            timestamp = int(ticker.get("event_time") or now)
+            self._append("ticker", market_type, symbol, timestamp, tuple(ticker.get(field, 0.0) for field in fields))
+
+    def _on_kline(self, exchange: str, topic: str, deltas: Dict[str, Dict[str, Any]], sequence: int) -> None:
+        """市場數據總線回調，只記錄已收盤的K線"""
+        market_type = topic.split("@", 1)[0]
+        for symbol, kline in deltas.items():
+            if not kline.get("closed"):
+                continue
+            self._append("kline_1m", market_type, symbol, int(kline["open_time"]),
+                         tuple(kline.get(field, 0.0) for field in CANDLE_FIELDS))
+
+    def _write(self, batch: Dict[BufferKey, List[Tuple[Any, ...]]]) -> int:
+        """將一批緩衝記錄追加到文件（在線程中執行），返回寫入的字節數"""
+        written = 0
+        for (kind, market_type, day, symbol), rows in batch.items():
+            path = self.path(kind, market_type, day, symbol)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            data = np.array(rows, dtype=RECORD_DTYPES[kind]).tobytes()
+            with open(path, "ab") as file:
+                file.write(data)
+            written += len(data)
+        return written
+
+    async def flush(self) -> None:
+        """將緩衝區中的記錄寫入文件"""
+        if not self._buffers:
+            return
+        batch, self._buffers = self._buffers, {}
+        try:
+            self.stats["bytes_written"] += await asyncio.to_thread(self._write, batch)
+            self.stats["flushes"] += 1
+        except Exception as e:
+            self.stats["write_errors"] += 1
+            logger.error(f"寫入行情歷史記錄失敗: {str(e)}")
+
+    async def _flush_loop(self) -> None:
+        """後台寫盤循環"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self) -> None:
+        """註冊總線監聽器並啟動後台寫盤任務"""
+        if self.running:
+            return
+        bus = market_data_service.bus
+        for market_type in MARKET_TYPES:
+            bus.add_listener(self.exchange, market_type, self._on_ticker)
+            bus.add_listener(self.exchange, f"{market_type}@kline_1m", self._on_kline)
+        self._task = asyncio.create_task(self._flush_loop())
+        logger.info(f"行情歷史記錄器已啟動，數據目錄: {os.path.abspath(self.root)}")
+
+    async def stop(self) -> None:
+        """移除總線監聽器，停止後台任務並寫入剩餘記錄"""
+        if self._task is None:
+            return
+        bus = market_data_service.bus
+        for market_type in MARKET_TYPES:
+            bus.remove_listener(self.exchange, market_type, self._on_ticker)
+            bus.remove_listener(self.exchange, f"{market_type}@kline_1m", self._on_kline)
+        task, self._task = self._task, None
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await self.flush()
+
+    def _read_file(self, path: str, dtype: np.dtype, start: int, end: int) -> Optional[np.ndarray]:
+        """以內存映射讀取文件中 [start, end] 時間範圍的記錄"""
+        try:
+            count = os.path.getsize(path) // dtype.itemsize
+        except OSError:
+            return None
+        if count == 0:
+            return None
+        # 只映射完整的記錄，寫入中斷留下的不完整尾部會被忽略
+        records = np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+        timestamps = records["timestamp"]
+        low = int(np.searchsorted(timestamps, start, side="left"))
+        high = int(np.searchsorted(timestamps, end, side="right"))
+        if low >= high:
+            return None
+        result = np.array(records[low:high])
+        del records
+        return result
+
+    def read(self, kind: str, symbol: str, start: int, end: int, market_type: str = "spot", limit: Optional[int] = None) -> np.ndarray:
+        """
+        讀取時間範圍內的歷史記錄
+
+        參數:
+            kind: 記錄類型，'ticker' 或 'kline_1m'
+            symbol: 交易對，如 BTCUSDT
+            start: 開始時間（毫秒，包含）
+            end: 結束時間（毫秒，包含）
+            market_type: 市場類型
+            limit: 最多返回的記錄數，從開始時間起算
+
+        返回:
+            np.ndarray: 結構化記錄數組，字段見 TICKER_DTYPE / CANDLE_DTYPE
+
+        異常:
+            ValueError: 不支援的記錄類型、市場類型或無效的交易對名稱
+        """
+        dtype = RECORD_DTYPES.get(kind)
+        if dtype is None:
+            raise ValueError(f"不支援的記錄類型: {kind}")
+        if market_type not in MARKET_TYPES:
+            raise ValueError(f"不支援的市場類型: {market_type}")
+        symbol = symbol.upper()
+        if not symbol.isalnum():
+            raise ValueError(f"無效的交易對: {symbol}")
+
+        chunks = []
+        remaining = limit
+        for day in range(max(start, 0) // DAY_MS, max(end, 0) // DAY_MS + 1):
+            chunk = self._read_file(self.path(kind, market_type, day, symbol), dtype, start, end)
+            if chunk is None:
+                continue
+            if remaining is not None:
+                chunk = chunk[:remaining]
+                remaining -= len(chunk)
+            chunks.append(chunk)
+            if remaining is not None and remaining <= 0:
+                break
+        return np.concatenate(chunks) if chunks else np.empty(0, dtype=dtype)
+
+    def read_candles(self, symbol: str, start: int, end: int, interval: str = "1m", market_type: str = "spot",
+                     limit: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """
+        讀取歷史K線，1 分鐘以上的週期由 1 分鐘K線重採樣
+
+        參數:
+            limit: 最多返回的K線數量，從開始時間起算；結束時間會被收窄到這些K線覆蓋的範圍
+
+        返回:
+            Dict[str, np.ndarray]: 與 CandleStore.get_candles 相同格式的數組字典
+
+        異常:
+            ValueError: 不支援的K線週期
+        """
+        minutes = INTERVAL_MINUTES.get(interval)
+        if minutes is None:
+            raise ValueError(f"不支援的K線週期: {interval}")
+        if limit is not None:
+            period = minutes * MINUTE_MS
+            end = min(end, start - start % period + limit * period - 1)
+        records = self.read("kline_1m", symbol, start, end, market_type)
+        open_time = records["timestamp"]
+        values = np.column_stack([records[field] for field in CANDLE_FIELDS]) if len(records) else np.empty((0, len(CANDLE_FIELDS)))
+        open_time, values = resample(open_time, values, minutes)
+        if limit is not None:
+            open_time, values = open_time[:limit], values[:limit]
+        candles = {"open_time": open_time}
+        for index, field in enumerate(CANDLE_FIELDS):
+            candles[field] = values[:, index]
+        return candles
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取記錄器統計信息"""
+        stats = self.stats.copy()
+        stats["running"] = self.running
+        stats["buffered"] = sum(len(rows) for rows in self._buffers.values())
+        stats["root"] = self.root
+        return stats
+
+
+# 創建全局實例
+market_recorder = MarketRecorder()
@@ -0,0 +1,432 @@
+"""
+訂單簿深度緩存服務
+
+為每個關注的（市場類型, 交易對）在內存中維護一份本地訂單簿：
+先訂閱 <symbol>@depth@100ms 增量數據流並緩衝事件，再通過 REST /depth 獲取快照，
+按幣安的更新ID規則丟棄過期事件並依序應用增量；發現序號不連續時自動重新同步。
+買賣兩側各以按價格升序排列的 NumPy 數組保存，讀取前N檔、價差和中間價只需切片。
+
+本地訂單簿只為 WebSocket 推送端（watch/unwatch）維護；一次性的 REST 查詢在沒有
+已維護的訂單簿時直接返回 REST 快照，不創建訂單簿也不訂閱數據流。
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.http_client import http_clients
+from app.services.market_data import market_data_service
+
+logger = logging.getLogger(__name__)
+
+# 增量深度數據流類型
+DEPTH_STREAM = "depth@100ms"
+
+# REST 快照的檔位數量，現貨和期貨均支援 1000
+SNAPSHOT_LIMIT = 1000
+
+# REST /depth 接受的檔位數量，一次性查詢取不小於請求檔位的最小值
+REST_DEPTH_LIMITS = (5, 10, 20, 50, 100, 500, 1000)
+
+# 同步期間緩衝的增量事件上限，超出時丟棄最舊的事件並在快照後重新檢查序號
+MAX_PENDING_EVENTS = 1000
+
+# 快照與緩衝事件無法銜接時的最大重試次數
+MAX_SYNC_ATTEMPTS = 3
+
+
+def _levels(levels: List[List[Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    """將 [[價格, 數量], ...] 轉換為價格和數量數組"""
+    if not levels:
+        empty = np.empty(0, dtype=np.float64)
+        return empty, empty
+    array = np.array(levels, dtype=np.float64)[:, :2]
+    return array[:, 0].copy(), array[:, 1].copy()
+
+
+class BookSide:
+    """
+    訂單簿的一側
+
+    價格按升序保存（買盤最優價在末尾，賣盤最優價在開頭），數量為0的檔位會被移除。
+    """
+
+    def __init__(self, descending: bool):
+        """
+        參數:
+            descending: 是否為買盤（最優價為最高價）
+        """
+        self.descending = descending
+        self.prices = np.empty(0, dtype=np.float64)
+        self.quantities = np.empty(0, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def load(self, prices: np.ndarray, quantities: np.ndarray) -> None:
+        """以快照替換整側檔位"""
+        order = np.argsort(prices, kind="stable")
+        keep = quantities[order] > 0
+        self.prices = prices[order][keep]
+        self.quantities = quantities[order][keep]
+
+    def apply(self, prices: np.ndarray, quantities: np.ndarray) -> None:
+        """
+        應用一批檔位更新：已有價格覆蓋數量，新價格插入，數量為0時刪除
+
+        參數:
+            prices: 更新的價格
+            quantities: 對應的新數量（絕對值，不是增量）
+        """
+        if len(prices) == 0:
+            return
+        index = np.searchsorted(self.prices, prices)
+        size = len(self.prices)
+        exists = index < size
+        exists[exists] = self.prices[index[exists]] == prices[exists]
+
+        self.quantities[index[exists]] = quantities[exists]
+
+        new = ~exists & (quantities > 0)
+        if new.any():
+            order = np.argsort(prices[new], kind="stable")
+            positions = index[new][order]
+            self.prices = np.insert(self.prices, positions, prices[new][order])
+            self.quantities = np.insert(self.quantities, positions, quantities[new][order])
+
+        if exists.any() and not np.all(quantities[exists] > 0):
+            keep = self.quantities > 0
+            self.prices = self.prices[keep]
+            self.quantities = self.quantities[keep]
+
+    def best(self) -> Optional[float]:
+        """最優價格，沒有檔位時返回None"""
+        if len(self.prices) == 0:
+            return None
+        return float(self.prices[-1] if self.descending else self.prices[0])
+
+    def top(self, depth: int) -> np.ndarray:
+        """前 depth 檔，形狀為 (n, 2) 的 [價格, 數量] 數組，按從優到劣排列"""
+        if self.descending:
+            prices, quantities = self.prices[::-1][:depth], self.quantities[::-1][:depth]
+        else:
+            prices, quantities = self.prices[:depth], self.quantities[:depth]
+        return np.column_stack((prices, quantities))
+
+
+class OrderBook:
+    """
+    單個交易對的本地訂單簿
+
+    增量事件的序號規則（幣安）:
+    - 現貨: 丟棄 u <= lastUpdateId 的事件；第一個事件需滿足 U <= lastUpdateId+1 <= u，
+      之後每個事件的 U 等於上一個事件的 u+1
+    - 期貨: 丟棄 u < lastUpdateId 的事件；第一個事件需滿足 U <= lastUpdateId <= u，
+      之後每個事件的 pu 等於上一個事件的 u
+    """
+
+    def __init__(self, symbol: str, market_type: str):
+        self.symbol = symbol
+        self.market_type = market_type
+        self.bids = BookSide(descending=True)
+        self.asks = BookSide(descending=False)
+        self.last_update_id = 0
+        self.event_time: Optional[int] = None
+        self.version = 0            # 每次應用快照或增量時遞增，供推送端判斷是否有變化
+        self.synced = False
+        self.pending: List[Dict[str, Any]] = []  # 未同步時緩衝的增量事件
+        self._first_event = True
+
+    def load_snapshot(self, snapshot: Dict[str, Any]) -> None:
+        """載入 REST 深度快照"""
+        self.bids.load(*_levels(snapshot.get("bids", [])))
+        self.asks.load(*_levels(snapshot.get("asks", [])))
+        self.last_update_id = int(snapshot["lastUpdateId"])
+        self.event_time = snapshot.get("E")
+        self._first_event = True
+        self.version += 1
+
+    def apply_event(self, event: Dict[str, Any]) -> bool:
+        """
+        按序號規則應用一個增量事件
+
+        返回:
+            bool: 事件已應用或屬於過期事件時返回True，序號不連續（需要重新同步）時返回False
+        """
+        first, last = int(event["U"]), int(event["u"])
+        if last < self.last_update_id:
+            return True
+        # u == lastUpdateId 的事件在現貨中已包含於快照；期貨快照後的第一個事件可以是它
+        if last == self.last_update_id and (self.market_type == "spot" or not self._first_event):
+            return True
+
+        if self._first_event:
+            start = self.last_update_id + 1 if self.market_type == "spot" else self.last_update_id
+            if not first <= start <= last:
+                return False
+        elif self.market_type == "spot":
+            if first != self.last_update_id + 1:
+                return False
+        elif int(event.get("pu", -1)) != self.last_update_id:
+            return False
+
+        self.bids.apply(*_levels(event.get("b", [])))
+        self.asks.apply(*_levels(event.get("a", [])))
+        self.last_update_id = last
+        self.event_time = event.get("E")
+        self._first_event = False
+        self.version += 1
+        return True
+
+    def spread(self) -> Optional[float]:
+        """買賣價差，任一側為空時返回None"""
+        bid, ask = self.bids.best(), self.asks.best()
+        if bid is None or ask is None:
+            return None
+        return ask - bid
+
+    def mid_price(self) -> Optional[float]:
+        """中間價，任一側為空時返回None"""
+        bid, ask = self.bids.best(), self.asks.best()
+        if bid is None or ask is None:
+            return None
+        return (bid + ask) / 2
+
+    def snapshot(self, depth: int = 20) -> Dict[str, Any]:
+        """
+        生成訂單簿快照
+
+        參數:
+            depth: 每側返回的檔位數量
+
+        返回:
+            Dict[str, Any]: 包含前 depth 檔買賣盤、最優價、價差和中間價
+        """
+        return {
+            "symbol": self.symbol,
+            "market_type": self.market_type,
+            "last_update_id": self.last_update_id,
+            "event_time": self.event_time,
+            "synced": self.synced,
+            "best_bid": self.bids.best(),
+            "best_ask": self.asks.best(),
+            "spread": self.spread(),
+            "mid_price": self.mid_price(),
+            "bids": self.bids.top(depth).tolist(),
+            "asks": self.asks.top(depth).tolist()
+        }
+
+
+class OrderBookService:
+    """
+    訂單簿深度緩存服務
+
+    推送端首次關注某交易對時訂閱增量深度數據流並通過 REST 快照完成同步，之後由數據流維護；
+    增量序號不連續時在後台重新同步，期間的事件照常緩衝。最後一個推送端退出時停止追蹤。
+    """
+
+    def __init__(self, exchange: str = "binance"):
+        """
+        初始化訂單簿服務
+
+        參數:
+            exchange: 交易所名稱
+        """
+        self.exchange = exchange
+        self.books: Dict[Tuple[str, str], OrderBook] = {}
+        self._syncing: Dict[Tuple[str, str], asyncio.Task] = {}
+        # 推送端的引用計數，最後一個推送主題停止時停止追蹤
+        self.watchers: Dict[Tuple[str, str], int] = {}
+        self._listening = set()
+        self.stats = {"snapshots": 0, "rest_snapshots": 0, "events": 0, "resyncs": 0, "dropped_events": 0}
+
+    def _on_depth(self, exchange: str, topic: str, deltas: Dict[str, Dict[str, Any]], sequence: int) -> None:
+        """市場數據總線回調，將增量事件應用到對應的訂單簿或在同步期間緩衝"""
+        market_type = topic.split("@", 1)[0]
+        for symbol, event in deltas.items():
+            book = self.books.get((market_type, symbol))
+            if book is None:
+                continue
+            self.stats["events"] += 1
+            if not book.synced:
+                book.pending.append(event)
+                if len(book.pending) > MAX_PENDING_EVENTS:
+                    book.pending.pop(0)
+                    self.stats["dropped_events"] += 1
+                continue
+            if not book.apply_event(event):
+                logger.warning(f"{market_type} {symbol} 訂單簿增量序號不連續，重新同步")
+                self.stats["resyncs"] += 1
+                book.synced = False
+                book.pending = [event]
+                self._start_sync(symbol, market_type)
+
+    async def _fetch_snapshot(self, symbol: str, market_type: str, limit: int = SNAPSHOT_LIMIT) -> Dict[str, Any]:
+        """通過 REST /depth 獲取深度快照"""
+        exchange = market_data_service.get_exchange(self.exchange)
+        if exchange is None:
+            raise RuntimeError(f"交易所 {self.exchange} 未初始化")
+        url = f"{exchange.rest_endpoints[market_type]}/depth"
+        response = await http_clients.get(url).get(url, params={"symbol": symbol, "limit": limit})
+        response.raise_for_status()
+        self.stats["snapshots"] += 1
+        return response.json()
+
+    async def _sync(self, symbol: str, market_type: str) -> OrderBook:
+        """訂閱增量數據流（首次）並以快照加緩衝事件完成同步"""
+        key = (market_type, symbol)
+        exchange = market_data_service.get_exchange(self.exchange)
+        if exchange is None:
+            raise RuntimeError(f"交易所 {self.exchange} 未初始化")
+
+        topic = f"{market_type}@{DEPTH_STREAM}"
+        if topic not in self._listening:
+            market_data_service.bus.add_listener(self.exchange, topic, self._on_depth)
+            self._listening.add(topic)
+
+        book = self.books.get(key)
+        if book is None:
+            book = OrderBook(symbol, market_type)
+            self.books[key] = book
+            try:
+                # 先訂閱數據流再取快照，快照期間到達的事件會被緩衝
+                await exchange.subscribe_symbols([symbol], market_type, [DEPTH_STREAM])
+                return await self._sync_book(book)
+            except BaseException:
+                # 首次同步失敗（如無效交易對）時撤銷訂單簿和數據流訂閱
+                if self.books.get(key) is book:
+                    await self.untrack(symbol, market_type)
+                raise
+        return await self._sync_book(book)
+
+    async def _sync_book(self, book: OrderBook) -> OrderBook:
+        """以快照加緩衝事件完成訂單簿同步，無法銜接時重試"""
+        symbol, market_type = book.symbol, book.market_type
+        key = (market_type, symbol)
+        for attempt in range(MAX_SYNC_ATTEMPTS):
+            snapshot = await self._fetch_snapshot(symbol, market_type)
+            if self.books.get(key) is not book:
+                # 同步期間已停止追蹤
+                return book
+            book.load_snapshot(snapshot)
+            pending, book.pending = book.pending, []
+            if all(book.apply_event(event) for event in pending):
+                book.synced = True
+                return book
+            # 快照早於緩衝的事件（或事件已被丟棄），稍後重新獲取快照
+            book.pending = [event for event in pending if int(event["u"]) >= book.last_update_id]
+            await asyncio.sleep(0.5 * (attempt + 1))
+        raise RuntimeError(f"{market_type} {symbol} 訂單簿同步失敗：快照與增量事件無法銜接")
+
+    def _start_sync(self, symbol: str, market_type: str) -> asyncio.Task:
+        """啟動或加入交易對的同步任務"""
+        key = (market_type, symbol)
+        task = self._syncing.get(key)
+        if task is None:
+            task = asyncio.create_task(self._sync(symbol, market_type))
+            self._syncing[key] = task
+
+            def done(finished: asyncio.Task) -> None:
+                self._syncing.pop(key, None)
+                if not finished.cancelled() and finished.exception() is not None:
+                    logger.error(f"{market_type} {symbol} 訂單簿同步失敗: {str(finished.exception())}")
+
+            task.add_done_callback(done)
+        return task
+
+    async def get_book(self, symbol: str, market_type: str = "spot") -> OrderBook:
+        """
+        獲取已同步的訂單簿，首次請求時訂閱數據流並同步，並發請求共用同一次同步
+
+        參數:
+            symbol: 交易對，如 BTCUSDT
+            market_type: 市場類型
+
+        返回:
+            OrderBook: 本地訂單簿
+
+        異常:
+            ValueError: 不支援的市場類型
+        """
+        if market_type not in ("spot", "futures"):
+            raise ValueError(f"不支援的市場類型: {market_type}")
+        symbol = symbol.upper()
+        book = self.books.get((market_type, symbol))
+        if book is not None and book.synced:
+            return book
+        return await asyncio.shield(self._start_sync(symbol, market_type))
+
+    async def get_depth(self, symbol: str, market_type: str = "spot", depth: int = 20) -> Dict[str, Any]:
+        """
+        獲取訂單簿前N檔及價差、中間價
+
+        交易對已由推送端維護本地訂單簿時直接讀取；否則只獲取一次 REST 快照，
+        不創建本地訂單簿，也不訂閱增量數據流。
+
+        參數:
+            symbol: 交易對
+            market_type: 市場類型
+            depth: 每側返回的檔位數量
+
+        返回:
+            Dict[str, Any]: 訂單簿快照，見 OrderBook.snapshot
+
+        異常:
+            ValueError: 不支援的市場類型
+        """
+        if market_type not in ("spot", "futures"):
+            raise ValueError(f"不支援的市場類型: {market_type}")
+        symbol = symbol.upper()
+        book = self.books.get((market_type, symbol))
+        if book is not None and book.synced:
+            return book.snapshot(depth)
+
+        limit = next((limit for limit in REST_DEPTH_LIMITS if limit >= depth), SNAPSHOT_LIMIT)
+        book = OrderBook(symbol, market_type)
+        book.load_snapshot(await self._fetch_snapshot(symbol, market_type, limit))
+        book.synced = True  # REST 快照本身是一致的
+        self.stats["rest_snapshots"] += 1
+        return book.snapshot(depth)
+
+    async def watch(self, symbol: str, market_type: str = "spot") -> OrderBook:
+        """增加交易對的推送引用計數並返回已同步的訂單簿，需對應一次 unwatch；同步失敗時撤銷引用"""
+        key = (market_type, symbol.upper())
+        self.watchers[key] = self.watchers.get(key, 0) + 1
+        try:
+            return await self.get_book(symbol, market_type)
+        except BaseException:
+            await self.unwatch(symbol, market_type)
+            raise
+
+    async def unwatch(self, symbol: str, market_type: str = "spot") -> None:
+        """減少交易對的推送引用計數，歸零時停止追蹤"""
+        key = (market_type, symbol.upper())
+        count = self.watchers.get(key, 0) - 1
+        if count > 0:
+            self.watchers[key] = count
+            return
+        self.watchers.pop(key, None)
+        await self.untrack(symbol, market_type)
+
+    async def untrack(self, symbol: str, market_type: str = "spot") -> None:
+        """停止追蹤交易對：釋放訂單簿並取消增量數據流訂閱"""
+        symbol = symbol.upper()
+        if self.books.pop((market_type, symbol), None) is None:
+            return
+        exchange = market_data_service.get_exchange(self.exchange)
+        if exchange is not None:
+            await exchange.unsubscribe_symbols([symbol], market_type, [DEPTH_STREAM])
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取訂單簿服務統計信息"""
+        stats = self.stats.copy()
+        stats["tracked"] = len(self.books)
+        stats["synced"] = sum(1 for book in self.books.values() if book.synced)
+        stats["levels"] = sum(len(book.bids) + len(book.asks) for book in self.books.values())
+        return stats
+
+
+# 創建全局實例
+order_book_service = OrderBookService()
@@ -0,0 +1,177 @@
+"""
+全市場篩選服務
+
+基於列式行情存儲（TickerStore）提供漲幅榜、跌幅榜、成交額榜等篩選查詢。
+每個排序字段維護一份預排序的行號索引：市場數據總線每發布一幀增量只標記
+版本號，索引在下一次查詢時重建一次（每幀最多一次，而不是每個請求一次），
+之後同一版本的所有請求只需按過濾條件切片，並只為返回的交易對生成字典。
+"""
+
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from app.core.exchanges.ticker_store import COLUMN_INDEX, TickerStore
+from app.services.market_data import market_data_service
+
+logger = logging.getLogger(__name__)
+
+# 排序方式: 名稱 → (排序字段, 是否升序)
+SCREENER_SORTS = {
+    "gainers": ("price_change_24h", False),    # 漲幅榜
+    "losers": ("price_change_24h", True),      # 跌幅榜
+    "volume": ("quote_volume_24h", False),     # 成交額榜
+    "trades": ("count", False),                # 成交筆數榜
+}
+
+# 篩選結果中每個交易對返回的字段，只包含前端列表需要顯示的數據
+SCREENER_FIELDS = ("price", "price_change_24h", "price_change", "quote_volume_24h", "volume_24h", "high_24h", "low_24h")
+
+MARKET_TYPES = ("spot", "futures")
+
+
+class MarketScreener:
+    """
+    全市場篩選器
+
+    監聽市場數據總線以追蹤各市場的行情版本，按需重建預排序索引。
+    """
+
+    def __init__(self, exchange: str = "binance"):
+        """
+        初始化篩選器
+
+        參數:
+            exchange: 交易所名稱
+        """
+        self.exchange = exchange
+        self.versions: Dict[str, int] = {market_type: 0 for market_type in MARKET_TYPES}
+        # (市場類型, 排序字段) → (行情版本, 按字段降序排列的行號)
+        self._rankings: Dict[Tuple[str, str], Tuple[int, np.ndarray]] = {}
+        # (市場類型, 計價資產) → (交易對數量, 是否以該資產計價的布爾數組)
+        self._quote_masks: Dict[Tuple[str, str], Tuple[int, np.ndarray]] = {}
+        self._listening = False
+        self.stats = {"queries": 0, "rebuilds": 0}
+
+    def _on_delta(self, exchange: str, market_type: str, deltas: Dict[str, Any], sequence: int) -> None:
+        """市場數據總線回調，只記錄版本號，不在數據流的處理路徑上排序"""
+        self.versions[market_type] = sequence
+
+    def _ensure_listening(self) -> None:
+        """首次查詢時註冊總線監聽器"""
+        if self._listening:
+            return
+        for market_type in MARKET_TYPES:
+            market_data_service.bus.add_listener(self.exchange, market_type, self._on_delta)
+        self._listening = True
+
+    def _get_store(self, market_type: str) -> Optional[TickerStore]:
+        """獲取市場的列式行情存儲"""
+        exchange = market_data_service.get_exchange(self.exchange)
+        if exchange is None:
+            return None
+        store = exchange.market_data.get(market_type)
+        return store if isinstance(store, TickerStore) else None
+
+    def _ranking(self, store: TickerStore, market_type: str, field: str) -> np.ndarray:
+        """獲取字段的降序行號索引，行情版本變化或交易對數量變化時重建"""
+        key = (market_type, field)
+        version = self.versions.get(market_type, 0)
+        cached = self._rankings.get(key)
+        if cached is not None and cached[0] == version and len(cached[1]) == len(store):
+            return cached[1]
+        order = np.argsort(-store.column(field), kind="stable")
+        self._rankings[key] = (version, order)
+        self.stats["rebuilds"] += 1
+        return order
+
+    def _quote_mask(self, store: TickerStore, market_type: str, quote_asset: str) -> np.ndarray:
+        """獲取以指定資產計價的交易對布爾數組，交易對只會追加，數量不變時重用"""
+        key = (market_type, quote_asset)
+        cached = self._quote_masks.get(key)
+        if cached is not None and cached[0] == len(store):
+            return cached[1]
+        mask = np.fromiter((symbol.endswith(quote_asset) for symbol in store.symbols), dtype=bool, count=len(store))
+        self._quote_masks[key] = (len(store), mask)
+        return mask
+
+    def screen(self,
+               market_type: str = "spot",
+               sort: str = "gainers",
+               limit: int = 20,
+               min_change: Optional[float] = None,
+               max_change: Optional[float] = None,
+               min_quote_volume: Optional[float] = None,
+               quote_asset: Optional[str] = None) -> Dict[str, Any]:
+        """
+        篩選全市場交易對
+
+        參數:
+            market_type: 市場類型，'spot' 或 'futures'
+            sort: 排序方式，見 SCREENER_SORTS
+            limit: 返回數量
+            min_change: 最小24小時漲跌幅（百分比）
+            max_change: 最大24小時漲跌幅（百分比）
+            min_quote_volume: 最小24小時成交額
+            quote_asset: 計價資產，如 USDT
+
+        返回:
+            Dict[str, Any]: 包含符合條件的總數 total 和前 limit 個交易對 items
+
+        異常:
+            ValueError: 不支援的市場類型或排序方式
+        """
+        if market_type not in MARKET_TYPES:
+            raise ValueError(f"不支援的市場類型: {market_type}")
+        if sort not in SCREENER_SORTS:
+            raise ValueError(f"不支援的排序方式: {sort}，可選: {', '.join(SCREENER_SORTS)}")
+        self._ensure_listening()
+        self.stats["queries"] += 1
+
+        result = {"market_type": market_type, "sort": sort, "total": 0, "items": []}
+        store = self._get_store(market_type)
+        if store is None or len(store) == 0:
+            return result
+
+        field, ascending = SCREENER_SORTS[sort]
+        order = self._ranking(store, market_type, field)
+        if ascending:
+            order = order[::-1]
+
+        # 過濾條件全部以列運算完成，只有返回的交易對才生成字典
+        mask = store.column("price") > 0
+        change = store.column("price_change_24h")
+        if min_change is not None:
+            mask &= change >= min_change
+        if max_change is not None:
+            mask &= change <= max_change
+        if min_quote_volume is not None:
+            mask &= store.column("quote_volume_24h") >= min_quote_volume
+        if quote_asset:
+            mask &= self._quote_mask(store, market_type, quote_asset.upper())
+
+        matched = order[mask[order]]
+        result["total"] = int(len(matched))
+        result["items"] = [self._row_dict(store, row) for row in matched[:max(limit, 0)]]
+        return result
+
+    @staticmethod
+    def _row_dict(store: TickerStore, row: int) -> Dict[str, Any]:
+        """生成單個交易對的精簡行情字典"""
+        item: Dict[str, Any] = {"symbol": store.symbols[row]}
+        values = store.values[row]
+        for field in SCREENER_FIELDS:
+            item[field] = float(values[COLUMN_INDEX[field]])
+        return item
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取篩選器統計信息"""
+        stats = self.stats.copy()
+        stats["versions"] = self.versions.copy()
+        stats["rankings"] = len(self._rankings)
+        return stats
+
+
+# 創建全局實例
+market_screener = MarketScreener()
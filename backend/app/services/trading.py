@@ -1,4 +1,4 @@
-from typing import Dict, List, Optional, Any, Union, Callable
+from typing import Dict, List, Optional, Any, Union, Callable, Tuple
 import ccxt.async_support as ccxt
 from fastapi import HTTPException, status
 from sqlalchemy.orm import Session
@@ -9,6 +9,7 @@ import asyncio
 import random
 import time
 import traceback
+import uuid
 
 # 導入Cython優化模組
 try:
@@ -33,12 +34,21 @@ from ..schemas.trading import (
 )
 from backend.utils.exchange import get_exchange_client
 from backend.utils.connection_pool import ExchangeConnectionPool
+from backend.utils.market_metadata import market_metadata_cache
+from backend.utils.rate_limiter import RateLimitWaitExceeded
+from backend.utils.batch import chunked, gather_bounded
 
 logger = logging.getLogger(__name__)
 
 # 創建連接池實例
 exchange_pool = ExchangeConnectionPool()
 
+# 批量下單和撤單
+MAX_BATCH_ORDERS = 200           # 單次批量請求最多的訂單數
+BATCH_CONCURRENCY = 5            # 同時進行的交易所請求數
+BINANCE_BATCH_ORDER_SIZE = 5     # 幣安合約 batchOrders 每次最多5個訂單
+BINANCE_BATCH_CANCEL_SIZE = 10   # 幣安合約批量撤單每次最多10個訂單
+
 class TradingService:
     """
     交易服務類，處理與交易所的所有交互
@@ -226,6 +236,26 @@ class TradingService:
                 )
                 return result
                 
+            except RateLimitWaitExceeded as e:
+                # 共享額度已被用盡且需等待過久，直接返回而不重試
+                if virtual_key_id:
+                    await api_key_manager.log_api_usage(
+                        db=db,
+                        user_id=user.id,
+                        virtual_key_id=virtual_key_id,
+                        operation=operation_name,
+                        execution_time=time.time() - start_time,
+                        success=False,
+                        details={"error": str(e), "args": str(args), "kwargs": str(kwargs)}
+                    )
+                
+                logger.warning(f"用戶 {user.id} 在 {exchange.value} 執行 {operation_name} 被頻率限制拒絕: {str(e)}")
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail=f"交易所請求過於頻繁，請 {e.retry_after:.0f} 秒後再試",
+                    headers={"Retry-After": str(int(e.retry_after) + 1)}
+                )
+                
             except ccxt.NetworkError as e:
                 # 網絡錯誤可以重試
                 if retry_count < max_retries:
@@ -260,6 +290,10 @@ class TradingService:
                     )
                     
             except ccxt.ExchangeError as e:
+                # 無效交易對可能是新上線的交易對，在後台刷新共享的市場元數據
+                if market_metadata_cache.is_invalid_symbol_error(e):
+                    market_metadata_cache.refresh_on_invalid_symbol(exchange)
+                
                 # 記錄失敗的 API 使用情況
                 if virtual_key_id:
                     await api_key_manager.log_api_usage(
@@ -889,6 +923,10 @@ class TradingService:
         """
         批量下單
         
+        幣安合約的普通訂單使用原生 batchOrders 接口（每次最多5個），
+        其他交易所、現貨及止盈止損訂單以有限並發逐個提交。
+        所有請求都經過共享的頻率限制器。
+        
         Args:
             user: 用戶模型實例
             db: 數據庫會話
@@ -896,13 +934,13 @@ class TradingService:
             batch_request: 批量訂單請求
             
         Returns:
-            List[Dict]: 批量下單結果
+            List[Dict]: 批量下單結果，順序與請求中的訂單一致
         """
         # 檢查訂單數量限制
-        if len(batch_request.orders) > 5:
+        if len(batch_request.orders) > MAX_BATCH_ORDERS:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="批量下單最多支持5個訂單"
+                detail=f"批量下單最多支持{MAX_BATCH_ORDERS}個訂單"
             )
             
         async def _batch_operation(client):
@@ -917,53 +955,173 @@ class TradingService:
                     detail="訂單類型必須是 'spot' 或 'futures'"
                 )
             
-            # 批量下單結果
-            results = []
+            orders = batch_request.orders
+            results: List[Any] = [None] * len(orders)
             
-            # 逐個處理訂單
-            for order in batch_request.orders:
-                try:
-                    # 根據訂單類型處理
-                    if isinstance(order, StopOrder):
-                        # 止盈止損訂單
-                        result = await self._place_single_stop_order(client, order)
-                    else:
-                        # 普通訂單
-                        result = await self._place_single_order(client, order)
-                    
-                    results.append({
+            # 幣安合約的持倉模式只查詢一次
+            dual_side = None
+            if client.id == 'binance' and batch_request.order_type == 'futures':
+                dual_side = await self._get_binance_dual_side(client)
+            
+            # 幣安合約普通訂單走原生批量接口，其餘逐個提交
+            native = []  # (訂單位置, 下單參數)
+            single = []
+            for index, order in enumerate(orders):
+                if dual_side is not None and not isinstance(order, StopOrder):
+                    try:
+                        native.append((index, self._build_order_args(order, dual_side)))
+                    except ValueError as e:
+                        results[index] = e
+                else:
+                    single.append(index)
+            
+            async def _place_chunk(chunk):
+                return await self._place_binance_batch(client, [order_args for _, order_args in chunk])
+            
+            async def _place_one(index):
+                order = orders[index]
+                if isinstance(order, StopOrder):
+                    # 止盈止損訂單
+                    return await self._place_single_stop_order(client, order, dual_side)
+                # 普通訂單
+                return await self._place_single_order(client, order, dual_side)
+            
+            chunks = chunked(native, BINANCE_BATCH_ORDER_SIZE)
+            chunk_results, single_results = await asyncio.gather(
+                gather_bounded(_place_chunk, chunks, BATCH_CONCURRENCY),
+                gather_bounded(_place_one, single, BATCH_CONCURRENCY)
+            )
+            for chunk, chunk_result in zip(chunks, chunk_results):
+                for position, (index, _) in enumerate(chunk):
+                    results[index] = chunk_result if isinstance(chunk_result, Exception) else chunk_result[position]
+            for index, result in zip(single, single_results):
+                results[index] = result
+            
+            formatted = []
+            for order, result in zip(orders, results):
+                if self._is_failed_batch_result(result) or not result.get('id'):
+                    message = self._batch_error_message(result)
+                    logger.error(f"批量下單中的單個訂單失敗: {message}")
+                    formatted.append({
+                        "orderId": None,
+                        "symbol": getattr(order, 'symbol', 'unknown'),
+                        "status": "FAILED",
+                        "message": message
+                    })
+                else:
+                    formatted.append({
                         "orderId": result['id'],
                         "symbol": result['symbol'],
                         "status": "NEW",
                         "message": "success"
                     })
-                except Exception as e:
-                    logger.error(f"批量下單中的單個訂單失敗: {str(e)}")
-                    results.append({
-                        "orderId": None,
-                        "symbol": getattr(order, 'symbol', 'unknown'),
-                        "status": "FAILED",
-                        "message": str(e)
-                    })
             
-            return results
+            return formatted
         
-        return await self.execute_exchange_operation(user, db, exchange, _batch_operation, "batch_place_orders", batch_request)
+        return await self.execute_exchange_operation(user, db, exchange, _batch_operation, "batch_place_orders")
     
-    async def _place_single_order(
-        self, 
-        client: ccxt.Exchange, 
-        order: OrderRequest
-    ) -> Dict[str, Any]:
+    @staticmethod
+    def _is_failed_batch_result(result: Any) -> bool:
+        """批量操作中的單個結果是否失敗：異常、缺失或被交易所拒絕"""
+        return isinstance(result, Exception) or not result or result.get('status') == 'rejected'
+    
+    @staticmethod
+    def _batch_error_message(result: Any) -> str:
+        """從批量操作的失敗結果中提取錯誤信息"""
+        if isinstance(result, Exception):
+            return str(result)
+        info = (result or {}).get('info') or {}
+        if isinstance(info, dict) and info.get('msg'):
+            return f"{info.get('code')}: {info['msg']}"
+        return "交易所未返回訂單結果"
+    
+    @staticmethod
+    def _align_batch_results(keys: List[str], results: List[Dict[str, Any]], field: str) -> List[Optional[Dict[str, Any]]]:
         """
-        下單單個普通訂單的輔助方法
+        將批量接口的結果按請求順序排列
+        
+        CCXT 解析批量響應時會按時間戳排序，失敗條目（無時間戳）被穩定地排在最前面。
+        成功條目按 field 對應到請求，失敗條目按原有相對順序依次填入未對應的位置。
+        
+        Args:
+            keys: 請求中每個條目的標識（客戶端訂單ID或訂單ID）
+            results: CCXT 返回的訂單列表
+            field: 用於對應的訂單字段
+            
+        Returns:
+            List[Optional[Dict]]: 與 keys 一一對應的結果
+        """
+        matched = {}
+        unmatched = []
+        for result in results:
+            key = result.get(field)
+            if key is not None and str(key) in keys and str(key) not in matched:
+                matched[str(key)] = result
+            else:
+                unmatched.append(result)
+        remaining = iter(unmatched)
+        return [matched.get(key) or next(remaining, None) for key in keys]
+    
+    async def _get_binance_dual_side(self, client: ccxt.Exchange) -> bool:
+        """查詢幣安合約賬戶是否為對沖模式，查詢失敗時按單向模式處理"""
+        try:
+            position_mode_info = await client.fapiPrivate_get_positionside_dual()
+            return bool(position_mode_info.get('dualSidePosition', False))
+        except Exception as e:
+            # 如果獲取持倉模式失敗，記錄錯誤但繼續嘗試下單
+            logger.warning(f"獲取持倉模式失敗，將使用默認參數: {str(e)}")
+            return False
+    
+    async def _place_binance_batch(
+        self,
+        client: ccxt.Exchange,
+        orders_args: List[Tuple[str, str, str, float, Optional[float], Dict[str, Any]]]
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        通過幣安合約 batchOrders 接口一次提交最多5個普通訂單
         
         Args:
             client: 交易所客戶端
+            orders_args: 由 _build_order_args 生成的下單參數列表
+            
+        Returns:
+            List[Optional[Dict]]: 與 orders_args 順序一致的訂單響應，失敗條目的 status 為 rejected
+        """
+        requests = []
+        client_order_ids = []
+        for symbol, type, side, amount, price, params in orders_args:
+            params = dict(params)
+            client_order_id = uuid.uuid4().hex
+            params['clientOrderId'] = client_order_id
+            client_order_ids.append(client_order_id)
+            requests.append({
+                'symbol': symbol,
+                'type': type,
+                'side': side,
+                'amount': amount,
+                'price': price,
+                'params': params
+            })
+        response = await client.create_orders(requests)
+        return self._align_batch_results(client_order_ids, response, 'clientOrderId')
+    
+    def _build_order_args(
+        self,
+        order: OrderRequest,
+        dual_side: Optional[bool] = None
+    ) -> Tuple[str, str, str, float, Optional[float], Dict[str, Any]]:
+        """
+        將普通訂單請求轉換為 create_order 的參數
+        
+        Args:
             order: 訂單請求
+            dual_side: 幣安合約賬戶是否為對沖模式，None 表示無需處理持倉方向
             
         Returns:
-            Dict: 訂單響應
+            Tuple: (symbol, type, side, amount, price, params)
+            
+        Raises:
+            ValueError: 限價單未指定價格
         """
         # 準備訂單參數
         symbol = order.symbol
@@ -988,28 +1146,40 @@ class TradingService:
         if order.reduce_only:
             params['reduceOnly'] = True
             
-        # 處理幣安期貨的持倉模式
-        if 'defaultType' in client.options and client.options['defaultType'] == 'future':
-            # 只對期貨市場進行處理
-            exchange_id = client.id
-            if exchange_id == 'binance':
-                try:
-                    # 檢查賬戶是單向模式還是對沖模式
-                    position_mode_info = await client.fapiPrivate_get_positionside_dual()
-                    dual_side_position = position_mode_info.get('dualSidePosition', False)
-                    
-                    # 如果是對沖模式，需要指定持倉方向
-                    if dual_side_position:
-                        # 根據訂單方向確定持倉方向
-                        if side == 'buy':
-                            params['positionSide'] = 'LONG'
-                        else:
-                            params['positionSide'] = 'SHORT'
-                        
-                        logger.info(f"賬戶使用對沖模式，為{side}單設置持倉方向: {params['positionSide']}")
-                except Exception as e:
-                    # 如果獲取持倉模式失敗，記錄錯誤但繼續嘗試下單
-                    logger.warning(f"獲取持倉模式失敗，將使用默認參數: {str(e)}")
+        # 如果是對沖模式，需要指定持倉方向
+        if dual_side:
+            # 根據訂單方向確定持倉方向
+            if side == 'buy':
+                params['positionSide'] = 'LONG'
+            else:
+                params['positionSide'] = 'SHORT'
+            
+            logger.info(f"賬戶使用對沖模式，為{side}單設置持倉方向: {params['positionSide']}")
+        
+        return symbol, type, side, amount, price, params
+    
+    async def _place_single_order(
+        self, 
+        client: ccxt.Exchange, 
+        order: OrderRequest,
+        dual_side: Optional[bool] = None
+    ) -> Dict[str, Any]:
+        """
+        下單單個普通訂單的輔助方法
+        
+        Args:
+            client: 交易所客戶端
+            order: 訂單請求
+            dual_side: 已查詢的幣安合約持倉模式，None 時按需查詢
+            
+        Returns:
+            Dict: 訂單響應
+        """
+        # 處理幣安期貨的持倉模式（只對期貨市場進行處理）
+        if dual_side is None and client.options.get('defaultType') == 'future' and client.id == 'binance':
+            dual_side = await self._get_binance_dual_side(client)
+        
+        symbol, type, side, amount, price, params = self._build_order_args(order, dual_side)
         
         # 下單並返回結果
         return await client.create_order(
@@ -1024,7 +1194,8 @@ class TradingService:
     async def _place_single_stop_order(
         self, 
         client: ccxt.Exchange, 
-        order: StopOrder
+        order: StopOrder,
+        dual_side: Optional[bool] = None
     ) -> Dict[str, Any]:
         """
         下單單個止盈止損訂單的輔助方法
@@ -1032,6 +1203,7 @@ class TradingService:
         Args:
             client: 交易所客戶端
             order: 止盈止損訂單
+            dual_side: 已查詢的幣安合約持倉模式，None 時按需查詢
             
         Returns:
             Dict: 訂單響應
@@ -1052,29 +1224,22 @@ class TradingService:
         price = float(order.price) if order.price else None
         
         # 處理幣安期貨的持倉模式 (止盈止損訂單通常用於期貨)
-        exchange_id = client.id
-        if exchange_id == 'binance':
-            try:
-                # 檢查賬戶是單向模式還是對沖模式
-                position_mode_info = await client.fapiPrivate_get_positionside_dual()
-                dual_side_position = position_mode_info.get('dualSidePosition', False)
-                
-                # 如果是對沖模式，需要指定持倉方向
-                if dual_side_position:
-                    # 根據止盈止損訂單類型和方向確定持倉方向
-                    # 這裡邏輯可能需要根據業務規則調整
-                    side_lower = side.lower()
-                    if side_lower == 'buy':
-                        # 買單通常是做多倉位的止盈止損
-                        params['positionSide'] = 'LONG'
-                    else:
-                        # 賣單通常是做空倉位的止盈止損
-                        params['positionSide'] = 'SHORT'
-                    
-                    logger.info(f"賬戶使用對沖模式，為止盈止損訂單設置持倉方向: {params['positionSide']}")
-            except Exception as e:
-                # 如果獲取持倉模式失敗，記錄錯誤但繼續嘗試下單
-                logger.warning(f"獲取持倉模式失敗，將使用默認參數: {str(e)}")
+        if dual_side is None and client.id == 'binance':
+            dual_side = await self._get_binance_dual_side(client)
+            
+        # 如果是對沖模式，需要指定持倉方向
+        if dual_side:
+            # 根據止盈止損訂單類型和方向確定持倉方向
+            # 這裡邏輯可能需要根據業務規則調整
+            side_lower = side.lower()
+            if side_lower == 'buy':
+                # 買單通常是做多倉位的止盈止損
+                params['positionSide'] = 'LONG'
+            else:
+                # 賣單通常是做空倉位的止盈止損
+                params['positionSide'] = 'SHORT'
+            
+            logger.info(f"賬戶使用對沖模式，為止盈止損訂單設置持倉方向: {params['positionSide']}")
         
         # 下單並返回結果
         return await client.create_order(
@@ -1096,6 +1261,9 @@ class TradingService:
         """
         批量取消訂單
         
+        幣安合約使用原生批量撤單接口（每次最多10個），其他情況以有限並發逐個取消。
+        所有請求都經過共享的頻率限制器。
+        
         Args:
             user: 用戶模型實例
             db: 數據庫會話
@@ -1103,13 +1271,13 @@ class TradingService:
             batch_request: 批量取消訂單請求
             
         Returns:
-            List[Dict]: 批量取消結果
+            List[Dict]: 批量取消結果，順序與請求中的訂單ID一致
         """
         # 檢查訂單數量限制
-        if len(batch_request.order_ids) > 10:
+        if len(batch_request.order_ids) > MAX_BATCH_ORDERS:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="批量取消最多支持10個訂單"
+                detail=f"批量取消最多支持{MAX_BATCH_ORDERS}個訂單"
             )
         
         async def _batch_operation(client):
@@ -1124,52 +1292,49 @@ class TradingService:
                     detail="訂單類型必須是 'spot' 或 'futures'"
                 )
             
-            # 批量取消結果
-            results = []
+            order_ids = batch_request.order_ids
             
             # 不同交易所的批量取消處理
-            if exchange == ExchangeEnum.BINANCE and hasattr(client, 'cancel_orders'):
-                # Binance支持批量取消
-                try:
-                    response = await client.cancel_orders(batch_request.order_ids, batch_request.symbol)
-                    
-                    # 處理響應
-                    for order in response:
-                        results.append({
-                            "orderId": order['id'],
-                            "status": "CANCELED",
-                            "message": "success"
-                        })
-                except Exception as e:
-                    logger.error(f"批量取消訂單失敗: {str(e)}")
-                    # 如果批量取消失敗，返回所有訂單都失敗的信息
-                    for order_id in batch_request.order_ids:
-                        results.append({
-                            "orderId": order_id,
-                            "status": "FAILED",
-                            "message": str(e)
-                        })
+            if exchange == ExchangeEnum.BINANCE and batch_request.order_type == 'futures':
+                # 幣安合約支持批量撤單，每次最多10個
+                async def _cancel_chunk(ids):
+                    response = await client.cancel_orders(ids, batch_request.symbol)
+                    return self._align_batch_results(ids, response, 'id')
+                
+                chunks = chunked(order_ids, BINANCE_BATCH_CANCEL_SIZE)
+                chunk_results = await gather_bounded(_cancel_chunk, chunks, BATCH_CONCURRENCY)
+                responses = []
+                for ids, chunk_result in zip(chunks, chunk_results):
+                    # 整批請求失敗時，該批所有訂單都記為失敗
+                    responses.extend([chunk_result] * len(ids) if isinstance(chunk_result, Exception) else chunk_result)
             else:
-                # 其他交易所逐個取消
-                for order_id in batch_request.order_ids:
-                    try:
-                        response = await client.cancel_order(id=order_id, symbol=batch_request.symbol)
-                        results.append({
-                            "orderId": order_id,
-                            "status": "CANCELED",
-                            "message": "success"
-                        })
-                    except Exception as e:
-                        logger.error(f"取消訂單 {order_id} 失敗: {str(e)}")
-                        results.append({
-                            "orderId": order_id,
-                            "status": "FAILED",
-                            "message": str(e)
-                        })
+                # 其他情況以有限並發逐個取消
+                async def _cancel_one(order_id):
+                    return await client.cancel_order(id=order_id, symbol=batch_request.symbol)
+                
+                responses = await gather_bounded(_cancel_one, order_ids, BATCH_CONCURRENCY)
+            
+            # 批量取消結果
+            results = []
+            for order_id, response in zip(order_ids, responses):
+                if self._is_failed_batch_result(response):
+                    message = self._batch_error_message(response)
+                    logger.error(f"取消訂單 {order_id} 失敗: {message}")
+                    results.append({
+                        "orderId": order_id,
+                        "status": "FAILED",
+                        "message": message
+                    })
+                else:
+                    results.append({
+                        "orderId": order_id,
+                        "status": "CANCELED",
+                        "message": "success"
+                    })
             
             return results
         
-        return await self.execute_exchange_operation(user, db, exchange, _batch_operation, "batch_cancel_orders", batch_request)
+        return await self.execute_exchange_operation(user, db, exchange, _batch_operation, "batch_cancel_orders")
     
     async def get_symbol_info(
         self,
@@ -1186,61 +1351,27 @@ class TradingService:
         Returns:
             Union[Dict, List[Dict]]: 單個或多個交易對信息
         """
-        # 創建一個虛擬用戶和會話用於獲取公開市場數據
-        # 這樣我們可以利用連接池，而不必每次創建新連接
-        class VirtualUser:
-            def __init__(self):
-                self.id = 0  # 使用特殊ID 0 表示系統查詢
-                
-        class VirtualSession:
-            def query(self, *args):
-                return self
-                
-            def filter(self, *args):
-                return self
-                
-            def first(self):
-                # 返回一個虛擬的API密鑰記錄
-                class ApiKeyRecord:
-                    def __init__(self):
-                        self.api_key = ""
-                        self.api_secret = ""
-                return ApiKeyRecord()
-        
+        # 交易對信息來自進程內共享的市場元數據，無需用戶客戶端
         try:
-            virtual_user = VirtualUser()
-            virtual_db = VirtualSession()
+            if symbol:
+                # 獲取特定交易對信息
+                market = await market_metadata_cache.find_market(exchange, symbol)
+                if market is None:
+                    raise HTTPException(
+                        status_code=status.HTTP_404_NOT_FOUND,
+                        detail=f"交易對 {symbol} 不存在"
+                    )
+                return self._format_symbol_info(market, exchange)
             
-            # 使用execute_exchange_operation執行操作，這樣就能利用連接池
-            async def _operation(client):
-                # 加載市場
-                await client.load_markets()
-                
-                if symbol:
-                    # 獲取特定交易對信息
-                    if symbol not in client.markets:
-                        raise HTTPException(
-                            status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"交易對 {symbol} 不存在"
-                        )
-                    
-                    market = client.markets[symbol]
-                    result = self._format_symbol_info(market, exchange)
-                else:
-                    # 獲取所有交易對信息
-                    results = []
-                    for market_symbol, market in client.markets.items():
-                        # 只處理活躍的現貨和永續合約
-                        if market['active'] and (market['spot'] or market['swap']):
-                            symbol_info = self._format_symbol_info(market, exchange)
-                            results.append(symbol_info)
-                    
-                    result = results
-                
-                return result
-                
-            # 使用執行操作的通用方法，設置不重試
-            return await self.execute_exchange_operation(virtual_user, virtual_db, exchange, _operation, "get_symbol_info", symbol)
+            # 獲取所有交易對信息
+            markets = await market_metadata_cache.get_markets(exchange)
+            results = []
+            for market_symbol, market in markets.items():
+                # 只處理活躍的現貨和永續合約
+                if market['active'] and (market['spot'] or market['swap']):
+                    symbol_info = self._format_symbol_info(market, exchange)
+                    results.append(symbol_info)
+            return results
             
         except HTTPException:
             raise
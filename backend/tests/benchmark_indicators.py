@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+技術指標計算基準測試
+
+比較以下實現在 1 萬與 10 萬根K線上的耗時，並校驗結果一致：
+- 原有逐元素循環的 Python 實現（保留在本腳本中作為基準）
+- Cython 實現（app/cython_modules/market_data_cy，需先編譯）
+- NumPy 向量化實現（app.services.indicators.calculate_indicators）
+- 增量實現（IndicatorState.update，測量每根新K線的更新耗時）
+
+用法:
+    python tests/benchmark_indicators.py
+    python tests/benchmark_indicators.py --sizes 10000 100000 --rounds 3
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import Callable, Dict
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import indicators
+
+INDICATORS = list(indicators.DEFAULT_INDICATORS)
+
+
+# ---- 原有的逐元素循環實現，僅作為基準 ----
+
+def legacy_sma(data, period):
+    n = len(data)
+    result = np.zeros(n)
+    result[:period-1] = np.nan
+    for i in range(period-1, n):
+        result[i] = np.mean(data[i-period+1:i+1])
+    return result
+
+
+def legacy_ema(data, period):
+    n = len(data)
+    result = np.zeros(n)
+    alpha = 2.0 / (period + 1.0)
+    result[:period-1] = np.nan
+    result[period-1] = np.mean(data[:period])
+    for i in range(period, n):
+        result[i] = data[i] * alpha + result[i-1] * (1.0 - alpha)
+    return result
+
+
+def legacy_rsi(data, period):
+    n = len(data)
+    result = np.zeros(n)
+    gain = np.zeros(n)
+    loss = np.zeros(n)
+    for i in range(1, n):
+        delta = data[i] - data[i-1]
+        if delta > 0:
+            gain[i] = delta
+        elif delta < 0:
+            loss[i] = -delta
+    avg_gain = np.zeros(n)
+    avg_loss = np.zeros(n)
+    avg_gain[period] = np.sum(gain[1:period+1]) / period
+    avg_loss[period] = np.sum(loss[1:period+1]) / period
+    for i in range(period+1, n):
+        avg_gain[i] = (avg_gain[i-1] * (period-1) + gain[i]) / period
+        avg_loss[i] = (avg_loss[i-1] * (period-1) + loss[i]) / period
+    for i in range(period, n):
+        result[i] = 100 if avg_loss[i] == 0 else 100 - (100 / (1 + avg_gain[i] / avg_loss[i]))
+    result[:period] = np.nan
+    return result
+
+
+def legacy_bollinger(data, period=20, deviation=2.0):
+    middle = legacy_sma(data, period)
+    std = np.zeros(len(data))
+    for i in range(period-1, len(data)):
+        std[i] = np.std(data[i-period+1:i+1])
+    return middle + deviation * std, middle, middle - deviation * std
+
+
+def legacy_macd(data, fast_period=12, slow_period=26, signal_period=9):
+    macd_line = legacy_ema(data, fast_period) - legacy_ema(data, slow_period)
+    # 原實現直接對含 NaN 的 MACD 線計算信號線；此處從第一個有效值開始，以便與新實現比較
+    first = slow_period - 1
+    signal_line = np.full(len(data), np.nan)
+    signal_line[first:] = legacy_ema(macd_line[first:], signal_period)
+    return macd_line, signal_line, macd_line - signal_line
+
+
+def legacy_calculate(ohlcv: Dict[str, np.ndarray]) -> Dict[str, Dict[str, np.ndarray]]:
+    closes = np.asarray(ohlcv["close"], dtype=np.float64)
+    upper, middle, lower = legacy_bollinger(closes)
+    macd_line, signal_line, histogram = legacy_macd(closes)
+    return {
+        "sma": {str(p): legacy_sma(closes, p) for p in indicators.SMA_PERIODS},
+        "ema": {str(p): legacy_ema(closes, p) for p in indicators.EMA_PERIODS},
+        "rsi": {"14": legacy_rsi(closes, 14)},
+        "bollinger": {"upper": upper, "middle": middle, "lower": lower},
+        "macd": {"macd": macd_line, "signal": signal_line, "histogram": histogram},
+    }
+
+
+# ---- 工具函數 ----
+
+def build_series(size: int, seed: int = 42) -> Dict[str, np.ndarray]:
+    """生成隨機遊走的收盤價序列"""
+    rng = np.random.default_rng(seed)
+    closes = 30000 * np.exp(np.cumsum(rng.normal(0, 0.001, size)))
+    return {"close": closes}
+
+
+def bench(name: str, func: Callable[[], object], rounds: int) -> float:
+    """執行基準測試並輸出平均耗時（毫秒）"""
+    func()  # 預熱
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    elapsed = (time.perf_counter() - start) / rounds * 1000
+    print(f"  {name:<28} {elapsed:10.2f} ms")
+    return elapsed
+
+
+def max_difference(expected: Dict, actual: Dict) -> float:
+    """兩組指標結果的最大相對誤差（忽略雙方均為 NaN 的位置）"""
+    worst = 0.0
+    for group, series in expected.items():
+        for key, values in series.items():
+            other = np.asarray(actual[group][key], dtype=np.float64)
+            mask = ~(np.isnan(values) & np.isnan(other))
+            if np.any(np.isnan(values[mask]) != np.isnan(other[mask])):
+                return float("inf")
+            valid = mask & ~np.isnan(values)
+            if valid.any():
+                scale = np.maximum(np.abs(values[valid]), 1.0)
+                worst = max(worst, float(np.max(np.abs(values[valid] - other[valid]) / scale)))
+    return worst
+
+
+def load_cython():
+    """載入已編譯的 Cython 實現，未編譯時返回 None"""
+    try:
+        from app.cython_modules.market_data_cy import calculate_indicators
+        return calculate_indicators
+    except ImportError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="技術指標計算基準測試")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000], help="K線數量")
+    parser.add_argument("--rounds", type=int, default=3, help="重複輪數")
+    args = parser.parse_args()
+
+    cython_calculate = load_cython()
+    print(f"SciPy lfilter: {'可用' if indicators.SCIPY_AVAILABLE else '不可用（使用分塊閉式解）'}")
+    print(f"Cython: {'已編譯' if cython_calculate else '未編譯，跳過'}")
+
+    for size in args.sizes:
+        ohlcv = build_series(size)
+        print(f"\n{size} 根K線:")
+        baseline = bench("Python 循環（原實現）", lambda: legacy_calculate(ohlcv), 1)
+        if cython_calculate:
+            bench("Cython", lambda: cython_calculate(ohlcv, INDICATORS), args.rounds)
+        vectorized = bench("NumPy 向量化", lambda: indicators.calculate_indicators(ohlcv, INDICATORS), args.rounds)
+        print(f"  向量化加速比: {baseline / vectorized:.1f}x")
+        print(f"  與原實現的最大相對誤差: {max_difference(legacy_calculate(ohlcv), indicators.calculate_indicators(ohlcv)):.2e}")
+
+        # 增量更新：以前 size-1000 根K線初始化，測量其後每根K線的 update 耗時
+        closes = ohlcv["close"]
+        history = max(size - 1000, 0)
+        state = indicators.IndicatorState.from_history(closes[:history])
+        start = time.perf_counter()
+        for value in closes[history:]:
+            latest = state.update(float(value))
+        per_bar = (time.perf_counter() - start) / max(size - history, 1) * 1e6
+        expected = indicators.calculate_indicators(ohlcv)
+        drift = max(
+            abs(latest["ema"]["200"] - expected["ema"]["200"][-1]) / expected["ema"]["200"][-1],
+            abs(latest["bollinger"]["upper"] - expected["bollinger"]["upper"][-1]) / expected["bollinger"]["upper"][-1],
+            abs(latest["rsi"]["14"] - expected["rsi"]["14"][-1]) / 100,
+        )
+        print(f"  {'增量更新（每根K線）':<28} {per_bar:10.2f} µs，與全量計算的最大相對誤差: {drift:.2e}")
+
+
+if __name__ == "__main__":
+    main()
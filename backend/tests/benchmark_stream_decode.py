@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+行情數據流解碼基準測試
+
+比較標準庫 json.loads 與 orjson（app.core.json_utils.parse_json）解析
+幣安 !ticker@arr 行情幀的耗時，並測量解碼加上 BinanceExchange 寫入行情存儲的
+完整處理耗時。
+
+用法:
+    python tests/benchmark_stream_decode.py                      # 使用合成的行情幀
+    python tests/benchmark_stream_decode.py --frames frames.txt  # 使用錄製的行情幀（每行一幀原始JSON）
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Callable, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.json_utils import parse_json
+
+
+def build_synthetic_frame(symbol_count: int = 400) -> str:
+    """生成與幣安 !ticker@arr 格式相同的合成行情幀"""
+    now = int(time.time() * 1000)
+    items = []
+    for i in range(symbol_count):
+        price = random.uniform(0.0001, 60000)
+        items.append({
+            "e": "24hrTicker", "E": now, "s": f"SYM{i}USDT",
+            "p": f"{price * 0.01:.8f}", "P": f"{random.uniform(-15, 15):.3f}", "w": f"{price:.8f}",
+            "x": f"{price:.8f}", "c": f"{price:.8f}", "Q": "1.00000000",
+            "b": f"{price * 0.999:.8f}", "B": "10.00000000", "a": f"{price * 1.001:.8f}", "A": "12.00000000",
+            "o": f"{price * 0.99:.8f}", "h": f"{price * 1.05:.8f}", "l": f"{price * 0.95:.8f}",
+            "v": f"{random.uniform(1000, 1e7):.8f}", "q": f"{random.uniform(1e5, 1e9):.8f}",
+            "O": now - 86400000, "C": now, "F": 1, "L": 100000, "n": random.randint(100, 100000)
+        })
+    return json.dumps(items)
+
+
+def load_frames(path: str) -> List[str]:
+    """讀取錄製的行情幀，每行一幀"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def bench(name: str, func: Callable[[str], object], frames: List[str], rounds: int) -> float:
+    """執行基準測試並輸出每幀平均耗時（毫秒）"""
+    for frame in frames[:3]:
+        func(frame)  # 預熱
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for frame in frames:
+            func(frame)
+    elapsed = (time.perf_counter() - start) / (rounds * len(frames)) * 1000
+    print(f"{name:<32} {elapsed:8.3f} ms/幀")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="行情數據流解碼基準測試")
+    parser.add_argument("--frames", help="錄製的行情幀文件，每行一幀原始JSON")
+    parser.add_argument("--symbols", type=int, default=400, help="合成行情幀的交易對數量")
+    parser.add_argument("--rounds", type=int, default=50, help="重複輪數")
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames) if args.frames else [build_synthetic_frame(args.symbols) for _ in range(5)]
+    average_size = sum(len(frame) for frame in frames) / len(frames) / 1024
+    print(f"行情幀數: {len(frames)}，平均大小: {average_size:.1f} KB，輪數: {args.rounds}")
+
+    baseline = bench("json.loads", json.loads, frames, args.rounds)
+    fast = bench("parse_json (orjson)", parse_json, frames, args.rounds)
+    print(f"orjson 加速比: {baseline / fast:.2f}x")
+
+    try:
+        from app.core.exchanges.binance import BinanceExchange
+    except ImportError as e:
+        print(f"跳過完整處理測試，無法導入 BinanceExchange: {e}")
+        return
+
+    exchange = BinanceExchange()
+    bench("parse_json + 寫入行情存儲", lambda frame: exchange._process_ticker_data(parse_json(frame), "spot"), frames, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
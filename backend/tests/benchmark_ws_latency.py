@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+WebSocket 推送端到端延遲基準測試
+
+以 N 個模擬客戶端連接後端的行情推送端點，測量從回放服務器發出行情幀到
+客戶端收到推送的延遲分位數和吞吐量。延遲由回放服務器加入的標記交易對
+REPLAYUSDT 計算：其價格為幀的發送時間（微秒），回放服務器與客戶端需在同一台機器上。
+
+用法:
+    # 1. 啟動回放服務器（見 replay_exchange.py），或使用 --serve 在本進程內啟動合成行情回放
+    # 2. 以回放服務器地址啟動後端:
+    #    BINANCE_SPOT_WS="ws://127.0.0.1:9001/spot/ws/!ticker@arr" \\
+    #    BINANCE_FUTURES_WS="ws://127.0.0.1:9001/futures/ws/!ticker@arr" uvicorn app.main:app
+    # 3. 運行基準測試
+    python tests/benchmark_ws_latency.py --clients 100 --duration 60
+    python tests/benchmark_ws_latency.py --serve --speed 10 --clients 500 --url ws://127.0.0.1:8000/api/v1/markets/ws/all
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import Any, List, Optional
+
+import numpy as np
+import websockets
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.json_utils import parse_json
+from replay_exchange import MARKER_SYMBOL, ReplayChannel, ReplayServer, synthetic_ticker_frames
+
+
+def find_marker(message: Any, depth: int = 4) -> Optional[float]:
+    """在推送消息中查找標記交易對的價格（發送時間，微秒）"""
+    if depth < 0 or not isinstance(message, dict):
+        return None
+    marker = message.get(MARKER_SYMBOL)
+    if isinstance(marker, dict) and "price" in marker:
+        return float(marker["price"])
+    for value in message.values():
+        if isinstance(value, dict):
+            found = find_marker(value, depth - 1)
+            if found is not None:
+                return found
+    return None
+
+
+class ClientStats:
+    """單個模擬客戶端的統計"""
+
+    def __init__(self):
+        self.latencies: List[float] = []  # 毫秒
+        self.messages = 0
+        self.bytes = 0
+        self.error: Optional[str] = None
+
+
+async def run_client(url: str, deadline: float, stats: ClientStats) -> None:
+    """連接推送端點並記錄每個新標記的延遲"""
+    last_marker = None
+    try:
+        async with websockets.connect(url, max_size=None) as websocket:
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    message = await asyncio.wait_for(websocket.recv(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                received_us = time.time_ns() // 1000
+                stats.messages += 1
+                stats.bytes += len(message)
+                marker = find_marker(parse_json(message))
+                # 同一幀可能被重複推送（如後加入連接的首條消息），只統計第一次
+                if marker is not None and marker != last_marker:
+                    last_marker = marker
+                    stats.latencies.append((received_us - marker) / 1000)
+    except Exception as e:
+        stats.error = str(e)
+
+
+async def start_replay(args):
+    """在本進程內啟動合成行情回放服務器"""
+    channels = {
+        f"{market_type}_ticker": ReplayChannel(
+            f"{market_type}_ticker", synthetic_ticker_frames(args.symbols), args.speed, loop=True, stamp=True)
+        for market_type in ("spot", "futures")
+    }
+    server = await websockets.serve(ReplayServer(channels).handler, "127.0.0.1", args.replay_port, max_size=None)
+    tasks = [asyncio.create_task(channel.run()) for channel in channels.values()]
+    print(f"回放服務器: ws://127.0.0.1:{args.replay_port}，{args.symbols} 個交易對，倍速 {args.speed}x")
+    return server, tasks
+
+
+async def main_async(args) -> None:
+    replay = await start_replay(args) if args.serve else None
+    try:
+        deadline = time.monotonic() + args.duration
+        clients = [ClientStats() for _ in range(args.clients)]
+        started = time.monotonic()
+        await asyncio.gather(*(run_client(args.url, deadline, stats) for stats in clients))
+        elapsed = time.monotonic() - started
+    finally:
+        if replay is not None:
+            server, tasks = replay
+            for task in tasks:
+                task.cancel()
+            server.close()
+            await server.wait_closed()
+
+    errors = [stats.error for stats in clients if stats.error]
+    latencies = np.array([value for stats in clients for value in stats.latencies])
+    messages = sum(stats.messages for stats in clients)
+    total_bytes = sum(stats.bytes for stats in clients)
+
+    print(f"\n端點: {args.url}")
+    print(f"客戶端: {args.clients}（失敗 {len(errors)}），持續 {elapsed:.1f} 秒")
+    if errors:
+        print(f"  首個錯誤: {errors[0]}")
+    print(f"吞吐量: {messages / elapsed:.1f} 條/秒，{total_bytes / elapsed / 1024 / 1024:.2f} MB/秒"
+          f"（每客戶端 {messages / elapsed / max(args.clients, 1):.2f} 條/秒）")
+    if len(latencies) == 0:
+        print("沒有收到帶延遲標記的消息：請確認後端已連接到回放服務器")
+        return
+    p50, p90, p99, p999 = np.percentile(latencies, [50, 90, 99, 99.9])
+    print(f"端到端延遲（毫秒，{len(latencies)} 個樣本）:")
+    print(f"  p50 {p50:8.2f}   p90 {p90:8.2f}   p99 {p99:8.2f}   p99.9 {p999:8.2f}   max {latencies.max():8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebSocket 推送端到端延遲基準測試")
+    parser.add_argument("--url", default="ws://127.0.0.1:8000/api/v1/markets/ws/spot", help="後端推送端點")
+    parser.add_argument("--clients", type=int, default=50, help="模擬客戶端數量")
+    parser.add_argument("--duration", type=float, default=30, help="測試秒數")
+    parser.add_argument("--serve", action="store_true", help="在本進程內啟動合成行情回放服務器")
+    parser.add_argument("--replay-port", type=int, default=9001, help="回放服務器端口")
+    parser.add_argument("--symbols", type=int, default=400, help="合成行情幀的交易對數量")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放倍速")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
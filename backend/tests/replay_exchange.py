@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+幣安行情回放服務器
+
+在本地以真實的 WebSocket 連接回放錄製的幣安數據幀，代替幣安服務器驅動
+BinanceExchange 的行情處理、background_price_updater 和 WebSocket 推送，
+用於壓力測試和延遲測試，不需要連接幣安。
+
+提供的路徑:
+    /spot/ws/!ticker@arr, /futures/ws/!ticker@arr   全市場24小時行情（!ticker@arr）
+    /spot/stream, /futures/stream                    組合流，處理 SUBSCRIBE/UNSUBSCRIBE，
+                                                     只推送連接已訂閱的數據流（kline、bookTicker 等）
+    /spot/ws/<listenKey>, /futures/ws/<listenKey>    用戶數據流（訂單、賬戶更新）
+
+錄製文件每行一幀，格式為 "<接收時間毫秒>\\t<原始JSON>"，回放時按原始幀間隔除以
+--speed 發送。用戶數據流需要API密鑰，record 命令不錄製，可按相同格式自行準備
+{市場類型}_user.txt。行情幀的事件時間 E 會改寫為發送時間，並加入標記交易對 REPLAYUSDT，
+其價格為發送時間（微秒），客戶端據此計算端到端延遲（見 benchmark_ws_latency.py）。
+
+用法:
+    # 錄製幣安數據幀（組合流錄製 --symbols 指定交易對的 kline_1m、bookTicker 和 aggTrade）
+    python tests/replay_exchange.py record --output recordings --duration 300 --symbols BTCUSDT ETHUSDT
+
+    # 回放錄製的數據幀（10倍速，循環播放）
+    python tests/replay_exchange.py serve --recordings recordings --speed 10 --loop
+
+    # 沒有錄製文件時生成合成數據幀（每秒一幀，400個交易對）
+    python tests/replay_exchange.py serve --synthetic --symbols 400 --speed 1
+
+    # 啟動後端並指向回放服務器
+    BINANCE_SPOT_WS="ws://127.0.0.1:9001/spot/ws/!ticker@arr" \\
+    BINANCE_FUTURES_WS="ws://127.0.0.1:9001/futures/ws/!ticker@arr" \\
+    BINANCE_SPOT_STREAM_WS="ws://127.0.0.1:9001/spot/stream" \\
+    BINANCE_FUTURES_STREAM_WS="ws://127.0.0.1:9001/futures/stream" \\
+    uvicorn app.main:app
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import websockets
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.json_utils import dump_json_str, parse_json
+
+MARKET_TYPES = ("spot", "futures")
+
+# 標記交易對：價格為發送時間（微秒），用於測量端到端延遲
+MARKER_SYMBOL = "REPLAYUSDT"
+
+# 錄製文件名: {市場類型}_{頻道}.txt，頻道為 ticker（!ticker@arr）、stream（組合流）或 user（用戶數據流）
+CHANNELS = ("ticker", "stream", "user")
+
+LIVE_ENDPOINTS = {
+    "spot": {"ticker": "wss://stream.binance.com:9443/ws/!ticker@arr", "stream": "wss://stream.binance.com:9443/stream"},
+    "futures": {"ticker": "wss://fstream.binance.com/ws/!ticker@arr", "stream": "wss://fstream.binance.com/stream"},
+}
+
+Frame = Tuple[int, str]
+
+
+def load_recording(path: str) -> List[Frame]:
+    """讀取錄製文件，返回 [(接收時間毫秒, 原始JSON)]"""
+    frames = []
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            timestamp, _, raw = line.rstrip("\n").partition("\t")
+            if raw:
+                frames.append((int(timestamp), raw))
+    return frames
+
+
+def synthetic_ticker_frames(symbol_count: int, count: int = 60) -> List[Frame]:
+    """生成與 !ticker@arr 格式相同的合成行情幀，每秒一幀"""
+    rng = random.Random(42)
+    prices = [rng.uniform(0.01, 60000) for _ in range(symbol_count)]
+    start = int(time.time() * 1000)
+    frames = []
+    for index in range(count):
+        items = []
+        for i, price in enumerate(prices):
+            price = prices[i] = price * (1 + rng.gauss(0, 0.001))
+            items.append({
+                "e": "24hrTicker", "E": start + index * 1000, "s": f"SYM{i}USDT",
+                "p": f"{price * 0.01:.8f}", "P": f"{rng.uniform(-15, 15):.3f}", "c": f"{price:.8f}",
+                "b": f"{price * 0.999:.8f}", "B": "10.0", "a": f"{price * 1.001:.8f}", "A": "12.0",
+                "o": f"{price * 0.99:.8f}", "h": f"{price * 1.05:.8f}", "l": f"{price * 0.95:.8f}",
+                "v": f"{rng.uniform(1000, 1e7):.8f}", "q": f"{rng.uniform(1e5, 1e9):.8f}", "n": rng.randint(100, 100000)
+            })
+        frames.append((start + index * 1000, dump_json_str(items)))
+    return frames
+
+
+class ReplayChannel:
+    """
+    單個回放頻道
+
+    一個後台任務按錄製的時間間隔發送數據幀，所有連接共用同一份幀，
+    使用 websockets.broadcast 非阻塞廣播，慢客戶端不會拖慢回放。
+    """
+
+    def __init__(self, name: str, frames: List[Frame], speed: float, loop: bool, stamp: bool):
+        """
+        參數:
+            name: 頻道名稱，如 spot_ticker
+            frames: 數據幀
+            speed: 回放倍速
+            loop: 播放完畢後是否從頭循環
+            stamp: 是否改寫事件時間並加入延遲標記（僅 !ticker@arr 幀）
+        """
+        self.name = name
+        self.frames = frames
+        self.speed = speed
+        self.loop = loop
+        self.stamp = stamp
+        self.clients: Set[Any] = set()
+        # 組合流連接已訂閱的數據流名稱
+        self.subscriptions: Dict[Any, Set[str]] = {}
+        self.sent = 0
+
+    def _stamp(self, raw: str) -> str:
+        """改寫行情幀的事件時間並加入標記交易對"""
+        items = parse_json(raw)
+        now_us = time.time_ns() // 1000
+        now_ms = now_us // 1000
+        for item in items:
+            item["E"] = now_ms
+        items.append({"e": "24hrTicker", "E": now_ms, "s": MARKER_SYMBOL, "c": str(now_us), "P": "0", "v": "0", "q": "0"})
+        return dump_json_str(items)
+
+    def _targets(self, raw: str) -> List[Any]:
+        """返回應接收該幀的連接，組合流幀只發給訂閱了該數據流的連接"""
+        if not self.subscriptions:
+            return list(self.clients)
+        stream = parse_json(raw).get("stream")
+        return [client for client, streams in self.subscriptions.items() if stream in streams]
+
+    async def run(self) -> None:
+        """按錄製的時間間隔回放數據幀"""
+        if not self.frames:
+            return
+        while True:
+            previous = self.frames[0][0]
+            for timestamp, raw in self.frames:
+                delay = (timestamp - previous) / 1000 / self.speed
+                previous = timestamp
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if not self.clients:
+                    continue
+                message = self._stamp(raw) if self.stamp else raw
+                websockets.broadcast(self._targets(raw), message)
+                self.sent += 1
+            if not self.loop:
+                return
+
+
+class ReplayServer:
+    """回放服務器：按請求路徑將連接分配到對應的回放頻道"""
+
+    def __init__(self, channels: Dict[str, ReplayChannel]):
+        self.channels = channels
+
+    @staticmethod
+    def _path(websocket) -> str:
+        """兼容不同 websockets 版本的請求路徑"""
+        request = getattr(websocket, "request", None)
+        return request.path if request is not None else websocket.path
+
+    async def handler(self, websocket, path: Optional[str] = None) -> None:
+        """WebSocket 連接處理：/<市場類型>/ws/!ticker@arr、/<市場類型>/stream 或 /<市場類型>/ws/<listenKey>"""
+        parts = (path or self._path(websocket)).strip("/").split("/", 2)
+        market_type = parts[0] if parts else ""
+        if market_type not in MARKET_TYPES or len(parts) < 2:
+            await websocket.close(code=1008, reason="unknown path")
+            return
+        if parts[1] == "stream":
+            channel = self.channels.get(f"{market_type}_stream")
+        elif len(parts) == 3 and parts[2] == "!ticker@arr":
+            channel = self.channels.get(f"{market_type}_ticker")
+        else:
+            channel = self.channels.get(f"{market_type}_user")
+        if channel is None:
+            await websocket.close(code=1008, reason="no recording for this channel")
+            return
+
+        channel.clients.add(websocket)
+        if parts[1] == "stream":
+            channel.subscriptions[websocket] = set()
+        try:
+            async for message in websocket:
+                # 組合流的 SUBSCRIBE/UNSUBSCRIBE 控制消息
+                request = parse_json(message)
+                if not isinstance(request, dict) or websocket not in channel.subscriptions:
+                    continue
+                streams = channel.subscriptions[websocket]
+                if request.get("method") == "SUBSCRIBE":
+                    streams.update(request.get("params", []))
+                elif request.get("method") == "UNSUBSCRIBE":
+                    streams.difference_update(request.get("params", []))
+                await websocket.send(dump_json_str({"result": None, "id": request.get("id")}))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            channel.clients.discard(websocket)
+            channel.subscriptions.pop(websocket, None)
+
+
+def build_channels(args) -> Dict[str, ReplayChannel]:
+    """根據命令行參數載入錄製文件或生成合成數據幀"""
+    channels = {}
+    for market_type in MARKET_TYPES:
+        for channel in CHANNELS:
+            name = f"{market_type}_{channel}"
+            frames: List[Frame] = []
+            if args.recordings:
+                path = os.path.join(args.recordings, f"{name}.txt")
+                if os.path.exists(path):
+                    frames = load_recording(path)
+            elif args.synthetic and channel == "ticker":
+                frames = synthetic_ticker_frames(args.symbols)
+            if frames:
+                channels[name] = ReplayChannel(name, frames, args.speed, args.loop or args.synthetic, stamp=channel == "ticker")
+                print(f"{name}: {len(frames)} 幀")
+    return channels
+
+
+async def serve(args) -> None:
+    """啟動回放服務器"""
+    channels = build_channels(args)
+    if not channels:
+        print("沒有可回放的數據幀，請指定 --recordings 或 --synthetic")
+        return
+    server = ReplayServer(channels)
+    async with websockets.serve(server.handler, args.host, args.port, max_size=None):
+        print(f"回放服務器已啟動: ws://{args.host}:{args.port}，倍速 {args.speed}x")
+        await asyncio.gather(*(channel.run() for channel in channels.values()))
+        print("回放完畢")
+
+
+async def record_channel(url: str, path: str, duration: float, subscribe: Optional[List[str]] = None) -> int:
+    """連接幣安並錄製數據幀"""
+    count = 0
+    deadline = time.monotonic() + duration
+    async with websockets.connect(url, max_size=None) as websocket:
+        if subscribe:
+            await websocket.send(dump_json_str({"method": "SUBSCRIBE", "params": subscribe, "id": 1}))
+        with open(path, "w", encoding="utf-8") as file:
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    message = await asyncio.wait_for(websocket.recv(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                if subscribe and '"result"' in message[:20]:
+                    continue
+                file.write(f"{int(time.time() * 1000)}\t{message}\n")
+                count += 1
+    return count
+
+
+async def record(args) -> None:
+    """錄製全市場行情和指定交易對的組合流數據幀"""
+    os.makedirs(args.output, exist_ok=True)
+    tasks = {}
+    for market_type in MARKET_TYPES:
+        endpoints = LIVE_ENDPOINTS[market_type]
+        tasks[f"{market_type}_ticker"] = record_channel(
+            endpoints["ticker"], os.path.join(args.output, f"{market_type}_ticker.txt"), args.duration)
+        if args.symbols:
+            streams = [f"{symbol.lower()}@{kind}" for symbol in args.symbols for kind in ("kline_1m", "bookTicker", "aggTrade")]
+            tasks[f"{market_type}_stream"] = record_channel(
+                endpoints["stream"], os.path.join(args.output, f"{market_type}_stream.txt"), args.duration, streams)
+    results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+    for name, result in zip(tasks, results):
+        print(f"{name}: {result if isinstance(result, Exception) else f'{result} 幀'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="幣安行情回放服務器")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="回放數據幀")
+    serve_parser.add_argument("--recordings", help="錄製文件目錄（{市場類型}_{ticker|stream|user}.txt）")
+    serve_parser.add_argument("--synthetic", action="store_true", help="沒有錄製文件時生成合成行情幀")
+    serve_parser.add_argument("--symbols", type=int, default=400, help="合成行情幀的交易對數量")
+    serve_parser.add_argument("--speed", type=float, default=1.0, help="回放倍速，如 1、10、100")
+    serve_parser.add_argument("--loop", action="store_true", help="播放完畢後循環")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=9001)
+
+    record_parser = commands.add_parser("record", help="錄製幣安數據幀")
+    record_parser.add_argument("--output", default="recordings", help="輸出目錄")
+    record_parser.add_argument("--duration", type=float, default=300, help="錄製秒數")
+    record_parser.add_argument("--symbols", nargs="*", default=[], help="錄製組合流的交易對")
+
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args) if args.command == "serve" else record(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
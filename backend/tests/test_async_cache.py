@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+異步單飛緩存測試
+
+以可控的時鐘驗證 AsyncSingleFlightCache 的 TTL、過期後仍可使用（stale-while-revalidate）、
+負緩存的過期和並發請求共用一次上游調用。
+
+用法:
+    python -m pytest tests/test_async_cache.py -q
+"""
+
+import asyncio
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core import async_cache
+from app.core.async_cache import AsyncSingleFlightCache
+
+
+class FakeClock:
+    """替代 time.monotonic 的可控時鐘"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+class CountingLoader:
+    """記錄調用次數的加載函數，fail 為 True 時拋出異常"""
+
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0)
+        if self.fail:
+            raise RuntimeError(f"upstream error {self.calls}")
+        return self.calls
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    # 只替換緩存模組使用的時鐘，事件循環仍使用真實時間
+    monkeypatch.setattr(async_cache, "time", types.SimpleNamespace(monotonic=fake))
+    return fake
+
+
+def test_value_is_reused_until_ttl_expires(clock):
+    async def run():
+        cache = AsyncSingleFlightCache("test", ttl=10)
+        loader = CountingLoader()
+        assert await cache.get("key", loader) == 1
+        clock.advance(9.9)
+        assert await cache.get("key", loader) == 1
+        clock.advance(0.2)
+        assert await cache.get("key", loader) == 2
+        assert loader.calls == 2
+        # 單次調用可覆蓋默認 TTL
+        clock.advance(1)
+        assert await cache.get("key", loader, ttl=0.5) == 3
+
+    asyncio.run(run())
+
+
+def test_stale_value_is_returned_while_refreshing(clock):
+    async def run():
+        cache = AsyncSingleFlightCache("test", ttl=10, stale_ttl=5)
+        loader = CountingLoader()
+        assert await cache.get("key", loader) == 1
+        clock.advance(12)
+        assert await cache.get("key", loader) == 1
+        await asyncio.sleep(0.01)
+        assert loader.calls == 2
+        assert await cache.get("key", loader) == 2
+        # 超出 stale_ttl 窗口後同步等待新值
+        clock.advance(16)
+        assert await cache.get("key", loader) == 3
+
+    asyncio.run(run())
+
+
+def test_negative_ttl_suppresses_retries_until_expiry(clock):
+    async def run():
+        cache = AsyncSingleFlightCache("test", ttl=10, negative_ttl=5)
+        loader = CountingLoader()
+        loader.fail = True
+        with pytest.raises(RuntimeError, match="upstream error 1"):
+            await cache.get("key", loader)
+        clock.advance(4.9)
+        with pytest.raises(RuntimeError, match="upstream error 1"):
+            await cache.get("key", loader)
+        assert loader.calls == 1
+        assert cache.stats["negative_hits"] == 1
+
+        clock.advance(0.2)
+        loader.fail = False
+        assert await cache.get("key", loader) == 2
+        assert cache.peek("key") == 2
+
+    asyncio.run(run())
+
+
+def test_failed_refresh_keeps_old_value_during_negative_ttl(clock):
+    async def run():
+        cache = AsyncSingleFlightCache("test", ttl=10, negative_ttl=5)
+        loader = CountingLoader()
+        assert await cache.get("key", loader) == 1
+        clock.advance(11)
+        loader.fail = True
+        assert await cache.get("key", loader) == 1
+        clock.advance(1)
+        assert await cache.get("key", loader) == 1
+        assert loader.calls == 2
+
+        clock.advance(5)
+        loader.fail = False
+        assert await cache.get("key", loader) == 3
+
+    asyncio.run(run())
+
+
+def test_concurrent_requests_share_one_load(clock):
+    async def run():
+        cache = AsyncSingleFlightCache("test", ttl=10)
+        loader = CountingLoader()
+        results = await asyncio.gather(*(cache.get("key", loader) for _ in range(10)))
+        assert results == [1] * 10
+        assert loader.calls == 1
+        assert cache.stats["coalesced"] == 9
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+批量下單結果對齊測試
+
+驗證 TradingService._align_batch_results 在 CCXT 將失敗條目排到最前面時，
+仍按請求順序返回結果；以及 gather_bounded 按輸入順序返回結果並重新拋出取消。
+
+用法:
+    python -m pytest tests/test_batch_orders.py -q
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(BACKEND_DIR))
+
+from backend.utils.batch import gather_bounded
+
+
+async def _import_trading_service():
+    # trading 模組導入時會創建連接池的定期清理任務，需要在事件循環中導入
+    from app.services.trading import TradingService
+    return TradingService
+
+
+TradingService = asyncio.run(_import_trading_service())
+align = TradingService._align_batch_results
+
+
+def rejected(code: int = -2019, msg: str = "Margin is insufficient.") -> dict:
+    """CCXT 解析出的被拒絕條目：沒有訂單ID和時間戳"""
+    return {"id": None, "clientOrderId": None, "status": "rejected", "info": {"code": code, "msg": msg}}
+
+
+def test_rejected_entry_in_middle_of_chunk():
+    keys = ["c1", "c2", "c3", "c4", "c5"]
+    # 第3個訂單被拒絕，CCXT 按時間戳排序後它排在最前面
+    results = [rejected(), {"id": "1", "clientOrderId": "c1"}, {"id": "2", "clientOrderId": "c2"},
+               {"id": "4", "clientOrderId": "c4"}, {"id": "5", "clientOrderId": "c5"}]
+    aligned = align(keys, results, "clientOrderId")
+    assert [result["clientOrderId"] for result in aligned] == ["c1", "c2", None, "c4", "c5"]
+    assert aligned[2]["status"] == "rejected"
+    assert TradingService._is_failed_batch_result(aligned[2])
+    assert TradingService._batch_error_message(aligned[2]) == "-2019: Margin is insufficient."
+    assert not any(TradingService._is_failed_batch_result(aligned[i]) for i in (0, 1, 3, 4))
+
+
+def test_multiple_rejections_keep_relative_order():
+    keys = ["c1", "c2", "c3", "c4"]
+    results = [rejected(-1111, "first"), rejected(-2022, "second"),
+               {"id": "1", "clientOrderId": "c1"}, {"id": "4", "clientOrderId": "c4"}]
+    aligned = align(keys, results, "clientOrderId")
+    assert aligned[0]["clientOrderId"] == "c1"
+    assert aligned[1]["info"]["msg"] == "first"
+    assert aligned[2]["info"]["msg"] == "second"
+    assert aligned[3]["clientOrderId"] == "c4"
+
+
+def test_missing_results_are_none():
+    aligned = align(["1", "2", "3"], [{"id": 3}, {"id": 1}], "id")
+    assert aligned[0]["id"] == 1
+    assert aligned[1] is None
+    assert aligned[2]["id"] == 3
+    assert TradingService._is_failed_batch_result(aligned[1])
+
+
+def test_gather_bounded_keeps_order_and_returns_exceptions():
+    async def run():
+        async def work(item):
+            await asyncio.sleep(0.001 * (5 - item))
+            if item == 2:
+                raise ValueError("failed")
+            return item * 10
+
+        results = await gather_bounded(work, [0, 1, 2, 3, 4], 2)
+        assert results[:2] == [0, 10] and results[3:] == [30, 40]
+        assert isinstance(results[2], ValueError)
+
+    asyncio.run(run())
+
+
+def test_gather_bounded_reraises_cancelled_child():
+    async def run():
+        async def work(item):
+            if item == 1:
+                raise asyncio.CancelledError()
+            return item
+
+        with pytest.raises(asyncio.CancelledError):
+            await gather_bounded(work, [0, 1, 2], 3)
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+訂單簿增量序號規則測試
+
+驗證 OrderBook.apply_event 按幣安現貨和期貨的更新ID規則丟棄過期事件、
+接受第一個可銜接的事件，並在序號不連續時要求重新同步。
+
+用法:
+    python -m pytest tests/test_order_book.py -q
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.order_book import OrderBook
+
+
+def make_book(market_type: str, last_update_id: int = 100) -> OrderBook:
+    """以 [100, 1] 買盤和 [101, 1] 賣盤的快照建立訂單簿"""
+    book = OrderBook("BTCUSDT", market_type)
+    book.load_snapshot({
+        "lastUpdateId": last_update_id,
+        "bids": [["100", "1"]],
+        "asks": [["101", "1"]],
+    })
+    return book
+
+
+def event(first: int, last: int, prev: int = None, bids=None, asks=None) -> dict:
+    """構造增量深度事件，prev 為期貨事件的 pu"""
+    data = {"U": first, "u": last, "b": bids or [], "a": asks or []}
+    if prev is not None:
+        data["pu"] = prev
+    return data
+
+
+def test_spot_drops_events_up_to_last_update_id():
+    book = make_book("spot")
+    assert book.apply_event(event(90, 100, bids=[["100", "5"]]))
+    assert book.last_update_id == 100
+    assert book.bids.best() == 100.0 and book.bids.quantities[-1] == 1.0
+
+
+def test_spot_first_event_must_cover_next_id():
+    book = make_book("spot")
+    assert not book.apply_event(event(103, 105))
+
+    book = make_book("spot")
+    assert book.apply_event(event(95, 102, bids=[["100.5", "2"]]))
+    assert book.last_update_id == 102
+    assert book.bids.best() == 100.5
+
+
+def test_spot_requires_contiguous_events():
+    book = make_book("spot")
+    assert book.apply_event(event(101, 102))
+    assert book.apply_event(event(103, 104))
+    assert not book.apply_event(event(106, 107))
+
+
+def test_futures_first_event_ending_at_last_update_id_is_applied():
+    book = make_book("futures")
+    assert book.apply_event(event(95, 100, prev=94, asks=[["101", "3"]]))
+    assert book.last_update_id == 100
+    assert book.asks.quantities[0] == 3.0
+    # 後續事件以 pu 銜接，不需要重新同步
+    assert book.apply_event(event(101, 104, prev=100))
+    assert book.last_update_id == 104
+
+
+def test_futures_drops_only_older_events():
+    book = make_book("futures")
+    assert book.apply_event(event(90, 99, prev=89, bids=[["100", "9"]]))
+    assert book.bids.quantities[-1] == 1.0
+    assert book.apply_event(event(98, 103, prev=97))
+    # 已應用後，u 等於 lastUpdateId 的重複事件被丟棄
+    assert book.apply_event(event(98, 103, prev=97, bids=[["100", "9"]]))
+    assert book.bids.quantities[-1] == 1.0
+
+
+def test_futures_requires_pu_chain():
+    book = make_book("futures")
+    assert book.apply_event(event(99, 102, prev=98))
+    assert not book.apply_event(event(104, 106, prev=103))
+
+
+def test_zero_quantity_removes_level():
+    book = make_book("spot")
+    assert book.apply_event(event(101, 101, bids=[["100", "0"], ["99", "2"]], asks=[["102", "1"]]))
+    assert book.bids.best() == 99.0
+    assert book.snapshot(5)["asks"] == [[101.0, 1.0], [102.0, 1.0]]
+    assert book.spread() == 2.0
+
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+交易所請求頻率限制器測試
+
+以可控的時鐘驗證令牌桶的透支與補充、acquire 的等待與超時退還、
+按幣安響應頭校正各 API 類別的權重桶，以及 API 類別的識別。
+
+用法:
+    python -m pytest tests/test_rate_limiter.py -q
+"""
+
+import asyncio
+import os
+import sys
+import types
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(BACKEND_DIR))
+
+from backend.app.schemas.trading import ExchangeEnum
+from backend.utils import rate_limiter
+from backend.utils.rate_limiter import (
+    BINANCE_API_FAMILIES, IP_LIMITS, ExchangeRateLimiter, RateLimitWaitExceeded, TokenBucket,
+)
+
+CAPACITY, WINDOW = IP_LIMITS[ExchangeEnum.BINANCE]
+
+
+class FakeClock:
+    """替代 time.monotonic 的可控時鐘，sleep 只推進時鐘並記錄等待時間"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+    async def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.advance(seconds)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    # 只替換限制器模組使用的時鐘和 sleep，事件循環不受影響
+    monkeypatch.setattr(rate_limiter, "time", types.SimpleNamespace(monotonic=fake))
+    monkeypatch.setattr(rate_limiter, "asyncio", types.SimpleNamespace(sleep=fake.sleep))
+    return fake
+
+
+@pytest.fixture
+def limiter(clock):
+    return ExchangeRateLimiter(max_wait=5, use_redis=False)
+
+
+def test_token_bucket_overdraft_and_refill(clock):
+    bucket = TokenBucket(60, 60)
+    assert bucket.take(50) == 0
+    # 透支 10 個額度，按每秒 1 個的速度需要等待 10 秒
+    assert bucket.take(20) == pytest.approx(10)
+    clock.advance(4)
+    assert bucket.available() == pytest.approx(-6)
+    # 退還額度
+    assert bucket.take(-6) == 0
+    clock.advance(100)
+    assert bucket.available() == 60
+    assert bucket.cap(15) == 0 and bucket.available() == 15
+
+
+def test_acquire_waits_for_overdraft(limiter, clock):
+    async def run():
+        assert await limiter.acquire(ExchangeEnum.BINANCE, weight=CAPACITY) == 0
+        wait = await limiter.acquire(ExchangeEnum.BINANCE, weight=CAPACITY / WINDOW * 2)
+        assert wait == pytest.approx(2)
+        assert clock.sleeps == [pytest.approx(2)]
+        assert limiter.stats["delayed"] == 1
+
+    asyncio.run(run())
+
+
+def test_acquire_over_max_wait_refunds_reservation(limiter, clock):
+    async def run():
+        await limiter.acquire(ExchangeEnum.BINANCE, "key", weight=CAPACITY, orders=1, api="fapiPrivate")
+        bucket = limiter.buckets["binance:ip:fapi"]
+        orders = [name for name in limiter.buckets if name.endswith(":fapi:orders_10s")]
+        assert len(orders) == 1
+        before = limiter.buckets[orders[0]].available()
+
+        with pytest.raises(RateLimitWaitExceeded) as info:
+            await limiter.acquire(ExchangeEnum.BINANCE, "key", weight=CAPACITY / WINDOW * 10, orders=1,
+                                  api="fapiPrivate")
+        assert info.value.retry_after == pytest.approx(10)
+        assert bucket.available() == pytest.approx(0)
+        assert limiter.buckets[orders[0]].available() == pytest.approx(before)
+        assert limiter.stats["rejected"] == 1
+        assert clock.sleeps == []
+
+    asyncio.run(run())
+
+
+def test_families_have_independent_buckets(limiter):
+    async def run():
+        await limiter.acquire(ExchangeEnum.BINANCE, weight=CAPACITY, api="fapiPublic")
+        # 合約額度用完不影響現貨請求
+        assert await limiter.acquire(ExchangeEnum.BINANCE, weight=10, api="public") == 0
+        assert limiter.buckets["binance:ip:spot"].available() == CAPACITY - 10
+
+    asyncio.run(run())
+
+
+def test_used_weight_header_scales_into_family_bucket(limiter):
+    async def run():
+        await limiter.update_from_headers(ExchangeEnum.BINANCE, None, "https://fapi.binance.com/fapi/v1/depth",
+                                          {"X-MBX-USED-WEIGHT-1M": "1200"})
+        await limiter.update_from_headers(ExchangeEnum.BINANCE, None, "https://api.binance.com/api/v3/depth",
+                                          {"X-MBX-USED-WEIGHT-1M": "600"})
+        fapi = CAPACITY - 1200 * CAPACITY / BINANCE_API_FAMILIES["fapi"]
+        spot = CAPACITY - 600 * CAPACITY / BINANCE_API_FAMILIES["spot"]
+        assert limiter.buckets["binance:ip:fapi"].available() == pytest.approx(fapi)
+        assert limiter.buckets["binance:ip:spot"].available() == pytest.approx(spot)
+
+        # 已用額度較少的響應頭不會調高本地額度
+        await limiter.update_from_headers(ExchangeEnum.BINANCE, None, "https://fapi.binance.com/fapi/v1/depth",
+                                          {"x-mbx-used-weight-1m": "10"})
+        assert limiter.buckets["binance:ip:fapi"].available() == pytest.approx(fapi)
+        assert limiter.stats["corrections"] == 3
+
+    asyncio.run(run())
+
+
+def test_order_count_headers_follow_family_limits(limiter):
+    async def run():
+        key_id = limiter._key_id("key")
+        await limiter.update_from_headers(ExchangeEnum.BINANCE, "key", "https://api.binance.com/api/v3/order",
+                                          {"X-MBX-ORDER-COUNT-10S": "40", "X-MBX-ORDER-COUNT-1D": "7",
+                                           "X-MBX-ORDER-COUNT-1M": "9"})
+        assert limiter.buckets[f"binance:{key_id}:spot:orders_10s"].available() == 60
+        assert limiter.buckets[f"binance:{key_id}:spot:orders_1d"].available() == 200000 - 7
+        # 現貨沒有每分鐘下單限制，對應的響應頭被忽略
+        assert f"binance:{key_id}:spot:orders_1m" not in limiter.buckets
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("api, family", [
+    ("fapiPublic", "fapi"),
+    ("fapiPrivateV2", "fapi"),
+    ("dapiPrivate", "dapi"),
+    ("eapiPublic", "eapi"),
+    ("papiV2", "papi"),
+    ("public", "spot"),
+    ("private", "spot"),
+    ("sapi", "spot"),
+    ("sapiV3", "spot"),
+    (None, "spot"),
+    ("https://fapi.binance.com/fapi/v1/order", "fapi"),
+    ("https://dapi.binance.com/dapi/v1/depth", "dapi"),
+    ("https://api.binance.com/api/v3/order", "spot"),
+    ("https://api.binance.com/sapi/v1/capital/config/getall", "spot"),
+])
+def test_api_family(api, family):
+    assert ExchangeRateLimiter._api_family(ExchangeEnum.BINANCE, api) == family
+
+
+def test_other_exchanges_have_no_family(limiter):
+    assert ExchangeRateLimiter._api_family(ExchangeEnum.BYBIT, "fapiPublic") is None
+
+    async def run():
+        await limiter.acquire(ExchangeEnum.BYBIT, weight=5)
+        assert "bybit:ip" in limiter.buckets
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,53 @@
+"""
+批量請求工具
+
+提供限制並發數的批量執行，以及按交易所批量接口的上限切分請求。
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, List, Sequence, TypeVar
+
+T = TypeVar("T")
+
+
+async def gather_bounded(func: Callable[[T], Awaitable[Any]], items: Sequence[T], concurrency: int) -> List[Any]:
+    """
+    對每個元素調用 func，同時進行的調用不超過 concurrency
+
+    Args:
+        func: 接收單個元素的協程函數
+        items: 元素列表
+        concurrency: 最大並發數
+
+    Returns:
+        List[Any]: 按輸入順序排列的結果，調用失敗的位置為對應的異常對象
+
+    Raises:
+        asyncio.CancelledError: 任一調用被取消時在所有調用結束後重新拋出，
+            取消不會作為結果返回，調用方只需檢查 Exception
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(item: T) -> Any:
+        async with semaphore:
+            return await func(item)
+
+    results = await asyncio.gather(*(run(item) for item in items), return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException) and not isinstance(result, Exception):
+            raise result
+    return results
+
+
+def chunked(items: Sequence[T], size: int) -> List[List[T]]:
+    """
+    按固定大小切分列表
+
+    Args:
+        items: 元素列表
+        size: 每組的最大元素數
+
+    Returns:
+        List[List[T]]: 切分後的列表，保持原有順序
+    """
+    return [list(items[i:i + size]) for i in range(0, len(items), size)]
@@ -6,6 +6,7 @@ import random
 import websockets
 from typing import Dict, Any, Optional, Callable, List, Tuple
 from backend.utils.ed25519_util import Ed25519KeyManager
+from backend.app.core.json_utils import parse_json
 import uuid
 
 logger = logging.getLogger(__name__)
@@ -582,9 +583,10 @@ class BinanceWebSocketClient:
                     
                     # 解析消息
                     try:
-                        response = json.loads(message)
-                        logger.debug(f"收到響應摘要: {_log_response_summary(response)}")
-                    except json.JSONDecodeError:
+                        response = parse_json(message)
+                        if logger.isEnabledFor(logging.DEBUG):
+                            logger.debug(f"收到響應摘要: {_log_response_summary(response)}")
+                    except ValueError:
                         logger.error(f"無法解析 WebSocket 響應: {message}")
                         continue
                     
@@ -1466,7 +1468,7 @@ class BinanceWebSocketClient:
                     message = await user_ws.recv()
                     
                     # 解析消息
-                    data = json.loads(message)
+                    data = parse_json(message)
                     
                     # 處理不同類型的事件
                     event_type = data.get("e")
@@ -1495,7 +1497,7 @@ class BinanceWebSocketClient:
                     if callback and callable(callback):
                         asyncio.create_task(callback(data))
                         
-                except json.JSONDecodeError:
+                except ValueError:
                     logger.error(f"無法解析WebSocket消息: {message}")
                     continue
                 except Exception as msg_err:
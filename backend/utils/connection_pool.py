@@ -1,12 +1,15 @@
 import asyncio
 import time
 import logging
-from typing import Dict, Any, Optional, Tuple
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional, Tuple
 import ccxt.async_support as ccxt
 
 # 修改導入路徑以適應新位置
 from backend.app.schemas.trading import ExchangeEnum
 from backend.utils.exchange import get_exchange_client
+from backend.utils.market_metadata import market_metadata_cache
+from backend.utils.rate_limiter import exchange_rate_limiter
 from backend.app.core.secure_key_cache import SecureKeyCache
 from backend.app.core.api_key_manager import ApiKeyManager
 from sqlalchemy.orm import Session
@@ -19,13 +22,19 @@ class ExchangeConnectionPool:
     
     管理并复用交易所客户端连接，避免频繁创建和销毁连接
     提供连接获取、释放和健康检查等功能
+
+    并发设计：
+    - 复用已有连接的快速路径不加锁
+    - 同一个 user:exchange 的创建和刷新是单飞的，并发请求共享同一次创建
+    - 连接的放入、移除、淘汰和清理按分片加锁，创建客户端和关闭连接等网络操作在锁外进行
     """
     
     def __init__(self, 
                  max_connections: int = 100,
                  max_idle_time: int = 300,
                  cleanup_interval: int = 120,
-                 health_check_interval: int = 60):
+                 health_check_interval: int = 60,
+                 shard_count: int = 16):
         """
         初始化连接池
         
@@ -34,15 +43,21 @@ class ExchangeConnectionPool:
             max_idle_time: 连接最大空闲时间(秒)，超过后会被清理
             cleanup_interval: 定期清理的时间间隔(秒)
             health_check_interval: 健康检查结果缓存时间(秒)
+            shard_count: 分片锁数量
         """
         self.pools: Dict[str, ccxt.Exchange] = {}  # 按用户ID和交易所分组的连接池
         self.last_used: Dict[str, float] = {}  # 记录每个连接的最后使用时间
-        self.lock = asyncio.Lock()  # 用于并发访问保护
+        self.shard_count = shard_count
+        self.shard_locks = [asyncio.Lock() for _ in range(shard_count)]  # 按 pool_key 分片的锁
         self.max_connections = max_connections
         self.max_idle_time = max_idle_time
         self.cleanup_interval = cleanup_interval
         self.health_check_interval = health_check_interval
         
+        # 进行中的连接创建/刷新与健康检查，按 pool_key 单飞
+        self._creating: Dict[str, asyncio.Task] = {}
+        self._health_checks: Dict[str, asyncio.Task] = {}
+        
         # 健康状态缓存
         self.health_status: Dict[str, Tuple[float, bool]] = {}  # 键: pool_key, 值: (检查时间, 是否健康)
         
@@ -50,24 +65,15 @@ class ExchangeConnectionPool:
         self.reuse_counts: Dict[str, int] = {}  # 连接复用次数计数
         self.max_reuse_count = 1000  # 连接最大复用次数，超过后将刷新
         
-        # 请求频率限制
-        self.rate_limits = {
-            ExchangeEnum.BINANCE: {"max_requests": 1200, "per_minute": 60},
-            ExchangeEnum.BYBIT: {"max_requests": 600, "per_minute": 60},
-            ExchangeEnum.okx: {"max_requests": 600, "per_minute": 60},
-            ExchangeEnum.GATE: {"max_requests": 600, "per_minute": 60},
-            ExchangeEnum.MEXC: {"max_requests": 500, "per_minute": 60},
-        }
-        self.request_counters: Dict[ExchangeEnum, Dict[str, Any]] = {}  # 按交易所记录请求次数
-        
         # 连接统计信息
         self.stats = {
             "created": 0,          # 创建的连接总数
             "reused": 0,           # 重用的连接次数  
+            "coalesced": 0,        # 加入其他请求正在进行的创建的次数
             "errors": 0,           # 连接错误次数
             "refreshed": 0,        # 刷新的连接数
             "cleaned": 0,          # 清理的连接数
-            "rejected": 0,         # 由于频率限制被拒绝的请求数
+            "evicted": 0,          # 连接池已满时淘汰的连接数
             "avg_response_time": 0.0,  # 平均响应时间
             "total_response_time": 0.0,  # 总响应时间
             "total_operations": 0,  # 总操作次数
@@ -75,8 +81,44 @@ class ExchangeConnectionPool:
             "connections_by_exchange": {},  # 按交易所统计连接数
         }
         
+        # 等待时间统计：lock 为等待分片锁的时间，creation 为等待连接创建完成的时间
+        self.wait_stats = {
+            kind: {"count": 0, "total": 0.0, "max": 0.0} for kind in ("lock", "creation")
+        }
+        
         # 启动定期清理任务
         self._cleanup_task = asyncio.create_task(self._schedule_cleanup())
+    
+    def _record_wait(self, kind: str, seconds: float) -> None:
+        wait = self.wait_stats[kind]
+        wait["count"] += 1
+        wait["total"] += seconds
+        wait["max"] = max(wait["max"], seconds)
+    
+    def _shard_index(self, pool_key: str) -> int:
+        return hash(pool_key) % self.shard_count
+    
+    @asynccontextmanager
+    async def _shard_lock(self, shard: int):
+        """获取分片锁并记录等待时间"""
+        started = time.perf_counter()
+        async with self.shard_locks[shard]:
+            self._record_wait("lock", time.perf_counter() - started)
+            yield
+    
+    def _remove(self, pool_key: str) -> Optional[ccxt.Exchange]:
+        """从连接池移除连接及其状态，返回被移除的客户端，调用方负责在锁外关闭"""
+        client = self.pools.pop(pool_key, None)
+        self.last_used.pop(pool_key, None)
+        self.reuse_counts.pop(pool_key, None)
+        self.health_status.pop(pool_key, None)
+        return client
+    
+    async def _close(self, client: ccxt.Exchange, pool_key: str) -> None:
+        try:
+            await client.close()
+        except Exception as e:
+            logger.warning(f"关闭连接出错: {pool_key} - {str(e)}")
             
     async def get_client(self, 
                         user_id: int, 
@@ -86,8 +128,8 @@ class ExchangeConnectionPool:
         """
         获取一个可用的交易所客户端
         
-        如果连接池中已有可用连接，则返回该连接
-        否则创建新连接并添加到连接池
+        如果连接池中已有可用连接，则不加锁直接返回该连接
+        否则创建新连接并添加到连接池，同一用户和交易所的并发请求共享同一次创建
         
         Args:
             user_id: 用户ID
@@ -102,59 +144,19 @@ class ExchangeConnectionPool:
         pool_key = f"{user_id}:{exchange.value}"
         
         try:
-            # 检查请求频率限制
-            await self._check_rate_limit(exchange)
-            
-            async with self.lock:
-                # 检查是否已有可用连接
-                if pool_key in self.pools and self.pools[pool_key]:
-                    # 检查复用次数是否超过限制
-                    if pool_key in self.reuse_counts and self.reuse_counts[pool_key] >= self.max_reuse_count:
-                        logger.info(f"连接 {pool_key} 已达到最大复用次数 {self.max_reuse_count}，刷新连接")
-                        client = await self._refresh_client_internal(pool_key, exchange, api_key, api_secret)
-                        self.reuse_counts[pool_key] = 0
-                        return client
-                        
-                    # 复用连接
-                    client = self.pools[pool_key]
+            # 快速路径：复用已有连接，不加锁
+            client = self.pools.get(pool_key)
+            if client is not None and pool_key not in self._creating:
+                if self.reuse_counts.get(pool_key, 0) < self.max_reuse_count and client.apiKey == api_key:
                     self.last_used[pool_key] = time.time()
                     self.reuse_counts[pool_key] = self.reuse_counts.get(pool_key, 0) + 1
                     self.stats["reused"] += 1
                     return client
                     
-                # 检查是否达到最大连接数
-                if len(self.pools) >= self.max_connections:
-                    # 释放最久未使用的连接
-                    await self._release_oldest_connection()
+                # 复用次数超过限制或密钥已更换时刷新连接
+                logger.info(f"连接 {pool_key} 已达到最大复用次数 {self.max_reuse_count} 或密钥已更换，刷新连接")
                 
-                # 创建新连接
-                try:
-                    client = await get_exchange_client(exchange, api_key, api_secret)
-                    self.pools[pool_key] = client
-                    self.last_used[pool_key] = time.time()
-                    self.reuse_counts[pool_key] = 0
-                    
-                    # 更新统计信息
-                    self.stats["created"] += 1
-                    
-                    # 按交易所统计
-                    exchange_key = exchange.value
-                    if exchange_key not in self.stats["connections_by_exchange"]:
-                        self.stats["connections_by_exchange"][exchange_key] = 0
-                    self.stats["connections_by_exchange"][exchange_key] += 1
-                    
-                    return client
-                except Exception as e:
-                    self.stats["errors"] += 1
-                    
-                    # 错误统计
-                    error_type = type(e).__name__
-                    if error_type not in self.stats["errors_by_type"]:
-                        self.stats["errors_by_type"][error_type] = 0
-                    self.stats["errors_by_type"][error_type] += 1
-                    
-                    logger.error(f"创建交易所连接失败: {str(e)}")
-                    raise
+            return await self._wait_creation(pool_key, exchange, api_key, api_secret)
                     
         except Exception as e:
             # 记录错误但继续抛出
@@ -168,62 +170,96 @@ class ExchangeConnectionPool:
             self.stats["avg_response_time"] = (
                 self.stats["total_response_time"] / self.stats["total_operations"]
             )
+    
+    async def _wait_creation(self, 
+                             pool_key: str, 
+                             exchange: ExchangeEnum, 
+                             api_key: str, 
+                             api_secret: str) -> ccxt.Exchange:
+        """启动或加入 pool_key 的连接创建，并等待其完成"""
+        task = self._creating.get(pool_key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            task = asyncio.create_task(self._create_client(pool_key, exchange, api_key, api_secret))
+            # 无人等待时也要取回异常，避免 "exception was never retrieved"
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._creating[pool_key] = task
+            
+        started = time.perf_counter()
+        try:
+            # shield：单个等待者被取消时不影响其他共享这次创建的请求
+            return await asyncio.shield(task)
+        finally:
+            self._record_wait("creation", time.perf_counter() - started)
+    
+    async def _create_client(self, 
+                             pool_key: str, 
+                             exchange: ExchangeEnum, 
+                             api_key: str, 
+                             api_secret: str) -> ccxt.Exchange:
+        """创建客户端并放入连接池，替换已有连接时在后续关闭旧连接"""
+        try:
+            # 检查是否达到最大连接数
+            if pool_key not in self.pools and len(self.pools) >= self.max_connections:
+                # 释放最久未使用的连接
+                await self._release_oldest_connection()
+            
+            try:
+                client = await get_exchange_client(exchange, api_key, api_secret)
+            except Exception as e:
+                self.stats["errors"] += 1
+                
+                # 错误统计
+                error_type = type(e).__name__
+                if error_type not in self.stats["errors_by_type"]:
+                    self.stats["errors_by_type"][error_type] = 0
+                self.stats["errors_by_type"][error_type] += 1
+                
+                logger.error(f"创建交易所连接失败: {str(e)}")
+                raise
+                
+            async with self._shard_lock(self._shard_index(pool_key)):
+                old_client = self._remove(pool_key)
+                self.pools[pool_key] = client
+                self.last_used[pool_key] = time.time()
+                self.reuse_counts[pool_key] = 0
+                
+            if old_client is not None:
+                self.stats["refreshed"] += 1
+                await self._close(old_client, pool_key)
+            else:
+                # 更新统计信息
+                self.stats["created"] += 1
+                
+                # 按交易所统计
+                exchange_key = exchange.value
+                if exchange_key not in self.stats["connections_by_exchange"]:
+                    self.stats["connections_by_exchange"][exchange_key] = 0
+                self.stats["connections_by_exchange"][exchange_key] += 1
+                
+            return client
+        finally:
+            self._creating.pop(pool_key, None)
             
     async def _release_oldest_connection(self) -> None:
         """
         释放最久未使用的连接
         在连接池已满时调用
         """
-        if not self.last_used:
+        candidates = [(key, used) for key, used in self.last_used.items() if key not in self._creating]
+        if not candidates:
             return
             
         # 找出最久未使用的连接
-        oldest_key = min(self.last_used.items(), key=lambda x: x[1])[0]
+        oldest_key = min(candidates, key=lambda x: x[1])[0]
         logger.info(f"连接池已满，释放最久未使用的连接: {oldest_key}")
         
-        # 解析key
-        user_id_str, exchange_value = oldest_key.split(":")
-        await self.close_client(int(user_id_str), ExchangeEnum(exchange_value))
-    
-    async def _check_rate_limit(self, exchange: ExchangeEnum) -> None:
-        """
-        检查请求频率限制
-        超过限制时会等待适当时间
-        
-        Args:
-            exchange: 交易所枚举
-        """
-        if exchange not in self.rate_limits:
-            return
-            
-        current_time = time.time()
-        minute_start = int(current_time / 60) * 60
-        
-        if exchange not in self.request_counters:
-            self.request_counters[exchange] = {"count": 1, "minute_start": minute_start}
-            return
-            
-        counter = self.request_counters[exchange]
-        
-        # 如果是新的一分钟，重置计数器
-        if minute_start > counter["minute_start"]:
-            counter["count"] = 1
-            counter["minute_start"] = minute_start
-            return
-            
-        # 检查是否超过限制
-        if counter["count"] >= self.rate_limits[exchange]["max_requests"]:
-            wait_time = 60 - (current_time - minute_start)
-            logger.warning(f"已达到{exchange}请求频率限制，等待{wait_time:.2f}秒")
-            self.stats["rejected"] += 1
-            await asyncio.sleep(wait_time)
-            # 重置计数器
-            counter["count"] = 1
-            counter["minute_start"] = int(time.time() / 60) * 60
-            return
-            
-        # 增加计数
-        counter["count"] += 1
+        async with self._shard_lock(self._shard_index(oldest_key)):
+            client = self._remove(oldest_key)
+        if client is not None:
+            self.stats["evicted"] += 1
+            await self._close(client, oldest_key)
             
     async def release_client(self, user_id: int, exchange: ExchangeEnum) -> None:
         """
@@ -234,7 +270,8 @@ class ExchangeConnectionPool:
             exchange: 交易所枚举
         """
         pool_key = f"{user_id}:{exchange.value}"
-        self.last_used[pool_key] = time.time()
+        if pool_key in self.pools:
+            self.last_used[pool_key] = time.time()
     
     async def close_client(self, user_id: int, exchange: ExchangeEnum) -> None:
         """
@@ -246,49 +283,12 @@ class ExchangeConnectionPool:
         """
         pool_key = f"{user_id}:{exchange.value}"
         
-        async with self.lock:
-            if pool_key in self.pools:
-                client = self.pools[pool_key]
-                try:
-                    await client.close()
-                except Exception as e:
-                    logger.warning(f"关闭连接出错: {str(e)}")
-                
-                del self.pools[pool_key]
-                if pool_key in self.last_used:
-                    del self.last_used[pool_key]
-                if pool_key in self.reuse_counts:
-                    del self.reuse_counts[pool_key]
-                if pool_key in self.health_status:
-                    del self.health_status[pool_key]
-                
-                self.stats["cleaned"] += 1
-    
-    async def _refresh_client_internal(self, 
-                                     pool_key: str,
-                                     exchange: ExchangeEnum, 
-                                     api_key: str, 
-                                     api_secret: str) -> ccxt.Exchange:
-        """内部使用的刷新连接方法，无需再次获取锁"""
-        if pool_key in self.pools:
-            client = self.pools[pool_key]
-            try:
-                await client.close()
-            except Exception as e:
-                logger.warning(f"刷新连接时关闭旧连接出错: {str(e)}")
-        
-        # 创建新连接
-        client = await get_exchange_client(exchange, api_key, api_secret)
-        
-        self.pools[pool_key] = client
-        self.last_used[pool_key] = time.time()
-        self.stats["refreshed"] += 1
-        
-        # 清除健康状态缓存
-        if pool_key in self.health_status:
-            del self.health_status[pool_key]
-        
-        return client
+        async with self._shard_lock(self._shard_index(pool_key)):
+            client = self._remove(pool_key)
+            
+        if client is not None:
+            await self._close(client, pool_key)
+            self.stats["cleaned"] += 1
     
     async def refresh_client(self, 
                            user_id: int, 
@@ -296,7 +296,9 @@ class ExchangeConnectionPool:
                            api_key: str, 
                            api_secret: str) -> ccxt.Exchange:
         """
-        刷新连接，关闭旧连接并创建新连接
+        刷新连接，创建新连接替换旧连接后关闭旧连接
+        
+        同一连接的并发刷新只会创建一次新连接
         
         Args:
             user_id: 用户ID
@@ -308,9 +310,7 @@ class ExchangeConnectionPool:
             ccxt.Exchange: 新的交易所客户端实例
         """
         pool_key = f"{user_id}:{exchange.value}"
-        
-        async with self.lock:
-            return await self._refresh_client_internal(pool_key, exchange, api_key, api_secret)
+        return await self._wait_creation(pool_key, exchange, api_key, api_secret)
     
     async def check_client_health(self, 
                                 user_id: int, 
@@ -319,6 +319,7 @@ class ExchangeConnectionPool:
         检查客户端连接是否健康
         
         使用缓存机制减少频繁检查，在缓存有效期内直接返回上次检查结果
+        缓存过期时同一连接的并发检查共享同一次请求
         
         Args:
             user_id: 用户ID
@@ -336,16 +337,16 @@ class ExchangeConnectionPool:
             if current_time - last_check_time < self.health_check_interval:
                 return is_healthy
         
-        # 执行实际的健康检查
-        is_healthy = await self._perform_health_check(pool_key)
-        
-        # 缓存结果
-        self.health_status[pool_key] = (current_time, is_healthy)
-        return is_healthy
+        task = self._health_checks.get(pool_key)
+        if task is None:
+            task = asyncio.create_task(self._perform_health_check(pool_key))
+            self._health_checks[pool_key] = task
+            task.add_done_callback(lambda t: self._health_checks.pop(pool_key, None))
+        return await asyncio.shield(task)
     
     async def _perform_health_check(self, pool_key: str) -> bool:
         """
-        执行实际的健康检查
+        执行实际的健康检查并缓存结果
         
         Args:
             pool_key: 连接池键
@@ -353,46 +354,54 @@ class ExchangeConnectionPool:
         Returns:
             bool: 连接是否健康
         """
-        if pool_key not in self.pools:
+        client = self.pools.get(pool_key)
+        if client is None:
             return False
             
-        client = self.pools[pool_key]
-        
         try:
             # 使用较轻量的操作验证连接有效性
             await client.fetch_time()
-            return True
+            is_healthy = True
         except Exception as e:
             logger.warning(f"连接健康检查失败: {pool_key} - {str(e)}")
-            return False
+            is_healthy = False
+            
+        # 连接在检查期间被替换或移除时不缓存结果
+        if self.pools.get(pool_key) is client:
+            self.health_status[pool_key] = (time.time(), is_healthy)
+        return is_healthy
     
     async def cleanup_idle_connections(self) -> None:
         """
         清理空闲连接
         
-        关闭超过最大空闲时间的连接，释放资源
+        按分片逐个加锁移除超过最大空闲时间的连接，在锁外关闭，释放资源
         """
         current_time = time.time()
         
-        async with self.lock:
-            for pool_key, last_used in list(self.last_used.items()):
-                if current_time - last_used > self.max_idle_time:
-                    if pool_key in self.pools:
-                        client = self.pools[pool_key]
-                        try:
-                            await client.close()
-                        except Exception as e:
-                            logger.warning(f"关闭空闲连接出错: {str(e)}")
-                            
-                        del self.pools[pool_key]
-                        del self.last_used[pool_key]
-                        if pool_key in self.reuse_counts:
-                            del self.reuse_counts[pool_key]
-                        if pool_key in self.health_status:
-                            del self.health_status[pool_key]
+        # 按分片分组候选连接
+        shards: Dict[int, List[str]] = {}
+        for pool_key, last_used in list(self.last_used.items()):
+            if current_time - last_used > self.max_idle_time:
+                shards.setdefault(self._shard_index(pool_key), []).append(pool_key)
+                
+        for shard, keys in shards.items():
+            removed = []
+            async with self._shard_lock(shard):
+                for pool_key in keys:
+                    # 加锁后再次确认：等待期间可能已被复用或正在刷新
+                    last_used = self.last_used.get(pool_key)
+                    if last_used is None or pool_key in self._creating:
+                        continue
+                    if current_time - last_used > self.max_idle_time:
+                        client = self._remove(pool_key)
+                        if client is not None:
+                            removed.append((pool_key, client))
                             
-                        self.stats["cleaned"] += 1
-                        logger.info(f"已清理空闲连接: {pool_key}")
+            for pool_key, client in removed:
+                await self._close(client, pool_key)
+                self.stats["cleaned"] += 1
+                logger.info(f"已清理空闲连接: {pool_key}")
     
     async def _schedule_cleanup(self) -> None:
         """
@@ -414,18 +423,19 @@ class ExchangeConnectionPool:
         """
         logger.info("正在清理所有交易所连接...")
         
-        async with self.lock:
-            for pool_key, client in list(self.pools.items()):
-                try:
-                    await client.close()
-                    logger.debug(f"已关闭连接: {pool_key}")
-                except Exception as e:
-                    logger.warning(f"关闭连接出错: {pool_key} - {str(e)}")
+        # 等待进行中的创建完成，避免其在清理后放入新连接
+        if self._creating:
+            await asyncio.gather(*self._creating.values(), return_exceptions=True)
             
-            self.pools.clear()
-            self.last_used.clear()
-            self.reuse_counts.clear()
-            self.health_status.clear()
+        removed = []
+        for shard in range(self.shard_count):
+            async with self._shard_lock(shard):
+                for pool_key in [key for key in self.pools if self._shard_index(key) == shard]:
+                    removed.append((pool_key, self._remove(pool_key)))
+                    
+        for pool_key, client in removed:
+            await self._close(client, pool_key)
+            logger.debug(f"已关闭连接: {pool_key}")
             
         logger.info("所有交易所连接已清理完毕")
     
@@ -434,13 +444,25 @@ class ExchangeConnectionPool:
         获取连接池统计信息
         
         Returns:
-            Dict: 连接池统计信息
+            Dict: 连接池统计信息，wait 为等待分片锁和等待连接创建的时间（毫秒）
         """
         return {
             "active_connections": len(self.pools),
             "stats": self.stats,
+            "wait": {
+                kind: {
+                    "count": wait["count"],
+                    "avg_ms": round(wait["total"] / wait["count"] * 1000, 3) if wait["count"] else 0.0,
+                    "max_ms": round(wait["max"] * 1000, 3),
+                    "total_ms": round(wait["total"] * 1000, 3)
+                }
+                for kind, wait in self.wait_stats.items()
+            },
+            "creating": len(self._creating),
+            "shards": self.shard_count,
             "pools": list(self.pools.keys()),
-            "rate_limits": {k.value: v for k, v in self.rate_limits.items()}
+            "rate_limits": exchange_rate_limiter.get_stats(),
+            "market_metadata": market_metadata_cache.get_stats()
         } 
 
     async def get_client_with_cache(
@@ -1,24 +1,17 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import ccxt.async_support as ccxt
 from backend.app.schemas.trading import ExchangeEnum
+from backend.utils.rate_limiter import exchange_rate_limiter
 
-async def get_exchange_client(exchange: ExchangeEnum, api_key: str, api_secret: str) -> ccxt.Exchange:
+def create_exchange_client(exchange: ExchangeEnum, api_key: Optional[str] = None, api_secret: Optional[str] = None) -> ccxt.Exchange:
     """
-    獲取交易所客戶端實例
-    
-    注意：CCXT 庫僅支持 HMAC-SHA256 密鑰格式，不支持 Ed25519 密鑰。
-    請確保提供的 api_key 和 api_secret 是 HMAC-SHA256 格式的密鑰。
-    
-    Args:
-        exchange: 交易所枚舉
-        api_key: API Key (HMAC-SHA256 格式)
-        api_secret: API Secret (HMAC-SHA256 格式)
-    
-    Returns:
-        ccxt.Exchange: 交易所客戶端實例
-    
+    創建交易所客戶端實例，不加載市場
+
+    不提供密鑰時創建只能訪問公開接口的客戶端。
+    所有客戶端的請求都經過共享的頻率限制器，而不是各自獨立節流。
+
     Raises:
-        ValueError: 如果交易所不支持或使用了不兼容的密鑰格式
+        ValueError: 如果交易所不支持
     """
     exchange_classes: Dict[ExchangeEnum, Any] = {
         ExchangeEnum.BINANCE: ccxt.binance,
@@ -30,20 +23,49 @@ async def get_exchange_client(exchange: ExchangeEnum, api_key: str, api_secret:
     
     if exchange not in exchange_classes:
         raise ValueError(f"Exchange {exchange} is not supported")
-    
-    # 創建交易所實例
-    exchange_class = exchange_classes[exchange]
-    client = exchange_class({
-        'apiKey': api_key,
-        'secret': api_secret,
-        'enableRateLimit': True,  # 啟用請求頻率限制
+
+    config = {
+        'enableRateLimit': True,  # 啟用請求頻率限制（由共享限制器接管）
         'options': {
             'defaultType': 'future',  # 默認使用合約市場
             'adjustForTimeDifference': True,  # 調整時間差
         }
-    })
-    
-    # 加載市場
-    await client.load_markets()
-    
-    return client 
\ No newline at end of file
+    }
+    if api_key and api_secret:
+        config['apiKey'] = api_key
+        config['secret'] = api_secret
+    return exchange_rate_limiter.attach(exchange_classes[exchange](config), exchange)
+
+async def get_exchange_client(exchange: ExchangeEnum, api_key: str, api_secret: str) -> ccxt.Exchange:
+    """
+    獲取交易所客戶端實例
+
+    注意：CCXT 庫僅支持 HMAC-SHA256 密鑰格式，不支持 Ed25519 密鑰。
+    請確保提供的 api_key 和 api_secret 是 HMAC-SHA256 格式的密鑰。
+
+    市場信息不由每個客戶端自行下載，而是從進程內共享的市場元數據緩存注入。
+
+    Args:
+        exchange: 交易所枚舉
+        api_key: API Key (HMAC-SHA256 格式)
+        api_secret: API Secret (HMAC-SHA256 格式)
+
+    Returns:
+        ccxt.Exchange: 交易所客戶端實例
+
+    Raises:
+        ValueError: 如果交易所不支持或使用了不兼容的密鑰格式
+    """
+    from backend.utils.market_metadata import market_metadata_cache
+
+    # 創建交易所實例
+    client = create_exchange_client(exchange, api_key, api_secret)
+
+    # 注入共享的市場信息
+    try:
+        await market_metadata_cache.inject(client, exchange)
+    except Exception:
+        await client.close()
+        raise
+
+    return client
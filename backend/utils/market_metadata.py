@@ -0,0 +1,318 @@
+"""
+交易所市場元數據緩存
+
+進程內共享 CCXT 的市場信息（load_markets 的結果）。每個交易所只由一個不帶密鑰的
+模板客戶端下載並解析一次 exchangeInfo，連接池中的每個用戶客戶端直接引用同一份
+markets / currencies 字典，不再自行加載市場。
+
+元數據按固定間隔在後台刷新（過期後仍返回舊數據），遇到無效交易對錯誤
+（幣安 -1121 / ccxt.BadSymbol）時提前刷新，刷新後自動更新所有已注入的客戶端。
+同時為 SymbolRules 表提供交易對規則。
+"""
+
+import asyncio
+import logging
+import os
+import time
+import weakref
+from decimal import Decimal
+from typing import Any, Dict, Optional
+
+import ccxt.async_support as ccxt
+from sqlalchemy.orm import Session
+
+from backend.app.core.async_cache import AsyncSingleFlightCache
+from backend.app.schemas.trading import ExchangeEnum
+
+logger = logging.getLogger(__name__)
+
+# 注入到客戶端的市場屬性，全部按引用共享
+SHARED_MARKET_ATTRIBUTES = (
+    "markets", "markets_by_id", "symbols", "ids",
+    "currencies", "currencies_by_id", "codes", "baseCurrencies", "quoteCurrencies"
+)
+
+# 市場類型 → CCXT 市場標誌，用於按交易所ID（如 BTCUSDT）查找時區分現貨和永續合約
+MARKET_TYPE_FLAGS = {"spot": "spot", "future": "swap", "futures": "swap", "swap": "swap", "delivery": "future"}
+
+# SymbolRules 的規則字段及缺失時的默認值
+SYMBOL_RULE_DEFAULTS = {
+    "price_precision": 8,
+    "quantity_precision": 8,
+    "min_quantity": Decimal("0"),
+    "min_notional": Decimal("0"),
+    "max_leverage": None,
+    "taker_fee": Decimal("0"),
+    "maker_fee": Decimal("0"),
+    "contract_value": None,
+}
+
+
+def _decimal(value: Any) -> Optional[Decimal]:
+    return Decimal(str(value)) if value is not None else None
+
+
+def _precision_digits(explicit: Any, precision: Any, precision_mode: int) -> Optional[int]:
+    """
+    轉換為小數位數
+
+    交易所直接提供的位數（如幣安合約的 pricePrecision）優先；否則按 CCXT 的精度模式換算，
+    TICK_SIZE 模式下 0.01 換算為 2 位。
+    """
+    if explicit is not None:
+        return int(explicit)
+    if precision is None:
+        return None
+    if precision_mode != ccxt.TICK_SIZE:
+        return int(precision)
+    return max(0, -Decimal(str(precision)).normalize().as_tuple().exponent)
+
+
+class MarketMetadataCache:
+    """
+    進程內共享的市場元數據緩存
+
+    每個交易所一個模板客戶端負責加載市場，加載由單飛緩存合併，
+    同一時間最多只有一個 exchangeInfo 請求。
+    """
+
+    def __init__(self, refresh_interval: Optional[float] = None, invalid_symbol_refresh_interval: float = 60.0):
+        """
+        初始化緩存
+
+        Args:
+            refresh_interval: 定期刷新間隔(秒)，默認讀取 MARKET_METADATA_REFRESH_INTERVAL
+            invalid_symbol_refresh_interval: 因無效交易對錯誤觸發刷新的最小間隔(秒)
+        """
+        self.refresh_interval = refresh_interval or float(os.getenv("MARKET_METADATA_REFRESH_INTERVAL", "3600"))
+        self.invalid_symbol_refresh_interval = invalid_symbol_refresh_interval
+        # 過期後仍返回舊數據並在後台刷新；加載失敗時60秒內不重試
+        self.cache = AsyncSingleFlightCache("market_metadata", ttl=self.refresh_interval, stale_ttl=7 * 86400, negative_ttl=60)
+        self._templates: Dict[ExchangeEnum, ccxt.Exchange] = {}
+        # 已注入的客戶端，刷新後需要同步更新；客戶端被回收後自動移除
+        self._clients: Dict[ExchangeEnum, "weakref.WeakSet[ccxt.Exchange]"] = {}
+        self._last_invalid_refresh: Dict[ExchangeEnum, float] = {}
+        self.stats = {"loads": 0, "injected": 0, "invalid_symbol_refreshes": 0}
+
+    def _get_template(self, exchange: ExchangeEnum) -> ccxt.Exchange:
+        template = self._templates.get(exchange)
+        if template is None:
+            from backend.utils.exchange import create_exchange_client
+            template = self._templates[exchange] = create_exchange_client(exchange)
+        return template
+
+    async def _load(self, exchange: ExchangeEnum) -> ccxt.Exchange:
+        """由模板客戶端加載市場，並更新所有已注入的客戶端"""
+        template = self._get_template(exchange)
+        started = time.monotonic()
+        await template.load_markets(reload=True)
+        self.stats["loads"] += 1
+        clients = self._clients.get(exchange)
+        for client in list(clients or ()):
+            self._apply(template, client)
+        logger.info(f"已加載 {exchange.value} 市場元數據: {len(template.markets)} 個市場，"
+                    f"耗時 {time.monotonic() - started:.2f} 秒")
+        return template
+
+    async def get_template(self, exchange: ExchangeEnum, force: bool = False) -> ccxt.Exchange:
+        """獲取已加載市場的模板客戶端"""
+        return await self.cache.get(exchange, lambda: self._load(exchange), force=force)
+
+    async def get_markets(self, exchange: ExchangeEnum) -> Dict[str, Dict[str, Any]]:
+        """獲取交易所的全部市場，鍵為 CCXT 統一符號"""
+        return (await self.get_template(exchange)).markets
+
+    @staticmethod
+    def _apply(template: ccxt.Exchange, client: ccxt.Exchange) -> None:
+        for attribute in SHARED_MARKET_ATTRIBUTES:
+            setattr(client, attribute, getattr(template, attribute))
+        # 幣安在加載市場時計算本地時鐘偏差，客戶端不再自行加載市場，沿用模板的結果
+        if "timeDifference" in template.options:
+            client.options["timeDifference"] = template.options["timeDifference"]
+
+    async def inject(self, client: ccxt.Exchange, exchange: ExchangeEnum) -> None:
+        """
+        將共享的市場信息注入客戶端
+
+        注入後客戶端的 load_markets() 直接返回共享數據，不會再請求交易所。
+        """
+        template = await self.get_template(exchange)
+        self._apply(template, client)
+        self._clients.setdefault(exchange, weakref.WeakSet()).add(client)
+        self.stats["injected"] += 1
+
+    @staticmethod
+    def is_invalid_symbol_error(error: Exception) -> bool:
+        """是否為無效交易對錯誤（可能是新上線的交易對，市場元數據已過時）"""
+        return isinstance(error, ccxt.BadSymbol) or "-1121" in str(error)
+
+    def refresh_on_invalid_symbol(self, exchange: ExchangeEnum) -> Optional[asyncio.Task]:
+        """
+        因無效交易對錯誤在後台刷新市場元數據
+
+        每個交易所在 invalid_symbol_refresh_interval 內最多觸發一次。
+
+        Returns:
+            Optional[asyncio.Task]: 刷新任務，被限流時返回None
+        """
+        now = time.monotonic()
+        last = self._last_invalid_refresh.get(exchange)
+        if last is not None and now - last < self.invalid_symbol_refresh_interval:
+            return None
+        self._last_invalid_refresh[exchange] = now
+        self.stats["invalid_symbol_refreshes"] += 1
+        logger.info(f"{exchange.value} 出現無效交易對，刷新市場元數據")
+        return self.cache.refresh(exchange, lambda: self._load(exchange))
+
+    @staticmethod
+    def _lookup(template: ccxt.Exchange, symbol: str, market_type: str) -> Optional[Dict[str, Any]]:
+        market = template.markets.get(symbol)
+        if market is not None:
+            return market
+        flag = MARKET_TYPE_FLAGS.get(market_type, market_type)
+        for candidate in (template.markets_by_id or {}).get(symbol.upper(), ()):
+            if candidate.get(flag):
+                return candidate
+        return None
+
+    async def find_market(self, exchange: ExchangeEnum, symbol: str, market_type: str = "future") -> Optional[Dict[str, Any]]:
+        """
+        查找市場
+
+        Args:
+            exchange: 交易所枚舉
+            symbol: CCXT 統一符號（如 BTC/USDT:USDT）或交易所ID（如 BTCUSDT）
+            market_type: 按交易所ID查找時的市場類型，spot 或 future
+
+        Returns:
+            Optional[Dict]: CCXT 市場結構，刷新後仍找不到時返回None
+        """
+        template = await self.get_template(exchange)
+        market = self._lookup(template, symbol, market_type)
+        if market is None:
+            refresh = self.refresh_on_invalid_symbol(exchange)
+            if refresh is not None:
+                template = await refresh
+                market = self._lookup(template, symbol, market_type)
+        return market
+
+    def _rules_from_market(self, exchange: ExchangeEnum, template: ccxt.Exchange, market: Dict[str, Any]) -> Dict[str, Any]:
+        info = market.get("info") or {}
+        precision = market.get("precision") or {}
+        limits = market.get("limits") or {}
+        max_leverage = (limits.get("leverage") or {}).get("max")
+        rules = {
+            "exchange": exchange.value,
+            "symbol": market["id"],
+            "price_precision": _precision_digits(info.get("pricePrecision"), precision.get("price"), template.precisionMode),
+            "quantity_precision": _precision_digits(info.get("quantityPrecision"), precision.get("amount"), template.precisionMode),
+            "min_quantity": _decimal((limits.get("amount") or {}).get("min")),
+            "min_notional": _decimal((limits.get("cost") or {}).get("min")),
+            "max_leverage": int(max_leverage) if max_leverage else None,
+            "taker_fee": _decimal(market.get("taker")),
+            "maker_fee": _decimal(market.get("maker")),
+            "contract_value": _decimal(market.get("contractSize")) if market.get("contract") else None,
+        }
+        for field, default in SYMBOL_RULE_DEFAULTS.items():
+            if rules[field] is None:
+                rules[field] = default
+        return rules
+
+    def _save_rules(self, db: Session, rules: Dict[str, Any]) -> None:
+        """寫入 SymbolRules，規則未變化時不寫入"""
+        from backend.app.db.models.grid import SymbolRules
+
+        row = db.query(SymbolRules).filter(
+            SymbolRules.exchange == rules["exchange"],
+            SymbolRules.symbol == rules["symbol"]
+        ).first()
+        if row is None:
+            row = SymbolRules(exchange=rules["exchange"], symbol=rules["symbol"])
+            db.add(row)
+        elif all(getattr(row, field) == rules[field] for field in SYMBOL_RULE_DEFAULTS):
+            return
+        for field in SYMBOL_RULE_DEFAULTS:
+            setattr(row, field, rules[field])
+        try:
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"保存交易對規則失敗: {rules['exchange']} {rules['symbol']} - {str(e)}")
+
+    def _load_saved_rules(self, db: Session, exchange: ExchangeEnum, symbol: str) -> Optional[Dict[str, Any]]:
+        from backend.app.db.models.grid import SymbolRules
+
+        row = db.query(SymbolRules).filter(
+            SymbolRules.exchange == exchange.value,
+            SymbolRules.symbol == symbol.upper()
+        ).first()
+        if row is None:
+            return None
+        rules = {"exchange": row.exchange, "symbol": row.symbol}
+        rules.update({field: getattr(row, field) for field in SYMBOL_RULE_DEFAULTS})
+        return rules
+
+    async def get_symbol_rules(self,
+                               exchange: ExchangeEnum,
+                               symbol: str,
+                               market_type: str = "future",
+                               db: Optional[Session] = None) -> Optional[Dict[str, Any]]:
+        """
+        獲取交易對規則（精度、最小數量、最小名義價值、槓桿上限、費率）
+
+        規則由共享的市場元數據計算；提供數據庫會話時同步寫入 SymbolRules，
+        交易所不可用時從 SymbolRules 讀取上次保存的規則。
+
+        Args:
+            exchange: 交易所枚舉
+            symbol: 交易所ID（如 BTCUSDT）或 CCXT 統一符號
+            market_type: spot 或 future
+            db: 數據庫會話（可選）
+
+        Returns:
+            Optional[Dict]: 字段與 SymbolRules 相同，交易對不存在時返回None
+        """
+        try:
+            market = await self.find_market(exchange, symbol, market_type)
+        except Exception as e:
+            if db is None:
+                raise
+            logger.warning(f"加載 {exchange.value} 市場元數據失敗，使用已保存的交易對規則: {str(e)}")
+            return self._load_saved_rules(db, exchange, symbol)
+        if market is None:
+            return None
+        rules = self._rules_from_market(exchange, self._templates[exchange], market)
+        if db is not None:
+            self._save_rules(db, rules)
+        return rules
+
+    async def close(self) -> None:
+        """關閉模板客戶端"""
+        for template in self._templates.values():
+            try:
+                await template.close()
+            except Exception as e:
+                logger.warning(f"關閉市場元數據客戶端出錯: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        獲取緩存統計信息
+
+        Returns:
+            Dict: 加載次數、注入次數及各交易所的市場數量、數據年齡和共享客戶端數
+        """
+        stats = self.stats.copy()
+        stats["exchanges"] = {
+            exchange.value: {
+                "markets": len(template.markets or {}),
+                "age_seconds": round(age, 1) if (age := self.cache.age(exchange)) is not None else None,
+                "clients": len(self._clients.get(exchange, ()))
+            }
+            for exchange, template in self._templates.items()
+        }
+        stats["cache"] = self.cache.get_stats()
+        return stats
+
+
+# 創建全局實例
+market_metadata_cache = MarketMetadataCache()
@@ -0,0 +1,480 @@
+"""
+交易所請求頻率限制模組
+
+所有交易所客戶端共享同一個限制器，按請求權重從令牌桶扣除額度：
+
+- 每個交易所一個按出口 IP 計算的權重桶，所有用戶共享；幣安的現貨（/api、/sapi）、
+  U本位合約（/fapi）、幣本位合約（/dapi）等 API 各自計算額度，分別使用獨立的桶
+- 每個 API Key 的下單次數桶（幣安現貨 10 秒 / 1 天、合約 10 秒 / 1 分鐘下單限制）
+- 請求權重取自 CCXT 為每個端點定義的 cost，不同端點權重不同
+- 根據幣安返回的 X-MBX-USED-WEIGHT-1M / X-MBX-ORDER-COUNT-* 響應頭校正本地額度
+- 收到 429 / 418 時按 Retry-After 暫停該交易所的所有請求
+- 可選使用 Redis 存儲令牌桶，多個應用節點共享同一份額度
+
+令牌允許透支：額度不足時先預留，再在鎖外等待相應時間，
+等待中的請求按預留順序依次放行，不會阻塞其他交易所或已有額度的請求。
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import ccxt.async_support as ccxt
+
+from backend.app.schemas.trading import ExchangeEnum
+
+logger = logging.getLogger(__name__)
+
+# 每個交易所按 IP 計算的權重上限：(額度, 窗口秒數)，單位與 CCXT 端點 cost 一致
+IP_LIMITS: Dict[ExchangeEnum, Tuple[float, float]] = {
+    ExchangeEnum.BINANCE: (1200, 60),
+    ExchangeEnum.BYBIT: (600, 60),
+    ExchangeEnum.okx: (600, 60),
+    ExchangeEnum.GATE: (600, 60),
+    ExchangeEnum.MEXC: (500, 60),
+}
+
+# 幣安按 API 類別分別計算額度：類別 -> 原生 IP 權重上限（每分鐘）
+# CCXT 將各類別的端點權重統一折算為 IP_LIMITS 中的額度，因此各類別的桶容量相同但互不影響
+BINANCE_API_FAMILIES: Dict[str, float] = {"spot": 6000, "fapi": 2400, "dapi": 2400, "eapi": 2400, "papi": 6000}
+
+# 每個 API Key 的下單次數上限：名稱 -> (次數, 窗口秒數)，幣安按 API 類別區分
+ORDER_LIMITS: Dict[ExchangeEnum, Dict[str, Tuple[float, float]]] = {
+    ExchangeEnum.BINANCE: {"orders_10s": (300, 10), "orders_1m": (1200, 60)},
+}
+BINANCE_ORDER_LIMITS: Dict[str, Dict[str, Tuple[float, float]]] = {
+    "spot": {"orders_10s": (100, 10), "orders_1d": (200000, 86400)},
+    "fapi": ORDER_LIMITS[ExchangeEnum.BINANCE],
+    "dapi": ORDER_LIMITS[ExchangeEnum.BINANCE],
+}
+
+# 幣安響應頭與令牌桶的對應關係
+BINANCE_WEIGHT_HEADER = "x-mbx-used-weight-1m"
+BINANCE_ORDER_HEADERS = {"x-mbx-order-count-10s": "orders_10s", "x-mbx-order-count-1m": "orders_1m",
+                         "x-mbx-order-count-1d": "orders_1d"}
+
+# 幣安計入下單次數的端點
+BINANCE_ORDER_PATHS = {"order", "batchOrders"}
+
+# 收到 429 / 418 但沒有 Retry-After 時暫停的秒數
+DEFAULT_BAN_SECONDS = 10.0
+
+# Redis 出錯後暫停使用 Redis 的秒數
+REDIS_RETRY_INTERVAL = 60.0
+
+REDIS_KEY_PREFIX = "exchange_rate:"
+
+# 原子更新多個令牌桶，返回需要等待的秒數
+# ARGV[1] 為模式：take 扣除（負數即退還）額度；cap 將額度壓到不超過給定上限
+# 其後每個桶依次為 容量、每秒補充量、數值
+REDIS_BUCKET_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local mode = ARGV[1]
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 3 - 1])
+    local rate = tonumber(ARGV[i * 3])
+    local value = tonumber(ARGV[i * 3 + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    if mode == 'take' then
+        tokens = math.min(capacity, tokens - value)
+    else
+        tokens = math.min(tokens, value)
+    end
+    redis.call('HMSET', key, 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('EXPIRE', key, math.ceil(capacity / rate) + 60)
+    if tokens < 0 then
+        wait = math.max(wait, -tokens / rate)
+    end
+end
+return tostring(wait)
+"""
+
+
+class RateLimitWaitExceeded(ccxt.RateLimitExceeded):
+    """額度不足且預計等待時間超過上限"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    本地令牌桶
+
+    額度允許為負數，表示已被預留的未來額度。
+    """
+
+    def __init__(self, capacity: float, window: float):
+        self.capacity = float(capacity)
+        self.refill_rate = self.capacity / window  # 每秒補充的額度
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+
+    def take(self, amount: float) -> float:
+        """
+        扣除額度（負數表示退還）
+
+        Returns:
+            float: 額度恢復到非負前需要等待的秒數
+        """
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+        return self.wait_time()
+
+    def cap(self, ceiling: float) -> float:
+        """將額度壓到不超過 ceiling，用於按響應頭校正或封禁暫停"""
+        self._refill()
+        self.tokens = min(self.tokens, ceiling)
+        return self.wait_time()
+
+    def wait_time(self) -> float:
+        return max(0.0, -self.tokens / self.refill_rate)
+
+    def available(self) -> float:
+        self._refill()
+        return self.tokens
+
+
+class ExchangeRateLimiter:
+    """
+    交易所請求頻率限制器
+
+    用法:
+        client = create_exchange_client(exchange, api_key, api_secret)
+        exchange_rate_limiter.attach(client, exchange)   # 此後客戶端的每個 REST 請求都經過限制器
+    """
+
+    def __init__(self, max_wait: Optional[float] = None, use_redis: Optional[bool] = None):
+        """
+        Args:
+            max_wait: 單個請求最多等待額度的秒數，超過時拋出 RateLimitWaitExceeded
+            use_redis: 是否使用 Redis 在多個節點間共享額度，默認讀取環境變量
+        """
+        self.max_wait = max_wait if max_wait is not None else float(os.getenv("EXCHANGE_RATE_LIMIT_MAX_WAIT", "30"))
+        if use_redis is None:
+            use_redis = (os.getenv("REDIS_ENABLED", "false").lower() == "true"
+                         and os.getenv("EXCHANGE_RATE_LIMIT_REDIS", "false").lower() == "true")
+        self.use_redis = use_redis
+        self.buckets: Dict[str, TokenBucket] = {}
+        self._redis = None
+        self._redis_failed_at: Optional[float] = None
+        self._pending: set = set()
+        self.stats = {
+            "requests": 0,      # 經過限制器的請求數
+            "weight": 0.0,      # 累計權重
+            "delayed": 0,       # 需要等待額度的請求數
+            "wait_time": 0.0,   # 累計等待秒數
+            "rejected": 0,      # 等待時間超過上限被拒絕的請求數
+            "corrections": 0,   # 按響應頭校正額度的次數
+            "bans": 0,          # 收到 429 / 418 的次數
+            "redis_errors": 0,
+        }
+
+    @staticmethod
+    def _key_id(api_key: Optional[str]) -> Optional[str]:
+        """API Key 只以摘要形式出現在桶名和 Redis 中"""
+        if not api_key:
+            return None
+        return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+    @staticmethod
+    def _api_family(exchange: ExchangeEnum, api: Optional[str]) -> Optional[str]:
+        """
+        幣安請求所屬的 API 類別，其他交易所返回 None
+
+        Args:
+            exchange: 交易所
+            api: CCXT 的 api 類型（如 fapiPrivate、sapi）或請求 URL
+
+        Returns:
+            Optional[str]: BINANCE_API_FAMILIES 中的類別，無法識別時為 spot
+        """
+        if exchange != ExchangeEnum.BINANCE:
+            return None
+        api = str(api or "")
+        for family in BINANCE_API_FAMILIES:
+            if family != "spot" and (api.startswith(family) or f"/{family}/" in api):
+                return family
+        return "spot"
+
+    def _ip_bucket(self, exchange: ExchangeEnum, family: Optional[str]) -> Tuple[str, float, float]:
+        """返回 IP 權重桶 (桶名, 容量, 窗口秒數)"""
+        capacity, window = IP_LIMITS[exchange]
+        return (f"{exchange.value}:ip:{family}" if family else f"{exchange.value}:ip"), capacity, window
+
+    @staticmethod
+    def _order_limits(exchange: ExchangeEnum, family: Optional[str]) -> Dict[str, Tuple[float, float]]:
+        if family is not None:
+            return BINANCE_ORDER_LIMITS.get(family, {})
+        return ORDER_LIMITS.get(exchange, {})
+
+    def _buckets_for(self, exchange: ExchangeEnum, key_id: Optional[str], order_buckets: bool,
+                     family: Optional[str] = None) -> List[Tuple[str, float, float]]:
+        """返回 [(桶名, 容量, 窗口秒數)]，第一個為 IP 權重桶"""
+        result = []
+        if exchange in IP_LIMITS:
+            result.append(self._ip_bucket(exchange, family))
+        if order_buckets and key_id:
+            prefix = f"{exchange.value}:{key_id}:{family}" if family else f"{exchange.value}:{key_id}"
+            for name, (capacity, window) in self._order_limits(exchange, family).items():
+                result.append((f"{prefix}:{name}", capacity, window))
+        return result
+
+    def _local(self, name: str, capacity: float, window: float) -> TokenBucket:
+        bucket = self.buckets.get(name)
+        if bucket is None:
+            bucket = self.buckets[name] = TokenBucket(capacity, window)
+        return bucket
+
+    async def _get_redis(self):
+        """Redis 可用時返回連接池，出錯後暫停一段時間再嘗試"""
+        if not self.use_redis:
+            return None
+        if self._redis_failed_at is not None and time.monotonic() - self._redis_failed_at < REDIS_RETRY_INTERVAL:
+            return None
+        if self._redis is None:
+            try:
+                from backend.app.core.websocket_redis import get_redis_pool
+                self._redis = await get_redis_pool()
+            except Exception as e:
+                logger.warning(f"無法連接 Redis，交易所頻率限制改用本地令牌桶: {str(e)}")
+            if self._redis is None:
+                self._redis_failed_at = time.monotonic()
+        return self._redis
+
+    async def _apply(self, mode: str, updates: List[Tuple[str, float, float, float]]) -> float:
+        """
+        對多個令牌桶執行 take / cap，優先使用 Redis，失敗時退回本地令牌桶
+
+        Args:
+            mode: take 或 cap
+            updates: [(桶名, 容量, 窗口秒數, 數值)]
+
+        Returns:
+            float: 需要等待的秒數（各桶中最長者）
+        """
+        if not updates:
+            return 0.0
+        redis = await self._get_redis()
+        if redis is not None:
+            args = [mode]
+            for _, capacity, window, value in updates:
+                args.extend([capacity, capacity / window, value])
+            try:
+                result = await redis.eval(REDIS_BUCKET_SCRIPT,
+                                          keys=[REDIS_KEY_PREFIX + name for name, _, _, _ in updates],
+                                          args=args)
+                return float(result)
+            except Exception as e:
+                self.stats["redis_errors"] += 1
+                self._redis = None
+                self._redis_failed_at = time.monotonic()
+                logger.warning(f"Redis 令牌桶更新失敗，改用本地令牌桶: {str(e)}")
+
+        wait = 0.0
+        for name, capacity, window, value in updates:
+            bucket = self._local(name, capacity, window)
+            wait = max(wait, bucket.take(value) if mode == "take" else bucket.cap(value))
+        return wait
+
+    async def acquire(self, exchange: ExchangeEnum, api_key: Optional[str] = None,
+                      weight: float = 1, orders: int = 0, max_wait: Optional[float] = None,
+                      api: Optional[str] = None) -> float:
+        """
+        預留額度並等待到可以發出請求
+
+        Args:
+            exchange: 交易所
+            api_key: 發出請求的 API Key，公開請求為 None
+            weight: 請求權重
+            orders: 請求包含的下單數量
+            max_wait: 最多等待的秒數，默認使用限制器的設置
+            api: CCXT 的 api 類型或請求 URL，幣安據此選擇 API 類別的額度，默認為現貨
+
+        Returns:
+            float: 實際等待的秒數
+
+        Raises:
+            RateLimitWaitExceeded: 預計等待時間超過 max_wait，預留的額度已退還
+        """
+        max_wait = self.max_wait if max_wait is None else max_wait
+        buckets = self._buckets_for(exchange, self._key_id(api_key), orders > 0, self._api_family(exchange, api))
+        updates = [(name, capacity, window, weight if index == 0 else orders)
+                   for index, (name, capacity, window) in enumerate(buckets)]
+        wait = await self._apply("take", updates)
+
+        if wait > max_wait:
+            await self._apply("take", [(name, capacity, window, -value) for name, capacity, window, value in updates])
+            self.stats["rejected"] += 1
+            raise RateLimitWaitExceeded(
+                f"{exchange.value} 請求額度不足，預計需等待 {wait:.1f} 秒，超過上限 {max_wait:.1f} 秒", wait
+            )
+
+        self.stats["requests"] += 1
+        self.stats["weight"] += weight
+        if wait > 0:
+            self.stats["delayed"] += 1
+            self.stats["wait_time"] += wait
+            logger.debug(f"{exchange.value} 請求額度不足，等待 {wait:.2f} 秒")
+            await asyncio.sleep(wait)
+        return wait
+
+    async def update_from_headers(self, exchange: ExchangeEnum, api_key: Optional[str],
+                                  url: str, headers: Dict[str, Any]) -> None:
+        """
+        按交易所返回的已用額度校正令牌桶
+
+        交易所統計的已用額度包含其他進程或節點的請求，本地額度只會被調低，不會調高。
+        """
+        if exchange != ExchangeEnum.BINANCE or not headers:
+            return
+        headers = {str(k).lower(): v for k, v in headers.items()}
+        family = self._api_family(exchange, url)
+        updates = []
+        try:
+            used = headers.get(BINANCE_WEIGHT_HEADER)
+            if used is not None:
+                name, capacity, window = self._ip_bucket(exchange, family)
+                updates.append((name, capacity, window,
+                                capacity - float(used) * capacity / BINANCE_API_FAMILIES[family]))
+
+            key_id = self._key_id(api_key)
+            if key_id:
+                limits = self._order_limits(exchange, family)
+                for header, name in BINANCE_ORDER_HEADERS.items():
+                    count = headers.get(header)
+                    if count is not None and name in limits:
+                        capacity, window = limits[name]
+                        updates.append((f"{exchange.value}:{key_id}:{family}:{name}", capacity, window,
+                                        capacity - float(count)))
+        except (TypeError, ValueError) as e:
+            logger.debug(f"無法解析{exchange.value}的頻率限制響應頭: {str(e)}")
+            return
+
+        if updates:
+            await self._apply("cap", updates)
+            self.stats["corrections"] += 1
+
+    async def penalize(self, exchange: ExchangeEnum, headers: Optional[Dict[str, Any]] = None,
+                       api: Optional[str] = None) -> None:
+        """收到 429 / 418 後暫停該交易所（幣安為該 API 類別）的所有請求，時長取 Retry-After"""
+        retry_after = None
+        for key, value in (headers or {}).items():
+            if str(key).lower() == "retry-after":
+                try:
+                    retry_after = float(value)
+                except (TypeError, ValueError):
+                    pass
+        seconds = retry_after if retry_after is not None else DEFAULT_BAN_SECONDS
+        self.stats["bans"] += 1
+        logger.warning(f"{exchange.value} 返回頻率限制錯誤，暫停請求 {seconds:.0f} 秒")
+        if exchange in IP_LIMITS:
+            name, capacity, window = self._ip_bucket(exchange, self._api_family(exchange, api))
+            await self._apply("cap", [(name, capacity, window, -capacity / window * seconds)])
+
+    @staticmethod
+    def _order_count(exchange: ExchangeEnum, path: str, method: str, params: Dict[str, Any]) -> int:
+        """請求包含的下單數量，僅統計有下單次數限制的交易所"""
+        if exchange != ExchangeEnum.BINANCE or str(method).upper() != "POST" or path not in BINANCE_ORDER_PATHS:
+            return 0
+        if path == "batchOrders":
+            batch = params.get("batchOrders") if isinstance(params, dict) else None
+            return len(batch) if isinstance(batch, list) else 1
+        return 1
+
+    def _track(self, coro) -> None:
+        """在後台執行響應頭校正，不阻塞 CCXT 的同步回調"""
+        task = asyncio.ensure_future(coro)
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    def attach(self, client: ccxt.Exchange, exchange: ExchangeEnum) -> ccxt.Exchange:
+        """
+        讓客戶端的所有 REST 請求經過共享限制器
+
+        以共享令牌桶取代 CCXT 按客戶端實例計算的節流，權重取 CCXT 為端點定義的 cost。
+
+        Args:
+            client: CCXT 客戶端
+            exchange: 交易所枚舉
+
+        Returns:
+            ccxt.Exchange: 同一個客戶端
+        """
+        if getattr(client, "shared_rate_limiter", None) is self:
+            return client
+        limiter = self
+        api_key = getattr(client, "apiKey", None) or None
+        fetch2 = client.fetch2
+        on_rest_response = client.on_rest_response
+        client.enableRateLimit = False
+        client.shared_rate_limiter = self
+
+        async def limited_fetch2(path, api='public', method='GET', params={}, headers=None, body=None, config={}):
+            weight = client.calculate_rate_limiter_cost(api, method, path, params, config)
+            orders = limiter._order_count(exchange, path, method, params)
+            await limiter.acquire(exchange, api_key, weight, orders, api=api)
+            try:
+                return await fetch2(path, api, method, params, headers, body, config)
+            except (ccxt.RateLimitExceeded, ccxt.DDoSProtection) as e:
+                if not isinstance(e, RateLimitWaitExceeded):
+                    await limiter.penalize(exchange, client.last_response_headers, api)
+                raise
+
+        def observed_on_rest_response(code, reason, url, method, response_headers, response_body,
+                                      request_headers, request_body):
+            if response_headers:
+                limiter._track(limiter.update_from_headers(exchange, api_key, url, response_headers))
+            return on_rest_response(code, reason, url, method, response_headers, response_body,
+                                    request_headers, request_body)
+
+        client.fetch2 = limited_fetch2
+        client.on_rest_response = observed_on_rest_response
+        return client
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        獲取限制器統計信息
+
+        Returns:
+            Dict[str, Any]: 各交易所的額度設置、本地令牌桶剩餘額度及統計
+        """
+        return {
+            "backend": "redis" if self._redis is not None else "local",
+            "max_wait": self.max_wait,
+            "limits": {
+                exchange.value: {
+                    "ip_weight": {"capacity": capacity, "window_seconds": window},
+                    "per_api_key": {name: {"capacity": c, "window_seconds": w}
+                                    for name, (c, w) in ORDER_LIMITS.get(exchange, {}).items()}
+                }
+                for exchange, (capacity, window) in IP_LIMITS.items()
+            },
+            "binance_api_families": {
+                family: {"native_weight_1m": native,
+                         "per_api_key": {name: {"capacity": c, "window_seconds": w}
+                                         for name, (c, w) in BINANCE_ORDER_LIMITS.get(family, {}).items()}}
+                for family, native in BINANCE_API_FAMILIES.items()
+            },
+            "ip_buckets": {name: round(bucket.available(), 2)
+                           for name, bucket in self.buckets.items() if ":ip" in name},
+            "stats": {k: round(v, 3) if isinstance(v, float) else v for k, v in self.stats.items()},
+        }
+
+
+# 創建全局實例
+exchange_rate_limiter = ExchangeRateLimiter()